@@ -0,0 +1,85 @@
+"""Benchmark per-diagram overhead of one-process-per-graph vs batched rendering.
+
+Usage::
+
+    python benchmarks/bench_batch_render.py --count 500 --format svg
+
+Generates *count* small specs, renders them once with
+``redspec.generator.pipeline.generate`` (one ``dot`` process per diagram) and
+once with ``generate_batch`` (one ``dot`` process per chunk), and prints the
+mean wall-clock cost per diagram for each mode.  Requires Graphviz on PATH.
+"""
+
+from __future__ import annotations
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from redspec.generator.pipeline import generate, generate_batch
+from redspec.models.diagram import DiagramSpec
+
+
+def _make_spec(index: int) -> DiagramSpec:
+    return DiagramSpec.model_validate({
+        "diagram": {"name": f"Bench {index}"},
+        "resources": [
+            {
+                "type": "azure/vnet",
+                "name": f"vnet-{index}",
+                "children": [
+                    {"type": "azure/app-service", "name": f"web-{index}"},
+                    {"type": "azure/sql-database", "name": f"db-{index}"},
+                ],
+            },
+            {"type": "azure/storage", "name": f"store-{index}"},
+        ],
+        "connections": [
+            {"from": f"web-{index}", "to": f"db-{index}", "label": "SQL"},
+            {"from": f"web-{index}", "to": f"store-{index}"},
+        ],
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=500)
+    parser.add_argument("--format", default="svg", choices=["svg", "png"])
+    parser.add_argument("--chunk-size", type=int, default=64)
+    args = parser.parse_args()
+
+    if shutil.which("dot") is None:
+        sys.exit("Graphviz 'dot' was not found on PATH; install Graphviz to run this benchmark.")
+
+    specs = [_make_spec(i) for i in range(args.count)]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        base = Path(tmpdir)
+
+        start = time.perf_counter()
+        for i, spec in enumerate(specs):
+            generate(spec, str(base / "single" / f"d{i}.{args.format}"), out_format=args.format)
+        single = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = generate_batch(
+            [(spec, str(base / "batched" / f"d{i}.{args.format}")) for i, spec in enumerate(specs)],
+            out_format=args.format,
+            chunk_size=args.chunk_size,
+        )
+        batched = time.perf_counter() - start
+
+    failures = [r for r in results if isinstance(r, Exception)]
+    print(f"{args.count} diagrams, format={args.format}, chunk_size={args.chunk_size}")
+    print(f"  one process per diagram: {single:8.2f}s total, {single / args.count * 1000:7.1f} ms/diagram")
+    print(f"  batched:                 {batched:8.2f}s total, {batched / args.count * 1000:7.1f} ms/diagram")
+    print(f"  speed-up: {single / batched:.1f}x")
+    if failures:
+        print(f"  {len(failures)} batched renders failed, first error: {failures[0]}")
+
+
+if __name__ == "__main__":
+    main()
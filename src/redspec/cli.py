@@ -1,11 +1,36 @@
 """Command-line interface for redspec."""
 
+import json
+import shutil
+import sys
 import tempfile
+from collections.abc import Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
+from typing import Any
 
 import click
 
 
+def _size_option(ctx: click.Context, param: click.Parameter, value: str | None) -> int | None:
+    from redspec.generator.retention import parse_size
+
+    try:
+        return None if value is None else parse_size(value)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc)) from exc
+
+
+def _duration_option(ctx: click.Context, param: click.Parameter, value: str | None) -> float | None:
+    from redspec.generator.retention import parse_duration
+
+    try:
+        return None if value is None else parse_duration(value)
+    except ValueError as exc:
+        raise click.BadParameter(str(exc)) from exc
+
+
 @click.group()
 def main() -> None:
     """Redspec -- generate architecture diagrams from YAML."""
@@ -46,9 +71,16 @@ def main() -> None:
 )
 @click.option(
     "--export-format",
-    type=click.Choice(["mermaid", "plantuml", "drawio"]),
-    default=None,
-    help="Export to text-based format instead of rendering.",
+    multiple=True,
+    help="Export to a text-based format instead of rendering: mermaid, plantuml, drawio, "
+    "json, graphml or a format added by an exporter plugin.  Repeat it, give a comma-separated list "
+    "or 'all' to write several exports next to the rendered diagram in one run.",
+)
+@click.option(
+    "--compressed",
+    is_flag=True,
+    default=False,
+    help="With --export-format drawio, use draw.io's compressed diagram encoding.",
 )
 @click.option("--report", is_flag=True, default=False, help="Generate PDF report instead of plain diagram.")
 @click.option(
@@ -66,7 +98,8 @@ def generate(
     strict: bool,
     direction: str | None,
     dpi: int | None,
-    export_format: str | None,
+    export_format: tuple[str, ...],
+    compressed: bool,
     report: bool,
     polish: str | None,
     glow: bool | None,
@@ -82,26 +115,23 @@ def generate(
     if output and output_dir:
         raise click.UsageError("Cannot use both -o/--output and -d/--output-dir.")
 
-    # Text-based export mode
-    if export_format:
+    formats = _export_formats(export_format)
+    if len(formats) > 1 and report and not output:
+        raise click.UsageError("--report with several export formats needs -o/--output.")
+
+    # A single text-based export replaces rendering, streamed to the output
+    if len(formats) == 1 and "all" not in export_format:
+        from redspec.exporters.registry import ExportOptions, write_export
+
         spec = parse_yaml(yaml_file)
-        if export_format == "mermaid":
-            from redspec.exporters.mermaid import export_mermaid
-            text = export_mermaid(spec)
-        elif export_format == "plantuml":
-            from redspec.exporters.plantuml import export_plantuml
-            text = export_plantuml(spec)
-        elif export_format == "drawio":
-            from redspec.exporters.drawio import export_drawio
-            text = export_drawio(spec)
-        else:
-            raise click.UsageError(f"Unknown export format: {export_format}")
+        options = ExportOptions(icon_registry=IconRegistry(), compressed=compressed)
 
         if output:
-            Path(output).write_text(text, encoding="utf-8")
+            with open(output, "w", encoding="utf-8") as stream:
+                write_export(formats[0], spec, stream, options)
             click.echo(f"Exported to {output}")
         else:
-            click.echo(text)
+            write_export(formats[0], spec, sys.stdout, options)
         return
 
     azure_pack = ALL_PACKS["azure"]
@@ -124,16 +154,23 @@ def generate(
 
     if output:
         # Direct file output (backward compatible)
-        result = run_pipeline(
-            spec,
-            output,
-            icon_registry=registry,
-            strict=strict,
-            out_format=out_format,
-            direction_override=direction_val,
-            dpi_override=dpi_val,
-            glow=glow,
-        )
+        with ThreadPoolExecutor(max_workers=max(len(formats), 1)) as executor:
+            render = partial(
+                run_pipeline,
+                spec,
+                output,
+                icon_registry=registry,
+                strict=strict,
+                out_format=out_format,
+                direction_override=direction_val,
+                dpi_override=dpi_val,
+                glow=glow,
+            )
+            result, exports = _render_and_export(
+                executor, render, spec, formats, Path(output), registry, compressed
+            )
+            for future in exports:
+                click.echo(f"Exported to {future.result()}")
 
         # PDF report mode
         if report:
@@ -145,9 +182,11 @@ def generate(
         # Organized output mode
         target_dir = Path(output_dir) if output_dir else Path("./output")
 
-        with tempfile.TemporaryDirectory() as tmpdir:
+        with tempfile.TemporaryDirectory() as tmpdir, \
+                ThreadPoolExecutor(max_workers=max(len(formats), 1)) as executor:
             tmp_output = str(Path(tmpdir) / f"diagram.{out_format}")
-            generated = run_pipeline(
+            render = partial(
+                run_pipeline,
                 spec,
                 tmp_output,
                 icon_registry=registry,
@@ -157,6 +196,10 @@ def generate(
                 dpi_override=dpi_val,
                 glow=glow,
             )
+            generated, exports = _render_and_export(
+                executor, render, spec, formats, Path(tmp_output), registry, compressed
+            )
+            written = [future.result() for future in exports]
 
             # PDF report mode
             if report:
@@ -171,12 +214,82 @@ def generate(
                 theme=spec.diagram.theme,
                 direction=direction_val or spec.diagram.direction,
                 dpi=dpi_val or spec.diagram.dpi,
+                move=True,
                 format=out_format,
             )
+            for path in written:
+                target = result.parent / path.name
+                shutil.move(path, target)
+                click.echo(f"Exported to {target}")
 
         click.echo(f"Diagram written to {result}")
 
 
+def _export_formats(values: tuple[str, ...]) -> list[str]:
+    """The export formats named by repeated or comma-separated *values*, 'all' expanded."""
+    from redspec.exceptions import ExportFormatNotFoundError
+    from redspec.exporters.registry import exporter_names, get_exporter
+
+    formats: list[str] = []
+    for value in values:
+        for name in filter(None, (part.strip() for part in value.split(","))):
+            for fmt in exporter_names() if name == "all" else [name]:
+                try:
+                    get_exporter(fmt)
+                except ExportFormatNotFoundError as exc:
+                    raise click.UsageError(str(exc)) from exc
+                if fmt not in formats:
+                    formats.append(fmt)
+    return formats
+
+
+def _render_and_export(
+    executor: ThreadPoolExecutor,
+    render: Callable[..., Path],
+    spec: Any,
+    formats: list[str],
+    diagram_path: Path,
+    registry: Any,
+    compressed: bool,
+) -> tuple[Path, list[Future[Path]]]:
+    """Run *render* and write *spec* in each of *formats* next to *diagram_path*.
+
+    The exports are written concurrently in *executor*, each named after
+    the diagram with the exporter's extension.  Formats that place nodes
+    wait for the diagram's layout, which *render* (a partial
+    :func:`~redspec.generator.pipeline.generate`) reports through its
+    ``on_layout`` callback from the same Graphviz run as the image.
+    """
+    from redspec.exporters.registry import (
+        Exporter,
+        ExportOptions,
+        get_exporter,
+        write_export,
+    )
+    from redspec.generator.layout import Layout
+
+    exporters = [get_exporter(fmt) for fmt in formats]
+    layout: Future[Layout | None] | None = Future() if any(e.uses_layout for e in exporters) else None
+
+    def write(exporter: Exporter) -> Path:
+        options = ExportOptions(icon_registry=registry, use_graphviz=False, compressed=compressed)
+        if exporter.uses_layout and layout is not None:
+            options.layout = layout.result()
+        path = diagram_path.with_suffix(exporter.extension)
+        with open(path, "w", encoding="utf-8") as stream:
+            write_export(exporter.name, spec, stream, options)
+        return path
+
+    exports = [executor.submit(write, exporter) for exporter in exporters]
+    try:
+        generated = render(on_layout=layout.set_result if layout is not None else None)
+    finally:
+        # Without a layout (the render failed) the exports use their grid
+        if layout is not None and not layout.done():
+            layout.set_result(None)
+    return generated, exports
+
+
 def _generate_report(spec, diagram_path: Path) -> None:
     """Generate a PDF report."""
     try:
@@ -298,8 +411,139 @@ def validate(yaml_file: str, lint: bool) -> None:
     type=click.Path(file_okay=False),
     help="Output directory for generated diagrams.",
 )
-def serve(port: int, host: str, output_dir: str) -> None:
-    """Start the Redspec web UI."""
+@click.option(
+    "--render-workers",
+    default=2,
+    type=click.IntRange(min=1),
+    help="Diagrams rendered concurrently (default: 2).",
+)
+@click.option(
+    "--render-queue",
+    default=16,
+    type=click.IntRange(min=0),
+    help="Render requests that may wait for a worker before new ones are refused (default: 16).",
+)
+@click.option(
+    "--render-processes",
+    is_flag=True,
+    default=False,
+    help="Render in worker processes instead of threads.",
+)
+@click.option(
+    "--cache-dir",
+    default=None,
+    type=click.Path(file_okay=False),
+    help="Directory for cached render results (default: ~/.cache/redspec/results).",
+)
+@click.option(
+    "--no-disk-cache",
+    is_flag=True,
+    default=False,
+    help="Keep cached render results in memory only.",
+)
+@click.option(
+    "--async-threshold",
+    default=2.0,
+    type=click.FloatRange(min=0),
+    help="Render specs estimated to take longer than this many seconds as background jobs (default: 2).",
+)
+@click.option(
+    "--max-render-seconds",
+    default=None,
+    type=click.FloatRange(min=0),
+    help="Refuse renders estimated to take longer than this many seconds.",
+)
+@click.option(
+    "--max-render-memory",
+    default=None,
+    callback=_size_option,
+    help="Refuse renders estimated to need more memory than this, e.g. 2G.",
+)
+@click.option(
+    "--client-quota",
+    default=None,
+    type=click.FloatRange(min=0, min_open=True),
+    help="Estimated render-seconds each client may use per minute.",
+)
+@click.option(
+    "--job-retention",
+    default=3600,
+    type=click.IntRange(min=0),
+    help="Seconds finished background jobs and their results are kept (default: 3600).",
+)
+@click.option(
+    "--max-bytes",
+    default=None,
+    callback=_size_option,
+    help="Keep the gallery under this size, e.g. 500M or 20G.",
+)
+@click.option(
+    "--max-entries",
+    default=None,
+    type=click.IntRange(min=0),
+    help="Keep at most this many gallery entries.",
+)
+@click.option(
+    "--max-age",
+    default=None,
+    callback=_duration_option,
+    help="Remove entries not viewed for this long, e.g. 12h or 30d.",
+)
+@click.option(
+    "--gc-interval",
+    default=600,
+    type=click.IntRange(min=1),
+    help="Seconds between gallery retention runs (default: 600).",
+)
+@click.option(
+    "--history-artifacts",
+    default=5,
+    type=click.IntRange(min=0),
+    help="Rendered diagrams kept per gallery entry's revision history (default: 5).",
+)
+@click.option(
+    "--svgz",
+    is_flag=True,
+    default=False,
+    help="Store gallery SVGs gzip-compressed (diagram.svgz).",
+)
+@click.option(
+    "-w",
+    "--workers",
+    default=1,
+    type=click.IntRange(min=1),
+    help="Server worker processes sharing the output directory (default: 1).",
+)
+def serve(
+    port: int,
+    host: str,
+    output_dir: str,
+    render_workers: int,
+    render_queue: int,
+    render_processes: bool,
+    cache_dir: str | None,
+    no_disk_cache: bool,
+    async_threshold: float,
+    max_render_seconds: float | None,
+    max_render_memory: int | None,
+    client_quota: float | None,
+    job_retention: int,
+    max_bytes: int | None,
+    max_entries: int | None,
+    max_age: float | None,
+    gc_interval: int,
+    history_artifacts: int,
+    svgz: bool,
+    workers: int,
+) -> None:
+    """Start the Redspec web UI.
+
+    With --max-bytes, --max-entries or --max-age the gallery is trimmed to
+    that retention policy in the background every --gc-interval seconds.
+
+    With --workers N, N server processes share the port and the output
+    directory; render options such as --render-workers apply per process.
+    """
     try:
         import uvicorn  # noqa: F401
 
@@ -312,9 +556,55 @@ def serve(port: int, host: str, output_dir: str) -> None:
         )
         raise SystemExit(1)
 
-    app = create_app(output_dir=Path(output_dir))
+    from redspec.config import RESULT_CACHE_DIR
+    from redspec.generator.retention import RetentionPolicy
+
+    retention = RetentionPolicy(max_bytes=max_bytes, max_entries=max_entries, max_age=max_age)
+    config: dict[str, Any] = {
+        "output_dir": Path(output_dir),
+        "render_workers": render_workers,
+        "render_queue_size": render_queue,
+        "render_processes": render_processes,
+        "cache_dir": None if no_disk_cache else Path(cache_dir or RESULT_CACHE_DIR),
+        "async_threshold": async_threshold,
+        "job_retention": job_retention,
+        "retention": retention,
+        "gc_interval": gc_interval,
+        "history_artifacts": history_artifacts,
+        "compress_svg": svgz,
+        "max_render_seconds": max_render_seconds,
+        "max_render_memory": max_render_memory,
+        "client_quota": client_quota,
+    }
     click.echo(f"Starting Redspec web UI at http://{host}:{port}")
-    uvicorn.run(app, host=host, port=port)
+
+    if workers == 1:
+        uvicorn.run(create_app(**config), host=host, port=port)
+        return
+
+    # Worker processes build their own app from the environment
+    import dataclasses
+    import os
+
+    from redspec.web.app import SERVE_CONFIG_ENV
+
+    config["shared_state"] = True
+    config["retention"] = dataclasses.asdict(retention)
+    os.environ[SERVE_CONFIG_ENV] = json.dumps(config, default=str)
+    if no_disk_cache:
+        click.echo("Note: without a disk cache, workers cannot share render results.", err=True)
+    if client_quota is not None:
+        click.echo(
+            f"Note: --client-quota is counted per worker; a client may use up to {workers} times it.",
+            err=True,
+        )
+    uvicorn.run(
+        "redspec.web.app:create_app_from_env",
+        factory=True,
+        host=host,
+        port=port,
+        workers=workers,
+    )
 
 
 @main.command()
@@ -338,7 +628,7 @@ def schema(output: str | None, bundled: bool) -> None:
 
 
 @main.command()
-@click.argument("yaml_file", type=click.Path(exists=True, dir_okay=False))
+@click.argument("path", type=click.Path(exists=True))
 @click.option("--port", default=9876, type=int, help="Port for live-reload server.")
 @click.option("--no-browser", is_flag=True, default=False, help="Don't open browser.")
 @click.option(
@@ -348,41 +638,113 @@ def schema(output: str | None, bundled: bool) -> None:
     default="svg",
     help="Output format (default: svg for speed).",
 )
-def watch(yaml_file: str, port: int, no_browser: bool, out_format: str) -> None:
-    """Watch a YAML file and auto-regenerate on save."""
+@click.option(
+    "--poll",
+    is_flag=True,
+    default=False,
+    help="Poll for changes instead of using file-system events.",
+)
+@click.option(
+    "-o",
+    "--output-dir",
+    default=None,
+    type=click.Path(file_okay=False),
+    help="Write diagrams here (default: a temporary directory removed on exit).",
+)
+@click.option(
+    "-w",
+    "--workers",
+    default=2,
+    type=click.IntRange(min=1),
+    help="Maximum concurrent renders when watching a directory (default: 2).",
+)
+def watch(
+    path: str,
+    port: int,
+    no_browser: bool,
+    out_format: str,
+    poll: bool,
+    output_dir: str | None,
+    workers: int,
+) -> None:
+    """Watch a YAML file or a directory of specs, and auto-regenerate on save.
+
+    Given a directory, every spec in it is rendered and kept up to date,
+    and the browser page lists each spec with its build status.
+    """
     import datetime
 
     from redspec.watch_server import WatchServer
-    from redspec.watcher import watch_loop
+    from redspec.watcher import watch_loop, watch_tree
 
     server = WatchServer(port=port, diagram_format=out_format)
     server.start()
     click.echo(f"Watch server running at {server.url}")
 
-    yaml_path = Path(yaml_file)
+    watch_path = Path(path)
+    out_path = Path(output_dir) if output_dir else None
+    backend = "poll" if poll else "auto"
+    browser_opened = False
 
-    def on_first_build(path):
-        server.update_diagram(path)
-        if not no_browser:
+    def open_browser():
+        nonlocal browser_opened
+        if not browser_opened and not no_browser:
             import webbrowser
             webbrowser.open(server.url)
+        browser_opened = True
 
-    def on_rebuild(path):
-        server.update_diagram(path)
-        ts = datetime.datetime.now().strftime("%H:%M:%S")
-        click.echo(f"[{ts}] Rebuilt: {path}")
-
-    def on_error(exc):
-        ts = datetime.datetime.now().strftime("%H:%M:%S")
-        click.echo(f"[{ts}] Error: {exc}", err=True)
+    def timestamp() -> str:
+        return datetime.datetime.now().strftime("%H:%M:%S")
 
     try:
-        watch_loop(
-            yaml_path,
-            on_rebuild=on_rebuild,
-            on_error=on_error,
-            on_first_build=on_first_build,
-        )
+        if watch_path.is_dir():
+            root = watch_path.resolve()
+
+            def spec_name(spec_path):
+                return spec_path.relative_to(root).as_posix()
+
+            def on_tree_rebuild(spec_path, output):
+                server.update_diagram(output, spec=spec_name(spec_path))
+                click.echo(f"[{timestamp()}] Rebuilt: {spec_name(spec_path)} -> {output}")
+                open_browser()
+
+            def on_tree_error(spec_path, exc):
+                server.set_status(spec_name(spec_path), "error", str(exc))
+                click.echo(f"[{timestamp()}] Error in {spec_name(spec_path)}: {exc}", err=True)
+
+            watch_tree(
+                root,
+                on_rebuild=on_tree_rebuild,
+                on_error=on_tree_error,
+                on_building=lambda spec_path: server.set_status(spec_name(spec_path), "building"),
+                on_removed=lambda spec_path: server.remove_spec(spec_name(spec_path)),
+                backend=backend,
+                output_dir=out_path,
+                out_format=out_format,
+                max_workers=workers,
+            )
+        else:
+
+            def on_first_build(output):
+                server.update_diagram(output)
+                open_browser()
+
+            def on_rebuild(output):
+                server.update_diagram(output)
+                click.echo(f"[{timestamp()}] Rebuilt: {output}")
+
+            def on_error(exc):
+                click.echo(f"[{timestamp()}] Error: {exc}", err=True)
+
+            watch_loop(
+                watch_path,
+                on_rebuild=on_rebuild,
+                on_error=on_error,
+                on_first_build=on_first_build,
+                backend=backend,
+                output_dir=out_path,
+                out_format=out_format,
+            )
     except KeyboardInterrupt:
         click.echo("\nStopping watch mode...")
     finally:
@@ -422,6 +784,27 @@ def _list_spec_files(spec_dir: Path) -> list[Path]:
     help="Target a specific file within a spec (e.g. diagram.png, spec.yaml, metadata.json).",
 )
 @click.option("--edit", is_flag=True, default=False, help="Open the spec.yaml for editing in $EDITOR.")
+@click.option("--pin", is_flag=True, default=False, help="Pin the named diagrams so retention never removes them.")
+@click.option("--unpin", is_flag=True, default=False, help="Unpin the named diagrams.")
+@click.option("--gc", is_flag=True, default=False, help="Apply the retention policy given by the --max-* options.")
+@click.option(
+    "--max-bytes",
+    default=None,
+    callback=_size_option,
+    help="Keep the gallery under this size, e.g. 500M or 20G.",
+)
+@click.option(
+    "--max-entries",
+    default=None,
+    type=click.IntRange(min=0),
+    help="Keep at most this many gallery entries.",
+)
+@click.option(
+    "--max-age",
+    default=None,
+    callback=_duration_option,
+    help="Remove entries not viewed for this long, e.g. 12h or 30d.",
+)
 def clean(
     names: tuple[str, ...],
     output_dir: str,
@@ -430,6 +813,12 @@ def clean(
     yes: bool,
     file_filter: str | None,
     edit: bool,
+    pin: bool,
+    unpin: bool,
+    gc: bool,
+    max_bytes: int | None,
+    max_entries: int | None,
+    max_age: float | None,
 ) -> None:
     """List, edit, or delete generated diagram output.
 
@@ -438,10 +827,21 @@ def clean(
     With slug names:          delete those specs (or specific files with --file).
     With --edit <slug>:       open the spec.yaml in $EDITOR.
     With --all:               remove the entire output directory.
+    With --pin/--unpin <slug>: exempt specs from (or return them to) retention.
+    With --gc:                remove least recently viewed specs beyond the
+                              --max-bytes, --max-entries and --max-age limits.
     """
     import shutil
 
-    from redspec.generator.output_organizer import list_gallery, slugify
+    from redspec.generator.blob_store import detach
+    from redspec.generator.output_organizer import (
+        list_gallery,
+        remove_gallery_entry,
+        set_pinned,
+        slugify,
+        update_gallery_entry,
+    )
+    from redspec.generator.retention import RetentionPolicy
 
     out_path = Path(output_dir)
 
@@ -449,6 +849,22 @@ def clean(
         click.echo(f"Output directory does not exist: {out_path}")
         return
 
+    # --- Retention ---
+    if gc:
+        _clean_gc(out_path, RetentionPolicy(max_bytes, max_entries, max_age), dry_run, yes)
+        return
+
+    if pin or unpin:
+        if not names:
+            raise click.UsageError("Specify the diagram slugs to pin or unpin.")
+        for name in names:
+            slug = slugify(name) if " " in name else name
+            if not set_pinned(out_path, slug, pin):
+                click.echo(f"  Not found: {slug}", err=True)
+                continue
+            click.echo(f"  {'Pinned' if pin else 'Unpinned'}: {slug}")
+        return
+
     # --- Edit mode ---
     if edit:
         if not names:
@@ -460,7 +876,10 @@ def clean(
             raise SystemExit(1)
         import os
         editor = os.environ.get("EDITOR", os.environ.get("VISUAL", "vi"))
+        # The file is a read-only link to a shared blob; edit a private copy
+        detach(target_file)
         click.edit(filename=str(target_file), editor=editor)
+        update_gallery_entry(out_path, slug)
         return
 
     # --- Delete all ---
@@ -541,6 +960,7 @@ def clean(
             if not remaining:
                 shutil.rmtree(target)
                 click.echo(f"  Removed empty directory: {slug}/")
+            update_gallery_entry(out_path, slug)
             continue
 
         # Delete the entire spec directory
@@ -553,10 +973,39 @@ def clean(
             continue
         if not yes:
             click.confirm(f"Delete {slug}/ ({len(files)} files, {_format_size(dir_size)})?", abort=True)
-        shutil.rmtree(target)
+        remove_gallery_entry(out_path, slug)
         click.echo(f"  Removed: {slug}/  ({len(files)} files, {_format_size(dir_size)})")
 
 
+def _clean_gc(out_path: Path, policy, dry_run: bool, yes: bool) -> None:
+    """Trim the gallery at *out_path* to *policy*."""
+    from redspec.generator.retention import collect_garbage
+
+    if not policy.enabled:
+        raise click.UsageError("--gc needs at least one of --max-bytes, --max-entries or --max-age.")
+
+    plan = collect_garbage(out_path, policy, dry_run=True)
+    if not plan.removed:
+        click.echo(f"Nothing to remove: {plan.kept} diagram(s), {_format_size(plan.kept_bytes)}")
+        return
+    label = f"{len(plan.removed)} diagram(s) ({_format_size(plan.freed_bytes)})"
+    if dry_run:
+        click.echo(f"Would remove {label}:")
+        for slug in plan.removed:
+            click.echo(f"  {slug}/")
+        return
+    if not yes:
+        click.confirm(f"Remove {label}, least recently viewed first?", abort=True)
+
+    result = collect_garbage(out_path, policy)
+    for slug in result.removed:
+        click.echo(f"  Removed: {slug}/")
+    click.echo(
+        f"Removed {len(result.removed)} diagram(s), freeing {_format_size(result.freed_bytes)}; "
+        f"{result.kept} diagram(s), {_format_size(result.kept_bytes)} left"
+    )
+
+
 @main.command("import-azure")
 @click.option("--subscription", required=True, help="Azure subscription ID.")
 @click.option("--resource-group", default=None, help="Filter to a specific resource group.")
@@ -608,6 +1057,25 @@ def import_azure(subscription: str, resource_group: str | None, output: str) ->
     help="Layout direction override.",
 )
 @click.option("--dpi", type=click.IntRange(72, 600), default=None, help="DPI override.")
+@click.option(
+    "--batched",
+    is_flag=True,
+    default=False,
+    help="Lay out many specs per Graphviz process (faster for many small specs).",
+)
+@click.option(
+    "--shard",
+    default=None,
+    metavar="INDEX/COUNT",
+    help="Only render this shard of the specs, e.g. 2/4 (1-based).",
+)
+@click.option(
+    "--manifest",
+    "previous_manifest",
+    default=None,
+    type=click.Path(dir_okay=False),
+    help="Previous batch manifest to balance shards by (default: <output-dir>/redspec-batch.json).",
+)
 def batch(
     directory: str,
     out_format: str,
@@ -615,16 +1083,46 @@ def batch(
     strict: bool,
     direction: str | None,
     dpi: int | None,
+    batched: bool,
+    shard: str | None,
+    previous_manifest: str | None,
 ) -> None:
-    """Generate diagrams from all YAML files in a directory."""
+    """Generate diagrams from all YAML files in a directory.
+
+    Writes a manifest with per-file status and timings to the output
+    directory.  With --shard, only the specs assigned to that shard are
+    rendered and the manifest is named after the shard; combine shard
+    manifests afterwards with `redspec batch-merge`.
+    """
+    import time
     from concurrent.futures import ThreadPoolExecutor, as_completed
 
+    from redspec.exceptions import YAMLParseError
     from redspec.generator.pipeline import generate as run_pipeline
+    from redspec.generator.pipeline import generate_batch
     from redspec.icons.downloader import download_icons
     from redspec.icons.packs import ALL_PACKS
     from redspec.icons.registry import IconRegistry
+    from redspec.models.diagram import DiagramSpec
+    from redspec.sharding import (
+        MANIFEST_NAME,
+        ManifestEntry,
+        estimate_costs,
+        load_timings,
+        manifest_name,
+        parse_shard,
+        select_shard,
+        write_manifest,
+    )
     from redspec.yaml_io.parser import parse_yaml
 
+    shard_val = None
+    if shard:
+        try:
+            shard_val = parse_shard(shard)
+        except ValueError as exc:
+            raise click.BadParameter(str(exc), param_hint="--shard") from exc
+
     azure_pack = ALL_PACKS["azure"]
     if not azure_pack.downloaded_marker.exists():
         click.echo("Icons not found, downloading on first run...")
@@ -642,40 +1140,140 @@ def batch(
     registry = IconRegistry()
     direction_val = direction.upper() if direction else None
 
-    success = 0
-    errors = 0
+    timings = load_timings(Path(previous_manifest) if previous_manifest else target_dir / MANIFEST_NAME)
+    # Specs parsed for cost estimates, rendered without parsing them again
+    specs: dict[str, DiagramSpec | None] = {}
+    if shard_val:
+        yaml_files, costs = select_shard(yaml_files, shard_val, timings, out_format, dpi, specs)
+        click.echo(f"Shard {shard_val[0]}/{shard_val[1]}: {len(yaml_files)} spec(s)")
+    else:
+        costs = estimate_costs(yaml_files, timings, out_format, dpi, specs)
+
+    def load(yaml_file: Path) -> DiagramSpec:
+        # An unparseable spec is parsed again, for its error
+        return specs.pop(yaml_file.name, None) or parse_yaml(yaml_file)
+
+    # Start the most expensive specs first so the slowest one is not last
+    yaml_files.sort(key=lambda f: (-costs.get(f.name, 0.0), f.name))
+
+    entries: list[ManifestEntry] = []
+
+    def record(yaml_file: Path, output_path: Path | None, error: str | None, seconds: float | None) -> None:
+        entries.append(ManifestEntry(
+            file=yaml_file.name,
+            status="failed" if error else "ok",
+            output=str(output_path) if output_path and not error else None,
+            error=error,
+            seconds=round(seconds, 4) if seconds is not None else None,
+            cost=round(costs.get(yaml_file.name, 0.0), 4),
+        ))
+        if error:
+            click.echo(f"  FAIL: {yaml_file.name}: {error}", err=True)
+        else:
+            click.echo(f"  OK: {yaml_file.name}")
+
+    if batched:
+        jobs = []
+        parsed_files: list[Path] = []
+        for yaml_file in yaml_files:
+            try:
+                spec = load(yaml_file)
+            except YAMLParseError as exc:
+                record(yaml_file, None, str(exc), None)
+                continue
+            jobs.append((spec, str(target_dir / f"{yaml_file.stem}.{out_format}")))
+            parsed_files.append(yaml_file)
 
-    def process_file(yaml_file: Path) -> tuple[Path, str | None]:
-        try:
-            spec = parse_yaml(yaml_file)
-            output_path = str(target_dir / f"{yaml_file.stem}.{out_format}")
-            run_pipeline(
-                spec,
-                output_path,
-                icon_registry=registry,
-                strict=strict,
-                out_format=out_format,
-                direction_override=direction_val,
-                dpi_override=dpi,
-            )
-            return yaml_file, None
-        except Exception as exc:
-            return yaml_file, str(exc)
-
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        futures = [executor.submit(process_file, f) for f in yaml_files]
-        for future in as_completed(futures):
-            yaml_file, error = future.result()
-            if error:
-                errors += 1
-                click.echo(f"  FAIL: {yaml_file.name}: {error}", err=True)
+        results = generate_batch(
+            jobs,
+            icon_registry=registry,
+            strict=strict,
+            out_format=out_format,
+            direction_override=direction_val,
+            dpi_override=dpi,
+            max_workers=4,
+        )
+        # Per-file timings are not separable inside a shared process
+        for yaml_file, result in zip(parsed_files, results, strict=True):
+            if isinstance(result, Exception):
+                record(yaml_file, None, str(result), None)
             else:
-                success += 1
-                click.echo(f"  OK: {yaml_file.name}")
-
+                record(yaml_file, result, None, None)
+    else:
+        def process_file(yaml_file: Path) -> tuple[Path, Path | None, str | None, float]:
+            start = time.perf_counter()
+            try:
+                spec = load(yaml_file)
+                output_path = str(target_dir / f"{yaml_file.stem}.{out_format}")
+                result = run_pipeline(
+                    spec,
+                    output_path,
+                    icon_registry=registry,
+                    strict=strict,
+                    out_format=out_format,
+                    direction_override=direction_val,
+                    dpi_override=dpi,
+                )
+                return yaml_file, result, None, time.perf_counter() - start
+            except Exception as exc:
+                return yaml_file, None, str(exc), time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(process_file, f) for f in yaml_files]
+            for future in as_completed(futures):
+                record(*future.result())
+
+    write_manifest(target_dir / manifest_name(shard_val), entries, out_format, shard=shard_val)
+
+    success = sum(1 for e in entries if e.status == "ok")
+    errors = len(entries) - success
     click.echo(f"\nBatch complete: {success} succeeded, {errors} failed")
 
 
+@main.command("batch-merge")
+@click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option(
+    "-o",
+    "--output",
+    default=None,
+    type=click.Path(dir_okay=False),
+    help="Merged manifest path (default: redspec-batch.json next to the first input).",
+)
+def batch_merge(paths: tuple[str, ...], output: str | None) -> None:
+    """Merge per-shard batch manifests into one manifest and report.
+
+    PATHS may be shard manifest files or directories containing them.
+    """
+    from redspec.sharding import MANIFEST_NAME, find_shard_manifests, merge_manifests
+
+    manifests = find_shard_manifests(Path(p) for p in paths)
+    if not manifests:
+        click.echo("No shard manifests found.", err=True)
+        raise SystemExit(1)
+
+    merged = merge_manifests(manifests)
+
+    if output:
+        out_path = Path(output)
+    else:
+        first = Path(paths[0])
+        out_path = (first if first.is_dir() else first.parent) / MANIFEST_NAME
+    out_path.write_text(json.dumps(merged, indent=2), encoding="utf-8")
+
+    for entry in merged["entries"]:
+        if entry.get("status") != "ok":
+            click.echo(f"  FAIL: {entry['file']}: {entry.get('error')}", err=True)
+    if merged["missing_shards"]:
+        missing = ", ".join(str(i) for i in merged["missing_shards"])
+        click.echo(f"Warning: no manifest for shard(s) {missing}", err=True)
+
+    summary = merged["summary"]
+    click.echo(
+        f"Merged {len(manifests)} manifest(s): "
+        f"{summary['succeeded']} succeeded, {summary['failed']} failed -> {out_path}"
+    )
+
+
 @main.command()
 @click.argument("old_yaml", type=click.Path(exists=True, dir_okay=False))
 @click.argument("new_yaml", type=click.Path(exists=True, dir_okay=False))
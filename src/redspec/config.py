@@ -9,3 +9,4 @@ AZURE_ICON_URL = (
 CACHE_DIR = Path.home() / ".cache" / "redspec"
 ICON_CACHE_DIR = CACHE_DIR / "icons"
 DOWNLOADED_MARKER = ICON_CACHE_DIR / "azure" / ".downloaded"
+RESULT_CACHE_DIR = CACHE_DIR / "results"
@@ -1,5 +1,12 @@
 """Custom exceptions for redspec."""
 
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from redspec.generator.cost import CostEstimate
+
 
 class RedspecError(Exception):
     """Base exception for all redspec errors."""
@@ -44,6 +51,70 @@ class IconPackNotFoundError(RedspecError):
         super().__init__(f"Icon pack not found or not installed: '{pack_name}'")
 
 
+class GraphvizError(RedspecError):
+    """Raised when a Graphviz layout process fails or cannot be started."""
+
+
+class ExportFormatNotFoundError(RedspecError):
+    """Raised when no exporter is registered for an export format."""
+
+    def __init__(self, name: str, available: list[str]) -> None:
+        self.name = name
+        self.available = available
+        super().__init__(
+            f"Unknown export format: '{name}' (available: {', '.join(available)})"
+        )
+
+
+class RenderCancelledError(RedspecError):
+    """Raised when an in-flight render is cancelled by a newer request."""
+
+    def __init__(self) -> None:
+        super().__init__("Render cancelled")
+
+
+class QueueFullError(RedspecError):
+    """Raised when a render queue cannot accept another job.
+
+    *retry_after* estimates the seconds until capacity frees up.
+    *reserved* is True when only the capacity held back for higher-priority
+    jobs is left, rather than the queue being completely full.
+    """
+
+    def __init__(self, retry_after: int, reserved: bool = False) -> None:
+        self.retry_after = retry_after
+        self.reserved = reserved
+        super().__init__(f"Render queue full; retry in {retry_after}s")
+
+
+class RenderTooLargeError(RedspecError):
+    """Raised when a render's estimated cost exceeds the configured limits.
+
+    *estimate* is the :class:`~redspec.generator.cost.CostEstimate`;
+    *reasons* says which limits it exceeds.
+    """
+
+    def __init__(self, estimate: CostEstimate, reasons: list[str]) -> None:
+        self.estimate = estimate
+        self.reasons = reasons
+        super().__init__(
+            f"Diagram too large to render here: {'; '.join(reasons)}. "
+            "Split it into smaller diagrams, lower its DPI or render SVG, "
+            "or render it locally with `redspec generate`"
+        )
+
+
+class QuotaExceededError(RedspecError):
+    """Raised when a client has used up its render quota.
+
+    *retry_after* is the seconds until the quota allows the render.
+    """
+
+    def __init__(self, retry_after: int) -> None:
+        self.retry_after = retry_after
+        super().__init__(f"Render quota exceeded; retry in {retry_after}s")
+
+
 class YAMLParseError(RedspecError):
     """Raised when the input YAML is invalid."""
 
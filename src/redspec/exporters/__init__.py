@@ -1 +1 @@
-"""Diagram export formats (Mermaid, PlantUML, draw.io)."""
+"""Diagram export formats (Mermaid, PlantUML, draw.io, JSON and GraphML graphs)."""
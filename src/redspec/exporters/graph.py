@@ -0,0 +1,228 @@
+"""Export DiagramSpec as a machine-readable graph: JSON or GraphML.
+
+Nodes carry their resource type, metadata, parent container and zone;
+edges carry every connection attribute.  When a Graphviz layout is
+available (see :func:`redspec.exporters.drawio.spec_layout`), nodes,
+containers and zones also get their bounding box and edges the control
+points of their spline, so a client can hit-test, highlight or annotate
+the rendered SVG without asking for another render.
+
+Coordinates are in points with the origin at the top-left corner of the
+diagram and y pointing down, as in the SVG output.  Boxes are
+``[x, y, width, height]``; edge points are the cubic B-spline control
+points Graphviz draws the edge with.
+
+Both formats are written incrementally, one node or edge at a time.
+"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import Iterator
+from typing import TYPE_CHECKING, Any
+from xml.sax.saxutils import escape
+
+from redspec.exporters.traversal import ENTER, LEAF, edge_ordinals, walk_resources
+from redspec.models.resource import ConnectionDef
+
+if TYPE_CHECKING:
+    from redspec.generator.layout import Layout
+    from redspec.models.diagram import DiagramSpec
+
+# Connection attributes other than the endpoints, in declaration order
+_EDGE_FIELDS = [name for name in ConnectionDef.model_fields if name not in ("source", "to")]
+
+_XML_ENTITIES = {'"': "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#9;"}
+
+_GRAPHML_NODE_KEYS = [
+    ("type", "string"), ("metadata", "string"), ("parent", "string"), ("zone", "string"),
+    ("container", "boolean"), ("x", "double"), ("y", "double"), ("width", "double"), ("height", "double"),
+]
+_GRAPHML_EDGE_KEYS = [(name, "string") for name in _EDGE_FIELDS] + [("points", "string"), ("label_pos", "string")]
+
+
+def _pt(value: float) -> float:
+    return round(value, 2)
+
+
+def _num(value: float) -> str:
+    """A coordinate as GraphML text, without trailing zeros."""
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+class _Geometry:
+    """Boxes and edge routes from a Graphviz layout, flipped to y pointing down."""
+
+    def __init__(self, layout: Layout) -> None:
+        from redspec.generator.layout import parse_bb
+
+        self.layout = layout
+        llx, lly, urx, self.top = parse_bb(layout.graph["bb"])
+        self.bbox = [_pt(llx), 0.0, _pt(urx - llx), _pt(self.top - lly)]
+
+    def _flip(self, x: float, y: float) -> list[float]:
+        return [_pt(x), _pt(self.top - y)]
+
+    def box(self, name: str) -> list[float] | None:
+        """The bounding box of a resource or zone, if Graphviz drew it."""
+        from redspec.generator.layout import parse_bb, stable_node_id
+
+        cluster = self.layout.clusters.get("cluster_" + name, {})
+        if "bb" in cluster:
+            llx, lly, urx, ury = parse_bb(cluster["bb"])
+            return [*self._flip(llx, ury), _pt(urx - llx), _pt(ury - lly)]
+        node_id = stable_node_id(name)
+        node = self.layout.nodes.get(node_id, {})
+        if "pos" not in node or node_id not in self.layout.node_sizes:
+            return None
+        x, y = (float(v) for v in node["pos"].split(",")[:2])
+        width, height = (size * 72 for size in self.layout.node_sizes[node_id])
+        return [*self._flip(x - width / 2, y + height / 2), _pt(width), _pt(height)]
+
+    def edge(self, source: str, target: str, ordinal: int) -> dict[str, list[Any]]:
+        """The spline control points and label position of an edge, if routed."""
+        from redspec.generator.layout import parse_points, stable_node_id
+
+        attrs = self.layout.edges.get((stable_node_id(source), stable_node_id(target), ordinal), {})
+        route: dict[str, list[Any]] = {}
+        if attrs.get("pos"):
+            route["points"] = [self._flip(x, y) for x, y in parse_points(attrs["pos"])]
+        if attrs.get("lp"):
+            x, y = (float(v) for v in attrs["lp"].split(",")[:2])
+            route["label_pos"] = self._flip(x, y)
+        return route
+
+
+def _geometry(layout: Layout | None) -> _Geometry | None:
+    if layout is None or "bb" not in layout.graph:
+        return None
+    return _Geometry(layout)
+
+
+def _zones(spec: DiagramSpec) -> dict[str, str]:
+    """The zone of each top-level resource; the first zone listing it wins."""
+    zone_of: dict[str, str] = {}
+    for zone in spec.zones:
+        for name in zone.resources:
+            zone_of.setdefault(name, zone.name)
+    return zone_of
+
+
+def _nodes(spec: DiagramSpec, geometry: _Geometry | None) -> Iterator[dict[str, Any]]:
+    """One record per resource, in document order."""
+    zone_of = _zones(spec)
+    # The zone of a nested resource is its top-level ancestor's
+    top_level: dict[str, str] = {}
+    for visit in walk_resources(spec.resources):
+        if visit.kind not in (ENTER, LEAF):
+            continue
+        resource = visit.resource
+        parent = visit.parent.name if visit.parent else None
+        top_level[resource.name] = top_level[parent] if parent else resource.name
+        node: dict[str, Any] = {
+            "id": resource.name,
+            "type": resource.type,
+            "metadata": resource.metadata,
+            "parent": parent,
+            "zone": zone_of.get(top_level[resource.name]),
+            "container": visit.kind != LEAF,
+        }
+        if resource.style is not None:
+            node["style"] = resource.style.model_dump(exclude_none=True)
+        box = geometry.box(resource.name) if geometry else None
+        if box:
+            node["bbox"] = box
+        yield node
+
+
+def _edges(spec: DiagramSpec, geometry: _Geometry | None) -> Iterator[dict[str, Any]]:
+    """One record per connection, in document order."""
+    for index, (conn, ordinal) in enumerate(edge_ordinals(spec.connections)):
+        edge: dict[str, Any] = {"id": f"e{index}", "source": conn.source, "target": conn.to}
+        edge.update((name, value) for name in _EDGE_FIELDS if (value := getattr(conn, name)) is not None)
+        if geometry:
+            edge.update(geometry.edge(conn.source, conn.to, ordinal))
+        yield edge
+
+
+def iter_graph_json(spec: DiagramSpec, layout: Layout | None = None) -> Iterator[str]:
+    """Yield *spec* as a JSON graph document, one node or edge per chunk."""
+    geometry = _geometry(layout)
+    graph: dict[str, Any] = {"name": spec.diagram.name, "direction": spec.diagram.direction}
+    if geometry:
+        graph["bbox"] = geometry.bbox
+    yield '{"graph": ' + json.dumps(graph) + ',\n "zones": ['
+
+    for index, zone in enumerate(spec.zones):
+        record: dict[str, Any] = {"name": zone.name, "resources": zone.resources, "style": zone.style}
+        box = geometry.box(zone.name) if geometry else None
+        if box:
+            record["bbox"] = box
+        yield ("," if index else "") + "\n  " + json.dumps(record)
+    yield '],\n "nodes": ['
+
+    for index, node in enumerate(_nodes(spec, geometry)):
+        yield ("," if index else "") + "\n  " + json.dumps(node)
+    yield '],\n "edges": ['
+
+    for index, edge in enumerate(_edges(spec, geometry)):
+        yield ("," if index else "") + "\n  " + json.dumps(edge)
+    yield "]}\n"
+
+
+def _data(key: str, value: Any) -> str:
+    if isinstance(value, bool):
+        text = "true" if value else "false"
+    elif isinstance(value, float):
+        text = _num(value)
+    elif isinstance(value, dict):
+        text = json.dumps(value)
+    else:
+        text = str(value)
+    return f'<data key="{key}">{escape(text, _XML_ENTITIES)}</data>'
+
+
+def iter_graphml(spec: DiagramSpec, layout: Layout | None = None) -> Iterator[str]:
+    """Yield *spec* as a GraphML document, one node or edge per chunk.
+
+    Node metadata is a JSON object in the ``metadata`` attribute; edge
+    points are ``"x,y x,y ..."``.
+    """
+    geometry = _geometry(layout)
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+    for domain, keys in (("node", _GRAPHML_NODE_KEYS), ("edge", _GRAPHML_EDGE_KEYS)):
+        for name, kind in keys:
+            yield f'  <key id="{name}" for="{domain}" attr.name="{name}" attr.type="{kind}"/>\n'
+    yield f'  <graph id="{escape(spec.diagram.name, _XML_ENTITIES)}" edgedefault="directed">\n'
+
+    for node in _nodes(spec, geometry):
+        x, y, width, height = node.pop("bbox", (None,) * 4)
+        fields = {**node, "x": x, "y": y, "width": width, "height": height}
+        data = "".join(
+            _data(name, fields[name]) for name, _kind in _GRAPHML_NODE_KEYS if fields[name] not in (None, {})
+        )
+        yield f'    <node id="{escape(node["id"], _XML_ENTITIES)}">{data}</node>\n'
+
+    for edge in _edges(spec, geometry):
+        if "points" in edge:
+            edge["points"] = " ".join(f"{_num(x)},{_num(y)}" for x, y in edge["points"])
+        if "label_pos" in edge:
+            edge["label_pos"] = ",".join(_num(v) for v in edge["label_pos"])
+        data = "".join(_data(name, edge[name]) for name, _kind in _GRAPHML_EDGE_KEYS if name in edge)
+        yield (
+            f'    <edge id="{edge["id"]}" source="{escape(edge["source"], _XML_ENTITIES)}"'
+            f' target="{escape(edge["target"], _XML_ENTITIES)}">{data}</edge>\n'
+        )
+
+    yield "  </graph>\n</graphml>\n"
+
+
+def export_graph_json(spec: DiagramSpec, layout: Layout | None = None) -> str:
+    """Convert a DiagramSpec to a JSON graph document."""
+    return "".join(iter_graph_json(spec, layout))
+
+
+def export_graphml(spec: DiagramSpec, layout: Layout | None = None) -> str:
+    """Convert a DiagramSpec to GraphML."""
+    return "".join(iter_graphml(spec, layout))
@@ -2,11 +2,13 @@
 
 from __future__ import annotations
 
+from collections.abc import Iterator
 from typing import TYPE_CHECKING
 
+from redspec.exporters.traversal import ENTER, EXIT, walk_resources
+
 if TYPE_CHECKING:
     from redspec.models.diagram import DiagramSpec
-    from redspec.models.resource import ResourceDef
 
 _DIRECTION_MAP = {"TB": "TD", "LR": "LR", "BT": "BU", "RL": "RL"}
 
@@ -16,40 +18,31 @@ def _sanitize_id(name: str) -> str:
     return name.replace("-", "_").replace(" ", "_")
 
 
-def _process_resource(resource: ResourceDef, lines: list[str], depth: int = 0) -> None:
-    """Recursively process resources into Mermaid syntax."""
-    indent = "    " * depth
-    sid = _sanitize_id(resource.name)
-
-    if resource.children:
-        lines.append(f"{indent}subgraph {sid}[{resource.name}]")
-        for child in resource.children:
-            _process_resource(child, lines, depth + 1)
-        lines.append(f"{indent}end")
-    else:
-        lines.append(f"{indent}{sid}[{resource.name}]")
-
-
-def export_mermaid(spec: DiagramSpec) -> str:
-    """Convert a DiagramSpec to Mermaid flowchart syntax."""
+def iter_mermaid(spec: DiagramSpec) -> Iterator[str]:
+    """Yield the Mermaid flowchart for *spec* line by line."""
     direction = _DIRECTION_MAP.get(spec.diagram.direction, "TD")
-    lines: list[str] = [f"flowchart {direction}"]
-
-    for resource in spec.resources:
-        _process_resource(resource, lines, depth=1)
+    yield f"flowchart {direction}\n"
+
+    for visit in walk_resources(spec.resources):
+        indent = "    " * (visit.depth + 1)
+        resource = visit.resource
+        if visit.kind == ENTER:
+            yield f"{indent}subgraph {_sanitize_id(resource.name)}[{resource.name}]\n"
+        elif visit.kind == EXIT:
+            yield f"{indent}end\n"
+        else:
+            yield f"{indent}{_sanitize_id(resource.name)}[{resource.name}]\n"
 
     for conn in spec.connections:
         src = _sanitize_id(conn.source)
         tgt = _sanitize_id(conn.to)
+        arrow = "-.->" if conn.style == "dashed" else "-->"
         if conn.label:
-            if conn.style == "dashed":
-                lines.append(f"    {src} -.->|{conn.label}| {tgt}")
-            else:
-                lines.append(f"    {src} -->|{conn.label}| {tgt}")
+            yield f"    {src} {arrow}|{conn.label}| {tgt}\n"
         else:
-            if conn.style == "dashed":
-                lines.append(f"    {src} -.-> {tgt}")
-            else:
-                lines.append(f"    {src} --> {tgt}")
+            yield f"    {src} {arrow} {tgt}\n"
+
 
-    return "\n".join(lines) + "\n"
+def export_mermaid(spec: DiagramSpec) -> str:
+    """Convert a DiagramSpec to Mermaid flowchart syntax."""
+    return "".join(iter_mermaid(spec))
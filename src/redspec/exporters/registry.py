@@ -0,0 +1,203 @@
+"""Registry of diagram exporters.
+
+Every exporter streams a document for a :class:`DiagramSpec` as an
+iterator of text chunks, so callers can write it to a file, a terminal or
+an HTTP response without holding the whole document in memory.
+
+The built-in formats are registered here.  Other packages add formats by
+exposing an :class:`Exporter` under the ``redspec.exporters`` entry point
+group, or by calling :func:`register_exporter`::
+
+    [project.entry-points."redspec.exporters"]
+    dot = "my_package.exporters:DOT_EXPORTER"
+"""
+
+from __future__ import annotations
+
+import logging
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass
+from importlib.metadata import entry_points
+from typing import TYPE_CHECKING, TextIO
+
+from redspec.exceptions import ExportFormatNotFoundError
+
+if TYPE_CHECKING:
+    from redspec.generator.layout import Layout
+    from redspec.icons.registry import IconRegistry
+    from redspec.models.diagram import DiagramSpec
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "redspec.exporters"
+
+# Chunks smaller than this are joined before being handed to a stream
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+@dataclass
+class ExportOptions:
+    """Options an exporter may use; each format ignores the ones it has no use for.
+
+    *layout* is a precomputed Graphviz layout of the spec's diagram, so
+    exporters that place nodes need not run Graphviz again.
+    """
+
+    icon_registry: IconRegistry | None = None
+    layout: Layout | None = None
+    use_graphviz: bool = True
+    compressed: bool = False
+
+
+@dataclass(frozen=True)
+class Exporter:
+    """A named export format.
+
+    *iter_chunks* yields the exported document in pieces.  *uses_layout* is
+    True for formats that run Graphviz when no layout is given, so callers
+    can schedule them like renders.
+    """
+
+    name: str
+    iter_chunks: Callable[[DiagramSpec, ExportOptions], Iterator[str]]
+    media_type: str = "text/plain"
+    extension: str = ".txt"
+    uses_layout: bool = False
+
+
+def _mermaid(spec: DiagramSpec, options: ExportOptions) -> Iterator[str]:
+    from redspec.exporters.mermaid import iter_mermaid
+
+    return iter_mermaid(spec)
+
+
+def _plantuml(spec: DiagramSpec, options: ExportOptions) -> Iterator[str]:
+    from redspec.exporters.plantuml import iter_plantuml
+
+    return iter_plantuml(spec)
+
+
+def _drawio(spec: DiagramSpec, options: ExportOptions) -> Iterator[str]:
+    from redspec.exporters.drawio import iter_drawio
+
+    return iter_drawio(
+        spec,
+        icon_registry=options.icon_registry,
+        layout=options.layout,
+        use_graphviz=options.use_graphviz,
+        compressed=options.compressed,
+    )
+
+
+def _layout(spec: DiagramSpec, options: ExportOptions) -> Layout | None:
+    if options.layout is not None or not options.use_graphviz:
+        return options.layout
+    from redspec.exporters.drawio import spec_layout
+
+    return spec_layout(spec, options.icon_registry)
+
+
+def _graph_json(spec: DiagramSpec, options: ExportOptions) -> Iterator[str]:
+    from redspec.exporters.graph import iter_graph_json
+
+    return iter_graph_json(spec, _layout(spec, options))
+
+
+def _graphml(spec: DiagramSpec, options: ExportOptions) -> Iterator[str]:
+    from redspec.exporters.graph import iter_graphml
+
+    return iter_graphml(spec, _layout(spec, options))
+
+
+_EXPORTERS: dict[str, Exporter] = {
+    exporter.name: exporter
+    for exporter in (
+        Exporter("mermaid", _mermaid, "text/vnd.mermaid; charset=utf-8", ".mmd"),
+        Exporter("plantuml", _plantuml, "text/x-plantuml; charset=utf-8", ".puml"),
+        Exporter("drawio", _drawio, "application/vnd.jgraph.mxfile+xml; charset=utf-8", ".drawio", uses_layout=True),
+        Exporter("json", _graph_json, "application/json", ".json", uses_layout=True),
+        Exporter("graphml", _graphml, "application/graphml+xml; charset=utf-8", ".graphml", uses_layout=True),
+    )
+}
+_plugins_loaded = False
+
+
+def register_exporter(exporter: Exporter, replace: bool = False) -> None:
+    """Make *exporter* available under its name.
+
+    Raises ValueError if the name is taken, unless *replace* is True.
+    """
+    if exporter.name in _EXPORTERS and not replace:
+        raise ValueError(f"An exporter named {exporter.name!r} is already registered")
+    _EXPORTERS[exporter.name] = exporter
+
+
+def _load_plugins() -> None:
+    """Register the exporters advertised by installed packages, once."""
+    global _plugins_loaded
+    if _plugins_loaded:
+        return
+    _plugins_loaded = True
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        try:
+            exporter = entry_point.load()
+        except Exception:
+            logger.exception("Cannot load exporter plugin %s", entry_point.value)
+            continue
+        if not isinstance(exporter, Exporter):
+            logger.warning("Exporter plugin %s is not an Exporter; ignored", entry_point.value)
+            continue
+        if exporter.name in _EXPORTERS:
+            logger.warning("Exporter plugin %s reuses the name %r; ignored", entry_point.value, exporter.name)
+            continue
+        _EXPORTERS[exporter.name] = exporter
+
+
+def exporter_names() -> list[str]:
+    """Names of all registered export formats, built-in first."""
+    _load_plugins()
+    return list(_EXPORTERS)
+
+
+def get_exporter(name: str) -> Exporter:
+    """The exporter registered as *name*.
+
+    Raises :class:`~redspec.exceptions.ExportFormatNotFoundError` if there
+    is none.
+    """
+    _load_plugins()
+    try:
+        return _EXPORTERS[name]
+    except KeyError:
+        raise ExportFormatNotFoundError(name, list(_EXPORTERS)) from None
+
+
+def iter_export(
+    name: str,
+    spec: DiagramSpec,
+    options: ExportOptions | None = None,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+) -> Iterator[str]:
+    """Yield *spec* exported as *name*, in chunks of about *chunk_size* characters."""
+    exporter = get_exporter(name)
+    buffer: list[str] = []
+    size = 0
+    for chunk in exporter.iter_chunks(spec, options or ExportOptions()):
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= chunk_size:
+            yield "".join(buffer)
+            buffer.clear()
+            size = 0
+    if buffer:
+        yield "".join(buffer)
+
+
+def write_export(name: str, spec: DiagramSpec, stream: TextIO, options: ExportOptions | None = None) -> None:
+    """Write *spec* exported as *name* to *stream*."""
+    stream.writelines(iter_export(name, spec, options))
+
+
+def export_text(name: str, spec: DiagramSpec, options: ExportOptions | None = None) -> str:
+    """*spec* exported as *name*, as one string."""
+    return "".join(iter_export(name, spec, options))
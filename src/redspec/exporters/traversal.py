@@ -0,0 +1,66 @@
+"""One-pass traversal of a DiagramSpec shared by the text exporters.
+
+:func:`walk_resources` visits the resource tree depth-first without
+recursion, so arbitrarily deep imported trees neither hit the recursion
+limit nor need more than one stack entry per pending sibling.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Literal
+
+if TYPE_CHECKING:
+    from redspec.models.resource import ConnectionDef, ResourceDef
+
+ENTER: Literal["enter"] = "enter"
+LEAF: Literal["leaf"] = "leaf"
+EXIT: Literal["exit"] = "exit"
+
+
+@dataclass(frozen=True)
+class Visit:
+    """One step of a resource tree walk.
+
+    Containers are visited twice, on ``enter`` and on ``exit``; resources
+    without children once, as a ``leaf``.  *depth* is 0 for top-level
+    resources.
+    """
+
+    kind: Literal["enter", "leaf", "exit"]
+    resource: ResourceDef
+    depth: int
+    parent: ResourceDef | None
+
+
+def walk_resources(resources: Iterable[ResourceDef]) -> Iterator[Visit]:
+    """Visit *resources* and their descendants in document order."""
+    # Entries are (resource, depth, parent, exiting)
+    stack: list[tuple[ResourceDef, int, ResourceDef | None, bool]] = [
+        (resource, 0, None, False) for resource in reversed(list(resources))
+    ]
+    while stack:
+        resource, depth, parent, exiting = stack.pop()
+        if exiting:
+            yield Visit(EXIT, resource, depth, parent)
+        elif resource.children:
+            yield Visit(ENTER, resource, depth, parent)
+            stack.append((resource, depth, parent, True))
+            stack.extend((child, depth + 1, resource, False) for child in reversed(resource.children))
+        else:
+            yield Visit(LEAF, resource, depth, parent)
+
+
+def edge_ordinals(connections: Iterable[ConnectionDef]) -> Iterator[tuple[ConnectionDef, int]]:
+    """Pair each connection with its index among connections of the same endpoints.
+
+    Graphviz keys parallel edges the same way, so the ordinal finds a
+    connection's route in a layout.
+    """
+    counts: dict[tuple[str, str], int] = {}
+    for conn in connections:
+        pair = (conn.source, conn.to)
+        ordinal = counts.get(pair, 0)
+        counts[pair] = ordinal + 1
+        yield conn, ordinal
@@ -0,0 +1,200 @@
+"""Content-addressed storage for gallery files.
+
+Every diagram and spec written to the gallery is stored once, under its
+SHA-256, in ``<output_dir>/.blobs/``.  Gallery entries reference blobs
+through hard links, so saving the same diagram again, under any name, costs
+neither disk space nor a copy.  On file systems without hard links the
+entry gets its own copy and the store only saves the hashing.
+
+Files are never written in place: each one is written to a temporary file
+in the target directory and renamed over the old one, so readers see either
+the old or the new file, and writing through one hard link can never change
+another entry.  :func:`slug_lock` serialises writers of the same entry,
+across threads and processes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+BLOBS_DIRNAME = ".blobs"
+LOCKS_DIRNAME = ".locks"
+
+# Unreferenced blobs younger than this are kept: a writer may be about to link them
+_PRUNE_GRACE_SECONDS = 60.0
+
+_thread_locks: dict[str, threading.Lock] = {}
+_thread_locks_guard = threading.Lock()
+
+
+def hash_file(path: Path) -> str:
+    """Hex SHA-256 of the file at *path*."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_atomic(path: Path, data: bytes | str) -> None:
+    """Replace *path* with *data* through a temporary file and a rename."""
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def detach(path: Path) -> None:
+    """Give *path* its own copy of its data, so editing it in place is safe.
+
+    Needed before handing a gallery file to a tool, such as an editor, that
+    may write through the hard link into the shared blob.
+    """
+    try:
+        if path.stat().st_nlink < 2:
+            return
+    except FileNotFoundError:
+        return
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    os.close(fd)
+    try:
+        shutil.copy2(path, tmp)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+@contextmanager
+def slug_lock(output_dir: Path, slug: str) -> Iterator[None]:
+    """Hold the write lock of gallery entry *slug*.
+
+    A thread lock orders writers in this process; where ``fcntl`` is
+    available a lock file in ``<output_dir>/.locks/`` orders processes.
+    """
+    key = str(Path(output_dir).resolve() / slug)
+    with _thread_locks_guard:
+        lock = _thread_locks.setdefault(key, threading.Lock())
+    with lock:
+        try:
+            import fcntl
+        except ImportError:  # Windows: in-process ordering only
+            yield
+            return
+        locks = Path(output_dir) / LOCKS_DIRNAME
+        locks.mkdir(parents=True, exist_ok=True)
+        with open(locks / f"{slug}.lock", "a") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+class BlobStore:
+    """Blobs of the gallery under *output_dir*, keyed by SHA-256."""
+
+    def __init__(self, output_dir: Path) -> None:
+        self.root = Path(output_dir) / BLOBS_DIRNAME
+
+    def path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def put(self, source: Path, move: bool = False) -> str:
+        """Store the file at *source* and return its digest.
+
+        With *move*, *source* (which must be on the same file system to
+        avoid a copy) is renamed into the store instead of copied.
+        """
+        digest = hash_file(source)
+        blob = self.path(digest)
+        if blob.is_file():
+            # Refresh the mtime so a concurrent prune leaves it alone
+            os.utime(blob)
+            return digest
+
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=blob.parent, prefix=".tmp-")
+        os.close(fd)
+        try:
+            if move:
+                shutil.move(str(source), tmp)
+            else:
+                shutil.copyfile(source, tmp)
+            # Read-only: a blob is shared by every entry linking to it
+            os.chmod(tmp, 0o444)
+            os.replace(tmp, blob)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        return digest
+
+    def link(self, digest: str, dest: Path) -> None:
+        """Atomically make *dest* a hard link to blob *digest*.
+
+        Falls back to an atomic copy where hard links are not supported.
+        Nothing is written if *dest* already is that blob.
+        """
+        blob = self.path(digest)
+        try:
+            if os.path.samefile(blob, dest):
+                return
+        except OSError:
+            pass
+
+        tmp = dest.parent / f".tmp-{digest[:16]}-{os.getpid()}-{threading.get_ident()}"
+        tmp.unlink(missing_ok=True)
+        try:
+            try:
+                os.link(blob, tmp)
+            except OSError:
+                shutil.copyfile(blob, tmp)
+            os.replace(tmp, dest)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+
+    def release(self, digest: str) -> None:
+        """Delete blob *digest* if no gallery entry links to it any more."""
+        self._drop_if_unreferenced(self.path(digest), time.time() - _PRUNE_GRACE_SECONDS)
+
+    def prune(self) -> int:
+        """Delete blobs no gallery entry links to; return how many.
+
+        Without hard link support every blob looks unreferenced, which is
+        fine: entries then hold their own copies.
+        """
+        if not self.root.is_dir():
+            return 0
+        cutoff = time.time() - _PRUNE_GRACE_SECONDS
+        removed = 0
+        for blob in self.root.glob("*/*"):
+            if not blob.name.startswith(".") and self._drop_if_unreferenced(blob, cutoff):
+                removed += 1
+        return removed
+
+    @staticmethod
+    def _drop_if_unreferenced(blob: Path, cutoff: float) -> bool:
+        try:
+            st = blob.stat()
+        except OSError:
+            return False
+        if st.st_nlink == 1 and st.st_mtime < cutoff:
+            blob.unlink(missing_ok=True)
+            return True
+        return False
@@ -0,0 +1,205 @@
+"""Render cost estimates from the shape of a spec.
+
+Graphviz time grows faster than linearly with the size of the graph, and
+much faster with orthogonal edge routing; rasterising grows with the
+drawing's area times the square of the DPI.  :class:`CostModel` predicts a
+render's time and peak memory from a spec's :class:`SpecFeatures` with a
+fixed model of those effects, scaled to the machine by the timings of
+earlier renders: the scale is the median ratio of observed to predicted
+time over the recent samples.  Memory is not measured, so its estimate is
+the model's alone.
+
+The web app uses estimates to admit, route and bound renders, and
+``redspec batch`` to start the most expensive specs first.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import threading
+from collections import deque
+from collections.abc import Iterable
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from statistics import median
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from redspec.models.diagram import DiagramSpec
+    from redspec.models.resource import ResourceDef
+
+# Relative cost of edge routing per Graphviz ``splines`` mode
+_SPLINE_FACTORS = {
+    "ortho": 3.0,
+    "spline": 1.5,
+    "true": 1.5,
+    "curved": 1.3,
+    "polyline": 1.2,
+    "line": 1.0,
+    "false": 1.0,
+    "none": 1.0,
+    "": 1.0,
+}
+
+# Model constants, for a scale of 1.0
+_BASE_SECONDS = 0.3
+_SECONDS_PER_UNIT = 0.002
+_GROWTH = 1.3  # layout work grows as units ** _GROWTH
+_SECONDS_PER_MEGAPIXEL = 0.05
+
+_BASE_MEMORY = 40 * 1024**2
+_MEMORY_PER_NODE = 24 * 1024
+_MEMORY_PER_EDGE = 12 * 1024
+_NODE_AREA_INCHES = 3.2  # drawing area per node, including spacing
+_BYTES_PER_PIXEL = 4
+
+# Samples kept for calibration
+_MAX_SAMPLES = 200
+
+
+@dataclass(frozen=True)
+class SpecFeatures:
+    """The properties of a spec that drive its render cost."""
+
+    nodes: int = 0
+    edges: int = 0
+    clusters: int = 0
+    depth: int = 0
+    splines: str = "ortho"
+    dpi: int = 150
+    out_format: str = "png"
+
+    @classmethod
+    def from_spec(cls, spec: DiagramSpec, out_format: str = "png") -> SpecFeatures:
+        """Measure *spec*, as it would be rendered to *out_format*."""
+        from redspec.generator.themes import get_theme
+
+        nodes = clusters = depth = 0
+        stack: list[tuple[ResourceDef, int]] = [(r, 1) for r in spec.resources]
+        while stack:
+            resource, level = stack.pop()
+            depth = max(depth, level)
+            if resource.children:
+                clusters += 1
+                stack.extend((child, level + 1) for child in resource.children)
+            else:
+                nodes += 1
+        try:
+            splines = str(get_theme(spec.diagram.theme)["graph_attr"].get("splines", "spline"))
+        except ValueError:
+            splines = "spline"
+        return cls(
+            nodes=nodes,
+            edges=len(spec.connections),
+            clusters=clusters + len(spec.zones),
+            depth=depth,
+            splines=splines.lower(),
+            dpi=spec.diagram.dpi,
+            out_format=out_format,
+        )
+
+    def as_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+@dataclass(frozen=True)
+class CostEstimate:
+    """Predicted render time and peak memory."""
+
+    seconds: float
+    memory_bytes: int
+
+    def as_dict(self) -> dict[str, Any]:
+        return {"seconds": round(self.seconds, 3), "memory_bytes": self.memory_bytes}
+
+
+def _layout_units(features: SpecFeatures) -> float:
+    spline_factor = _SPLINE_FACTORS.get(features.splines, 1.5)
+    # Clusters constrain the layout, more so the deeper they nest
+    return (
+        features.nodes
+        + features.edges * spline_factor
+        + features.clusters * (2 + features.depth)
+    )
+
+
+def _megapixels(features: SpecFeatures) -> float:
+    if features.out_format != "png":
+        return 0.0
+    inches = max(1, features.nodes + features.clusters) * _NODE_AREA_INCHES
+    return inches * features.dpi**2 / 1e6
+
+
+def _predicted_seconds(features: SpecFeatures) -> float:
+    """The model's time, before calibration."""
+    return (
+        _BASE_SECONDS
+        + _SECONDS_PER_UNIT * _layout_units(features) ** _GROWTH
+        + _SECONDS_PER_MEGAPIXEL * _megapixels(features)
+    )
+
+
+class CostModel:
+    """Estimates render costs, calibrated by recorded render times.
+
+    Safe to share between threads.
+    """
+
+    def __init__(self, ratios: Iterable[float] = ()) -> None:
+        self._ratios: deque[float] = deque(
+            (r for r in ratios if r > 0 and math.isfinite(r)), maxlen=_MAX_SAMPLES
+        )
+        self._lock = threading.Lock()
+        self._scale = median(self._ratios) if self._ratios else 1.0
+
+    @classmethod
+    def calibrated(cls, samples: Iterable[tuple[SpecFeatures, float]]) -> CostModel:
+        """A model calibrated by ``(features, seconds)`` samples."""
+        return cls(seconds / _predicted_seconds(features) for features, seconds in samples)
+
+    @classmethod
+    def load(cls, path: Path) -> CostModel:
+        """The model saved at *path*; an uncalibrated one if there is none."""
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            return cls(float(r) for r in data.get("ratios", []))
+        except (OSError, ValueError, TypeError, AttributeError):
+            return cls()
+
+    def save(self, path: Path) -> None:
+        from redspec.generator.blob_store import write_atomic
+
+        with self._lock:
+            data = {"version": 1, "ratios": [round(r, 6) for r in self._ratios]}
+        write_atomic(path, json.dumps(data))
+
+    @property
+    def scale(self) -> float:
+        """Observed time per predicted time: 1.0 until calibrated."""
+        return self._scale
+
+    @property
+    def samples(self) -> int:
+        return len(self._ratios)
+
+    def record(self, features: SpecFeatures, seconds: float) -> None:
+        """Calibrate with a render of *features* that took *seconds*."""
+        ratio = seconds / _predicted_seconds(features)
+        if not (ratio > 0 and math.isfinite(ratio)):
+            return
+        with self._lock:
+            self._ratios.append(ratio)
+            self._scale = median(self._ratios)
+
+    def estimate(self, features: SpecFeatures) -> CostEstimate:
+        memory = (
+            _BASE_MEMORY
+            + _MEMORY_PER_NODE * (features.nodes + features.clusters)
+            + _MEMORY_PER_EDGE * features.edges
+            + _BYTES_PER_PIXEL * _megapixels(features) * 1e6
+        )
+        return CostEstimate(seconds=self._scale * _predicted_seconds(features), memory_bytes=int(memory))
+
+    def stats(self) -> dict[str, Any]:
+        return {"scale": round(self._scale, 4), "samples": self.samples}
@@ -0,0 +1,192 @@
+"""Graphviz subprocess invocation, one graph or many per process."""
+
+from __future__ import annotations
+
+import json
+import subprocess
+from collections.abc import Sequence
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from redspec.exceptions import GraphvizError, RenderCancelledError
+
+if TYPE_CHECKING:
+    import threading
+
+# Formats whose concatenated multi-graph output can be split back into
+# one document per graph.  Other formats (pdf) fall back to one process
+# per graph.
+SPLITTABLE_FORMATS = frozenset({"svg", "png", "json"})
+
+_PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# How often a cancellable render checks its cancel event, in seconds.
+_CANCEL_POLL_INTERVAL = 0.02
+
+
+def pipe(
+    source: str | bytes,
+    out_format: str,
+    engine: str = "dot",
+    args: Sequence[str] = (),
+    cancel_event: threading.Event | None = None,
+) -> bytes:
+    """Run a Graphviz *engine* on DOT *source* and return its stdout.
+
+    *source* may contain several graphs; Graphviz then writes one output
+    document per graph, back to back.  *args* are passed to the engine
+    after the ``-T`` flag.  Raises GraphvizError if the executable is
+    missing or exits with a non-zero status.
+
+    When *cancel_event* is given and becomes set while the process is
+    running, the process is killed and RenderCancelledError is raised.
+    """
+    data = source.encode("utf-8") if isinstance(source, str) else source
+    cmd = [engine, f"-T{out_format}", *args]
+    if cancel_event is not None and cancel_event.is_set():
+        raise RenderCancelledError()
+    try:
+        proc = subprocess.Popen(
+            cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+    except FileNotFoundError as exc:
+        raise GraphvizError(
+            f"Graphviz executable not found: {engine!r}. "
+            "Install Graphviz and make sure it is on PATH."
+        ) from exc
+
+    timeout = _CANCEL_POLL_INTERVAL if cancel_event is not None else None
+    pending_input: bytes | None = data
+    with proc:
+        while True:
+            try:
+                # Re-calling communicate() after a timeout resumes the
+                # transfer of the input given on the first call
+                stdout, stderr_bytes = proc.communicate(pending_input, timeout=timeout)
+                break
+            except subprocess.TimeoutExpired:
+                pending_input = None
+                if cancel_event is not None and cancel_event.is_set():
+                    proc.kill()
+                    raise RenderCancelledError() from None
+
+    if proc.returncode != 0:
+        stderr = stderr_bytes.decode("utf-8", errors="replace").strip()
+        raise GraphvizError(f"{engine} exited with status {proc.returncode}: {stderr}")
+    return stdout
+
+
+def run_dot(
+    source: str,
+    out_format: str,
+    output_path: Path,
+    engine: str = "dot",
+    args: Sequence[str] = (),
+    cancel_event: threading.Event | None = None,
+) -> Path:
+    """Render a single DOT graph to *output_path*.
+
+    See :func:`pipe` for the meaning of *args* and *cancel_event*.
+    """
+    data = pipe(source, out_format, engine=engine, args=args, cancel_event=cancel_event)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_bytes(data)
+    return output_path
+
+
+def run_dot_batch(
+    sources: Sequence[str],
+    out_format: str,
+    output_paths: Sequence[Path],
+    engine: str = "dot",
+) -> list[Path]:
+    """Render many DOT graphs with a single Graphviz process.
+
+    The graphs are concatenated into one multi-graph stream and the output
+    is split back into one file per graph, which amortizes process start-up,
+    plugin loading and fontconfig initialization across the whole batch.
+
+    Raises GraphvizError if the process fails or the output cannot be split
+    into exactly ``len(sources)`` documents; callers should then fall back to
+    :func:`run_dot` per graph to isolate the failing one.
+    """
+    if len(sources) != len(output_paths):
+        raise ValueError("sources and output_paths must have the same length")
+    if not sources:
+        return []
+    if out_format not in SPLITTABLE_FORMATS:
+        raise GraphvizError(f"Batched rendering does not support format: {out_format}")
+
+    data = pipe("\n".join(sources), out_format, engine=engine)
+    documents = split_output(data, out_format)
+    if len(documents) != len(sources):
+        raise GraphvizError(
+            f"Expected {len(sources)} {out_format} documents from batched render, "
+            f"got {len(documents)}"
+        )
+
+    for doc, path in zip(documents, output_paths, strict=True):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(doc)
+    return list(output_paths)
+
+
+def split_output(data: bytes, out_format: str) -> list[bytes]:
+    """Split concatenated Graphviz output into one document per graph."""
+    if out_format == "svg":
+        return _split_svg(data)
+    if out_format == "png":
+        return _split_png(data)
+    if out_format == "json":
+        return _split_json(data)
+    raise GraphvizError(f"Cannot split multi-graph output for format: {out_format}")
+
+
+def _split_svg(data: bytes) -> list[bytes]:
+    # Every document starts with an XML declaration; label text is escaped,
+    # so the marker cannot appear inside a document body.
+    marker = b"<?xml"
+    starts: list[int] = []
+    pos = data.find(marker)
+    while pos != -1:
+        starts.append(pos)
+        pos = data.find(marker, pos + 1)
+    return [data[s:e] for s, e in zip(starts, [*starts[1:], len(data)], strict=True)]
+
+
+def _split_png(data: bytes) -> list[bytes]:
+    # Walk the chunk structure so IEND markers inside image data cannot
+    # cause a false split.
+    docs: list[bytes] = []
+    pos = 0
+    while pos < len(data):
+        if not data.startswith(_PNG_SIGNATURE, pos):
+            raise GraphvizError("Malformed PNG stream from batched render")
+        start = pos
+        pos += len(_PNG_SIGNATURE)
+        while True:
+            if pos + 8 > len(data):
+                raise GraphvizError("Truncated PNG stream from batched render")
+            length = int.from_bytes(data[pos:pos + 4], "big")
+            chunk_type = data[pos + 4:pos + 8]
+            pos += 12 + length  # length + type + data + crc
+            if chunk_type == b"IEND":
+                break
+        docs.append(data[start:pos])
+    return docs
+
+
+def _split_json(data: bytes) -> list[bytes]:
+    decoder = json.JSONDecoder()
+    text = data.decode("utf-8")
+    docs: list[bytes] = []
+    pos = 0
+    while True:
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos >= len(text):
+            break
+        _, end = decoder.raw_decode(text, pos)
+        docs.append(text[pos:end].encode("utf-8"))
+        pos = end
+    return docs
@@ -0,0 +1,317 @@
+"""SQLite index of the gallery in an output directory.
+
+:func:`~redspec.generator.output_organizer.list_gallery` used to read every
+``metadata.json`` on each call.  The index keeps one row per gallery entry
+in ``<output_dir>/.index/gallery.db``, plus a full-text table over the diagram
+name, resource names and types, and metadata, so listing and searching
+cost the same however large the gallery grows.  It also records each
+entry's size on disk, whether it is pinned, and when it was last viewed,
+for :mod:`~redspec.generator.retention`.
+
+The index is updated whenever redspec writes, edits or deletes an entry.
+Entries added or removed behind its back are picked up by comparing the
+output directory's modification time, which changes whenever a
+subdirectory appears or disappears.  The database lives in a subdirectory
+of its own so that its journal files, which come and go with every
+connection, do not change that time.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+INDEX_DIRNAME = ".index"
+INDEX_FILENAME = "gallery.db"
+
+# Where the index was kept before it had its own directory
+_LEGACY_FILENAME = ".gallery.db"
+
+# Bump when the schema changes; older databases are rebuilt from disk
+_SCHEMA_VERSION = 2
+
+# Views closer together than this update ``last_viewed`` only once
+_TOUCH_INTERVAL_SECONDS = 60.0
+
+SORT_COLUMNS = ("timestamp", "name", "slug", "format")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    slug TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    format TEXT NOT NULL DEFAULT '',
+    timestamp TEXT NOT NULL DEFAULT '',
+    size INTEGER NOT NULL DEFAULT 0,
+    pinned INTEGER NOT NULL DEFAULT 0,
+    last_viewed REAL,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_timestamp ON entries (timestamp);
+CREATE INDEX IF NOT EXISTS entries_name ON entries (name COLLATE NOCASE);
+CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(
+    slug UNINDEXED, name, resources, metadata
+);
+"""
+
+
+def _spec_terms(spec_text: str) -> str:
+    """Resource names and types from a spec's YAML, space separated."""
+    import yaml
+
+    try:
+        raw = yaml.safe_load(spec_text)
+    except yaml.YAMLError:
+        return ""
+    terms: list[str] = []
+
+    def walk(resources: Any) -> None:
+        if not isinstance(resources, list):
+            return
+        for resource in resources:
+            if isinstance(resource, dict):
+                terms.extend(str(resource[k]) for k in ("name", "type") if resource.get(k))
+                walk(resource.get("children"))
+
+    if isinstance(raw, dict):
+        walk(raw.get("resources"))
+    return " ".join(terms)
+
+
+def _dir_size(path: Path) -> int:
+    """Apparent size of the files under *path*, in bytes."""
+    total = 0
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                total += _dir_size(Path(entry.path))
+            elif entry.is_file(follow_symlinks=False):
+                total += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            continue
+    return total
+
+
+def _metadata_terms(metadata: dict[str, Any]) -> str:
+    skip = {"name", "slug", "timestamp", "source_yaml", "output_path", "cache_key", "content_hash", "pinned"}
+    return " ".join(str(v) for k, v in metadata.items() if k not in skip and isinstance(v, (str, int, float)))
+
+
+def _match_query(text: str) -> str:
+    """Turn free text into an FTS5 query matching every word as a prefix."""
+    words = [w.replace('"', '""') for w in text.split()]
+    return " ".join(f'"{w}"*' for w in words)
+
+
+class GalleryIndex:
+    """Index of the gallery entries under *output_dir*."""
+
+    def __init__(self, output_dir: Path) -> None:
+        self.output_dir = Path(output_dir)
+        self.path = self.output_dir / INDEX_DIRNAME / INDEX_FILENAME
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        if not self.path.parent.is_dir():
+            self.path.parent.mkdir(exist_ok=True)
+            for suffix in ("", "-wal", "-shm", "-journal"):
+                (self.output_dir / (_LEGACY_FILENAME + suffix)).unlink(missing_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _prepare(self, conn: sqlite3.Connection) -> None:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == _SCHEMA_VERSION:
+            return
+        if version == 0:
+            # New database: let readers in other processes work during writes
+            conn.execute("PRAGMA journal_mode = WAL")
+        conn.executescript(
+            "DROP TABLE IF EXISTS entries; DROP TABLE IF EXISTS state; DROP TABLE IF EXISTS entries_fts;"
+        )
+        conn.executescript(_SCHEMA + _FTS_SCHEMA)
+        conn.execute(f"PRAGMA user_version = {_SCHEMA_VERSION}")
+
+    # ---- Writes ----
+
+    def upsert(self, slug: str, metadata: dict[str, Any], spec_text: str = "") -> None:
+        """Add or replace the entry for *slug*."""
+        if not self.output_dir.is_dir():
+            return
+        with self._connect() as conn:
+            self._prepare(conn)
+            self._upsert(conn, slug, metadata, spec_text)
+            self._sync(conn)
+
+    def refresh(self, slug: str) -> None:
+        """Re-read *slug* from disk, dropping it if it is gone."""
+        entry = self._read_entry(self.output_dir / slug)
+        if entry is None:
+            self.remove(slug)
+        else:
+            self.upsert(slug, *entry)
+
+    def remove(self, slug: str) -> None:
+        """Drop the entry for *slug*."""
+        if not self.path.exists():
+            return
+        with self._connect() as conn:
+            self._prepare(conn)
+            conn.execute("DELETE FROM entries WHERE slug = ?", (slug,))
+            conn.execute("DELETE FROM entries_fts WHERE slug = ?", (slug,))
+            self._sync(conn)
+
+    def touch(self, slug: str, at: float | None = None) -> None:
+        """Record that *slug* was viewed (at most once a minute)."""
+        if not self.path.exists():
+            return
+        at = time.time() if at is None else at
+        with self._connect() as conn:
+            self._prepare(conn)
+            conn.execute(
+                "UPDATE entries SET last_viewed = ? WHERE slug = ? AND (last_viewed IS NULL OR last_viewed < ?)",
+                (at, slug, at - _TOUCH_INTERVAL_SECONDS),
+            )
+
+    def _upsert(self, conn: sqlite3.Connection, slug: str, metadata: dict[str, Any], spec_text: str) -> None:
+        metadata = {**metadata, "slug": slug}
+        name = str(metadata.get("name", slug))
+        # An upsert rather than a replace, so last_viewed survives re-saves
+        conn.execute(
+            "INSERT INTO entries (slug, name, format, timestamp, size, pinned, metadata) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (slug) DO UPDATE SET "
+            "name = excluded.name, format = excluded.format, timestamp = excluded.timestamp, "
+            "size = excluded.size, pinned = excluded.pinned, metadata = excluded.metadata",
+            (
+                slug,
+                name,
+                str(metadata.get("format", "")),
+                str(metadata.get("timestamp", "")),
+                _dir_size(self.output_dir / slug),
+                int(bool(metadata.get("pinned"))),
+                json.dumps(metadata),
+            ),
+        )
+        conn.execute("DELETE FROM entries_fts WHERE slug = ?", (slug,))
+        conn.execute(
+            "INSERT INTO entries_fts (slug, name, resources, metadata) VALUES (?, ?, ?, ?)",
+            (slug, name, _spec_terms(spec_text), _metadata_terms(metadata)),
+        )
+
+    # ---- Reads ----
+
+    def query(
+        self,
+        q: str | None = None,
+        sort: str = "timestamp",
+        descending: bool = True,
+        limit: int | None = None,
+        offset: int = 0,
+    ) -> tuple[list[dict[str, Any]], int]:
+        """Return one page of entries (metadata dicts) and the total match count.
+
+        *q* searches diagram names, resource names and types, and metadata;
+        every word must match, as a prefix.  *sort* is one of
+        :data:`SORT_COLUMNS`.
+        """
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort!r}; choose from {', '.join(SORT_COLUMNS)}")
+        if not self.output_dir.is_dir():
+            return [], 0
+
+        with self._connect() as conn:
+            self._prepare(conn)
+            self._sync(conn)
+
+            where, params = "", []
+            if q and q.strip():
+                where = "WHERE slug IN (SELECT slug FROM entries_fts WHERE entries_fts MATCH ?)"
+                params.append(_match_query(q))
+            total = conn.execute(f"SELECT COUNT(*) FROM entries {where}", params).fetchone()[0]
+
+            collate = " COLLATE NOCASE" if sort == "name" else ""
+            direction = "DESC" if descending else "ASC"
+            rows = conn.execute(
+                f"SELECT metadata FROM entries {where} "
+                f"ORDER BY {sort}{collate} {direction}, slug {direction} LIMIT ? OFFSET ?",
+                [*params, -1 if limit is None else limit, offset],
+            ).fetchall()
+        return [json.loads(row["metadata"]) for row in rows], total
+
+    def usage(self) -> list[dict[str, Any]]:
+        """Return slug, size, timestamp, pinned and last_viewed of every entry."""
+        if not self.output_dir.is_dir():
+            return []
+        with self._connect() as conn:
+            self._prepare(conn)
+            self._sync(conn)
+            rows = conn.execute("SELECT slug, size, timestamp, pinned, last_viewed FROM entries").fetchall()
+        return [{**dict(row), "pinned": bool(row["pinned"])} for row in rows]
+
+    # ---- Consistency with the directory ----
+
+    def rebuild(self) -> None:
+        """Re-index every entry from disk."""
+        if not self.output_dir.is_dir():
+            return
+        with self._connect() as conn:
+            self._prepare(conn)
+            conn.execute("DELETE FROM entries")
+            conn.execute("DELETE FROM entries_fts")
+            conn.execute("DELETE FROM state")
+            self._sync(conn)
+
+    def _dir_mtime(self) -> str:
+        return str(os.stat(self.output_dir).st_mtime_ns)
+
+    def _store_dir_mtime(self, conn: sqlite3.Connection) -> None:
+        conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('dir_mtime', ?)", (self._dir_mtime(),))
+
+    def _sync(self, conn: sqlite3.Connection) -> None:
+        """Index entries added, and drop entries removed, behind our back."""
+        row = conn.execute("SELECT value FROM state WHERE key = 'dir_mtime'").fetchone()
+        if row is not None and row["value"] == self._dir_mtime():
+            return
+
+        on_disk = {p.name for p in self.output_dir.iterdir() if p.is_dir() and (p / "metadata.json").is_file()}
+        indexed = {r["slug"] for r in conn.execute("SELECT slug FROM entries")}
+        for slug in indexed - on_disk:
+            conn.execute("DELETE FROM entries WHERE slug = ?", (slug,))
+            conn.execute("DELETE FROM entries_fts WHERE slug = ?", (slug,))
+        for slug in sorted(on_disk - indexed):
+            entry = self._read_entry(self.output_dir / slug)
+            if entry is not None:
+                self._upsert(conn, slug, *entry)
+        self._store_dir_mtime(conn)
+
+    @staticmethod
+    def _read_entry(slug_dir: Path) -> tuple[dict[str, Any], str] | None:
+        try:
+            metadata = json.loads((slug_dir / "metadata.json").read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return None
+        if not isinstance(metadata, dict):
+            return None
+        try:
+            spec_text = (slug_dir / "spec.yaml").read_text(encoding="utf-8")
+        except OSError:
+            spec_text = ""
+        return metadata, spec_text
@@ -0,0 +1,182 @@
+"""Revision history of gallery entries.
+
+Every save of a gallery entry adds a revision in ``<slug>/.history/``:
+
+- ``revisions.json`` lists the revisions with their timestamp, render
+  options and the digest of the rendered diagram.
+- ``<n>.spec`` holds revision *n*'s spec, zlib-compressed, as a line delta
+  against revision *n - 1*.  Every :data:`KEYFRAME_INTERVAL` revisions, and
+  whenever a delta would not be smaller, the full text is stored instead,
+  which bounds the work to reconstruct any revision.
+- ``<n>.<format>`` is a hard link to the rendered diagram in the
+  :class:`~redspec.generator.blob_store.BlobStore`, kept only for the most
+  recent revisions.  Older diagrams are rendered again from their spec when
+  asked for.
+
+History therefore costs about the size of the edits, not a copy of the spec
+and diagram per revision.
+"""
+
+from __future__ import annotations
+
+import difflib
+import json
+import zlib
+from pathlib import Path
+from typing import Any
+
+HISTORY_DIRNAME = ".history"
+MANIFEST_FILENAME = "revisions.json"
+
+# Revisions between full spec snapshots
+KEYFRAME_INTERVAL = 16
+
+# Rendered diagrams kept for the most recent revisions
+DEFAULT_KEEP_ARTIFACTS = 5
+
+# Metadata carried into each revision, enough to render its spec again
+_RENDER_OPTIONS = ("format", "theme", "direction", "dpi")
+
+
+def _history_dir(slug_dir: Path) -> Path:
+    return slug_dir / HISTORY_DIRNAME
+
+
+def read_revisions(slug_dir: Path) -> list[dict[str, Any]]:
+    """Return the revisions of the entry in *slug_dir*, oldest first."""
+    try:
+        revisions = json.loads((_history_dir(slug_dir) / MANIFEST_FILENAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return []
+    return revisions if isinstance(revisions, list) else []
+
+
+def _encode_delta(old: str, new: str) -> list[Any]:
+    """Line delta from *old* to *new*: ``[start, end]`` copies old lines, a string inserts text."""
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+    ops: list[Any] = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            ops.append([i1, i2])
+        elif tag in ("replace", "insert"):
+            ops.append("".join(new_lines[j1:j2]))
+    return ops
+
+
+def _apply_delta(old: str, ops: list[Any]) -> str:
+    old_lines = old.splitlines(keepends=True)
+    parts = []
+    for op in ops:
+        parts.append(op if isinstance(op, str) else "".join(old_lines[op[0]:op[1]]))
+    return "".join(parts)
+
+
+def _read_record(path: Path) -> dict[str, Any]:
+    return json.loads(zlib.decompress(path.read_bytes()))
+
+
+def revision_spec(slug_dir: Path, revision: int) -> str | None:
+    """Reconstruct the spec text of *revision*, or None if it does not exist."""
+    history = _history_dir(slug_dir)
+    chain: list[dict[str, Any]] = []
+    number = revision
+    while number >= 1:
+        try:
+            record = _read_record(history / f"{number}.spec")
+        except (OSError, ValueError, zlib.error):
+            return None
+        chain.append(record)
+        if "full" in record:
+            break
+        number -= 1
+    else:
+        return None
+
+    text = chain.pop()["full"]
+    for record in reversed(chain):
+        text = _apply_delta(text, record["ops"])
+    return text
+
+
+def _artifact_name(revision: dict[str, Any]) -> str:
+    """File name of a revision's kept diagram; ``.svgz`` if stored compressed."""
+    name = f"{revision['revision']}.{revision.get('format', 'png')}"
+    return name + "z" if revision.get("encoding") == "gzip" else name
+
+
+def revision_artifact(slug_dir: Path, revision: dict[str, Any]) -> Path | None:
+    """Return the kept diagram of *revision* (a manifest entry), if any."""
+    path = _history_dir(slug_dir) / _artifact_name(revision)
+    return path if revision.get("artifact") and path.is_file() else None
+
+
+def history_blobs(slug_dir: Path) -> list[str]:
+    """Digests of the diagrams the history still links to."""
+    return [r["diagram_blob"] for r in read_revisions(slug_dir) if r.get("artifact") and r.get("diagram_blob")]
+
+
+def record_revision(
+    slug_dir: Path,
+    metadata: dict[str, Any],
+    spec_text: str,
+    keep_artifacts: int = DEFAULT_KEEP_ARTIFACTS,
+) -> dict[str, Any] | None:
+    """Add the entry's current state as a new revision and return it.
+
+    Call with the entry's slug lock held, after its files and metadata are
+    written.  Returns None, adding nothing, if neither the spec nor the
+    diagram changed since the last revision.
+    """
+    from redspec.generator.blob_store import BlobStore, hash_file, write_atomic
+
+    revisions = read_revisions(slug_dir)
+    diagram_blob = (metadata.get("blobs") or [None])[0]
+    spec_digest = hash_file(slug_dir / "spec.yaml")
+    latest = revisions[-1] if revisions else None
+    if latest and latest.get("diagram_blob") == diagram_blob and latest.get("spec_sha256") == spec_digest:
+        return None
+
+    history = _history_dir(slug_dir)
+    history.mkdir(exist_ok=True)
+    number = latest["revision"] + 1 if latest else 1
+
+    # Delta against the previous revision, unless a snapshot is due or smaller
+    record: dict[str, Any] = {"full": spec_text}
+    if latest and (number - 1) % KEYFRAME_INTERVAL:
+        previous = revision_spec(slug_dir, latest["revision"])
+        if previous is not None:
+            delta = {"ops": _encode_delta(previous, spec_text)}
+            if len(json.dumps(delta)) < len(spec_text):
+                record = delta
+    write_atomic(history / f"{number}.spec", zlib.compress(json.dumps(record).encode("utf-8"), 9))
+
+    revision = {
+        "revision": number,
+        "timestamp": metadata.get("timestamp", ""),
+        "content_hash": metadata.get("content_hash"),
+        "diagram_blob": diagram_blob,
+        "spec_sha256": spec_digest,
+        "artifact": False,
+        **{k: metadata[k] for k in _RENDER_OPTIONS if k in metadata},
+    }
+    if metadata.get("encoding"):
+        revision["encoding"] = metadata["encoding"]
+    revisions.append(revision)
+
+    store = BlobStore(slug_dir.parent)
+    if diagram_blob and keep_artifacts > 0:
+        store.link(diagram_blob, history / _artifact_name(revision))
+        revision["artifact"] = True
+
+    # Drop diagrams beyond the most recent keep_artifacts; their specs stay
+    for old in revisions[:-keep_artifacts] if keep_artifacts > 0 else revisions:
+        if old.get("artifact"):
+            (history / _artifact_name(old)).unlink(missing_ok=True)
+            old["artifact"] = False
+            if old.get("diagram_blob"):
+                store.release(old["diagram_blob"])
+
+    write_atomic(history / MANIFEST_FILENAME, json.dumps(revisions, indent=2))
+    return revision
@@ -0,0 +1,189 @@
+"""Incremental re-rendering for watch mode.
+
+Re-rendering a large diagram is dominated by Graphviz layout, yet most
+edits while iterating on a spec cannot move anything: a polish preset, an
+animation, an edge color or an edge label.  :class:`IncrementalRenderer`
+diffs each new spec against the last one it rendered and redoes only the
+stages the change affects.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import replace
+from enum import IntEnum
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from redspec.exceptions import GraphvizError
+from redspec.generator.layout import render_pinned, render_with_layout
+from redspec.generator.pipeline import _validate_unique_names
+from redspec.generator.renderer import finish_render, prepare_render
+
+if TYPE_CHECKING:
+    import threading
+
+    from redspec.generator.layout import Layout
+    from redspec.generator.renderer import RenderJob
+    from redspec.icons.registry import IconRegistry
+    from redspec.models import DiagramSpec
+    from redspec.models.resource import ResourceDef
+
+
+class ChangeLevel(IntEnum):
+    """How much of the render pipeline a spec change invalidates."""
+
+    NONE = 0
+    POSTPROCESS = 1  # SVG post-processing only
+    RESTYLE = 2  # new DOT attributes drawn on the previous layout
+    RELAYOUT = 3  # full Graphviz layout
+
+
+# Diagram metadata fields that do not need a full layout.  Anything not
+# listed here is assumed to move things.
+_META_LEVELS: dict[str, ChangeLevel] = {
+    "polish": ChangeLevel.POSTPROCESS,
+    "animation": ChangeLevel.POSTPROCESS,
+    "name": ChangeLevel.RESTYLE,
+    "dpi": ChangeLevel.RESTYLE,
+    "annotations": ChangeLevel.NONE,
+}
+
+# Connection fields that change the graph's structure or ranking.
+_CONNECTION_LAYOUT_FIELDS = ("source", "to", "minlen", "constraint")
+
+
+def _resource_shape(resource: ResourceDef) -> tuple:
+    return (resource.type, resource.name, tuple(_resource_shape(c) for c in resource.children))
+
+
+def _dump(models: list[Any]) -> list[dict[str, Any]]:
+    return [m.model_dump() for m in models]
+
+
+def classify_change(old: DiagramSpec | None, new: DiagramSpec) -> ChangeLevel:
+    """Return the earliest pipeline stage that must rerun to go from *old* to *new*."""
+    if old is None:
+        return ChangeLevel.RELAYOUT
+
+    level = ChangeLevel.NONE
+
+    old_meta, new_meta = old.diagram.model_dump(), new.diagram.model_dump()
+    for key in old_meta.keys() | new_meta.keys():
+        if old_meta.get(key) != new_meta.get(key):
+            level = max(level, _META_LEVELS.get(key, ChangeLevel.RELAYOUT))
+
+    if [_resource_shape(r) for r in old.resources] != [_resource_shape(r) for r in new.resources]:
+        return ChangeLevel.RELAYOUT
+    if _dump(old.resources) != _dump(new.resources):
+        level = max(level, ChangeLevel.RESTYLE)
+
+    if _dump(old.zones) != _dump(new.zones):
+        return ChangeLevel.RELAYOUT
+
+    if len(old.connections) != len(new.connections):
+        return ChangeLevel.RELAYOUT
+    for before, after in zip(old.connections, new.connections, strict=True):
+        if any(getattr(before, f) != getattr(after, f) for f in _CONNECTION_LAYOUT_FIELDS):
+            return ChangeLevel.RELAYOUT
+        # A label appearing or disappearing needs room made for it
+        if bool(before.label) != bool(after.label):
+            return ChangeLevel.RELAYOUT
+        if before != after:
+            level = max(level, ChangeLevel.RESTYLE)
+
+    if _dump(old.connection_styles) != _dump(new.connection_styles):
+        level = max(level, ChangeLevel.RESTYLE)
+
+    return level
+
+
+class IncrementalRenderer:
+    """Render successive versions of one spec to a fixed output path.
+
+    Each call to :meth:`render` classifies the change from the previously
+    rendered spec and reruns only what it needs: SVG post-processing on the
+    cached raw Graphviz output, a layout-free redraw pinned to the cached
+    layout, or a full layout.  The stage actually run is available as
+    :attr:`last_level`.
+
+    Rendering happens in a hidden file next to the output, which is then
+    renamed over it, so readers never see a partial diagram and a failed
+    or cancelled render leaves the previous one in place.
+    """
+
+    def __init__(
+        self,
+        output_path: Path,
+        icon_registry: IconRegistry | None = None,
+        out_format: str = "svg",
+        strict: bool = False,
+        glow: bool | None = None,
+    ) -> None:
+        self.output_path = Path(output_path).with_suffix(f".{out_format}")
+        self._work_path = self.output_path.with_name(
+            f".{self.output_path.stem}.partial{self.output_path.suffix}"
+        )
+        self.icon_registry = icon_registry
+        self.out_format = out_format
+        self.strict = strict
+        self.glow = glow
+        self.last_level: ChangeLevel | None = None
+        self._spec: DiagramSpec | None = None
+        self._layout: Layout | None = None
+        self._job: RenderJob | None = None
+        self._raw: bytes | None = None
+
+    def render(self, spec: DiagramSpec, cancel_event: threading.Event | None = None) -> Path:
+        """Bring the output up to date with *spec* and return its path."""
+        _validate_unique_names(spec.resources)
+
+        level = classify_change(self._spec, spec) if self._raw is not None else ChangeLevel.RELAYOUT
+        if level == ChangeLevel.POSTPROCESS and self.out_format != "svg":
+            level = ChangeLevel.NONE
+
+        try:
+            try:
+                self._run(spec, level, cancel_event)
+            except GraphvizError:
+                if level != ChangeLevel.RESTYLE:
+                    raise
+                # Pinned redraw failed (e.g. a position Graphviz rejects); lay out afresh
+                level = ChangeLevel.RELAYOUT
+                self._run(spec, level, cancel_event)
+        finally:
+            self._work_path.unlink(missing_ok=True)
+
+        self._spec = spec
+        self.last_level = level
+        return self.output_path
+
+    def _run(self, spec: DiagramSpec, level: ChangeLevel, cancel_event: threading.Event | None) -> None:
+        if level == ChangeLevel.NONE:
+            return
+
+        if level == ChangeLevel.POSTPROCESS:
+            assert self._job is not None and self._raw is not None
+            job = replace(self._job, spec=spec)
+            job.output.write_bytes(self._raw)
+        else:
+            job = prepare_render(
+                spec,
+                str(self._work_path),
+                icon_registry=self.icon_registry,
+                strict=self.strict,
+                out_format=self.out_format,
+                glow=self.glow,
+                layout=self._layout if level == ChangeLevel.RESTYLE else None,
+            )
+            if level == ChangeLevel.RESTYLE:
+                render_pinned(job.source, self.out_format, job.output, cancel_event=cancel_event)
+            else:
+                self._layout = render_with_layout(
+                    job.source, self.out_format, job.output, cancel_event=cancel_event
+                )
+            self._raw = job.output.read_bytes()
+            self._job = job
+
+        finish_render(job)
+        os.replace(job.output, self.output_path)
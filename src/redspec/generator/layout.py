@@ -0,0 +1,191 @@
+"""Capture a Graphviz layout and reuse it for later renders.
+
+A full render runs ``dot`` once, writing the requested image and a
+``-Tjson`` description of the computed geometry in the same process.  A
+later render whose changes cannot move anything (a new edge color, an edited
+edge label) pins every node, edge and cluster to the captured coordinates
+and is drawn with ``neato -n2``, which skips layout entirely.
+
+Layouts are also kept in a small in-process cache keyed by the DOT source,
+so exporters that need geometry (draw.io) reuse the layout of a render of
+the same graph instead of running Graphviz again; see
+:func:`compute_layout`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from redspec.generator.dot_runner import pipe, run_dot
+
+# Layouts kept by compute_layout() and render_with_layout()
+_LAYOUT_CACHE_SIZE = 32
+
+
+def stable_node_id(name: str) -> str:
+    """Return a DOT node id derived from a resource name.
+
+    Diagrams assigns random ids by default; deriving them from the (unique)
+    resource name keeps ids identical across renders, so geometry captured
+    from one render can be matched to the nodes of the next.
+    """
+    return "n" + hashlib.sha1(name.encode("utf-8")).hexdigest()[:16]
+
+
+def _pick(obj: dict[str, Any], keys: tuple[str, ...]) -> dict[str, str]:
+    return {k: str(obj[k]) for k in keys if k in obj}
+
+
+@dataclass
+class Layout:
+    """Geometry computed by Graphviz for one graph, keyed by stable ids.
+
+    Edges are keyed by ``(tail id, head id, n)`` where *n* counts earlier
+    edges between the same pair, in creation order.
+    """
+
+    graph: dict[str, str] = field(default_factory=dict)
+    nodes: dict[str, dict[str, str]] = field(default_factory=dict)
+    edges: dict[tuple[str, str, int], dict[str, str]] = field(default_factory=dict)
+    clusters: dict[str, dict[str, str]] = field(default_factory=dict)
+    node_sizes: dict[str, tuple[float, float]] = field(default_factory=dict)  # inches
+
+    @classmethod
+    def from_json(cls, data: str | bytes) -> Layout:
+        """Build a Layout from Graphviz ``-Tjson`` output."""
+        doc = json.loads(data)
+        objects = doc.get("objects", [])
+        n_subgraphs = doc.get("_subgraph_cnt", 0)
+
+        layout = cls(graph=_pick(doc, ("bb", "lp")))
+        for obj in objects[:n_subgraphs]:
+            if "bb" in obj:
+                layout.clusters[obj["name"]] = _pick(obj, ("bb", "lp"))
+
+        names: dict[int, str] = {}
+        for obj in objects[n_subgraphs:]:
+            names[obj["_gvid"]] = obj["name"]
+            if "pos" in obj:
+                layout.nodes[obj["name"]] = _pick(obj, ("pos",))
+            if "width" in obj and "height" in obj:
+                layout.node_sizes[obj["name"]] = (float(obj["width"]), float(obj["height"]))
+
+        seen: dict[tuple[str, str], int] = {}
+        for edge in sorted(doc.get("edges", []), key=lambda e: e["_gvid"]):
+            pair = (names[edge["tail"]], names[edge["head"]])
+            ordinal = seen.get(pair, 0)
+            seen[pair] = ordinal + 1
+            layout.edges[(*pair, ordinal)] = _pick(edge, ("pos", "lp"))
+        return layout
+
+    def node_attrs(self, node_id: str) -> dict[str, str]:
+        return dict(self.nodes.get(node_id, {}))
+
+    def edge_attrs(self, tail: str, head: str, ordinal: int, labelled: bool) -> dict[str, str]:
+        attrs = dict(self.edges.get((tail, head, ordinal), {}))
+        if not labelled:
+            attrs.pop("lp", None)
+        return attrs
+
+    def cluster_attrs(self, label: str) -> dict[str, str]:
+        return dict(self.clusters.get("cluster_" + label, {}))
+
+
+def parse_bb(bb: str) -> tuple[float, float, float, float]:
+    """Parse a Graphviz bounding box ``"llx,lly,urx,ury"`` (points, y up)."""
+    llx, lly, urx, ury = (float(v) for v in bb.split(","))
+    return llx, lly, urx, ury
+
+
+def parse_points(pos: str) -> list[tuple[float, float]]:
+    """Parse the control points of a Graphviz edge ``pos``.
+
+    The arrowhead end points (``e,x,y`` and ``s,x,y``) are left out.
+    """
+    points = []
+    for token in pos.split():
+        if token.startswith(("e,", "s,")):
+            continue
+        x, y = token.split(",")[:2]
+        points.append((float(x), float(y)))
+    return points
+
+
+_cache: OrderedDict[str, Layout] = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _source_key(source: str) -> str:
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+
+def _remember(source: str, layout: Layout) -> None:
+    key = _source_key(source)
+    with _cache_lock:
+        _cache[key] = layout
+        _cache.move_to_end(key)
+        while len(_cache) > _LAYOUT_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def cached_layout(source: str) -> Layout | None:
+    """The layout of DOT *source* captured by an earlier run, if still cached."""
+    key = _source_key(source)
+    with _cache_lock:
+        layout = _cache.get(key)
+        if layout is not None:
+            _cache.move_to_end(key)
+        return layout
+
+
+def compute_layout(source: str, cancel_event: threading.Event | None = None) -> Layout:
+    """Lay out DOT *source* with ``dot -Tjson``, or reuse its cached layout."""
+    layout = cached_layout(source)
+    if layout is None:
+        layout = Layout.from_json(pipe(source, "json", cancel_event=cancel_event))
+        _remember(source, layout)
+    return layout
+
+
+def render_with_layout(
+    source: str,
+    out_format: str,
+    output_path: Path,
+    cancel_event: threading.Event | None = None,
+) -> Layout:
+    """Lay out *source* with ``dot``, write the image and return the layout.
+
+    The image and the JSON geometry come from the same ``dot`` process, so
+    the layout is computed only once.
+    """
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="redspec-layout-") as tmp:
+        layout_file = Path(tmp) / "layout.json"
+        pipe(
+            source,
+            out_format,
+            args=["-o", str(output_path), "-Tjson", "-o", str(layout_file)],
+            cancel_event=cancel_event,
+        )
+        layout = Layout.from_json(layout_file.read_bytes())
+    _remember(source, layout)
+    return layout
+
+
+def render_pinned(
+    source: str,
+    out_format: str,
+    output_path: Path,
+    cancel_event: threading.Event | None = None,
+) -> Path:
+    """Render DOT *source* whose elements all carry positions, without layout."""
+    return run_dot(
+        source, out_format, output_path, engine="neato", args=("-n2",), cancel_event=cancel_event
+    )
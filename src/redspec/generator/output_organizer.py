@@ -28,6 +28,9 @@ def organize_output(
     source_yaml: Path,
     output_dir: Path,
     diagram_name: str,
+    move: bool = False,
+    history_artifacts: int = 5,
+    compress_svg: bool = False,
     **meta: Any,
 ) -> Path:
     """Move a generated diagram into a structured output directory.
@@ -39,56 +42,207 @@ def organize_output(
             spec.yaml
             metadata.json
 
+    The diagram and spec are hard links into the content-addressed
+    :class:`~redspec.generator.blob_store.BlobStore`, so they are read-only
+    and identical files are stored once.  With *move*, *generated_file* is
+    renamed into the store instead of copied.  Concurrent calls for the same
+    slug are serialised.
+
+    Each call also adds a revision to the entry's history (see
+    :mod:`redspec.generator.history`), keeping the rendered diagram of the
+    last *history_artifacts* revisions.
+
+    With *compress_svg*, an SVG diagram is stored gzip-compressed as
+    ``diagram.svgz`` (see :func:`diagram_file`).
+
     Returns the Path to the organized diagram file.
     """
+    from redspec.generator.blob_store import BlobStore, slug_lock, write_atomic
+    from redspec.generator.history import record_revision
+
     slug = slugify(diagram_name)
     dest_dir = output_dir / slug
     dest_dir.mkdir(parents=True, exist_ok=True)
+    store = BlobStore(output_dir)
 
-    # Copy diagram
     ext = generated_file.suffix
-    diagram_dest = dest_dir / f"diagram{ext}"
-    shutil.copy2(generated_file, diagram_dest)
-
-    # Copy source YAML
+    encoding = None
+    if compress_svg and ext == ".svg":
+        generated_file = _gzip_file(generated_file, move)
+        move, encoding = True, "gzip"
+    diagram_dest = dest_dir / f"diagram{ext}{'z' if encoding else ''}"
     spec_dest = dest_dir / "spec.yaml"
-    shutil.copy2(source_yaml, spec_dest)
-
-    # Write metadata
-    metadata = {
-        "name": diagram_name,
-        "slug": slug,
-        "format": ext.lstrip("."),
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "source_yaml": str(source_yaml),
-        "output_path": str(diagram_dest),
-        **meta,
-    }
-    metadata_dest = dest_dir / "metadata.json"
-    metadata_dest.write_text(json.dumps(metadata, indent=2), encoding="utf-8")
+
+    # Hashing and storing happen outside the lock; only linking needs it
+    diagram_blob = store.put(generated_file, move=move)
+    spec_blob = store.put(source_yaml)
+
+    with slug_lock(output_dir, slug):
+        previous = _read_metadata(dest_dir)
+        store.link(diagram_blob, diagram_dest)
+        store.link(spec_blob, spec_dest)
+
+        metadata = {
+            "name": diagram_name,
+            "slug": slug,
+            "format": ext.lstrip("."),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "source_yaml": str(source_yaml),
+            "output_path": str(diagram_dest),
+            "content_hash": diagram_blob[:20],
+            "blobs": [diagram_blob, spec_blob],
+            **meta,
+        }
+        if encoding:
+            metadata["encoding"] = encoding
+        if previous.get("pinned"):
+            metadata.setdefault("pinned", True)
+        # A diagram saved in another format or encoding is no longer referenced
+        if previous and diagram_file(dest_dir, previous) != diagram_dest:
+            diagram_file(dest_dir, previous).unlink(missing_ok=True)
+        write_atomic(dest_dir / "metadata.json", json.dumps(metadata, indent=2))
+        for digest in set(previous.get("blobs", [])) - {diagram_blob, spec_blob}:
+            store.release(digest)
+
+        spec_text = spec_dest.read_text(encoding="utf-8", errors="replace")
+        record_revision(dest_dir, metadata, spec_text, keep_artifacts=history_artifacts)
+        _index(output_dir, "upsert", slug, metadata, spec_text)
 
     return diagram_dest
 
 
-def list_gallery(output_dir: Path) -> list[dict[str, Any]]:
-    """Scan output directory and return metadata dicts sorted newest-first."""
-    entries: list[dict[str, Any]] = []
+def diagram_file(slug_dir: Path, metadata: dict[str, Any]) -> Path:
+    """The diagram file of the gallery entry in *slug_dir*.
+
+    That is ``diagram.<format>``, or ``diagram.svgz`` for an SVG stored
+    compressed (``"encoding": "gzip"`` in its metadata).
+    """
+    name = f"diagram.{metadata.get('format', 'png')}"
+    return slug_dir / (name + "z" if metadata.get("encoding") == "gzip" else name)
+
+
+def _gzip_file(path: Path, remove: bool) -> Path:
+    """Write a gzip-compressed copy of *path* beside it and return it."""
+    import gzip
+
+    target = path.with_name(path.name + ".gz")
+    # mtime=0: the same diagram always compresses to the same blob
+    target.write_bytes(gzip.compress(path.read_bytes(), compresslevel=9, mtime=0))
+    if remove:
+        path.unlink()
+    return target
+
+
+def _read_metadata(slug_dir: Path) -> dict[str, Any]:
+    try:
+        metadata = json.loads((slug_dir / "metadata.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return metadata if isinstance(metadata, dict) else {}
+
+
+def _index(output_dir: Path, method: str, *args: Any) -> None:
+    """Apply a change to the gallery index; the files on disk stay authoritative."""
+    import sqlite3
+
+    from redspec.generator.gallery_index import GalleryIndex
+
+    index = GalleryIndex(output_dir)
+    try:
+        getattr(index, method)(*args)
+    except sqlite3.OperationalError:
+        # Locked by another process for longer than the busy timeout; the
+        # index is still good and others may have it open
+        raise
+    except sqlite3.DatabaseError:
+        # Corrupt: rebuilt from disk on the next listing
+        index.path.unlink(missing_ok=True)
+
+
+def update_gallery_entry(output_dir: Path, slug: str) -> None:
+    """Re-index *slug* after its files were edited or deleted."""
+    _index(output_dir, "refresh", slug)
+
+
+def set_pinned(output_dir: Path, slug: str, pinned: bool) -> bool:
+    """Pin or unpin gallery entry *slug*; False if there is no such entry."""
+    from redspec.generator.blob_store import slug_lock, write_atomic
+
+    slug_dir = output_dir / slug
+    with slug_lock(output_dir, slug):
+        metadata = _read_metadata(slug_dir)
+        if not metadata:
+            return False
+        metadata["pinned"] = pinned
+        write_atomic(slug_dir / "metadata.json", json.dumps(metadata, indent=2))
+    update_gallery_entry(output_dir, slug)
+    return True
+
+
+def record_view(output_dir: Path, slug: str) -> None:
+    """Note that *slug* was viewed, for least-recently-viewed retention."""
+    import sqlite3
+
+    try:
+        _index(output_dir, "touch", slug)
+    except sqlite3.OperationalError:
+        pass  # a missed view only makes retention slightly less precise
+
+
+def remove_gallery_entry(output_dir: Path, slug: str) -> None:
+    """Delete gallery entry *slug*, and the blobs only it was using."""
+    from redspec.generator.blob_store import BlobStore, slug_lock
+    from redspec.generator.history import history_blobs
+
+    slug_dir = output_dir / slug
+    with slug_lock(output_dir, slug):
+        blobs = {*_read_metadata(slug_dir).get("blobs", []), *history_blobs(slug_dir)}
+        shutil.rmtree(slug_dir, ignore_errors=True)
+        store = BlobStore(output_dir)
+        for digest in blobs:
+            store.release(digest)
+    update_gallery_entry(output_dir, slug)
+
+
+def list_gallery(
+    output_dir: Path,
+    q: str | None = None,
+    sort: str = "timestamp",
+    descending: bool = True,
+    limit: int | None = None,
+    offset: int = 0,
+) -> list[dict[str, Any]]:
+    """Return gallery metadata dicts, newest first by default.
+
+    Served from the gallery index (see
+    :class:`~redspec.generator.gallery_index.GalleryIndex`); *q*, *sort*,
+    *descending*, *limit* and *offset* are passed to its
+    :meth:`~redspec.generator.gallery_index.GalleryIndex.query`.
+    """
+    return query_gallery(output_dir, q, sort, descending, limit, offset)[0]
+
+
+def query_gallery(
+    output_dir: Path,
+    q: str | None = None,
+    sort: str = "timestamp",
+    descending: bool = True,
+    limit: int | None = None,
+    offset: int = 0,
+) -> tuple[list[dict[str, Any]], int]:
+    """Like :func:`list_gallery`, also returning the total number of matches."""
+    import sqlite3
+
+    from redspec.generator.gallery_index import GalleryIndex
 
     if not output_dir.is_dir():
-        return entries
-
-    for subdir in output_dir.iterdir():
-        if not subdir.is_dir():
-            continue
-        meta_file = subdir / "metadata.json"
-        if not meta_file.exists():
-            continue
-        try:
-            data = json.loads(meta_file.read_text(encoding="utf-8"))
-            data["slug"] = subdir.name
-            entries.append(data)
-        except (json.JSONDecodeError, OSError):
-            continue
-
-    entries.sort(key=lambda e: e.get("timestamp", ""), reverse=True)
-    return entries
+        return [], 0
+    index = GalleryIndex(output_dir)
+    try:
+        return index.query(q, sort, descending, limit, offset)
+    except sqlite3.OperationalError:
+        raise
+    except sqlite3.DatabaseError:
+        # Corrupt or foreign file: start over from the entries on disk
+        index.path.unlink(missing_ok=True)
+        return index.query(q, sort, descending, limit, offset)
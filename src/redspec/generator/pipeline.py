@@ -2,13 +2,19 @@
 
 from __future__ import annotations
 
+from collections.abc import Callable, Sequence
 from pathlib import Path
-from typing import TYPE_CHECKING, Callable
+from typing import TYPE_CHECKING
 
-from redspec.exceptions import DuplicateResourceNameError
-from redspec.generator.renderer import render
+from redspec.exceptions import DuplicateResourceNameError, GraphvizError
+from redspec.generator.dot_runner import SPLITTABLE_FORMATS, run_dot, run_dot_batch
+from redspec.generator.renderer import finish_render, prepare_render, render
 
 if TYPE_CHECKING:
+    import threading
+
+    from redspec.generator.layout import Layout
+    from redspec.generator.renderer import RenderJob
     from redspec.icons.registry import IconRegistry
     from redspec.models import DiagramSpec
     from redspec.models.resource import ResourceDef
@@ -42,12 +48,18 @@ def generate(
     direction_override: str | None = None,
     dpi_override: int | None = None,
     glow: bool | None = None,
+    cancel_event: threading.Event | None = None,
+    on_stage: Callable[[str], None] | None = None,
+    on_layout: Callable[[Layout], None] | None = None,
 ) -> Path:
     """Generate a diagram image from a DiagramSpec.
 
     Returns the Path to the written file.  The *embedder_fn* parameter is
     accepted for backward compatibility but ignored (Diagrams uses its own
-    icon rendering).
+    icon rendering).  Setting *cancel_event* aborts a running render with
+    RenderCancelledError; *on_stage* is told as each render stage starts
+    and *on_layout* is given the diagram's layout (see
+    :func:`~redspec.generator.renderer.render`).
     """
     _validate_unique_names(spec.resources)
     return render(
@@ -59,4 +71,89 @@ def generate(
         direction_override=direction_override,
         dpi_override=dpi_override,
         glow=glow,
+        cancel_event=cancel_event,
+        on_stage=on_stage,
+        on_layout=on_layout,
     )
+
+
+def generate_batch(
+    jobs: Sequence[tuple[DiagramSpec, str]],
+    icon_registry: IconRegistry | None = None,
+    strict: bool = False,
+    out_format: str = "png",
+    direction_override: str | None = None,
+    dpi_override: int | None = None,
+    glow: bool | None = None,
+    chunk_size: int = 64,
+    max_workers: int = 1,
+) -> list[Path | Exception]:
+    """Generate many diagrams, sharing one Graphviz process per chunk.
+
+    *jobs* is a sequence of ``(spec, output_path)`` pairs.  Up to
+    *chunk_size* graphs are laid out by a single ``dot`` invocation, and up
+    to *max_workers* chunks run concurrently.  Returns one entry per job, in
+    order: the written Path, or the exception that job raised.  A failure in
+    one spec never fails the rest of its chunk.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    results: list[Path | Exception | None] = [None] * len(jobs)
+    prepared: list[tuple[int, RenderJob]] = []
+    for index, (spec, output_path) in enumerate(jobs):
+        try:
+            _validate_unique_names(spec.resources)
+            prepared.append((index, prepare_render(
+                spec,
+                output_path,
+                icon_registry=icon_registry,
+                strict=strict,
+                out_format=out_format,
+                direction_override=direction_override,
+                dpi_override=dpi_override,
+                glow=glow,
+            )))
+        except Exception as exc:
+            results[index] = exc
+
+    step = max(1, chunk_size) if out_format in SPLITTABLE_FORMATS else 1
+    chunks = [prepared[i:i + step] for i in range(0, len(prepared), step)]
+
+    def render_chunk(chunk: list[tuple[int, RenderJob]]) -> None:
+        batched = False
+        if len(chunk) > 1:
+            try:
+                run_dot_batch(
+                    [job.source for _, job in chunk],
+                    out_format,
+                    [job.output for _, job in chunk],
+                )
+                batched = True
+            except GraphvizError:
+                # One bad graph aborts the whole stream; render individually
+                # below so only the offending spec reports the error.
+                pass
+
+        if not batched:
+            for index, job in chunk:
+                try:
+                    run_dot(job.source, job.out_format, job.output)
+                except Exception as exc:
+                    results[index] = exc
+
+        for index, job in chunk:
+            if results[index] is not None:
+                continue
+            try:
+                results[index] = finish_render(job)
+            except Exception as exc:
+                results[index] = exc
+
+    if max_workers > 1 and len(chunks) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(render_chunk, chunks))
+    else:
+        for chunk in chunks:
+            render_chunk(chunk)
+
+    return results  # type: ignore[return-value]
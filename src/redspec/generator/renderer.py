@@ -2,21 +2,27 @@
 
 from __future__ import annotations
 
+from dataclasses import dataclass
 from pathlib import Path
 from typing import TYPE_CHECKING
 
-from diagrams import Cluster, Diagram, Edge
+from diagrams import Cluster, Diagram, Edge, setdiagram
 
 from redspec.exceptions import ConnectionTargetNotFoundError, IconNotFoundError
+from redspec.generator.dot_runner import run_dot
+from redspec.generator.layout import render_with_layout, stable_node_id
 from redspec.generator.node_mapper import resolve_node_class
 from redspec.generator.style_map import get_cluster_style, is_container_type
 from redspec.generator.themes import get_theme
 
 if TYPE_CHECKING:
+    import threading
+    from collections.abc import Callable
     from typing import Any
 
     from diagrams import Node
 
+    from redspec.generator.layout import Layout
     from redspec.icons.registry import IconRegistry
     from redspec.models import DiagramSpec
     from redspec.models.resource import ConnectionDef, ResourceDef
@@ -26,26 +32,30 @@ def _create_node(
     resource: ResourceDef,
     icon_registry: IconRegistry | None,
     strict: bool = False,
+    **attrs: str,
 ) -> Node:
-    """Create a Diagrams node for a leaf resource."""
+    """Create a Diagrams node for a leaf resource.
+
+    Extra *attrs* (``nodeid`` and Graphviz attributes) go to the node.
+    """
     node_cls = resolve_node_class(resource.type)
     if node_cls is not None:
-        node = node_cls(resource.name)
+        node = node_cls(resource.name, **attrs)
     elif icon_registry is not None:
         icon_path = icon_registry.resolve(resource.type)
         if icon_path is not None:
             from diagrams.custom import Custom
-            node = Custom(resource.name, str(icon_path))
+            node = Custom(resource.name, str(icon_path), **attrs)
         elif strict:
             raise IconNotFoundError(resource.type)
         else:
             from diagrams.azure.general import Resource
-            node = Resource(resource.name)
+            node = Resource(resource.name, **attrs)
     elif strict:
         raise IconNotFoundError(resource.type)
     else:
         from diagrams.azure.general import Resource
-        node = Resource(resource.name)
+        node = Resource(resource.name, **attrs)
 
     return node
 
@@ -57,18 +67,26 @@ def _process_resource(
     theme: dict[str, dict[str, Any]] | None = None,
     theme_name: str = "default",
     strict: bool = False,
+    layout: Layout | None = None,
 ) -> None:
-    """Recursively create Diagrams nodes/clusters for a resource tree."""
+    """Recursively create Diagrams nodes/clusters for a resource tree.
+
+    With a *layout*, every node and cluster is pinned to its position there.
+    """
     if is_container_type(resource.type):
         style = get_cluster_style(resource.type, theme=theme, theme_name=theme_name)
+        if layout is not None:
+            style = {**style, **layout.cluster_attrs(resource.name)}
         with Cluster(resource.name, graph_attr=style):
             for child in resource.children:
                 _process_resource(
                     child, icon_registry, name_to_node,
-                    theme=theme, theme_name=theme_name, strict=strict,
+                    theme=theme, theme_name=theme_name, strict=strict, layout=layout,
                 )
     else:
-        node = _create_node(resource, icon_registry, strict=strict)
+        node_id = stable_node_id(resource.name)
+        pinned = layout.node_attrs(node_id) if layout is not None else {}
+        node = _create_node(resource, icon_registry, strict=strict, nodeid=node_id, **pinned)
         name_to_node[resource.name] = node
 
 
@@ -76,8 +94,12 @@ def _create_edges(
     connections: list[ConnectionDef],
     name_to_node: dict[str, Node],
     spec: DiagramSpec | None = None,
+    layout: Layout | None = None,
 ) -> None:
-    """Create Diagrams edges between nodes."""
+    """Create Diagrams edges between nodes.
+
+    With a *layout*, every edge is pinned to its route there.
+    """
     # Build style lookup from connection_styles
     style_lookup: dict[str, dict[str, str]] = {}
     if spec and spec.connection_styles:
@@ -93,6 +115,7 @@ def _create_edges(
                 preset["arrowhead"] = cs.arrowhead
             style_lookup[cs.name] = preset
 
+    pair_counts: dict[tuple[str, str], int] = {}
     for conn in connections:
         if conn.source not in name_to_node:
             raise ConnectionTargetNotFoundError(conn.source, field="from")
@@ -120,6 +143,12 @@ def _create_edges(
             if val is not None:
                 edge_attrs[attr] = val
 
+        if layout is not None:
+            pair = (source.nodeid, target.nodeid)
+            ordinal = pair_counts.get(pair, 0)
+            pair_counts[pair] = ordinal + 1
+            edge_attrs.update(layout.edge_attrs(*pair, ordinal, labelled=bool(conn.label)))
+
         source >> Edge(**edge_attrs) >> target
 
 
@@ -130,6 +159,24 @@ _ZONE_STYLES: dict[str, dict[str, str]] = {
 }
 
 
+class _DeferredDiagram(Diagram):
+    """Diagram context that collects the DOT graph without invoking Graphviz."""
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        setdiagram(None)
+
+
+@dataclass
+class RenderJob:
+    """A built DOT graph waiting for Graphviz, plus what post-processing needs."""
+
+    spec: DiagramSpec
+    source: str
+    output: Path
+    out_format: str
+    glow: bool | None = None
+
+
 def render(
     spec: DiagramSpec,
     output_path: str,
@@ -139,8 +186,58 @@ def render(
     direction_override: str | None = None,
     dpi_override: int | None = None,
     glow: bool | None = None,
+    cancel_event: threading.Event | None = None,
+    on_stage: Callable[[str], None] | None = None,
+    on_layout: Callable[[Layout], None] | None = None,
 ) -> Path:
-    """Render a DiagramSpec to an image file using Diagrams (Graphviz)."""
+    """Render a DiagramSpec to an image file using Diagrams (Graphviz).
+
+    Setting *cancel_event* while Graphviz runs aborts the render with
+    RenderCancelledError.  *on_stage* is called with ``"build"``,
+    ``"layout"`` and ``"postprocess"`` as each stage starts.  *on_layout*,
+    if given, is passed the Graphviz layout of the diagram, which the same
+    ``dot`` run produces alongside the image.
+    """
+    if on_stage:
+        on_stage("build")
+    job = prepare_render(
+        spec,
+        output_path,
+        icon_registry=icon_registry,
+        strict=strict,
+        out_format=out_format,
+        direction_override=direction_override,
+        dpi_override=dpi_override,
+        glow=glow,
+    )
+    if on_stage:
+        on_stage("layout")
+    if on_layout is None:
+        run_dot(job.source, job.out_format, job.output, cancel_event=cancel_event)
+    else:
+        on_layout(render_with_layout(job.source, job.out_format, job.output, cancel_event=cancel_event))
+    if on_stage:
+        on_stage("postprocess")
+    return finish_render(job)
+
+
+def prepare_render(
+    spec: DiagramSpec,
+    output_path: str,
+    icon_registry: IconRegistry | None = None,
+    strict: bool = False,
+    out_format: str = "png",
+    direction_override: str | None = None,
+    dpi_override: int | None = None,
+    glow: bool | None = None,
+    layout: Layout | None = None,
+) -> RenderJob:
+    """Build the DOT graph for a DiagramSpec without running Graphviz.
+
+    Passing the *layout* of an earlier render of a structurally identical
+    spec pins every element to its previous position, for rendering with
+    :func:`redspec.generator.layout.render_pinned`.
+    """
     theme = get_theme(spec.diagram.theme)
 
     direction = direction_override or spec.diagram.direction
@@ -148,6 +245,8 @@ def render(
 
     graph_attr = dict(theme["graph_attr"])
     graph_attr["dpi"] = str(dpi)
+    if layout is not None:
+        graph_attr.update(layout.graph)
 
     node_attr = dict(theme["node_attr"])
     edge_attr = dict(theme["edge_attr"])
@@ -163,7 +262,7 @@ def render(
         for rname in zone.resources:
             zoned_resources[rname] = zone.name
 
-    with Diagram(
+    with _DeferredDiagram(
         name=spec.diagram.name,
         filename=filename,
         outformat=out_format,
@@ -172,7 +271,7 @@ def render(
         graph_attr=graph_attr,
         node_attr=node_attr,
         edge_attr=edge_attr,
-    ):
+    ) as diagram:
         # Render zones first
         zone_rendered_resources: set[str] = set()
         for zone in spec.zones:
@@ -187,6 +286,8 @@ def render(
                 merged_style.update(zone_style)
             else:
                 merged_style = dict(zone_style)
+            if layout is not None:
+                merged_style.update(layout.cluster_attrs(zone.name))
 
             with Cluster(zone.name, graph_attr=merged_style):
                 for resource in spec.resources:
@@ -194,6 +295,7 @@ def render(
                         _process_resource(
                             resource, icon_registry, name_to_node,
                             theme=theme, theme_name=spec.diagram.theme, strict=strict,
+                            layout=layout,
                         )
                         zone_rendered_resources.add(resource.name)
 
@@ -203,20 +305,37 @@ def render(
                 _process_resource(
                     resource, icon_registry, name_to_node,
                     theme=theme, theme_name=spec.diagram.theme, strict=strict,
+                    layout=layout,
                 )
 
-        _create_edges(spec.connections, name_to_node, spec=spec)
+        _create_edges(spec.connections, name_to_node, spec=spec, layout=layout)
 
         # Legend
         if spec.diagram.legend and name_to_node:
             seen_types: set[str] = set()
-            with Cluster("Legend", graph_attr={"bgcolor": "#FFFFFF20", "style": "rounded", "labeljust": "l"}):
+            legend_attr = {"bgcolor": "#FFFFFF20", "style": "rounded", "labeljust": "l"}
+            if layout is not None:
+                legend_attr.update(layout.cluster_attrs("Legend"))
+            with Cluster("Legend", graph_attr=legend_attr):
                 for resource in spec.resources:
-                    _add_legend_types(resource, icon_registry, seen_types)
+                    _add_legend_types(resource, icon_registry, seen_types, layout=layout)
+
+    return RenderJob(
+        spec=spec,
+        source=diagram.dot.source,
+        output=Path(f"{filename}.{out_format}"),
+        out_format=out_format,
+        glow=glow,
+    )
+
 
-    generated = Path(f"{filename}.{out_format}")
+def finish_render(job: RenderJob) -> Path:
+    """Apply SVG post-processing to a rendered job and return its output path."""
+    spec = job.spec
+    glow = job.glow
+    generated = job.output
 
-    if out_format == "svg":
+    if job.out_format == "svg":
         from redspec.generator.svg_enhancer import enhance_svg
         from redspec.generator.themes import default_polish_preset
         from redspec.models.diagram import PolishConfig, resolve_polish
@@ -241,7 +360,7 @@ def render(
                 enhance_svg(generated, spec.diagram.theme, polish=resolved)
 
     # SVG animations
-    if out_format == "svg" and spec.diagram.animation:
+    if job.out_format == "svg" and spec.diagram.animation:
         from redspec.generator.svg_animator import animate_svg
         animate_svg(generated, spec.diagram.animation)
 
@@ -252,18 +371,23 @@ def _add_legend_types(
     resource: ResourceDef,
     icon_registry: IconRegistry | None,
     seen_types: set[str],
+    layout: Layout | None = None,
 ) -> None:
     """Add legend entries for unique resource types."""
     if not is_container_type(resource.type) and resource.type not in seen_types:
         seen_types.add(resource.type)
+        node_id = stable_node_id("legend:" + resource.type)
+        pinned = layout.node_attrs(node_id) if layout is not None else {}
         try:
             _create_node(
                 type("_FakeResource", (), {"type": resource.type, "name": resource.type, "metadata": {}, "style": None})(),
                 icon_registry,
                 strict=False,
+                nodeid=node_id,
+                **pinned,
             )
         except Exception:
             pass
 
     for child in resource.children:
-        _add_legend_types(child, icon_registry, seen_types)
+        _add_legend_types(child, icon_registry, seen_types, layout=layout)
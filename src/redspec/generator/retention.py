@@ -0,0 +1,168 @@
+"""Retention policy for the gallery in an output directory.
+
+A :class:`RetentionPolicy` bounds the gallery by total size, number of
+entries and age.  :func:`collect_garbage` enforces it: entries not viewed
+(or, if never viewed, not saved) within the maximum age are removed, then
+the least recently viewed entries go until the gallery fits the size and
+count limits.  Pinned entries are never removed, though they count towards
+the limits.
+
+Sizes, view times and pins come from the gallery index, so a collection
+does not have to walk the output directory.
+"""
+
+from __future__ import annotations
+
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+# Touched after every collection, for callers that space collections out
+GC_STAMP_FILENAME = ".last-gc"
+
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+_DURATION_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_size(text: str) -> int:
+    """Parse a byte count such as ``"500M"`` or ``"2G"`` (binary units)."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*", text.lower())
+    if not match:
+        raise ValueError(f"Invalid size {text!r}; use a number with an optional K, M, G or T suffix")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+def parse_duration(text: str) -> float:
+    """Parse a duration such as ``"90m"``, ``"12h"`` or ``"30d"`` into seconds."""
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhdw]?)\s*", text.lower())
+    if not match:
+        raise ValueError(f"Invalid duration {text!r}; use a number with an optional s, m, h, d or w suffix")
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+@dataclass
+class RetentionPolicy:
+    """Limits on the gallery; ``None`` means unlimited.
+
+    *max_age* is in seconds.
+    """
+
+    max_bytes: int | None = None
+    max_entries: int | None = None
+    max_age: float | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return any(limit is not None for limit in (self.max_bytes, self.max_entries, self.max_age))
+
+
+@dataclass
+class GcResult:
+    """What a collection removed and what is left."""
+
+    removed: list[str] = field(default_factory=list)
+    freed_bytes: int = 0
+    kept: int = 0
+    kept_bytes: int = 0
+    blobs_pruned: int = 0
+    # True if the collection was skipped under *min_interval*
+    skipped: bool = False
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "removed": self.removed,
+            "freed_bytes": self.freed_bytes,
+            "kept": self.kept,
+            "kept_bytes": self.kept_bytes,
+            "blobs_pruned": self.blobs_pruned,
+        }
+
+
+def _saved_at(timestamp: str) -> float:
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except ValueError:
+        return 0.0
+
+
+def plan_gc(
+    entries: list[dict[str, Any]],
+    policy: RetentionPolicy,
+    now: float | None = None,
+) -> list[dict[str, Any]]:
+    """Return the entries *policy* evicts, in eviction order.
+
+    *entries* are as returned by
+    :meth:`~redspec.generator.gallery_index.GalleryIndex.usage`.
+    """
+    now = time.time() if now is None else now
+
+    def last_used(entry: dict[str, Any]) -> float:
+        return max(entry.get("last_viewed") or 0.0, _saved_at(entry.get("timestamp", "")))
+
+    candidates = sorted((e for e in entries if not e.get("pinned")), key=lambda e: (last_used(e), e["slug"]))
+    count = len(entries)
+    total = sum(e.get("size", 0) for e in entries)
+
+    evicted = []
+    for entry in candidates:
+        expired = policy.max_age is not None and now - last_used(entry) > policy.max_age
+        too_many = policy.max_entries is not None and count > policy.max_entries
+        too_big = policy.max_bytes is not None and total > policy.max_bytes
+        if not (expired or too_many or too_big):
+            # Candidates are oldest first: nothing later is expired either
+            break
+        evicted.append(entry)
+        count -= 1
+        total -= entry.get("size", 0)
+    return evicted
+
+
+def collect_garbage(
+    output_dir: Path,
+    policy: RetentionPolicy,
+    dry_run: bool = False,
+    now: float | None = None,
+    min_interval: float | None = None,
+) -> GcResult:
+    """Remove the gallery entries under *output_dir* that *policy* evicts.
+
+    With *dry_run* nothing is removed; the result lists what would be.
+    With *min_interval*, the collection is skipped if another one, in this
+    or any other process, finished less than that many seconds ago.
+    """
+    from redspec.generator.blob_store import BlobStore, slug_lock
+    from redspec.generator.gallery_index import GalleryIndex
+    from redspec.generator.output_organizer import remove_gallery_entry
+
+    result = GcResult()
+    if not output_dir.is_dir():
+        return result
+
+    # One collection at a time, also across the processes of ``serve --workers``
+    with slug_lock(output_dir, ".gc"):
+        stamp = output_dir / GC_STAMP_FILENAME
+        if min_interval is not None:
+            try:
+                if time.time() - stamp.stat().st_mtime < min_interval:
+                    result.skipped = True
+                    return result
+            except OSError:
+                pass
+
+        entries = GalleryIndex(output_dir).usage()
+        for entry in plan_gc(entries, policy, now):
+            if not dry_run:
+                remove_gallery_entry(output_dir, entry["slug"])
+            result.removed.append(entry["slug"])
+            result.freed_bytes += entry.get("size", 0)
+
+        result.kept = len(entries) - len(result.removed)
+        result.kept_bytes = sum(e.get("size", 0) for e in entries) - result.freed_bytes
+        if not dry_run:
+            result.blobs_pruned = BlobStore(output_dir).prune()
+            stamp.touch()
+    return result
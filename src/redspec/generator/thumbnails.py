@@ -0,0 +1,143 @@
+"""Small previews of gallery diagrams.
+
+Thumbnails are stored in ``<slug>/.thumbs/`` and named after the content
+hash of the diagram they were made from, so a thumbnail never goes stale:
+a new diagram has a new hash and gets a new thumbnail, and the old one is
+removed.
+
+PNG diagrams are downscaled with Pillow and SVG diagrams (also compressed
+``.svgz`` ones) rasterised with cairosvg (``pip install
+redspec[thumbnails]``).  Without cairosvg an SVG thumbnail is a
+stripped-down SVG: embedded icon images, which make up most of a diagram's
+size, are replaced by placeholders.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import re
+import tempfile
+from pathlib import Path
+
+THUMBS_DIRNAME = ".thumbs"
+THUMBNAIL_WIDTH = 320
+
+_MEDIA_TYPES = {".png": "image/png", ".svg": "image/svg+xml"}
+
+_IMAGE_RE = re.compile(r"<image\b([^>]*?)(?:/>|>.*?</image>)", re.DOTALL)
+_ANIMATION_RE = re.compile(r"<(animate\w*|set)\b[^>]*?(?:/>|>.*?</\1>)", re.DOTALL)
+_ROOT_RE = re.compile(r"<svg\b[^>]*>", re.DOTALL)
+
+
+def content_hash(path: Path) -> str:
+    """Short SHA-256 of the file at *path*."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()[:20]
+
+
+def media_type(path: Path) -> str:
+    return _MEDIA_TYPES.get(path.suffix, "application/octet-stream")
+
+
+def find_thumbnail(slug_dir: Path, digest: str) -> Path | None:
+    """Return the stored thumbnail made from content *digest*, if any."""
+    for ext in _MEDIA_TYPES:
+        path = slug_dir / THUMBS_DIRNAME / f"{digest}{ext}"
+        if path.is_file():
+            return path
+    return None
+
+
+def ensure_thumbnail(diagram: Path, digest: str | None = None, width: int = THUMBNAIL_WIDTH) -> Path | None:
+    """Return the thumbnail of *diagram*, creating it if needed.
+
+    *digest* is the diagram's :func:`content_hash`, when already known.
+    Returns None if no thumbnail can be made for this format.
+    """
+    digest = digest or content_hash(diagram)
+    slug_dir = diagram.parent
+    existing = find_thumbnail(slug_dir, digest)
+    if existing is not None:
+        return existing
+
+    made = _make(diagram, width)
+    if made is None:
+        return None
+    data, ext = made
+
+    thumbs = slug_dir / THUMBS_DIRNAME
+    thumbs.mkdir(exist_ok=True)
+    target = thumbs / f"{digest}{ext}"
+    fd, tmp = tempfile.mkstemp(dir=thumbs, prefix=".tmp-")
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, target)
+
+    # Thumbnails of earlier versions of the diagram are no longer reachable
+    for old in thumbs.iterdir():
+        if old != target and not old.name.startswith("."):
+            old.unlink(missing_ok=True)
+    return target
+
+
+def _make(diagram: Path, width: int) -> tuple[bytes, str] | None:
+    suffix = diagram.suffix.lower()
+    if suffix == ".png":
+        return _png_thumbnail(diagram.read_bytes(), width)
+    if suffix in (".svg", ".svgz"):
+        svg = diagram.read_bytes()
+        if suffix == ".svgz":
+            import gzip
+
+            svg = gzip.decompress(svg)
+        try:
+            import cairosvg
+        except ImportError:
+            return _lite_svg(svg.decode("utf-8", errors="replace"), width).encode("utf-8"), ".svg"
+        return cairosvg.svg2png(bytestring=svg, output_width=width), ".png"
+    return None
+
+
+def _png_thumbnail(data: bytes, width: int) -> tuple[bytes, str] | None:
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    import io
+
+    with Image.open(io.BytesIO(data)) as image:
+        image.thumbnail((width, width * 4))
+        out = io.BytesIO()
+        image.save(out, format="PNG", optimize=True)
+    return out.getvalue(), ".png"
+
+
+def _placeholder(match: re.Match[str]) -> str:
+    attrs = dict(re.findall(r'\b(x|y|width|height)="([^"]*)"', match.group(1)))
+    if "width" not in attrs or "height" not in attrs:
+        return ""
+    geometry = " ".join(f'{k}="{v}"' for k, v in attrs.items())
+    return f'<rect {geometry} rx="4" fill="#9aa5b1" fill-opacity="0.35"/>'
+
+
+def _lite_svg(svg: str, width: int) -> str:
+    """Shrink an SVG for display at *width* pixels."""
+    svg = _IMAGE_RE.sub(_placeholder, svg)
+    svg = _ANIMATION_RE.sub("", svg)
+
+    root = _ROOT_RE.search(svg)
+    if root is None:
+        return svg
+    tag = root.group(0)
+    box = re.search(r'viewBox="([^"]*)"', tag)
+    new_tag = re.sub(r'\s(width|height)="[^"]*"', "", tag)
+    if box:
+        parts = box.group(1).replace(",", " ").split()
+        if len(parts) == 4 and float(parts[2]) > 0:
+            height = round(width * float(parts[3]) / float(parts[2]))
+            new_tag = new_tag[:-1].rstrip("/") + f' width="{width}" height="{height}">'
+    return svg[: root.start()] + new_tag + svg[root.end():]
@@ -0,0 +1,214 @@
+"""Searchable catalogue of the resource types a spec can use.
+
+The catalogue joins the icons of the installed packs, the pack aliases and
+the types with a built-in Diagrams node class
+(:mod:`redspec.generator.node_mapper`), under their qualified names such as
+``azure/virtual-machines``.  It is built once per set of installed packs and
+indexed for prefix search, so an editor can ask for completions on every
+keystroke.
+
+Matches are ranked: the exact type first, then types starting with the
+query, types with a word (after ``-``) starting with it, types containing
+it, and finally types containing its letters in order (``vnt`` finds
+``virtual-network-gateways``).  Shorter names rank first within each group.
+"""
+
+from __future__ import annotations
+
+import bisect
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from redspec.icons.registry import IconRegistry
+
+# Entry kinds, in the order they win when a type is known several ways
+BUILTIN = "builtin"
+ICON = "icon"
+ALIAS = "alias"
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 200
+
+# Ranking tiers
+_EXACT, _PREFIX, _WORD_PREFIX, _SUBSTRING, _FUZZY = range(5)
+
+_SEARCH_CACHE_SIZE = 256
+
+
+@dataclass(frozen=True)
+class CatalogueEntry:
+    """A resource type: ``namespace/name``, and how it is known."""
+
+    namespace: str
+    name: str
+    kind: str
+    target: str | None = None  # an alias's qualified target
+
+    @property
+    def type(self) -> str:
+        return f"{self.namespace}/{self.name}"
+
+    def as_dict(self) -> dict[str, Any]:
+        data = {"type": self.type, "namespace": self.namespace, "name": self.name, "kind": self.kind}
+        if self.target:
+            data["target"] = self.target
+        return data
+
+
+def _builtin_types() -> dict[str, Iterable[str]]:
+    from redspec.generator import node_mapper
+
+    return {
+        "azure": node_mapper.NODE_MAP,
+        "aws": node_mapper.AWS_NODE_MAP,
+        "gcp": node_mapper.GCP_NODE_MAP,
+        "k8s": node_mapper.K8S_NODE_MAP,
+    }
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"[\s_]+", "-", text.strip().lower())
+
+
+def _fuzzy_gaps(query: str, name: str) -> int | None:
+    """Letters skipped to find *query*'s letters in order in *name*, or None."""
+    gaps = 0
+    position = 0
+    for char in query:
+        found = name.find(char, position)
+        if found < 0:
+            return None
+        gaps += found - position
+        position = found + 1
+    return gaps
+
+
+class ResourceCatalogue:
+    """Ranked, paginated search over resource types.
+
+    *version* identifies the installed packs; responses built from the
+    catalogue can use it as a validator.
+    """
+
+    def __init__(self, entries: Iterable[CatalogueEntry], version: str = "") -> None:
+        self.version = version
+        unique: dict[str, CatalogueEntry] = {}
+        for entry in entries:
+            unique.setdefault(entry.type, entry)
+        self.entries = sorted(unique.values(), key=lambda e: e.type)
+
+        # (name suffix starting at a word boundary, entry index), sorted
+        keys = []
+        for i, entry in enumerate(self.entries):
+            keys.append((entry.name, i))
+            keys.extend((entry.name[m.end():], i) for m in re.finditer("-", entry.name) if m.end() < len(entry.name))
+        keys.sort()
+        self._keys = keys
+        self._key_strings = [key for key, _ in keys]
+        self._cache: OrderedDict[tuple[str, str | None], list[int]] = OrderedDict()
+        self._cache_lock = threading.Lock()
+
+    @classmethod
+    def from_registry(cls, registry: IconRegistry, version: str = "") -> ResourceCatalogue:
+        """Catalogue built-in types and the icons and aliases of *registry*'s packs."""
+        from redspec.icons.packs import ALL_PACKS
+
+        entries: list[CatalogueEntry] = []
+        for namespace, names in _builtin_types().items():
+            entries.extend(CatalogueEntry(namespace, name, BUILTIN) for name in names)
+        for pack_name in registry.installed_packs():
+            for qualified in registry.list_all(namespace=pack_name):
+                namespace, name = qualified.split("/", 1)
+                entries.append(CatalogueEntry(namespace, name, ICON))
+            pack = ALL_PACKS.get(pack_name)
+            if pack is not None:
+                entries.extend(
+                    CatalogueEntry(pack.namespace, alias, ALIAS, f"{pack.namespace}/{target}")
+                    for alias, target in pack.aliases.items()
+                    if alias != target
+                )
+        return cls(entries, version)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def search(self, query: str = "", namespace: str | None = None) -> list[CatalogueEntry]:
+        """All entries matching *query*, best first."""
+        query = _normalize(query)
+        if "/" in query:
+            namespace, query = query.split("/", 1)
+        key = (query, namespace)
+        with self._cache_lock:
+            ranked = self._cache.get(key)
+            if ranked is not None:
+                self._cache.move_to_end(key)
+        if ranked is None:
+            ranked = self._rank(query, namespace)
+            with self._cache_lock:
+                self._cache[key] = ranked
+                if len(self._cache) > _SEARCH_CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        return [self.entries[i] for i in ranked]
+
+    def page(
+        self,
+        query: str = "",
+        namespace: str | None = None,
+        limit: int = DEFAULT_LIMIT,
+        cursor: str | None = None,
+    ) -> tuple[list[CatalogueEntry], str | None, int]:
+        """One page of :meth:`search` results.
+
+        Returns the entries, the cursor of the next page (None on the last
+        page) and the total number of matches.  Raises ValueError for a
+        cursor this catalogue did not hand out.
+        """
+        offset = 0
+        if cursor:
+            if not cursor.isdigit():
+                raise ValueError(f"Invalid cursor {cursor!r}")
+            offset = int(cursor)
+        limit = max(1, min(limit, MAX_LIMIT))
+        matches = self.search(query, namespace)
+        end = offset + limit
+        return matches[offset:end], str(end) if end < len(matches) else None, len(matches)
+
+    def _rank(self, query: str, namespace: str | None) -> list[int]:
+        def wanted(i: int) -> bool:
+            return namespace is None or self.entries[i].namespace == namespace
+
+        if not query:
+            return [i for i in range(len(self.entries)) if wanted(i)]
+
+        tiers: dict[int, int] = {}
+        for position in range(bisect.bisect_left(self._key_strings, query), len(self._keys)):
+            key, i = self._keys[position]
+            if not key.startswith(query):
+                break
+            if not wanted(i):
+                continue
+            name = self.entries[i].name
+            tier = _EXACT if name == query else _PREFIX if key == name else _WORD_PREFIX
+            tiers[i] = min(tier, tiers.get(i, tier))
+
+        fuzzy: dict[int, int] = {}
+        for i, entry in enumerate(self.entries):
+            if i in tiers or not wanted(i):
+                continue
+            if query in entry.name:
+                tiers[i] = _SUBSTRING
+            elif len(query) > 1:
+                gaps = _fuzzy_gaps(query, entry.name)
+                if gaps is not None:
+                    tiers[i] = _FUZZY
+                    fuzzy[i] = gaps
+
+        return sorted(
+            tiers,
+            key=lambda i: (tiers[i], fuzzy.get(i, 0), len(self.entries[i].name), self.entries[i].type),
+        )
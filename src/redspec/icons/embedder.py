@@ -1,11 +1,205 @@
-"""Embed SVG files as percent-encoded data URIs for draw.io compatibility."""
+"""Embed SVG files as data URIs, cached across runs.
 
-import functools
+Encoding an icon is cheap once but adds up when every process re-encodes
+the same pack icons for every export.  :class:`EmbedCache` keeps the data
+URIs in memory, keyed by the icon's resolved path so ``str`` and ``Path``
+spellings of one file share an entry, and in a small SQLite database next
+to the icon packs (``~/.cache/redspec/icons/.index/embedded.db``) so later
+runs start warm.  A stored URI is reused while the file's size and
+modification time are unchanged; when they change the file is hashed, and
+the URI re-encoded only if the content changed.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import logging
+import sqlite3
+import threading
 import urllib.parse
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
 from pathlib import Path
 
+from redspec.config import ICON_CACHE_DIR
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIRNAME = ".index"
+EMBED_CACHE_FILENAME = "embedded.db"
+
+# Encodings
+PERCENT = "percent"
+BASE64 = "base64"
+
+# Memory entries kept at least, whatever the installed packs hold
+_MIN_CAPACITY = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embedded (
+    path TEXT NOT NULL,
+    encoding TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    uri TEXT NOT NULL,
+    PRIMARY KEY (path, encoding)
+);
+"""
+
+
+def _encode(data: bytes, encoding: str) -> str:
+    if encoding == BASE64:
+        return "data:image/svg+xml;base64," + base64.b64encode(data).decode("ascii")
+    # Percent-encoding instead of base64, because draw.io's style parser
+    # splits on semicolons, which corrupts ``data:image/svg+xml;base64,...``
+    return "data:image/svg+xml," + urllib.parse.quote(data.decode("utf-8"), safe="")
+
+
+def _installed_icon_count() -> int:
+    """SVG files across the installed icon packs."""
+    from redspec.icons.packs import ALL_PACKS
+
+    return sum(sum(1 for _ in pack.cache_dir.glob("*.svg")) for pack in ALL_PACKS.values())
+
+
+class EmbedCache:
+    """Data URIs of SVG files, in memory and in the SQLite database at *path*.
+
+    *capacity* bounds the entries kept in memory; by default it fits both
+    encodings of every icon in the installed packs.  With *path* None the
+    cache is not persisted.
+    """
+
+    def __init__(self, path: Path | None = None, capacity: int | None = None) -> None:
+        self.path = path
+        self._capacity = capacity
+        self._memory: OrderedDict[tuple[str, str], tuple[int, int, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._persist = path is not None
+        self._prepared = False
+
+    @property
+    def capacity(self) -> int:
+        if self._capacity is None:
+            self._capacity = max(_MIN_CAPACITY, 2 * _installed_icon_count())
+        return self._capacity
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        assert self.path is not None
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            if not self._prepared:
+                conn.executescript(_SCHEMA)
+                self._prepared = True
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _stored(self, key: tuple[str, str]) -> tuple[int, int, str, str] | None:
+        """The stored ``(size, mtime_ns, sha256, uri)`` for *key*, if any."""
+        if not self._persist:
+            return None
+        try:
+            with self._connect() as conn:
+                row = conn.execute(
+                    "SELECT size, mtime_ns, sha256, uri FROM embedded WHERE path = ? AND encoding = ?", key
+                ).fetchone()
+        except (sqlite3.Error, OSError) as exc:
+            self._disable(exc)
+            return None
+        return (row[0], row[1], row[2], row[3]) if row else None
+
+    def _store(self, key: tuple[str, str], size: int, mtime_ns: int, digest: str, uri: str) -> None:
+        if not self._persist:
+            return
+        try:
+            with self._connect() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO embedded (path, encoding, size, mtime_ns, sha256, uri)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    (*key, size, mtime_ns, digest, uri),
+                )
+        except (sqlite3.Error, OSError) as exc:
+            self._disable(exc)
+
+    def _disable(self, exc: Exception) -> None:
+        """Keep going without the database for the rest of the process."""
+        logger.warning("Icon embedding cache %s unavailable, not persisting: %s", self.path, exc)
+        self._persist = False
+
+    def _remember(self, key: tuple[str, str], size: int, mtime_ns: int, uri: str) -> None:
+        with self._lock:
+            self._memory[key] = (size, mtime_ns, uri)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.capacity:
+                self._memory.popitem(last=False)
+
+    def get(self, svg_path: str | Path, encoding: str = PERCENT) -> str:
+        """The data URI of the SVG file at *svg_path*, or "" if there is none.
+
+        *encoding* is :data:`PERCENT` or :data:`BASE64`.
+        """
+        if encoding not in (PERCENT, BASE64):
+            raise ValueError(f"Unknown data URI encoding: {encoding!r}")
+        path = Path(svg_path).resolve()
+        key = (str(path), encoding)
+        try:
+            stat = path.stat()
+        except OSError:
+            with self._lock:
+                self._memory.pop(key, None)
+            return ""
+        size, mtime_ns = stat.st_size, stat.st_mtime_ns
+
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is not None and cached[:2] == (size, mtime_ns):
+                self._memory.move_to_end(key)
+                return cached[2]
+
+        stored = self._stored(key)
+        if stored is not None and stored[:2] == (size, mtime_ns):
+            uri = stored[3]
+        else:
+            try:
+                data = path.read_bytes()
+            except FileNotFoundError:
+                return ""
+            digest = hashlib.sha256(data).hexdigest()
+            # A touched but unchanged file keeps its URI
+            uri = stored[3] if stored is not None and stored[2] == digest else _encode(data, encoding)
+            self._store(key, size, mtime_ns, digest, uri)
+        self._remember(key, size, mtime_ns, uri)
+        return uri
+
+    def clear(self) -> None:
+        """Forget every cached URI, in memory and on disk."""
+        with self._lock:
+            self._memory.clear()
+        if self.path is not None:
+            self.path.unlink(missing_ok=True)
+            self._prepared = False
+
+
+_shared: EmbedCache | None = None
+_shared_lock = threading.Lock()
+
+
+def embed_cache() -> EmbedCache:
+    """The cache shared by this process, stored with the icon packs."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = EmbedCache(ICON_CACHE_DIR / INDEX_DIRNAME / EMBED_CACHE_FILENAME)
+        return _shared
+
 
-@functools.lru_cache(maxsize=256)
 def embed_svg(svg_path: str | Path) -> str:
     """Read an SVG file and return a percent-encoded data URI.
 
@@ -19,10 +213,19 @@ def embed_svg(svg_path: str | Path) -> str:
     Returns:
         A data URI string, or an empty string if the file is not found.
     """
-    path = Path(svg_path)
-    try:
-        data = path.read_text(encoding="utf-8")
-    except FileNotFoundError:
-        return ""
-    encoded = urllib.parse.quote(data, safe="")
-    return f"data:image/svg+xml,{encoded}"
+    return embed_cache().get(svg_path, PERCENT)
+
+
+def embed_svg_base64(svg_path: str | Path) -> str:
+    """Read an SVG file and return a base64 data URI.
+
+    For self-contained SVG output, where the data URI goes in an
+    ``<image href>`` rather than a draw.io style.
+
+    Args:
+        svg_path: Path to the SVG file.
+
+    Returns:
+        A data URI string, or an empty string if the file is not found.
+    """
+    return embed_cache().get(svg_path, BASE64)
@@ -3,11 +3,16 @@
 from __future__ import annotations
 
 import re
+from collections import Counter
 from pathlib import Path
 
 from redspec.config import ICON_CACHE_DIR
 from redspec.icons.packs import ALL_PACKS, IconPack
 
+# Miss buckets for resource types outside any known pack namespace
+OTHER_NAMESPACE = "other"
+NO_NAMESPACE = "none"
+
 # Legacy prefix pattern for backward compatibility with _normalize_filename
 _PREFIX_RE = re.compile(r"^\d+-icon-service-", re.IGNORECASE)
 
@@ -99,6 +104,18 @@ class PackRegistry:
         return sorted(self._icons)
 
 
+def miss_bucket(resource_type: str) -> str:
+    """The namespace an unresolved *resource_type* is counted under.
+
+    A known pack name, :data:`OTHER_NAMESPACE` for any other prefix, or
+    :data:`NO_NAMESPACE` for a type without one.
+    """
+    if "/" not in resource_type:
+        return NO_NAMESPACE
+    namespace = resource_type.split("/", 1)[0]
+    return namespace if namespace in ALL_PACKS else OTHER_NAMESPACE
+
+
 class IconRegistry:
     """Multi-pack icon registry that composes multiple PackRegistry instances.
 
@@ -112,6 +129,8 @@ class IconRegistry:
         pack_names: list[str] | None = None,
     ) -> None:
         self._registries: dict[str, PackRegistry] = {}
+        # Resource types that resolved to no icon, counted per pack namespace
+        self.misses: Counter[str] = Counter()
 
         if icon_dir is not None:
             # Legacy mode: single directory treated as azure pack
@@ -132,9 +151,17 @@ class IconRegistry:
 
         If the resource_type contains a namespace prefix (e.g. "azure/vm"),
         routes to the specific pack. Otherwise searches all packs in order.
+        Misses are counted in :attr:`misses` by namespace (see
+        :func:`miss_bucket`), not by type, so the counts stay bounded however
+        many distinct types are asked for.
         """
         key = resource_type.lower()
+        result = self._resolve(key)
+        if result is None:
+            self.misses[miss_bucket(key)] += 1
+        return result
 
+    def _resolve(self, key: str) -> Path | None:
         # Check for namespace prefix
         if "/" in key:
             namespace, icon_key = key.split("/", 1)
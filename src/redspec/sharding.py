@@ -0,0 +1,239 @@
+"""Deterministic, cost-aware partitioning of batch work across CI shards.
+
+Every shard runs the same partitioning over the same inputs (the sorted spec
+list plus the previous run's manifest), so all nodes agree on the split
+without talking to each other.  Each shard writes its own manifest; the
+manifests are merged afterwards with :func:`merge_manifests`.
+"""
+
+from __future__ import annotations
+
+import heapq
+import json
+import re
+from collections.abc import Iterable
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from redspec.generator.cost import SpecFeatures
+    from redspec.models.diagram import DiagramSpec
+
+MANIFEST_NAME = "redspec-batch.json"
+_SHARD_MANIFEST_RE = re.compile(r"^redspec-batch\.shard-(\d+)-of-(\d+)\.json$")
+
+
+@dataclass
+class ManifestEntry:
+    """Outcome of rendering a single spec file."""
+
+    file: str
+    status: str
+    output: str | None = None
+    error: str | None = None
+    seconds: float | None = None
+    cost: float | None = None
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    """Parse ``INDEX/COUNT`` (1-based) into a tuple.
+
+    >>> parse_shard("2/4")
+    (2, 4)
+    """
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", value)
+    if not match:
+        raise ValueError(f"Shard must look like INDEX/COUNT, got {value!r}")
+    index, count = int(match.group(1)), int(match.group(2))
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+
+def manifest_name(shard: tuple[int, int] | None = None) -> str:
+    """Return the manifest file name for a whole run or a single shard."""
+    if shard is None:
+        return MANIFEST_NAME
+    return f"redspec-batch.shard-{shard[0]}-of-{shard[1]}.json"
+
+
+def load_timings(manifest: Path) -> dict[str, float]:
+    """Return ``{file: seconds}`` for successful entries of a manifest.
+
+    A missing or unreadable manifest yields an empty mapping.
+    """
+    try:
+        data = json.loads(manifest.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return {}
+    timings: dict[str, float] = {}
+    for entry in data.get("entries", []):
+        seconds = entry.get("seconds")
+        if entry.get("status") == "ok" and isinstance(seconds, (int, float)):
+            timings[entry["file"]] = float(seconds)
+    return timings
+
+
+def estimate_features(
+    yaml_file: Path,
+    out_format: str = "png",
+    dpi: int | None = None,
+    specs: dict[str, DiagramSpec | None] | None = None,
+) -> SpecFeatures | None:
+    """Measure a spec file for cost estimation; None if it does not parse.
+
+    *specs*, if given, holds parsed specs by file name: a file found there
+    is not parsed again, and one parsed here is added.
+    """
+    from redspec.exceptions import YAMLParseError
+    from redspec.generator.cost import SpecFeatures
+    from redspec.yaml_io.parser import parse_yaml
+
+    spec: DiagramSpec | None
+    if specs is not None and yaml_file.name in specs:
+        spec = specs[yaml_file.name]
+    else:
+        try:
+            spec = parse_yaml(yaml_file)
+        except YAMLParseError:
+            spec = None
+        if specs is not None:
+            specs[yaml_file.name] = spec
+    if spec is None:
+        return None
+    if dpi:
+        spec.diagram.dpi = dpi
+    return SpecFeatures.from_spec(spec, out_format)
+
+
+def estimate_costs(
+    files: Iterable[Path],
+    timings: dict[str, float] | None = None,
+    out_format: str = "png",
+    dpi: int | None = None,
+    specs: dict[str, DiagramSpec | None] | None = None,
+) -> dict[str, float]:
+    """Estimate a render cost in seconds for each file, keyed by file name.
+
+    Files with a recorded timing use it directly.  The rest are estimated
+    by a :class:`~redspec.generator.cost.CostModel` calibrated by the
+    timed files.  Unparseable files fail fast, so they cost the least.
+
+    Specs are only parsed when some file has no timing.  Pass *specs* to
+    keep the parsed specs for rendering (see :func:`estimate_features`).
+    """
+    from redspec.generator.cost import CostModel, SpecFeatures
+
+    files = list(files)
+    timings = timings or {}
+    if all(f.name in timings for f in files):
+        return {f.name: timings[f.name] for f in files}
+    features = {f.name: estimate_features(f, out_format, dpi, specs) for f in files}
+    model = CostModel.calibrated(
+        (measured, timings[name]) for name, measured in features.items() if name in timings and measured
+    )
+    return {
+        name: timings[name] if name in timings else model.estimate(measured or SpecFeatures()).seconds
+        for name, measured in features.items()
+    }
+
+
+def partition(costs: dict[str, float], count: int) -> list[list[str]]:
+    """Split keys of *costs* into *count* groups with balanced total cost.
+
+    Greedy longest-processing-time-first: the most expensive remaining item
+    goes to the currently least-loaded group.  Ties are broken by name and
+    group index, so the result is fully deterministic.
+    """
+    groups: list[list[str]] = [[] for _ in range(count)]
+    heap = [(0.0, i) for i in range(count)]
+    for name in sorted(costs, key=lambda n: (-costs[n], n)):
+        load, index = heapq.heappop(heap)
+        groups[index].append(name)
+        heapq.heappush(heap, (load + costs[name], index))
+    for group in groups:
+        group.sort()
+    return groups
+
+
+def select_shard(
+    files: list[Path],
+    shard: tuple[int, int],
+    timings: dict[str, float] | None = None,
+    out_format: str = "png",
+    dpi: int | None = None,
+    specs: dict[str, DiagramSpec | None] | None = None,
+) -> tuple[list[Path], dict[str, float]]:
+    """Return the files assigned to *shard* and the cost estimate per file."""
+    index, count = shard
+    costs = estimate_costs(files, timings, out_format, dpi, specs)
+    selected = set(partition(costs, count)[index - 1])
+    return [f for f in files if f.name in selected], costs
+
+
+def write_manifest(
+    path: Path,
+    entries: list[ManifestEntry],
+    out_format: str,
+    shard: tuple[int, int] | None = None,
+) -> None:
+    """Write a batch manifest with per-file results and a summary."""
+    ok = sum(1 for e in entries if e.status == "ok")
+    data: dict[str, Any] = {
+        "version": 1,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "format": out_format,
+        "shard": {"index": shard[0], "count": shard[1]} if shard else None,
+        "summary": {"succeeded": ok, "failed": len(entries) - ok},
+        "entries": [asdict(e) for e in sorted(entries, key=lambda e: e.file)],
+    }
+    path.write_text(json.dumps(data, indent=2), encoding="utf-8")
+
+
+def find_shard_manifests(paths: Iterable[Path]) -> list[Path]:
+    """Expand directories into the shard manifests they contain."""
+    found: list[Path] = []
+    for path in paths:
+        if path.is_dir():
+            found.extend(sorted(p for p in path.iterdir() if _SHARD_MANIFEST_RE.match(p.name)))
+        else:
+            found.append(path)
+    return found
+
+
+def merge_manifests(manifests: list[Path]) -> dict[str, Any]:
+    """Combine per-shard manifests into a single run manifest.
+
+    Later manifests win when the same file appears twice.  The result's
+    ``missing_shards`` lists shard indexes that were expected (from the
+    shard counts) but not provided.
+    """
+    entries: dict[str, dict[str, Any]] = {}
+    formats: set[str] = set()
+    seen_shards: set[int] = set()
+    expected = 0
+
+    for manifest in manifests:
+        data = json.loads(manifest.read_text(encoding="utf-8"))
+        if data.get("format"):
+            formats.add(data["format"])
+        shard = data.get("shard")
+        if shard:
+            seen_shards.add(shard["index"])
+            expected = max(expected, shard["count"])
+        for entry in data.get("entries", []):
+            entries[entry["file"]] = entry
+
+    merged_entries = [entries[name] for name in sorted(entries)]
+    ok = sum(1 for e in merged_entries if e.get("status") == "ok")
+    return {
+        "version": 1,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "format": formats.pop() if len(formats) == 1 else None,
+        "shard": None,
+        "summary": {"succeeded": ok, "failed": len(merged_entries) - ok},
+        "missing_shards": sorted(set(range(1, expected + 1)) - seen_shards),
+        "entries": merged_entries,
+    }
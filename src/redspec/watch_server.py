@@ -1,95 +1,341 @@
-"""Minimal HTTP server for watch mode live-reload."""
+"""Minimal HTTP server for watch mode live-reload.
+
+Browsers subscribe to ``/events`` (server-sent events) and are told when a
+rebuild finishes, instead of polling.  The latest diagram of every watched
+spec is held in memory and served with an ETag, so revalidating an
+unchanged diagram costs a 304.
+
+A single-file watch serves its diagram at ``/`` and ``/diagram``.  A
+directory watch lists every spec with its live status at ``/`` and serves
+each one at ``/view/<spec>`` and ``/diagram/<spec>``.
+"""
 
 from __future__ import annotations
 
+import hashlib
+import html
+import json
 import threading
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+# Seconds between SSE keep-alive comments; also bounds how long a handler
+# thread lingers after its client disconnects.
+_KEEPALIVE_INTERVAL = 15.0
+
+# Name of the spec in a single-file watch
+_DEFAULT_SPEC = ""
+
+# Formatted with the spec name and the state version the page was rendered
+# at, so a rebuild that finishes before the event stream connects is not
+# missed.
+_LIVE_RELOAD_SCRIPT = """<script>
+(function () {
+  var spec = %s;
+  var source = new EventSource('/events?since=%d');
+  source.addEventListener('reload', function (e) {
+    var data = JSON.parse(e.data);
+    if (data.spec !== spec) { return; }
+    var el = document.getElementById('diagram');
+    if (!el) { location.reload(); return; }
+    var url = el.getAttribute('data-base') + '?v=' + data.version;
+    if (el.tagName === 'OBJECT') { el.data = url; } else { el.src = url; }
+  });
+})();
+</script>"""
+
+_INDEX_SCRIPT = """<script>
+(function () {
+  var source = new EventSource('/events?since=%d');
+  function update(e) {
+    var data = JSON.parse(e.data);
+    var cell = document.getElementById('status-' + data.spec);
+    if (!cell || data.status === 'removed') { location.reload(); return; }
+    cell.textContent = data.error ? data.status + ': ' + data.error : data.status;
+    cell.className = data.status;
+  }
+  source.addEventListener('reload', update);
+  source.addEventListener('status', update);
+})();
+</script>"""
+
+_PAGE_STYLE = "background:#1e1e2e;color:#cdd6f4;font-family:sans-serif;text-align:center;padding:1rem"
+
+_MEDIA_TYPES = {
+    "svg": "image/svg+xml",
+    "png": "image/png",
+    "pdf": "application/pdf",
+}
+
+
+class _SpecEntry:
+    """Latest diagram and build status of one watched spec."""
+
+    def __init__(self) -> None:
+        self.data: bytes | None = None
+        self.etag: str | None = None
+        self.status = "pending"
+        self.error: str | None = None
+        # State version of the last change to this entry
+        self.version = 0
+
+    def as_dict(self) -> dict[str, object]:
+        return {"status": self.status, "error": self.error, "version": self.version, "etag": self.etag}
+
+
+class _WatchState:
+    """All watched specs plus a condition SSE clients wait on.
+
+    ``version`` increases with every change to any spec; it doubles as the
+    SSE event id, so a reconnecting client is sent every change it missed.
+    """
+
+    def __init__(self) -> None:
+        self.specs: dict[str, _SpecEntry] = {}
+        self.version = 0
+        self.closed = False
+        self.changed = threading.Condition()
+
+    def _touch(self, name: str) -> _SpecEntry:
+        self.version += 1
+        entry = self.specs.setdefault(name, _SpecEntry())
+        entry.version = self.version
+        return entry
+
+    def update(self, name: str, data: bytes) -> None:
+        with self.changed:
+            entry = self._touch(name)
+            entry.data = data
+            entry.etag = '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+            entry.status, entry.error = "ok", None
+            self.changed.notify_all()
+
+    def set_status(self, name: str, status: str, error: str | None = None) -> None:
+        with self.changed:
+            entry = self._touch(name)
+            entry.status, entry.error = status, error
+            self.changed.notify_all()
+
+    def remove(self, name: str) -> None:
+        with self.changed:
+            # Keep a tombstone so streams can announce the removal
+            entry = self._touch(name)
+            entry.data = entry.etag = entry.error = None
+            entry.status = "removed"
+            self.changed.notify_all()
+
+    def live(self) -> dict[str, _SpecEntry]:
+        return {n: e for n, e in sorted(self.specs.items()) if e.status != "removed"}
+
+    def close(self) -> None:
+        with self.changed:
+            self.closed = True
+            self.changed.notify_all()
 
 
 class _WatchHandler(SimpleHTTPRequestHandler):
-    """HTTP handler that serves a live-reload wrapper page."""
+    """HTTP handler that serves live-reload pages and diagrams."""
 
-    diagram_path: Path | None = None
+    state: _WatchState
     diagram_format: str = "svg"
 
     def do_GET(self) -> None:
-        if self.path == "/":
-            self._serve_wrapper()
-        elif self.path == "/diagram":
-            self._serve_diagram()
+        path = urlsplit(self.path).path
+        if path == "/":
+            if set(self.__class__.state.live()) - {_DEFAULT_SPEC}:
+                self._serve_index()
+            else:
+                self._serve_wrapper(_DEFAULT_SPEC)
+        elif path == "/diagram":
+            self._serve_diagram(_DEFAULT_SPEC)
+        elif path.startswith("/diagram/"):
+            self._serve_diagram(unquote(path[len("/diagram/"):]))
+        elif path.startswith("/view/"):
+            self._serve_wrapper(unquote(path[len("/view/"):]))
+        elif path == "/status":
+            self._serve_status()
+        elif path == "/events":
+            self._serve_events()
         else:
             self.send_error(404)
 
-    def _serve_wrapper(self) -> None:
+    def _send_body(self, body: bytes, content_type: str) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _serve_wrapper(self, name: str) -> None:
         fmt = self.__class__.diagram_format
-        if self.__class__.diagram_path is None:
-            body = "<html><head><meta http-equiv='refresh' content='2'></head><body><h3>Waiting for first build...</h3></body></html>"
+        state = self.__class__.state
+        with state.changed:
+            entry = state.specs.get(name)
+            version = state.version
+        script = _LIVE_RELOAD_SCRIPT % (json.dumps(name), version)
+        # Browsers without JavaScript fall back to periodic refresh
+        fallback = "<noscript><meta http-equiv='refresh' content='2'></noscript>"
+
+        if entry is None or entry.data is None:
+            body = (
+                f"<html><head>{fallback}</head>"
+                f"<body><h3>Waiting for first build...</h3>{script}</body></html>"
+            )
         else:
+            base = "/diagram" if name == _DEFAULT_SPEC else f"/diagram/{quote(name)}"
+            src = f"{base}?v={entry.version}"
             if fmt == "svg":
-                embed = f'<object data="/diagram" type="image/svg+xml" width="100%" height="90%"></object>'
+                embed = (
+                    f'<object id="diagram" data-base="{base}" data="{src}" '
+                    f'type="image/svg+xml" width="100%" height="90%"></object>'
+                )
             else:
-                embed = f'<img src="/diagram" style="max-width:100%;max-height:90%">'
+                embed = f'<img id="diagram" data-base="{base}" src="{src}" style="max-width:100%;max-height:90%">'
+            title = "Redspec Watch Mode" if name == _DEFAULT_SPEC else html.escape(name)
             body = (
-                f"<html><head><meta http-equiv='refresh' content='2'>"
+                f"<html><head>{fallback}"
                 f"<title>Redspec Watch</title></head>"
-                f"<body style='background:#1e1e2e;color:#cdd6f4;font-family:sans-serif;text-align:center;padding:1rem'>"
-                f"<h3>Redspec Watch Mode</h3>"
-                f"{embed}</body></html>"
+                f"<body style='{_PAGE_STYLE}'>"
+                f"<h3>{title}</h3>"
+                f"{embed}{script}</body></html>"
             )
+        self._send_body(body.encode(), "text/html")
 
-        self.send_response(200)
-        self.send_header("Content-Type", "text/html")
-        self.send_header("Cache-Control", "no-cache")
-        self.end_headers()
-        self.wfile.write(body.encode())
+    def _serve_index(self) -> None:
+        state = self.__class__.state
+        with state.changed:
+            specs = state.live()
+            version = state.version
+        rows = []
+        for name, entry in specs.items():
+            label = html.escape(name)
+            status = entry.status + (f": {entry.error}" if entry.error else "")
+            rows.append(
+                f"<tr><td><a href='/view/{quote(name)}'>{label}</a></td>"
+                f"<td id='status-{label}' class='{entry.status}'>{html.escape(status)}</td></tr>"
+            )
+        body = (
+            "<html><head><noscript><meta http-equiv='refresh' content='2'></noscript>"
+            "<title>Redspec Watch</title>"
+            "<style>table{margin:auto;border-collapse:collapse}td{padding:.3rem 1rem;text-align:left}"
+            "a{color:#89b4fa}.ok{color:#a6e3a1}.error{color:#f38ba8}.building{color:#f9e2af}</style></head>"
+            f"<body style='{_PAGE_STYLE}'><h3>Redspec Watch Mode</h3>"
+            f"<table>{''.join(rows)}</table>{_INDEX_SCRIPT % version}</body></html>"
+        )
+        self._send_body(body.encode(), "text/html")
 
-    def _serve_diagram(self) -> None:
-        path = self.__class__.diagram_path
-        if path is None or not path.exists():
+    def _serve_status(self) -> None:
+        state = self.__class__.state
+        with state.changed:
+            payload = {name: entry.as_dict() for name, entry in state.live().items()}
+        self._send_body(json.dumps(payload).encode(), "application/json")
+
+    def _serve_diagram(self, name: str) -> None:
+        state = self.__class__.state
+        with state.changed:
+            entry = state.specs.get(name)
+            data, etag = (entry.data, entry.etag) if entry else (None, None)
+        if data is None or etag is None:
             self.send_error(404, "No diagram generated yet")
             return
 
-        media_types = {
-            "svg": "image/svg+xml",
-            "png": "image/png",
-            "pdf": "application/pdf",
-        }
-        content_type = media_types.get(self.__class__.diagram_format, "application/octet-stream")
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.end_headers()
+            return
 
-        data = path.read_bytes()
+        content_type = _MEDIA_TYPES.get(self.__class__.diagram_format, "application/octet-stream")
         self.send_response(200)
         self.send_header("Content-Type", content_type)
         self.send_header("Cache-Control", "no-cache")
+        self.send_header("ETag", etag)
         self.send_header("Content-Length", str(len(data)))
         self.end_headers()
         self.wfile.write(data)
 
+    def _serve_events(self) -> None:
+        state = self.__class__.state
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        # Reconnects carry Last-Event-ID; first connects say which version
+        # their page showed.  Anything newer is announced immediately.
+        since = self.headers.get("Last-Event-ID") or parse_qs(urlsplit(self.path).query).get("since", [""])[0]
+        try:
+            seen = int(since)
+        except ValueError:
+            seen = state.version
+        with state.changed:
+            # A version from before a server restart can be ahead of ours
+            seen = min(seen, state.version)
+
+        try:
+            self.wfile.write(b"retry: 2000\n\n")
+            self.wfile.flush()
+            while True:
+                def changed(seen: int = seen) -> bool:
+                    return state.closed or state.version > seen
+
+                with state.changed:
+                    state.changed.wait_for(changed, timeout=_KEEPALIVE_INTERVAL)
+                    if state.closed:
+                        return
+                    changes = sorted(
+                        ((e.version, n, e.as_dict()) for n, e in state.specs.items() if e.version > seen),
+                        key=lambda c: c[0],
+                    )
+                if not changes:
+                    self.wfile.write(b": keepalive\n\n")
+                for version, name, info in changes:
+                    seen = version
+                    event = "reload" if info["status"] == "ok" else "status"
+                    payload = json.dumps({"spec": name, **info})
+                    self.wfile.write(f"id: {version}\nevent: {event}\ndata: {payload}\n\n".encode())
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            return
+
     def log_message(self, format: str, *args: object) -> None:
         """Suppress request logging."""
         pass
 
 
 class WatchServer:
-    """Wrapper around HTTPServer for watch mode."""
+    """Wrapper around ThreadingHTTPServer for watch mode."""
 
     def __init__(self, host: str = "127.0.0.1", port: int = 9876, diagram_format: str = "svg") -> None:
         self.host = host
         self.port = port
         self.diagram_format = diagram_format
+        self._state = _WatchState()
 
         # Create a new handler class per server instance
         self._handler_class = type(
             "_BoundHandler",
             (_WatchHandler,),
-            {"diagram_path": None, "diagram_format": diagram_format},
+            {"state": self._state, "diagram_format": diagram_format},
         )
-        self._server = HTTPServer((host, port), self._handler_class)
+        self._server = ThreadingHTTPServer((host, port), self._handler_class)
+        self._server.daemon_threads = True
         self._thread: threading.Thread | None = None
 
-    def update_diagram(self, path: Path) -> None:
-        """Update the served diagram path."""
-        self._handler_class.diagram_path = path
+    def update_diagram(self, path: Path, spec: str = _DEFAULT_SPEC) -> None:
+        """Load the diagram at *path* for *spec* and notify connected browsers."""
+        self._state.update(spec, Path(path).read_bytes())
+
+    def set_status(self, spec: str, status: str, error: str | None = None) -> None:
+        """Record a build status (e.g. ``building`` or ``error``) for *spec*."""
+        self._state.set_status(spec, status, error)
+
+    def remove_spec(self, spec: str) -> None:
+        """Stop listing *spec*, e.g. after its file was deleted."""
+        self._state.remove(spec)
 
     def start(self) -> None:
         """Start serving in a daemon thread."""
@@ -97,8 +343,10 @@ class WatchServer:
         self._thread.start()
 
     def shutdown(self) -> None:
-        """Stop the server."""
+        """Stop the server and release connected event streams."""
+        self._state.close()
         self._server.shutdown()
+        self._server.server_close()
 
     @property
     def url(self) -> str:
@@ -1,13 +1,34 @@
-"""Watch mode: auto-regenerate diagrams on file save."""
+"""Watch mode: auto-regenerate diagrams on file save.
+
+Changes are detected through the optional ``watchfiles`` package (inotify,
+FSEvents or ReadDirectoryChangesW) when it is installed, with a polling
+fallback.  Every file in each spec's include closure is watched, bursts of
+saves are debounced into a single rebuild, and a render still running when
+a newer change arrives is cancelled.  Rebuilds are incremental: only the
+render stages affected by the edit are redone (see
+:mod:`redspec.generator.incremental`).
+
+:func:`watch_loop` watches one spec; :func:`watch_tree` watches every spec
+in a directory tree, rebuilding only the specs a change affects on a shared,
+bounded worker pool.
+"""
 
 from __future__ import annotations
 
 import os
+import queue
+import tempfile
+import threading
 import time
-from typing import TYPE_CHECKING, Callable
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Any
+
+BACKENDS = ("auto", "watchfiles", "poll")
 
-if TYPE_CHECKING:
-    from pathlib import Path
+_SPEC_SUFFIXES = (".yaml", ".yml")
 
 
 def _get_mtime(path: Path) -> float:
@@ -18,6 +39,332 @@ def _get_mtime(path: Path) -> float:
         return 0.0
 
 
+def _is_spec_file(path: Path, root: Path) -> bool:
+    """True for YAML files under *root* outside hidden directories."""
+    try:
+        rel = path.relative_to(root)
+    except ValueError:
+        return False
+    return path.suffix in _SPEC_SUFFIXES and not any(part.startswith(".") for part in rel.parts)
+
+
+def _find_spec_files(root: Path) -> set[Path]:
+    return {p for p in root.rglob("*") if _is_spec_file(p, root) and p.is_file()}
+
+
+class _PollingBackend:
+    """Report changes by polling the modification times of watched files."""
+
+    name = "poll"
+
+    def __init__(self, notify: Callable[[Path], None], interval: float) -> None:
+        self._notify = notify
+        self._interval = interval
+        self._paths: frozenset[Path] = frozenset()
+        self._trees: frozenset[Path] = frozenset()
+        self._mtimes: dict[Path, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def set_paths(self, paths: Iterable[Path], trees: Iterable[Path] = ()) -> None:
+        with self._lock:
+            self._paths, self._trees = frozenset(paths), frozenset(trees)
+            self._mtimes = {p: self._mtimes.get(p, _get_mtime(p)) for p in self._watched()}
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _watched(self) -> set[Path]:
+        watched = set(self._paths)
+        for tree in self._trees:
+            watched |= _find_spec_files(tree)
+        return watched
+
+    def _run(self) -> None:
+        while not self._stop.wait(self._interval):
+            with self._lock:
+                current = {p: _get_mtime(p) for p in self._watched() | self._mtimes.keys()}
+                for path, mtime in current.items():
+                    if mtime != self._mtimes.get(path, 0.0):
+                        self._notify(path)
+                self._mtimes = {p: m for p, m in current.items() if m or p in self._paths}
+
+
+class _WatchfilesBackend:
+    """Report changes from OS file-system events via ``watchfiles``.
+
+    The parent directories of the watched files are watched (editors often
+    save by renaming a temporary file over the original, which would orphan
+    a watch on the file itself) and events are filtered to the watched set,
+    plus any spec file inside a watched tree.
+    """
+
+    name = "watchfiles"
+
+    def __init__(self, notify: Callable[[Path], None]) -> None:
+        import watchfiles
+
+        self._watch = watchfiles.watch
+        self._notify = notify
+        self._paths: frozenset[Path] = frozenset()
+        self._trees: frozenset[Path] = frozenset()
+        self._dirs: frozenset[Path] = frozenset()
+        self._stop_current: threading.Event | None = None
+
+    def set_paths(self, paths: Iterable[Path], trees: Iterable[Path] = ()) -> None:
+        self._paths, self._trees = frozenset(paths), frozenset(trees)
+        outside = {p.parent for p in self._paths if not any(p.is_relative_to(t) for t in self._trees)}
+        dirs = frozenset(d for d in outside | self._trees if d.is_dir())
+        if dirs != self._dirs:
+            self.stop()
+            self._dirs = dirs
+            if dirs:
+                stop = threading.Event()
+                self._stop_current = stop
+                threading.Thread(target=self._run, args=(dirs, stop), daemon=True).start()
+
+    def stop(self) -> None:
+        if self._stop_current is not None:
+            self._stop_current.set()
+            self._stop_current = None
+
+    def _wanted(self, path: Path) -> bool:
+        return path in self._paths or any(_is_spec_file(path, t) for t in self._trees)
+
+    def _run(self, dirs: frozenset[Path], stop: threading.Event) -> None:
+        for changes in self._watch(
+            *dirs,
+            watch_filter=lambda _change, path: self._wanted(Path(path)),
+            stop_event=stop,
+            recursive=bool(self._trees),
+            step=10,
+        ):
+            for _change, path in changes:
+                self._notify(Path(path))
+
+
+def _make_backend(
+    backend: str,
+    notify: Callable[[Path], None],
+    poll_interval: float,
+) -> _PollingBackend | _WatchfilesBackend:
+    """Create the change-detection backend named *backend*."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown watch backend: {backend!r}")
+    if backend != "poll":
+        try:
+            return _WatchfilesBackend(notify)
+        except ImportError as exc:
+            if backend == "watchfiles":
+                raise ImportError(
+                    "watchfiles is required for event-driven watching. "
+                    "Install with: pip install redspec[watch]"
+                ) from exc
+    return _PollingBackend(notify, poll_interval)
+
+
+class _Spec:
+    """Watch state of one root spec."""
+
+    def __init__(self, path: Path, output: Path) -> None:
+        self.path = path
+        self.output = output
+        self.closure: set[Path] = {path}
+        # Kept across rebuilds; holds the spec's incremental renderer
+        self.state: dict = {}
+        # Monotonic time a rebuild is due, or None when up to date
+        self.due: float | None = 0.0
+        # Set while a build is queued or running
+        self.cancel_event: threading.Event | None = None
+
+
+class _Session:
+    """Shared engine of :func:`watch_loop` and :func:`watch_tree`.
+
+    The calling thread owns all state: backends and build workers only
+    post ``("change", path)`` and ``("done", ...)`` events to a queue.
+    """
+
+    def __init__(
+        self,
+        root: Path | None,
+        files: list[Path],
+        output_dir: Path,
+        out_format: str,
+        max_workers: int,
+        poll_interval: float,
+        debounce: float,
+        backend: str,
+        on_rebuild: Callable[[Path, Path], None],
+        on_error: Callable[[Path, Exception], None] | None,
+        on_building: Callable[[Path], None] | None,
+        on_removed: Callable[[Path], None] | None,
+    ) -> None:
+        self.root = root.resolve() if root is not None else None
+        self.files = [f.resolve() for f in files]
+        self.output_dir = output_dir
+        self.out_format = out_format
+        self.poll_interval = poll_interval
+        self.debounce = debounce
+        self.on_rebuild = on_rebuild
+        self.on_error = on_error
+        self.on_building = on_building
+        self.on_removed = on_removed
+        self.specs: dict[Path, _Spec] = {}
+        # Watched paths found missing, and when to check they are really gone
+        self.missing: dict[Path, float] = {}
+        self.events: queue.Queue[tuple[str, Any]] = queue.Queue()
+        self.watcher = _make_backend(backend, lambda path: self.events.put(("change", path)), poll_interval)
+        self.pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="redspec-watch")
+
+    def run(self, should_stop: Callable[[], bool] | None) -> None:
+        from redspec.exceptions import RenderCancelledError
+
+        try:
+            self._rescan()
+            while not (should_stop and should_stop()):
+                self._check_missing()
+                self._start_due()
+                try:
+                    kind, payload = self.events.get(timeout=self._timeout())
+                except queue.Empty:
+                    continue
+
+                if kind == "change":
+                    self._on_change(payload)
+                    continue
+
+                built: _Spec
+                built, cancel_event, result, exc = payload
+                if built.cancel_event is not cancel_event or self.specs.get(built.path) is not built:
+                    continue
+                built.cancel_event = None
+                if exc is None:
+                    self.on_rebuild(built.path, result)
+                elif not isinstance(exc, RenderCancelledError) and self.on_error:
+                    self.on_error(built.path, exc)
+        finally:
+            self.watcher.stop()
+            for spec in self.specs.values():
+                if spec.cancel_event is not None:
+                    spec.cancel_event.set()
+            self.pool.shutdown(wait=True, cancel_futures=True)
+
+    def _output_for(self, path: Path) -> Path:
+        rel = path.relative_to(self.root) if self.root is not None else Path(path.name)
+        return self.output_dir / rel.with_suffix(f".{self.out_format}")
+
+    def _rescan(self) -> None:
+        """Recompute which files are root specs and watch their closures."""
+        from redspec.yaml_io.includes import include_closure
+
+        if self.root is None:
+            roots = {f: include_closure(f) for f in self.files}
+        else:
+            closures = {f: include_closure(f) for f in _find_spec_files(self.root)}
+            fragments = set().union(*(c - {f} for f, c in closures.items())) if closures else set()
+            roots = {f: c for f, c in closures.items() if f not in fragments}
+
+        for path in self.specs.keys() - roots.keys():
+            spec = self.specs.pop(path)
+            if spec.cancel_event is not None:
+                spec.cancel_event.set()
+            spec.output.unlink(missing_ok=True)
+            if self.on_removed:
+                self.on_removed(path)
+        for path, closure in roots.items():
+            if path not in self.specs:
+                self.specs[path] = _Spec(path, self._output_for(path))
+            self.specs[path].closure = closure
+        self._sync_watch()
+
+    def _sync_watch(self) -> None:
+        paths = set().union(*(s.closure for s in self.specs.values())) if self.specs else set()
+        self.watcher.set_paths(paths, [self.root] if self.root is not None else [])
+
+    def _on_change(self, path: Path) -> None:
+        due = time.monotonic() + self.debounce
+        affected = [s for s in self.specs.values() if path in s.closure]
+        if self.root is not None and not affected:
+            # A spec appeared
+            self._rescan()
+            affected = [s for s in self.specs.values() if path in s.closure]
+        elif self.root is not None and not path.exists():
+            # Editors that save by renaming leave the path missing for a
+            # moment; it is only gone if still missing after the debounce
+            self.missing[path] = due
+
+        for spec in affected:
+            spec.due = due
+            if spec.cancel_event is not None:
+                spec.cancel_event.set()
+
+    def _check_missing(self) -> None:
+        """Drop the specs whose files stayed missing through the debounce."""
+        now = time.monotonic()
+        checked = [path for path, at in self.missing.items() if at <= now]
+        for path in checked:
+            del self.missing[path]
+        if any(not path.exists() for path in checked):
+            self._rescan()
+
+    def _start_due(self) -> None:
+        from redspec.yaml_io.includes import include_closure
+
+        now = time.monotonic()
+        ready = [
+            s for s in self.specs.values()
+            if s.due is not None and s.due <= now and s.cancel_event is None
+        ]
+        closures_changed = False
+        for spec in ready:
+            # Refresh the closure before building so edits made while the
+            # build reads the files are still reported.
+            closure = include_closure(spec.path)
+            if closure != spec.closure:
+                spec.closure = closure
+                closures_changed = True
+            spec.due = None
+            spec.cancel_event = threading.Event()
+            if self.on_building:
+                self.on_building(spec.path)
+            self.pool.submit(self._build, spec, spec.cancel_event)
+
+        if closures_changed:
+            # New includes can turn a spec into another spec's fragment
+            if self.root is not None:
+                self._rescan()
+            else:
+                self._sync_watch()
+
+    def _timeout(self) -> float:
+        now = time.monotonic()
+        waits = [s.due - now for s in self.specs.values() if s.due is not None and s.cancel_event is None]
+        waits.extend(at - now for at in self.missing.values())
+        return max(0.0, min([self.poll_interval, *waits]))
+
+    def _build(self, spec: _Spec, cancel_event: threading.Event) -> None:
+        from redspec.exceptions import RenderCancelledError
+
+        try:
+            if cancel_event.is_set():
+                # Superseded while waiting for a worker
+                raise RenderCancelledError()
+            result = _rebuild(
+                spec.path,
+                cancel_event=cancel_event,
+                state=spec.state,
+                output=spec.output,
+                out_format=self.out_format,
+            )
+        except Exception as exc:
+            self.events.put(("done", (spec, cancel_event, None, exc)))
+        else:
+            self.events.put(("done", (spec, cancel_event, result, None)))
+
+
 def watch_loop(
     yaml_file: Path,
     on_rebuild: Callable[[Path], None],
@@ -25,63 +372,137 @@ def watch_loop(
     on_first_build: Callable[[Path], None] | None = None,
     should_stop: Callable[[], bool] | None = None,
     poll_interval: float = 0.5,
+    debounce: float = 0.05,
+    backend: str = "auto",
+    output_dir: Path | None = None,
+    out_format: str = "svg",
 ) -> None:
-    """Poll a YAML file for changes and trigger rebuilds.
+    """Watch a YAML file and its includes for changes and trigger rebuilds.
 
     Args:
         yaml_file: Path to the YAML file to watch.
         on_rebuild: Called with the generated file path after each rebuild.
         on_error: Called with the exception on rebuild errors.
         on_first_build: Called once after the first successful build.
-        should_stop: Return True to stop the loop.
-        poll_interval: Seconds between polls.
+        should_stop: Return True to stop the loop; checked every *poll_interval*.
+        poll_interval: Seconds between stop checks, and between polls when
+            the polling backend is used.
+        debounce: Seconds without further changes before a rebuild starts.
+        backend: ``"watchfiles"``, ``"poll"``, or ``"auto"`` to use
+            watchfiles when it is installed and polling otherwise.
+        output_dir: Directory the diagram is written to.  Defaults to a
+            temporary directory removed when the loop ends.
+        out_format: Output format (svg, png or pdf).
     """
-    from redspec.exceptions import RedspecError, YAMLParseError
-
-    last_mtime = 0.0
     first_build_done = False
 
-    while True:
-        if should_stop and should_stop():
-            break
-
-        current_mtime = _get_mtime(yaml_file)
-        if current_mtime > last_mtime:
-            last_mtime = current_mtime
-            try:
-                result = _rebuild(yaml_file)
-                if not first_build_done:
-                    first_build_done = True
-                    if on_first_build:
-                        on_first_build(result)
-                on_rebuild(result)
-            except (RedspecError, YAMLParseError) as exc:
-                if on_error:
-                    on_error(exc)
-            except Exception as exc:
-                if on_error:
-                    on_error(exc)
-
-        time.sleep(poll_interval)
-
-
-def _rebuild(yaml_file: Path) -> Path:
-    """Parse and render the YAML file, returning the output path."""
-    import tempfile
-
-    from redspec.generator.pipeline import generate as run_pipeline
+    def rebuilt(_spec: Path, output: Path) -> None:
+        nonlocal first_build_done
+        if not first_build_done:
+            first_build_done = True
+            if on_first_build:
+                on_first_build(output)
+        on_rebuild(output)
+
+    _run_session(
+        None, [Path(yaml_file)], output_dir, out_format, 1, poll_interval, debounce, backend,
+        rebuilt, (lambda _spec, exc: on_error(exc)) if on_error else None, None, None, should_stop,
+    )
+
+
+def watch_tree(
+    root: Path,
+    on_rebuild: Callable[[Path, Path], None],
+    on_error: Callable[[Path, Exception], None] | None = None,
+    on_building: Callable[[Path], None] | None = None,
+    on_removed: Callable[[Path], None] | None = None,
+    should_stop: Callable[[], bool] | None = None,
+    poll_interval: float = 0.5,
+    debounce: float = 0.05,
+    backend: str = "auto",
+    output_dir: Path | None = None,
+    out_format: str = "svg",
+    max_workers: int = 2,
+) -> None:
+    """Watch every spec under *root* and rebuild the ones a change affects.
+
+    Root specs are the YAML files in the tree that no other file includes;
+    included fragments are watched as dependencies of the specs including
+    them.  Specs appearing or disappearing are picked up as they happen.
+    Each spec renders to ``output_dir/<relative path>.<format>``, replaced
+    atomically, and at most *max_workers* renders run at once.
+
+    Callbacks receive the spec's path first: *on_rebuild* with the output
+    path, *on_error* with the exception, *on_building* when a build starts
+    and *on_removed* when the spec's file is gone.  See :func:`watch_loop`
+    for the remaining arguments.
+    """
+    _run_session(
+        Path(root), [], output_dir, out_format, max_workers, poll_interval, debounce, backend,
+        on_rebuild, on_error, on_building, on_removed, should_stop,
+    )
+
+
+def _run_session(
+    root: Path | None,
+    files: list[Path],
+    output_dir: Path | None,
+    out_format: str,
+    max_workers: int,
+    poll_interval: float,
+    debounce: float,
+    backend: str,
+    on_rebuild: Callable[[Path, Path], None],
+    on_error: Callable[[Path, Exception], None] | None,
+    on_building: Callable[[Path], None] | None,
+    on_removed: Callable[[Path], None] | None,
+    should_stop: Callable[[], bool] | None,
+) -> None:
+    tmpdir = None
+    if output_dir is None:
+        tmpdir = tempfile.TemporaryDirectory(prefix="redspec-watch-")
+        output_dir = Path(tmpdir.name)
+    try:
+        _Session(
+            root, files, Path(output_dir), out_format, max_workers, poll_interval, debounce,
+            backend, on_rebuild, on_error, on_building, on_removed,
+        ).run(should_stop)
+    finally:
+        if tmpdir is not None:
+            tmpdir.cleanup()
+
+
+@lru_cache(maxsize=1)
+def _icon_registry():
+    """One icon registry shared by every spec a session renders."""
     from redspec.icons.registry import IconRegistry
+
+    return IconRegistry()
+
+
+def _rebuild(
+    yaml_file: Path,
+    cancel_event: threading.Event | None = None,
+    state: dict | None = None,
+    output: Path | None = None,
+    out_format: str = "svg",
+) -> Path:
+    """Parse and render the YAML file to *output*, returning the output path.
+
+    *state* persists between rebuilds of one spec; it holds the incremental
+    renderer so unchanged render stages can be skipped.
+    """
+    from redspec.generator.incremental import IncrementalRenderer
     from redspec.yaml_io.parser import parse_yaml
 
     spec = parse_yaml(yaml_file)
-    registry = IconRegistry()
 
-    tmpdir = tempfile.mkdtemp(prefix="redspec-watch-")
-    output = str(Path(tmpdir) / "diagram.svg")
+    state = {} if state is None else state
+    renderer = state.get("renderer")
+    if renderer is None:
+        if output is None:
+            output = Path(yaml_file).with_suffix(f".{out_format}")
+        renderer = IncrementalRenderer(output, icon_registry=_icon_registry(), out_format=out_format)
+        state["renderer"] = renderer
 
-    return run_pipeline(
-        spec,
-        output,
-        icon_registry=registry,
-        out_format="svg",
-    )
+    return renderer.render(spec, cancel_event=cancel_event)
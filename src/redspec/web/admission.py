@@ -0,0 +1,147 @@
+"""Admission control for web renders, by estimated cost.
+
+Before a render is queued its cost is estimated from the spec (see
+:mod:`redspec.generator.cost`).  :class:`Admission` turns the estimate
+into a decision: renders above the configured time or memory limits are
+refused outright with :class:`~redspec.exceptions.RenderTooLargeError`,
+and each client may spend only so many estimated render-seconds per
+minute (:class:`ClientQuotas`), beyond which it gets
+:class:`~redspec.exceptions.QuotaExceededError`.  Estimates above the
+async threshold are rendered as background jobs by the app.
+
+Cached results cost nothing and are not charged.  Quotas are kept per
+server process.
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any
+
+from redspec.exceptions import QuotaExceededError, RenderTooLargeError
+
+if TYPE_CHECKING:
+    from redspec.generator.cost import CostEstimate, CostModel, SpecFeatures
+    from redspec.models.diagram import DiagramSpec
+
+# Clients tracked before idle ones are forgotten
+_MAX_CLIENTS = 10_000
+
+
+def _format_bytes(size: float) -> str:
+    if size < 1024:
+        return f"{size:.0f} B"
+    for unit in ("KiB", "MiB"):
+        size /= 1024
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+    return f"{size / 1024:.1f} GiB"
+
+
+class ClientQuotas:
+    """Token buckets of estimated render-seconds, one per client.
+
+    A bucket holds up to *per_minute* seconds and refills at that rate.
+    A render costing more than a full bucket is allowed once the bucket is
+    full, and leaves it in debt.
+    """
+
+    def __init__(self, per_minute: float, clock: Callable[[], float] = time.monotonic) -> None:
+        if per_minute <= 0:
+            raise ValueError("per_minute must be positive")
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buckets: dict[str, tuple[float, float]] = {}  # client -> (tokens, updated)
+        self.rejected = 0
+
+    def _tokens(self, client: str, now: float) -> float:
+        tokens, updated = self._buckets.get(client, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) * self.rate)
+
+    def charge(self, client: str, seconds: float) -> None:
+        """Spend *seconds* of *client*'s quota, or raise QuotaExceededError."""
+        now = self._clock()
+        with self._lock:
+            tokens = self._tokens(client, now)
+            needed = min(seconds, self.capacity)
+            if tokens < needed:
+                self.rejected += 1
+                raise QuotaExceededError(max(1, math.ceil((needed - tokens) / self.rate)))
+            self._buckets[client] = (tokens - seconds, now)
+            if len(self._buckets) > _MAX_CLIENTS:
+                self._forget_idle(now)
+
+    def remaining(self, client: str) -> float:
+        with self._lock:
+            return self._tokens(client, self._clock())
+
+    def _forget_idle(self, now: float) -> None:
+        """Drop clients whose buckets have refilled.  Caller holds the lock."""
+        for client in [c for c in self._buckets if self._tokens(c, now) >= self.capacity]:
+            del self._buckets[client]
+
+
+class Admission:
+    """Estimates renders and applies limits and quotas to them.
+
+    *max_seconds* and *max_memory* bound a single render's estimate;
+    *client_quota* is the estimated render-seconds a client may use per
+    minute.  ``None`` disables a check.
+    """
+
+    def __init__(
+        self,
+        model: CostModel,
+        max_seconds: float | None = None,
+        max_memory: int | None = None,
+        client_quota: float | None = None,
+    ) -> None:
+        self.model = model
+        self.max_seconds = max_seconds
+        self.max_memory = max_memory
+        self.quotas = ClientQuotas(client_quota) if client_quota else None
+        self.too_large = 0
+
+    def estimate(self, spec: DiagramSpec, out_format: str) -> tuple[SpecFeatures, CostEstimate]:
+        from redspec.generator.cost import SpecFeatures
+
+        features = SpecFeatures.from_spec(spec, out_format)
+        return features, self.model.estimate(features)
+
+    def violations(self, estimate: CostEstimate) -> list[str]:
+        """The limits *estimate* exceeds, described for the user."""
+        reasons = []
+        if self.max_seconds is not None and estimate.seconds > self.max_seconds:
+            reasons.append(f"estimated {estimate.seconds:.0f}s to render, limit {self.max_seconds:.0f}s")
+        if self.max_memory is not None and estimate.memory_bytes > self.max_memory:
+            reasons.append(
+                f"estimated {_format_bytes(estimate.memory_bytes)} of memory, limit {_format_bytes(self.max_memory)}"
+            )
+        return reasons
+
+    def check(self, estimate: CostEstimate) -> None:
+        """Raise RenderTooLargeError if *estimate* exceeds the limits."""
+        reasons = self.violations(estimate)
+        if reasons:
+            self.too_large += 1
+            raise RenderTooLargeError(estimate, reasons)
+
+    def charge(self, client: str, estimate: CostEstimate) -> None:
+        """Spend *client*'s quota on *estimate*; raise QuotaExceededError if it is used up."""
+        if self.quotas is not None:
+            self.quotas.charge(client, estimate.seconds)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **self.model.stats(),
+            "max_seconds": self.max_seconds,
+            "max_memory": self.max_memory,
+            "client_quota": self.quotas.capacity if self.quotas else None,
+            "rejected_too_large": self.too_large,
+            "rejected_quota": self.quotas.rejected if self.quotas else 0,
+        }
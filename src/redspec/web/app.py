@@ -2,22 +2,77 @@
 
 from __future__ import annotations
 
+import asyncio
+import gzip
+import hashlib
 import json
-import shutil
+import logging
+import mimetypes
+import re
 import tempfile
+import threading
+import time
+from collections.abc import Callable
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
-from typing import Any
-
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from typing import TYPE_CHECKING, Any
+
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    Query,
+    Request,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import (
+    FileResponse,
+    HTMLResponse,
+    JSONResponse,
+    RedirectResponse,
+    Response,
+    StreamingResponse,
+)
 from fastapi.templating import Jinja2Templates
 from pydantic import BaseModel, Field
+from starlette.concurrency import run_in_threadpool
+
+if TYPE_CHECKING:
+    from redspec.exporters.registry import Exporter
+    from redspec.generator.retention import RetentionPolicy
+    from redspec.models.diagram import DiagramSpec
+
+logger = logging.getLogger(__name__)
 
 _WEB_DIR = Path(__file__).parent
 _TEMPLATES_DIR = _WEB_DIR / "templates"
 _STATIC_DIR = _WEB_DIR / "static"
 
+_MEDIA_TYPES: dict[str, str] = {
+    "png": "image/png",
+    "svg": "image/svg+xml",
+    "pdf": "application/pdf",
+}
+
+# Shared job states when several worker processes serve one output directory
+JOBS_DB_FILENAME = ".jobs.db"
+
+# Render cost model calibrated by this server's render times
+COST_MODEL_FILENAME = ".cost-model.json"
+
+# Environment variable carrying create_app() arguments to worker processes
+SERVE_CONFIG_ENV = "REDSPEC_SERVE_CONFIG"
+
+# Thumbnails and fingerprinted static files are named by content hash, so
+# their URLs never change meaning
+_IMMUTABLE = "public, max-age=31536000, immutable"
+_DIGEST_RE = re.compile(r"[0-9a-f]{8,64}")
+
+# Seconds between job event stream checks, and between progress events
+# while a job's stage is unchanged (so clients see elapsed time advance)
+_JOB_POLL_INTERVAL = 0.2
+_JOB_HEARTBEAT = 1.0
+
 
 # ---------- Request / response models ----------
 
@@ -39,16 +94,22 @@ class GenerateRequest(BaseModel):
     format: str | None = None
     glow: bool | None = None
     polish: str | None = None
+    save: bool = Field(
+        default=True,
+        description="Save to the gallery. Unsaved previews are rendered with priority.",
+    )
 
 
 class ExportRequest(BaseModel):
     yaml_content: str
-    format: str = Field(description="Export format: mermaid, plantuml, or drawio.")
+    format: str = Field(description="Export format: mermaid, plantuml, drawio, json, graphml or a plugin format.")
+    compressed: bool = Field(default=False, description="draw.io only: use draw.io's compressed diagram encoding.")
 
 
 class GalleryUpdateRequest(BaseModel):
     yaml_content: str | None = None
     name: str | None = None
+    pinned: bool | None = None
 
 
 # ---------- Helpers ----------
@@ -67,6 +128,59 @@ def _parse_yaml_content(yaml_content: str) -> dict:
     return raw
 
 
+def _generate_spec(raw: dict, body: GenerateRequest) -> Any:
+    """Apply request overrides to *raw* and validate it, raising HTTPException."""
+    from redspec.models.diagram import DiagramSpec
+
+    try:
+        if "diagram" not in raw:
+            raw["diagram"] = {}
+        if body.theme:
+            raw["diagram"]["theme"] = body.theme
+        if body.direction:
+            raw["diagram"]["direction"] = body.direction
+        if body.dpi:
+            raw["diagram"]["dpi"] = body.dpi
+        if body.polish:
+            from redspec.models.diagram import VALID_POLISH_PRESETS
+
+            if body.polish not in VALID_POLISH_PRESETS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"Invalid polish preset {body.polish!r}. "
+                    f"Valid presets: {', '.join(sorted(VALID_POLISH_PRESETS))}",
+                )
+            raw["diagram"]["polish"] = body.polish
+
+        return DiagramSpec.model_validate(raw)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+
+def _client_id(connection: Any) -> str:
+    """The address a request or WebSocket came from, for per-client quotas."""
+    return connection.client.host if connection.client else "unknown"
+
+
+def _gallery_diagram(slug_dir: Path) -> tuple[Path, dict[str, Any]] | None:
+    """Return a gallery entry's diagram file and metadata."""
+    try:
+        meta = json.loads((slug_dir / "metadata.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    from redspec.generator.output_organizer import diagram_file
+
+    diagram = diagram_file(slug_dir, meta)
+    return (diagram, meta) if diagram.is_file() else None
+
+
+def _thumbnail_url(entry: dict[str, Any]) -> str:
+    base = f"/api/gallery/{entry['slug']}/thumbnail"
+    return f"{base}/{entry['content_hash']}" if entry.get("content_hash") else base
+
+
 def _resolve_slug_dir(output_dir: Path, slug: str) -> Path:
     """Resolve and validate a gallery slug directory."""
     slug_dir = (output_dir / slug).resolve()
@@ -79,18 +193,581 @@ def _resolve_slug_dir(output_dir: Path, slug: str) -> Path:
     return slug_dir
 
 
+# ---------- Render jobs ----------
+#
+# These run on the render queue's workers, possibly in another process, so
+# they are module-level and take only picklable arguments.
+
+
+# (installed icon packs, registry) of the last registry built in this process
+_registry_cache: tuple[Any, Any] | None = None
+
+
+def _icon_registry():
+    """Icon registry shared by all renders in this worker process.
+
+    Rebuilt when icon packs are installed or updated, possibly by another
+    process, so a long-running worker never renders with a stale registry.
+    """
+    global _registry_cache
+    from redspec.icons.registry import IconRegistry
+    from redspec.web.result_cache import _icon_state
+
+    state = _icon_state()
+    cached = _registry_cache
+    if cached is None or cached[0] != state:
+        cached = _registry_cache = (state, IconRegistry())
+    return cached[1]
+
+
+# (icon registry, catalogue) of the last resource catalogue built in this process
+_catalogue_cache: tuple[Any, Any] | None = None
+
+
+def _resource_catalogue():
+    """Resource type catalogue, rebuilt along with the icon registry.
+
+    Its version covers the redspec version and the installed icon packs.
+    """
+    global _catalogue_cache
+    from redspec import __version__
+    from redspec.icons.catalogue import ResourceCatalogue
+    from redspec.web.result_cache import _icon_state
+
+    registry = _icon_registry()
+    cached = _catalogue_cache
+    if cached is None or cached[0] is not registry:
+        state = json.dumps([__version__, _icon_state()], default=str)
+        version = hashlib.sha256(state.encode("utf-8")).hexdigest()[:32]
+        cached = _catalogue_cache = (registry, ResourceCatalogue.from_registry(registry, version))
+    return cached[1]
+
+
+def _render_diagram(
+    spec: Any,
+    out_format: str,
+    glow: bool | None,
+    cancel_event: threading.Event | None = None,
+    on_stage: Callable[[str], None] | None = None,
+) -> bytes:
+    """Render *spec* and return the diagram bytes."""
+    from redspec.generator.pipeline import generate as run_pipeline
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        generated = run_pipeline(
+            spec,
+            str(Path(tmpdir) / f"diagram.{out_format}"),
+            icon_registry=_icon_registry(),
+            out_format=out_format,
+            glow=glow,
+            cancel_event=cancel_event,
+            on_stage=on_stage,
+        )
+        return Path(generated).read_bytes()
+
+
+def _timed(fn: Callable[..., Any], *args: Any, **kwargs: Any) -> tuple[Any, float]:
+    """Call ``fn(*args, **kwargs)``; return its result and the seconds it took."""
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def _render_incremental(renderer: Any, spec: Any) -> tuple[bytes, str]:
+    """Bring a preview session's incremental renderer up to date with *spec*.
+
+    Returns the diagram and the stage that was rerun.
+    """
+    path = renderer.render(spec)
+    return path.read_bytes(), renderer.last_level.name.lower()
+
+
+def _save_to_gallery(
+    data: bytes,
+    yaml_content: str,
+    spec: Any,
+    out_format: str,
+    key: str,
+    output_dir: Path,
+    history_artifacts: int = 5,
+    compress_svg: bool = False,
+) -> Path:
+    """Store rendered *data* as a gallery entry and return the diagram path.
+
+    Saving the same spec again leaves an up-to-date entry untouched.
+    """
+    from redspec.generator.output_organizer import (
+        diagram_file,
+        organize_output,
+        slugify,
+    )
+
+    slug_dir = output_dir / slugify(spec.diagram.name)
+    diagram = slug_dir / f"diagram.{out_format}{'z' if compress_svg and out_format == 'svg' else ''}"
+    try:
+        meta = json.loads((slug_dir / "metadata.json").read_text(encoding="utf-8"))
+        if (
+            meta.get("cache_key") == key
+            and diagram_file(slug_dir, meta) == diagram
+            and diagram.is_file()
+            and (slug_dir / "spec.yaml").read_text(encoding="utf-8") == yaml_content
+        ):
+            return diagram
+    except (OSError, ValueError):
+        pass
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        generated = Path(tmpdir) / f"diagram.{out_format}"
+        generated.write_bytes(data)
+
+        tmp_yaml = Path(tmpdir) / "spec.yaml"
+        tmp_yaml.write_text(yaml_content, encoding="utf-8")
+
+        return organize_output(
+            generated_file=generated,
+            source_yaml=tmp_yaml,
+            output_dir=output_dir,
+            diagram_name=spec.diagram.name,
+            theme=spec.diagram.theme,
+            direction=spec.diagram.direction,
+            dpi=spec.diagram.dpi,
+            move=True,
+            history_artifacts=history_artifacts,
+            compress_svg=compress_svg,
+            format=out_format,
+            cache_key=key,
+        )
+
+
+def _export_text(spec: Any, fmt: str, compressed: bool = False) -> bytes:
+    """Export *spec* to the text format *fmt*, UTF-8 encoded."""
+    from redspec.exporters.registry import ExportOptions, export_text
+
+    options = ExportOptions(icon_registry=_icon_registry(), compressed=compressed)
+    return export_text(fmt, spec, options).encode("utf-8")
+
+
+def create_app_from_env() -> FastAPI:
+    """Application factory for worker processes started by ``redspec serve --workers``.
+
+    Worker processes import the app afresh, so ``create_app()`` arguments
+    are passed in the :data:`SERVE_CONFIG_ENV` environment variable as JSON.
+    """
+    import os
+
+    from redspec.generator.retention import RetentionPolicy
+
+    config = json.loads(os.environ.get(SERVE_CONFIG_ENV, "{}"))
+    for name in ("output_dir", "cache_dir"):
+        if config.get(name) is not None:
+            config[name] = Path(config[name])
+    if config.get("retention") is not None:
+        config["retention"] = RetentionPolicy(**config["retention"])
+    return create_app(**config)
+
+
+def _register_gauges(metrics: Any, render_queue: Any, result_cache: Any, job_store: Any, admission: Any) -> None:
+    """Expose the queue, cache, job, admission and icon statistics as metrics."""
+
+    def icon_misses() -> list[tuple[dict[str, str], float]]:
+        # Only read a registry that renders have already built in this
+        # process; with --render-processes the misses happen in the workers
+        if _registry_cache is None:
+            return []
+        misses = _registry_cache[1].misses.copy()
+        return [({"namespace": namespace}, count) for namespace, count in sorted(misses.items())]
+
+    metrics.gauge("redspec_render_queue_depth", "Renders waiting for a worker.", lambda: render_queue.stats()["queued"])
+    metrics.gauge("redspec_render_workers_busy", "Workers rendering now.", lambda: render_queue.stats()["running"])
+    metrics.counter_from(
+        "redspec_render_queue_rejected_total",
+        "Renders refused because the queue was full.",
+        lambda: render_queue.stats()["rejected"],
+    )
+    metrics.counter_from(
+        "redspec_result_cache_hits_total", "Result cache hits.", lambda: result_cache.stats()["hits"]
+    )
+    metrics.counter_from(
+        "redspec_result_cache_misses_total", "Result cache misses.", lambda: result_cache.stats()["misses"]
+    )
+    metrics.gauge(
+        "redspec_result_cache_hit_ratio", "Share of result lookups served from cache.",
+        lambda: result_cache.stats()["hit_ratio"],
+    )
+    metrics.gauge(
+        "redspec_jobs", "Background render jobs by status.",
+        lambda: [({"status": status}, count) for status, count in sorted(job_store.counts().items())],
+    )
+    metrics.counter_from(
+        "redspec_render_admission_rejected_total",
+        "Renders refused by estimated cost, by reason.",
+        lambda: [
+            ({"reason": "too_large"}, admission.stats()["rejected_too_large"]),
+            ({"reason": "quota"}, admission.stats()["rejected_quota"]),
+        ],
+    )
+    metrics.gauge(
+        "redspec_render_cost_scale",
+        "Observed render time per predicted time, as calibrated.",
+        lambda: admission.model.scale,
+    )
+    metrics.counter_from(
+        "redspec_icon_misses_total",
+        "Resource types that resolved to no icon, by pack namespace (renders in this process only).",
+        icon_misses,
+    )
+
+
 # ---------- Application factory ----------
 
 
-def create_app(output_dir: Path | None = None) -> FastAPI:
-    """Create and configure the FastAPI application."""
+def create_app(
+    output_dir: Path | None = None,
+    render_workers: int = 2,
+    render_queue_size: int = 16,
+    render_processes: bool = False,
+    cache_dir: Path | None = None,
+    async_threshold: float | None = 2.0,
+    job_retention: float = 3600.0,
+    retention: RetentionPolicy | None = None,
+    gc_interval: float = 600.0,
+    history_artifacts: int = 5,
+    shared_state: bool = False,
+    compress_svg: bool = False,
+    max_render_seconds: float | None = None,
+    max_render_memory: int | None = None,
+    client_quota: float | None = None,
+) -> FastAPI:
+    """Create and configure the FastAPI application.
+
+    Diagrams are rendered off the event loop by *render_workers* worker
+    threads (or processes with *render_processes*), with at most
+    *render_queue_size* requests waiting for a worker; see
+    :class:`~redspec.web.render_queue.RenderQueue`.
+
+    Rendered diagrams and exports are cached by content in memory and, if
+    *cache_dir* is given, on disk; see
+    :class:`~redspec.web.result_cache.ResultCache`.
+
+    ``POST /api/jobs`` renders in the background; see
+    :mod:`redspec.web.jobs`.  ``POST /api/generate`` switches to a job by
+    itself (answering 202) for specs estimated to take more than
+    *async_threshold* seconds to render.  Finished jobs are kept for
+    *job_retention* seconds.
+
+    Renders estimated to take more than *max_render_seconds* or
+    *max_render_memory* bytes are refused, and each client may use
+    *client_quota* estimated render-seconds per minute; see
+    :mod:`redspec.web.admission`.  The estimates are calibrated by the
+    server's own render times, kept in *output_dir*.
+
+    If a *retention* policy is given, the gallery is trimmed to it every
+    *gc_interval* seconds; see :mod:`redspec.generator.retention`.
+
+    Gallery entries keep a revision history, with the rendered diagrams of
+    the last *history_artifacts* revisions; see
+    :mod:`redspec.generator.history`.  With *compress_svg*, SVG diagrams
+    are stored gzip-compressed and served as they are to clients that
+    accept gzip.
+
+    SVG and text responses are compressed for clients that accept it; see
+    :mod:`redspec.web.compression`.  Static files are precompressed and
+    served under fingerprinted URLs; see :mod:`redspec.web.assets`.
+
+    Set *shared_state* when several worker processes serve the same
+    *output_dir*: background jobs are then visible to, and cancellable
+    from, every worker.  The gallery, its index and the disk level of the
+    result cache are safe to share either way.
+    """
+    from redspec.exceptions import (
+        QueueFullError,
+        QuotaExceededError,
+        RenderCancelledError,
+        RenderTooLargeError,
+    )
+    from redspec.generator.cost import CostModel, SpecFeatures
+    from redspec.web import jobs as job_states
+    from redspec.web.admission import Admission
+    from redspec.web.assets import StaticAssets
+    from redspec.web.compression import (
+        choose_encoding,
+        compress,
+        encoded_headers,
+        negotiate,
+    )
+    from redspec.web.jobs import Job, JobStore
+    from redspec.web.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+    from redspec.web.metrics import AppMetrics
+    from redspec.web.render_queue import Priority, RenderQueue
+    from redspec.web.result_cache import ResultCache, cache_key, etag_for, etag_matches
+
     if output_dir is None:
         output_dir = Path("./output")
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    app = FastAPI(title="Redspec", version="0.1.0")
+    render_queue = RenderQueue(
+        workers=render_workers,
+        max_queued=render_queue_size,
+        processes=render_processes,
+    )
+
+    result_cache = ResultCache(cache_dir)
+    job_store = JobStore(
+        retention=job_retention,
+        shared_path=output_dir / JOBS_DB_FILENAME if shared_state else None,
+    )
+
+    cost_model_path = output_dir / COST_MODEL_FILENAME
+    admission = Admission(
+        CostModel.load(cost_model_path),
+        max_seconds=max_render_seconds,
+        max_memory=max_render_memory,
+        client_quota=client_quota,
+    )
+
+    async def collect_garbage_periodically(policy: RetentionPolicy) -> None:
+        from redspec.generator.retention import collect_garbage
+
+        # Every worker process runs this loop; one collection per interval
+        # between them is enough
+        min_interval = gc_interval if shared_state else None
+        while True:
+            try:
+                result = await run_in_threadpool(
+                    collect_garbage, output_dir, policy, min_interval=min_interval
+                )
+                if not result.skipped:
+                    app.state.last_gc = {"at": time.time(), **result.as_dict()}
+            except Exception:
+                logger.exception("Gallery garbage collection failed")
+            await asyncio.sleep(gc_interval)
+
+    @asynccontextmanager
+    async def lifespan(_app: FastAPI):
+        gc_task = None
+        if retention is not None and retention.enabled:
+            gc_task = asyncio.create_task(collect_garbage_periodically(retention))
+        yield
+        if gc_task is not None:
+            gc_task.cancel()
+        render_queue.shutdown()
+        try:
+            admission.model.save(cost_model_path)
+        except OSError:
+            logger.warning("Could not save the render cost model to %s", cost_model_path)
+
+    app = FastAPI(title="Redspec", version="0.1.0", lifespan=lifespan)
+    app.state.render_queue = render_queue
+    app.state.result_cache = result_cache
+    app.state.job_store = job_store
+    app.state.admission = admission
+    app.state.last_gc = None
     templates = Jinja2Templates(directory=str(_TEMPLATES_DIR))
-    app.mount("/static", StaticFiles(directory=str(_STATIC_DIR)), name="static")
+    assets = StaticAssets(_STATIC_DIR)
+    templates.env.globals["static_url"] = assets.url
+
+    metrics = AppMetrics()
+    app.state.metrics = metrics
+    _register_gauges(metrics, render_queue, result_cache, job_store, admission)
+
+    @app.middleware("http")
+    async def observe_requests(request: Request, call_next):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            metrics.observe_request(
+                request.method,
+                getattr(route, "path", "unmatched"),
+                status,
+                time.perf_counter() - started,
+            )
+
+    async def render(spec: Any, out_format: str, glow: bool | None, priority: Priority) -> bytes:
+        """Render *spec* through the queue, recording stage timings, failures and cost."""
+        observer = metrics.render_observer(out_format)
+        # Callbacks cannot cross into worker processes; there only the outcome is recorded
+        extra = {} if render_queue.processes else {"on_stage": observer.stage}
+        try:
+            data, seconds = await render_queue.run(
+                _timed, _render_diagram, spec, out_format, glow, priority=priority, **extra
+            )
+        except BaseException as exc:
+            observer.done(None, exc)
+            raise
+        observer.done(data, None)
+        admission.model.record(SpecFeatures.from_spec(spec, out_format), seconds)
+        return data
+
+    def admit(connection: Any, spec: Any, out_format: str) -> Any:
+        """Apply the cost limits and the client's quota to a render; return its estimate."""
+        _features, estimate = admission.estimate(spec, out_format)
+        admission.check(estimate)
+        admission.charge(_client_id(connection), estimate)
+        return estimate
+
+    @app.exception_handler(QueueFullError)
+    async def queue_full(_request: Request, exc: QueueFullError) -> JSONResponse:
+        # 429 when only the slots reserved for interactive previews are
+        # left; 503 when the render queue is completely full.
+        return JSONResponse(
+            {"detail": str(exc)},
+            status_code=429 if exc.reserved else 503,
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+
+    @app.exception_handler(RenderTooLargeError)
+    async def render_too_large(_request: Request, exc: RenderTooLargeError) -> JSONResponse:
+        return JSONResponse({"detail": str(exc), "estimate": exc.estimate.as_dict()}, status_code=413)
+
+    @app.exception_handler(QuotaExceededError)
+    async def quota_exceeded(_request: Request, exc: QuotaExceededError) -> JSONResponse:
+        return JSONResponse(
+            {"detail": str(exc)},
+            status_code=429,
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+
+    def prewarm_thumbnail(diagram: Path) -> None:
+        """Make a saved diagram's thumbnail before the gallery asks for it."""
+        from redspec.generator.thumbnails import ensure_thumbnail
+
+        try:
+            render_queue.submit(ensure_thumbnail, diagram, priority=Priority.BACKGROUND)
+        except QueueFullError:
+            pass  # made on first request instead
+
+    async def respond(
+        request: Request, data: bytes, media_type: str, headers: dict[str, str], key: str | None = None
+    ) -> Response:
+        """Send *data*, compressed if the client accepts it and it is worth it.
+
+        With *key*, the result it was made from, the compressed body is
+        cached too.
+        """
+        encoding = negotiate(request.headers.get("accept-encoding"), media_type, len(data))
+        if encoding is not None:
+            raw = data
+
+            async def produce() -> bytes:
+                return await run_in_threadpool(compress, raw, encoding)
+
+            data = await (result_cache.get_or_create(f"{key}.{encoding}", produce) if key else produce())
+        return Response(content=data, media_type=media_type, headers=encoded_headers(headers, encoding, media_type))
+
+    async def respond_gzipped(request: Request, path: Path, media_type: str, headers: dict[str, str]) -> Response:
+        """Send the gzip-compressed file at *path*, decompressing it only for clients that need it."""
+        if choose_encoding(request.headers.get("accept-encoding"), ("gzip",)):
+            return FileResponse(path=str(path), media_type=media_type, headers=encoded_headers(headers, "gzip"))
+        data = await run_in_threadpool(lambda: gzip.decompress(path.read_bytes()))
+        return Response(content=data, media_type=media_type, headers=encoded_headers(headers, None, media_type))
+
+    async def respond_file(request: Request, path: Path, media_type: str, digest: str | None) -> Response:
+        """Send a stored diagram or other gallery file, compressed where it helps.
+
+        *digest* is the file's blob digest, if known, under which the
+        compressed body is cached.  ``.svgz`` files are sent as stored.
+        """
+        headers = {"ETag": f'"{digest[:20]}"'} if digest else {}
+        if path.suffix == ".svgz":
+            return await respond_gzipped(request, path, "image/svg+xml", headers)
+        if negotiate(request.headers.get("accept-encoding"), media_type, path.stat().st_size) is None:
+            return FileResponse(path=str(path), media_type=media_type, headers=encoded_headers(headers, None, media_type))
+        data = await run_in_threadpool(path.read_bytes)
+        return await respond(request, data, media_type, headers, digest)
+
+    # ---- Background jobs ----
+
+    async def start_job(job: Job, spec: Any, body: GenerateRequest, key: str) -> Job:
+        """Register *job* and render *spec* for it in the background."""
+        out_format = body.format or "png"
+        job.media_type = _MEDIA_TYPES.get(out_format, "application/octet-stream")
+        job.etag = etag_for(key)
+        job.cache_key = key
+
+        observer = metrics.render_observer(out_format)
+
+        def finished(data: bytes | None, exc: BaseException | None, rendered: bool = True) -> None:
+            if rendered:
+                observer.done(data, exc)
+            if isinstance(exc, RenderCancelledError) or job.cancel_event.is_set():
+                job_store.finish(job, job_states.CANCELLED)
+                return
+            if exc is not None or data is None:
+                job_store.finish(job, job_states.FAILED, error=str(exc or "No diagram was produced"))
+                return
+            if rendered:
+                result_cache.put(key, data)
+            slug = None
+            if body.save:
+                try:
+                    saved = _save_to_gallery(
+                        data, body.yaml_content, spec, out_format, key, output_dir, history_artifacts
+                    )
+                except Exception as save_exc:
+                    job_store.finish(job, job_states.FAILED, error=str(save_exc))
+                    return
+                slug = saved.parent.name
+                prewarm_thumbnail(saved)
+            job_store.finish(job, job_states.SUCCEEDED, artifact=data, slug=slug)
+
+        # With shared state these record the job in the shared database
+        await run_in_threadpool(job_store.add, job)
+        cached = await result_cache.aget(key)
+        if cached is not None:
+            # Saving to the gallery writes files; keep it off the event loop
+            await run_in_threadpool(finished, cached, None, False)
+            return job
+
+        await run_in_threadpool(job_store.set_stage, job, job_states.QUEUED)
+        # Events and callbacks cannot cross into worker processes, so there
+        # a job only reports "queued" and "running" and cancels while queued.
+        def on_stage(stage: str) -> None:
+            observer.stage(stage)
+            job_store.set_stage(job, stage)
+
+        extra = {} if render_queue.processes else {"cancel_event": job.cancel_event, "on_stage": on_stage}
+        try:
+            job.future = render_queue.submit(
+                _timed, _render_diagram, spec, out_format, body.glow, priority=Priority.BACKGROUND, **extra
+            )
+        except QueueFullError:
+            await run_in_threadpool(job_store.discard, job.id)
+            raise
+        if render_queue.processes:
+            await run_in_threadpool(job_store.set_stage, job, job_states.RUNNING)
+
+        def on_done(future):
+            if future.cancelled():
+                finished(None, RenderCancelledError())
+            elif future.exception() is not None:
+                finished(None, future.exception())
+            else:
+                data, seconds = future.result()
+                admission.model.record(SpecFeatures.from_spec(spec, out_format), seconds)
+                finished(data, None)
+
+        job.future.add_done_callback(on_done)
+        return job
+
+    def _job_accepted(job: Job) -> JSONResponse:
+        url = f"/api/jobs/{job.id}"
+        return JSONResponse(
+            {**job.as_dict(), "url": url, "events_url": f"{url}/events"},
+            status_code=202,
+            headers={"Location": url},
+        )
+
+    async def _get_job(job_id: str) -> Job:
+        # A job another worker owns is read from the shared database
+        job = await run_in_threadpool(job_store.get, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Job {job_id!r} not found")
+        return job
 
     # ---- Pages ----
 
@@ -98,6 +775,82 @@ def create_app(output_dir: Path | None = None) -> FastAPI:
     async def index(request: Request) -> HTMLResponse:
         return templates.TemplateResponse(request, "index.html")
 
+    @app.websocket("/ws/preview")
+    async def preview_socket(websocket: WebSocket) -> None:
+        """Live preview: the editor sends edits, the server pushes validation and SVG updates."""
+        from redspec.generator.incremental import IncrementalRenderer
+        from redspec.web.preview import PreviewSession
+
+        await websocket.accept()
+        workdir = tempfile.TemporaryDirectory(prefix="redspec-preview-")
+        # Worker processes cannot keep a session's layout between renders
+        incremental = None
+        if not render_queue.processes:
+            incremental = IncrementalRenderer(
+                Path(workdir.name) / "preview.svg", icon_registry=_icon_registry(), out_format="svg"
+            )
+
+        async def render_preview(spec: Any) -> tuple[bytes, str]:
+            key = cache_key("generate", spec, format="svg", glow=None)
+            cached = await result_cache.aget(key)
+            if cached is not None:
+                return cached, "cached"
+            admit(websocket, spec, "svg")
+            if incremental is None:
+                return await result_cache.get_or_create(
+                    key, lambda: render(spec, "svg", None, Priority.INTERACTIVE)
+                ), "relayout"
+            observer = metrics.render_observer("svg")
+            try:
+                data, level = await render_queue.run(
+                    _render_incremental, incremental, spec, priority=Priority.INTERACTIVE
+                )
+            except BaseException as exc:
+                observer.done(None, exc)
+                raise
+            observer.done(data, None)
+            await result_cache.aput(key, data)
+            return data, level
+
+        session = PreviewSession(websocket.send_json, render_preview)
+        worker = asyncio.create_task(session.run())
+        try:
+            while True:
+                try:
+                    message = json.loads(await websocket.receive_text())
+                except ValueError:
+                    await websocket.send_json({"type": "error", "message": "Messages must be JSON"})
+                    continue
+                if not isinstance(message, dict):
+                    await websocket.send_json({"type": "error", "message": "Messages must be JSON objects"})
+                    continue
+                reply = session.receive(message)
+                if reply is not None:
+                    await websocket.send_json(reply)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            worker.cancel()
+            # The session may have failed sending to the closed socket
+            with suppress(asyncio.CancelledError, WebSocketDisconnect, RuntimeError):
+                await worker
+            workdir.cleanup()
+
+    @app.get("/static/{path:path}")
+    async def static_file(path: str, request: Request) -> Response:
+        """Serve a static file, precompressed; immutable under its fingerprinted URL."""
+        found = assets.lookup(path)
+        if found is None:
+            raise HTTPException(status_code=404, detail="Not found")
+        asset, fingerprinted = found
+        headers = {"ETag": asset.etag, "Cache-Control": _IMMUTABLE if fingerprinted else "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), asset.etag):
+            return Response(status_code=304, headers=encoded_headers(headers, None, asset.media_type))
+        body, encoding = assets.select(asset, request.headers.get("accept-encoding"))
+        return Response(
+            content=body, media_type=asset.media_type, headers=encoded_headers(headers, encoding, asset.media_type)
+        )
+
     # ---- Templates ----
 
     @app.get("/api/templates")
@@ -156,84 +909,155 @@ def create_app(output_dir: Path | None = None) -> FastAPI:
     # ---- Generate ----
 
     @app.post("/api/generate")
-    async def generate_diagram(body: GenerateRequest) -> FileResponse:
-        from redspec.generator.output_organizer import organize_output
-        from redspec.generator.pipeline import generate as run_pipeline
-        from redspec.icons.registry import IconRegistry
-        from redspec.models.diagram import DiagramSpec
-
-        raw = _parse_yaml_content(body.yaml_content)
-
-        try:
-            if "diagram" not in raw:
-                raw["diagram"] = {}
-            if body.theme:
-                raw["diagram"]["theme"] = body.theme
-            if body.direction:
-                raw["diagram"]["direction"] = body.direction
-            if body.dpi:
-                raw["diagram"]["dpi"] = body.dpi
-            if body.polish:
-                from redspec.models.diagram import VALID_POLISH_PRESETS
-
-                if body.polish not in VALID_POLISH_PRESETS:
-                    raise HTTPException(
-                        status_code=400,
-                        detail=f"Invalid polish preset {body.polish!r}. "
-                        f"Valid presets: {', '.join(sorted(VALID_POLISH_PRESETS))}",
-                    )
-                raw["diagram"]["polish"] = body.polish
-
-            spec = DiagramSpec.model_validate(raw)
-        except HTTPException:
-            raise
-        except Exception as exc:
-            raise HTTPException(status_code=400, detail=str(exc))
+    async def generate_diagram(body: GenerateRequest, request: Request) -> Response:
+        with metrics.time_stage("parse"):
+            raw = _parse_yaml_content(body.yaml_content)
+        with metrics.time_stage("validate"):
+            spec = _generate_spec(raw, body)
 
         out_format = body.format or "png"
-        registry = IconRegistry()
-
-        with tempfile.TemporaryDirectory() as tmpdir:
-            tmp_output = str(Path(tmpdir) / f"diagram.{out_format}")
-
-            tmp_yaml = Path(tmpdir) / "spec.yaml"
-            tmp_yaml.write_text(body.yaml_content, encoding="utf-8")
-
-            generated = run_pipeline(
-                spec,
-                tmp_output,
-                icon_registry=registry,
-                out_format=out_format,
-                glow=body.glow,
-            )
-
-            organized = organize_output(
-                generated_file=generated,
-                source_yaml=tmp_yaml,
-                output_dir=output_dir,
-                diagram_name=spec.diagram.name,
-                theme=spec.diagram.theme,
-                direction=spec.diagram.direction,
-                dpi=spec.diagram.dpi,
-                format=out_format,
+        media_type = _MEDIA_TYPES.get(out_format, "application/octet-stream")
+        key = cache_key("generate", spec, format=out_format, glow=body.glow)
+        headers = {"ETag": etag_for(key), "Cache-Control": "no-cache"}
+        not_modified = etag_matches(request.headers.get("if-none-match"), headers["ETag"])
+
+        if not_modified and not body.save:
+            return Response(status_code=304, headers=headers)
+
+        if await result_cache.apeek(key) is None:
+            estimate = admit(request, spec, out_format)
+            if async_threshold is not None and estimate.seconds > async_threshold:
+                # Too slow to render within a request; hand back a job instead
+                job = await start_job(Job(), spec, body, key)
+                return _job_accepted(job)
+
+        priority = Priority.BACKGROUND if body.save else Priority.INTERACTIVE
+        data = await result_cache.get_or_create(key, lambda: render(spec, out_format, body.glow, priority))
+
+        if body.save:
+            organized = await run_in_threadpool(
+                _save_to_gallery,
+                data, body.yaml_content, spec, out_format, key, output_dir, history_artifacts, compress_svg,
             )
-
-        slug = organized.parent.name
-        media_types: dict[str, str] = {
-            "png": "image/png",
-            "svg": "image/svg+xml",
-            "pdf": "application/pdf",
-        }
-        return FileResponse(
-            path=str(organized),
-            media_type=media_types.get(out_format, "application/octet-stream"),
-            headers={"X-Diagram-Slug": slug},
+            headers["X-Diagram-Slug"] = organized.parent.name
+            prewarm_thumbnail(organized)
+        if not_modified:
+            return Response(status_code=304, headers=headers)
+        return await respond(request, data, media_type, headers, key)
+
+    # ---- Jobs ----
+
+    @app.post("/api/jobs", status_code=202)
+    async def create_job(body: GenerateRequest, request: Request) -> JSONResponse:
+        """Start a background render; returns the job id and status URLs."""
+        job = Job()
+        job.stages.append(("parse", 0.0))
+        with metrics.time_stage("parse"):
+            raw = _parse_yaml_content(body.yaml_content)
+        job.stages.append(("validate", job.elapsed()))
+        with metrics.time_stage("validate"):
+            spec = _generate_spec(raw, body)
+        key = cache_key("generate", spec, format=body.format or "png", glow=body.glow)
+        if await result_cache.apeek(key) is None:
+            admit(request, spec, body.format or "png")
+        return _job_accepted(await start_job(job, spec, body, key))
+
+    @app.post("/api/estimate")
+    async def estimate_render(body: GenerateRequest) -> JSONResponse:
+        """Estimated render time and memory, and whether the render would be accepted."""
+        raw = _parse_yaml_content(body.yaml_content)
+        spec = _generate_spec(raw, body)
+        features, estimate = admission.estimate(spec, body.format or "png")
+        reasons = admission.violations(estimate)
+        return JSONResponse({
+            "features": features.as_dict(),
+            "estimate": estimate.as_dict(),
+            "accepted": not reasons,
+            "reasons": reasons,
+            "background": async_threshold is not None and estimate.seconds > async_threshold,
+        })
+
+    @app.get("/api/jobs/{job_id}")
+    async def job_status(job_id: str) -> JSONResponse:
+        return JSONResponse((await _get_job(job_id)).as_dict())
+
+    @app.get("/api/jobs/{job_id}/events")
+    async def job_events(job_id: str) -> StreamingResponse:
+        """Stream the job's status as server-sent events until it finishes."""
+        job = await _get_job(job_id)
+
+        async def stream():
+            nonlocal job
+            seen, last_sent = -1, 0.0
+            while True:
+                if job.remote:
+                    job = await run_in_threadpool(job_store.refresh, job)
+                now = time.monotonic()
+                if job.version != seen or now - last_sent >= _JOB_HEARTBEAT:
+                    seen, last_sent = job.version, now
+                    event = "done" if job.done else "progress"
+                    yield f"id: {seen}\nevent: {event}\ndata: {json.dumps(job.as_dict())}\n\n"
+                    if job.done:
+                        return
+                await asyncio.sleep(_JOB_POLL_INTERVAL)
+
+        return StreamingResponse(
+            stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"}
         )
 
+    @app.get("/api/jobs/{job_id}/artifact")
+    async def job_artifact(job_id: str, request: Request) -> Response:
+        job = await _get_job(job_id)
+        if job.status != job_states.SUCCEEDED:
+            detail = job.error if job.status == job_states.FAILED else f"Job is {job.status}"
+            raise HTTPException(status_code=409, detail=detail)
+        if job.etag is None:
+            raise HTTPException(status_code=409, detail="Job has no artifact")
+        headers = {"ETag": job.etag, "Cache-Control": "no-cache"}
+        if job.slug:
+            headers["X-Diagram-Slug"] = job.slug
+        if etag_matches(request.headers.get("if-none-match"), job.etag):
+            return Response(status_code=304, headers=headers)
+        # A job finished by another worker left its artifact in the result cache
+        artifact = job.artifact if job.artifact is not None else await result_cache.aget(job.cache_key or "")
+        if artifact is None:
+            raise HTTPException(status_code=409, detail="The artifact is held by another worker process")
+        return await respond(request, artifact, job.media_type, headers, job.cache_key)
+
+    @app.delete("/api/jobs/{job_id}")
+    async def job_delete(job_id: str) -> JSONResponse:
+        """Cancel a running job, or discard a finished one and its artifact."""
+        job = await _get_job(job_id)
+        if job.done:
+            await run_in_threadpool(job_store.discard, job.id)
+        else:
+            await run_in_threadpool(job_store.cancel, job)
+        return JSONResponse(job.as_dict())
+
+    @app.get("/api/queue")
+    async def queue_stats() -> JSONResponse:
+        """Render queue depth, worker usage and recent wait times."""
+        counts = await run_in_threadpool(job_store.counts)
+        return JSONResponse({**render_queue.stats(), "jobs": counts, "admission": admission.stats()})
+
+    @app.get("/api/cache")
+    async def cache_stats() -> JSONResponse:
+        """Result cache size and hit ratio."""
+        return JSONResponse(result_cache.stats())
+
+    @app.get("/metrics")
+    async def metrics_endpoint() -> Response:
+        """Operational metrics in the Prometheus text format."""
+        # Job counts may come from the shared database
+        content = await run_in_threadpool(metrics.render)
+        return Response(content=content, media_type=METRICS_CONTENT_TYPE)
+
     # ---- Export (text-based formats) ----
 
-    @app.post("/api/export")
-    async def export_diagram(body: ExportRequest) -> JSONResponse:
+    def _export_request(body: ExportRequest) -> tuple[DiagramSpec, Exporter]:
+        """The validated spec and the exporter an export request asks for."""
+        from redspec.exceptions import ExportFormatNotFoundError
+        from redspec.exporters.registry import get_exporter
         from redspec.models.diagram import DiagramSpec
 
         raw = _parse_yaml_content(body.yaml_content)
@@ -241,34 +1065,139 @@ def create_app(output_dir: Path | None = None) -> FastAPI:
         try:
             spec = DiagramSpec.model_validate(raw)
         except Exception as exc:
-            raise HTTPException(status_code=400, detail=str(exc))
-
-        fmt = body.format.lower()
-        if fmt == "mermaid":
-            from redspec.exporters.mermaid import export_mermaid
-            text = export_mermaid(spec)
-        elif fmt == "plantuml":
-            from redspec.exporters.plantuml import export_plantuml
-            text = export_plantuml(spec)
-        elif fmt == "drawio":
-            from redspec.exporters.drawio import export_drawio
-            text = export_drawio(spec)
-        else:
-            raise HTTPException(status_code=400, detail=f"Unknown export format: {fmt!r}")
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
 
-        return JSONResponse({"format": fmt, "content": text})
+        try:
+            exporter = get_exporter(body.format.lower())
+        except ExportFormatNotFoundError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        return spec, exporter
+
+    @app.post("/api/export")
+    async def export_diagram(body: ExportRequest, request: Request) -> Response:
+        spec, exporter = _export_request(body)
+        fmt = exporter.name
+
+        compressed = body.compressed and fmt == "drawio"
+        key = cache_key("export", spec, format=fmt, compressed=compressed)
+        headers = {"ETag": etag_for(key), "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+        async def produce() -> bytes:
+            if exporter.uses_layout:
+                # Geometry comes from a Graphviz layout pass
+                return await render_queue.run(_export_text, spec, fmt, compressed)
+            return await run_in_threadpool(_export_text, spec, fmt)
+
+        data = await result_cache.get_or_create(key, produce)
+        content = bytes(JSONResponse({"format": fmt, "content": data.decode("utf-8")}).body)
+        return await respond(request, content, "application/json", headers, f"{key}.json")
+
+    @app.post("/api/export/stream")
+    async def export_diagram_stream(body: ExportRequest, request: Request) -> Response:
+        """The exported document itself, streamed as it is produced.
+
+        Unlike ``/api/export`` the document is neither wrapped in JSON nor
+        cached, so exports of very large specs are sent without being held
+        in memory.
+        """
+        from redspec.exporters.drawio import spec_layout
+        from redspec.exporters.registry import ExportOptions, iter_export
+
+        spec, exporter = _export_request(body)
+        compressed = body.compressed and exporter.name == "drawio"
+        key = cache_key("export", spec, format=exporter.name, compressed=compressed)
+        headers = {
+            "ETag": etag_for(key),
+            "Cache-Control": "no-cache",
+            "Content-Disposition": f'attachment; filename="diagram{exporter.extension}"',
+        }
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+        registry = _icon_registry()
+        options = ExportOptions(icon_registry=registry, compressed=compressed, use_graphviz=False)
+        if exporter.uses_layout:
+            options.layout = await render_queue.run(spec_layout, spec, registry)
+
+        chunks = (chunk.encode("utf-8") for chunk in iter_export(exporter.name, spec, options))
+        # Starlette iterates a plain iterator in the thread pool
+        return StreamingResponse(chunks, media_type=exporter.media_type, headers=headers)
 
     # ---- Gallery CRUD ----
 
     @app.get("/api/gallery")
-    async def gallery() -> list[dict[str, Any]]:
-        from redspec.generator.output_organizer import list_gallery
+    async def gallery(
+        q: str | None = None,
+        sort: str = "timestamp",
+        order: str = "desc",
+        limit: int = Query(default=100, ge=1, le=1000),
+        offset: int = Query(default=0, ge=0),
+    ) -> JSONResponse:
+        """One page of gallery entries; the total is in ``X-Total-Count``."""
+        from redspec.generator.gallery_index import SORT_COLUMNS
+        from redspec.generator.output_organizer import query_gallery
+
+        if sort not in SORT_COLUMNS or order not in ("asc", "desc"):
+            raise HTTPException(
+                status_code=400,
+                detail=f"sort must be one of {', '.join(SORT_COLUMNS)} and order asc or desc",
+            )
+        entries, total = await run_in_threadpool(
+            query_gallery, output_dir, q, sort, order == "desc", limit, offset
+        )
+        for entry in entries:
+            entry["thumbnail_url"] = _thumbnail_url(entry)
+        return JSONResponse(entries, headers={"X-Total-Count": str(total)})
+
+    @app.get("/api/gallery/{slug}/thumbnail")
+    async def gallery_thumbnail_latest(slug: str) -> RedirectResponse:
+        """Redirect to the thumbnail of the entry's current diagram."""
+        from redspec.generator.thumbnails import content_hash
+
+        found = _gallery_diagram(_resolve_slug_dir(output_dir, slug))
+        if found is None:
+            raise HTTPException(status_code=404, detail="Diagram not found")
+        diagram, meta = found
+        digest = meta.get("content_hash") or await run_in_threadpool(content_hash, diagram)
+        return RedirectResponse(
+            f"/api/gallery/{slug}/thumbnail/{digest}",
+            status_code=307,
+            headers={"Cache-Control": "no-cache"},
+        )
+
+    @app.get("/api/gallery/{slug}/thumbnail/{digest}")
+    async def gallery_thumbnail(slug: str, digest: str) -> FileResponse:
+        """Serve the thumbnail made from diagram content *digest*, making it on first request."""
+        from redspec.generator.thumbnails import (
+            content_hash,
+            ensure_thumbnail,
+            find_thumbnail,
+            media_type,
+        )
 
-        return list_gallery(output_dir)
+        if not _DIGEST_RE.fullmatch(digest):
+            raise HTTPException(status_code=404, detail="Thumbnail not found")
+        slug_dir = _resolve_slug_dir(output_dir, slug)
+        thumb = find_thumbnail(slug_dir, digest)
+        if thumb is None:
+            found = _gallery_diagram(slug_dir)
+            if found is None:
+                raise HTTPException(status_code=404, detail="Diagram not found")
+            diagram, meta = found
+            current = meta.get("content_hash") or await run_in_threadpool(content_hash, diagram)
+            if current != digest:
+                raise HTTPException(status_code=404, detail="Thumbnail not found")
+            thumb = await run_in_threadpool(ensure_thumbnail, diagram, digest)
+            if thumb is None:
+                raise HTTPException(status_code=404, detail="No thumbnail available for this format")
+        return FileResponse(path=str(thumb), media_type=media_type(thumb), headers={"Cache-Control": _IMMUTABLE})
 
     @app.get("/api/gallery/{slug}/spec")
     async def gallery_spec(slug: str) -> JSONResponse:
         """Return the parsed spec JSON for a gallery entry."""
+        from redspec.generator.output_organizer import record_view
         from redspec.models.diagram import DiagramSpec
 
         slug_dir = _resolve_slug_dir(output_dir, slug)
@@ -276,6 +1205,7 @@ def create_app(output_dir: Path | None = None) -> FastAPI:
         if not spec_file.exists():
             raise HTTPException(status_code=404, detail="spec.yaml not found")
 
+        await run_in_threadpool(record_view, output_dir, slug_dir.name)
         raw = _parse_yaml_content(spec_file.read_text(encoding="utf-8"))
         try:
             spec = DiagramSpec.model_validate(raw)
@@ -284,53 +1214,165 @@ def create_app(output_dir: Path | None = None) -> FastAPI:
 
         return JSONResponse(spec.model_dump(by_alias=True, exclude_none=True))
 
+    # ---- Gallery history (before the catch-all file route) ----
+
+    def find_revision(slug_dir: Path, revision: int) -> dict[str, Any]:
+        from redspec.generator.history import read_revisions
+
+        for entry in read_revisions(slug_dir):
+            if entry.get("revision") == revision:
+                return entry
+        raise HTTPException(status_code=404, detail=f"Revision {revision} not found")
+
+    @app.get("/api/gallery/{slug}/revisions")
+    async def gallery_revisions(slug: str) -> JSONResponse:
+        """List a gallery entry's revisions, newest first."""
+        from redspec.generator.history import read_revisions
+
+        slug_dir = _resolve_slug_dir(output_dir, slug)
+        base = f"/api/gallery/{slug_dir.name}/revisions"
+        revisions = await run_in_threadpool(read_revisions, slug_dir)
+        return JSONResponse([
+            {
+                **{k: v for k, v in entry.items() if k not in ("diagram_blob", "spec_sha256")},
+                "spec_url": f"{base}/{entry['revision']}/spec",
+                "diagram_url": f"{base}/{entry['revision']}/diagram",
+            }
+            for entry in reversed(revisions)
+        ])
+
+    @app.get("/api/gallery/{slug}/revisions/{revision}/spec")
+    async def gallery_revision_spec(slug: str, revision: int, request: Request) -> Response:
+        """Return the spec YAML of an earlier revision."""
+        from redspec.generator.history import revision_spec
+
+        slug_dir = _resolve_slug_dir(output_dir, slug)
+        entry = find_revision(slug_dir, revision)
+        headers = {"ETag": f'"{entry.get("spec_sha256", "")[:32]}"'}
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        text = await run_in_threadpool(revision_spec, slug_dir, revision)
+        if text is None:
+            raise HTTPException(status_code=404, detail=f"Revision {revision} is damaged")
+        return Response(content=text, media_type="application/x-yaml", headers=headers)
+
+    @app.get("/api/gallery/{slug}/revisions/{revision}/diagram")
+    async def gallery_revision_diagram(slug: str, revision: int, request: Request) -> Response:
+        """Return the diagram of an earlier revision, rendering it again if it was not kept."""
+        from redspec.generator.history import revision_artifact, revision_spec
+
+        slug_dir = _resolve_slug_dir(output_dir, slug)
+        entry = find_revision(slug_dir, revision)
+        out_format = entry.get("format", "png")
+        media_type = _MEDIA_TYPES.get(out_format, "application/octet-stream")
+        artifact = revision_artifact(slug_dir, entry)
+        if artifact is not None:
+            return await respond_file(request, artifact, media_type, entry.get("diagram_blob"))
+
+        text = await run_in_threadpool(revision_spec, slug_dir, revision)
+        if text is None:
+            raise HTTPException(status_code=404, detail=f"Revision {revision} is damaged")
+        overrides = GenerateRequest(
+            yaml_content=text,
+            theme=entry.get("theme"),
+            direction=entry.get("direction"),
+            dpi=entry.get("dpi"),
+            format=out_format,
+        )
+        spec = _generate_spec(_parse_yaml_content(text), overrides)
+        key = cache_key("generate", spec, format=out_format, glow=None)
+        data = await result_cache.get_or_create(key, lambda: render(spec, out_format, None, Priority.INTERACTIVE))
+        return await respond(request, data, media_type, {"ETag": etag_for(key), "X-Regenerated": "1"}, key)
+
     @app.get("/api/gallery/{slug}/{file}")
-    async def gallery_file(slug: str, file: str) -> FileResponse:
+    async def gallery_file(slug: str, file: str, request: Request) -> Response:
         file_path = (output_dir / slug / file).resolve()
         try:
             file_path.relative_to(output_dir.resolve())
         except ValueError:
             raise HTTPException(status_code=403, detail="Forbidden")
 
+        media_type = mimetypes.guess_type(file)[0] or "application/octet-stream"
+        if not file_path.exists() and file_path.suffix == ".svg":
+            # An SVG stored compressed is still linked to as diagram.svg
+            file_path = file_path.with_suffix(".svgz")
         if not file_path.exists():
             raise HTTPException(status_code=404, detail="File not found")
 
-        return FileResponse(path=str(file_path))
+        digest = None
+        if file.startswith("diagram."):
+            from redspec.generator.output_organizer import record_view
+
+            await run_in_threadpool(record_view, output_dir, slug)
+            found = _gallery_diagram(file_path.parent)
+            if found is not None and found[0] == file_path:
+                digest = (found[1].get("blobs") or [None])[0]
+        return await respond_file(request, file_path, media_type, digest)
 
     @app.delete("/api/gallery/{slug}")
     async def gallery_delete(slug: str) -> JSONResponse:
         """Delete a gallery entry by slug."""
+        from redspec.generator.output_organizer import remove_gallery_entry
+
         slug_dir = _resolve_slug_dir(output_dir, slug)
-        shutil.rmtree(slug_dir)
+        await run_in_threadpool(remove_gallery_entry, output_dir, slug_dir.name)
         return JSONResponse({"deleted": slug})
 
     @app.patch("/api/gallery/{slug}")
     async def gallery_update(slug: str, body: GalleryUpdateRequest) -> JSONResponse:
-        """Update a gallery entry's spec.yaml or metadata name."""
-        slug_dir = _resolve_slug_dir(output_dir, slug)
+        """Update a gallery entry's spec.yaml, name or pinned flag."""
+        from redspec.generator.blob_store import slug_lock, write_atomic
+        from redspec.generator.output_organizer import update_gallery_entry
 
-        if body.yaml_content is not None:
-            spec_file = slug_dir / "spec.yaml"
-            spec_file.write_text(body.yaml_content, encoding="utf-8")
-
-        if body.name is not None:
-            meta_file = slug_dir / "metadata.json"
-            if meta_file.exists():
-                meta = json.loads(meta_file.read_text(encoding="utf-8"))
-            else:
-                meta = {}
-            meta["name"] = body.name
-            meta_file.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        slug_dir = _resolve_slug_dir(output_dir, slug)
 
+        def update() -> None:
+            # Replaced, not written in place: spec.yaml is a link to a shared blob
+            with slug_lock(output_dir, slug_dir.name):
+                if body.yaml_content is not None:
+                    write_atomic(slug_dir / "spec.yaml", body.yaml_content)
+
+                if body.name is not None or body.pinned is not None:
+                    meta_file = slug_dir / "metadata.json"
+                    if meta_file.exists():
+                        meta = json.loads(meta_file.read_text(encoding="utf-8"))
+                    else:
+                        meta = {}
+                    if body.name is not None:
+                        meta["name"] = body.name
+                    if body.pinned is not None:
+                        meta["pinned"] = body.pinned
+                    write_atomic(meta_file, json.dumps(meta, indent=2))
+
+            update_gallery_entry(output_dir, slug_dir.name)
+
+        await run_in_threadpool(update)
         return JSONResponse({"updated": slug})
 
     # ---- Resources ----
 
     @app.get("/api/resources")
-    async def list_resources() -> list[str]:
-        from redspec.icons.registry import IconRegistry
-
-        registry = IconRegistry()
-        return list(registry.list_all())
+    async def list_resources(
+        request: Request,
+        q: str = "",
+        namespace: str | None = None,
+        limit: int = Query(default=20, ge=1, le=200),
+        cursor: str | None = None,
+    ) -> Response:
+        """Search resource types, best match first, a page at a time."""
+        catalogue = await run_in_threadpool(_resource_catalogue)
+        headers = {"ETag": f'"{catalogue.version}"', "Cache-Control": "no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        try:
+            items, next_cursor, total = await run_in_threadpool(catalogue.page, q, namespace, limit, cursor)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        body = bytes(JSONResponse({
+            "items": [entry.as_dict() for entry in items],
+            "next_cursor": next_cursor,
+            "total": total,
+        }).body)
+        return await respond(request, body, "application/json", headers)
 
     return app
@@ -0,0 +1,102 @@
+"""Fingerprinted, precompressed static assets for the web UI.
+
+The files under ``web/static`` are read once, when the app is created, and
+compressed ahead of time with every encoding the server supports.  Pages
+link to them through :meth:`StaticAssets.url`, which puts a hash of the
+content in the file name (``app.3f2a9c01d4e5.js``); such a URL never
+changes meaning, so browsers may cache it for good.  The plain name still
+works, with revalidation, for anything that links to it directly.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mimetypes
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from redspec.web.compression import (
+    available_encodings,
+    choose_encoding,
+    compress,
+    is_compressible,
+)
+
+# name.<12 hex digits>.ext
+_FINGERPRINT_RE = re.compile(r"(?P<stem>.+)\.(?P<digest>[0-9a-f]{12})(?P<suffix>\.[^./]+)")
+
+
+@dataclass
+class Asset:
+    """One static file and its precompressed variants."""
+
+    name: str
+    data: bytes
+    media_type: str
+    digest: str
+    encoded: dict[str, bytes] = field(default_factory=dict)
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.digest}"'
+
+
+class StaticAssets:
+    """The files under *directory*, keyed by their path relative to it."""
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = Path(directory)
+        self._assets: dict[str, Asset] = {}
+        if self.directory.is_dir():
+            for path in sorted(self.directory.rglob("*")):
+                if path.is_file() and not path.name.startswith("."):
+                    self._add(path)
+
+    def _add(self, path: Path) -> None:
+        name = path.relative_to(self.directory).as_posix()
+        data = path.read_bytes()
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if media_type.startswith("text/") or media_type == "application/javascript":
+            media_type += "; charset=utf-8"
+        asset = Asset(name, data, media_type, hashlib.sha256(data).hexdigest()[:12])
+        if is_compressible(media_type):
+            for encoding in available_encodings():
+                compressed = compress(data, encoding)
+                if len(compressed) < len(data):
+                    asset.encoded[encoding] = compressed
+        self._assets[name] = asset
+
+    def url(self, name: str) -> str:
+        """The fingerprinted URL of static file *name*."""
+        asset = self._assets.get(name)
+        if asset is None:
+            return f"/static/{name}"
+        stem, dot, suffix = name.rpartition(".")
+        fingerprinted = f"{stem}.{asset.digest}.{suffix}" if dot else f"{name}.{asset.digest}"
+        return f"/static/{fingerprinted}"
+
+    def lookup(self, requested: str) -> tuple[Asset, bool] | None:
+        """Find the asset a request path names.
+
+        Returns the asset and whether the path carried its current
+        fingerprint.  A path with an outdated fingerprint (from a page
+        cached before an upgrade) gets the current file, not immutably.
+        """
+        asset = self._assets.get(requested)
+        if asset is not None:
+            return asset, False
+        match = _FINGERPRINT_RE.fullmatch(requested)
+        if match is None:
+            return None
+        asset = self._assets.get(match["stem"] + match["suffix"])
+        if asset is None:
+            return None
+        return asset, match["digest"] == asset.digest
+
+    def select(self, asset: Asset, accept_encoding: str | None) -> tuple[bytes, str | None]:
+        """The body to send for *asset*, and its encoding."""
+        encoding = choose_encoding(accept_encoding, tuple(asset.encoded))
+        if encoding is None:
+            return asset.data, None
+        return asset.encoded[encoding], encoding
@@ -0,0 +1,109 @@
+"""Content-encoding negotiation for web responses.
+
+SVG diagrams and text exports are mostly repeated markup and compress
+about tenfold.  Responses are gzip-compressed, or brotli-compressed when
+the ``brotli`` package is installed (``pip install redspec[compression]``)
+and the client accepts it.  Bodies below :data:`MIN_SIZE` are sent as they
+are: the saving would not pay for the work.
+"""
+
+from __future__ import annotations
+
+import gzip
+from typing import Any
+
+MIN_SIZE = 1024
+
+_COMPRESSIBLE_TYPES = (
+    "text/",
+    "image/svg+xml",
+    "application/json",
+    "application/xml",
+    "application/javascript",
+    "application/x-yaml",
+)
+
+
+def _brotli() -> Any:
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def available_encodings() -> tuple[str, ...]:
+    """Encodings this server can produce, most preferred first."""
+    return ("br", "gzip") if _brotli() is not None else ("gzip",)
+
+
+def is_compressible(media_type: str | None) -> bool:
+    return media_type is not None and media_type.startswith(_COMPRESSIBLE_TYPES)
+
+
+def choose_encoding(accept_encoding: str | None, offered: tuple[str, ...] | None = None) -> str | None:
+    """Pick the encoding to use for a request's ``Accept-Encoding`` header.
+
+    Returns the first of *offered* (default :func:`available_encodings`)
+    that the client accepts with a non-zero quality, or None.
+    """
+    if not accept_encoding:
+        return None
+    weights: dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            weights[name.strip().lower()] = quality
+
+    best: tuple[float, str] | None = None
+    for encoding in offered if offered is not None else available_encodings():
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > 0 and (best is None or quality > best[0]):
+            best = (quality, encoding)
+    return best[1] if best else None
+
+
+def negotiate(accept_encoding: str | None, media_type: str | None, size: int) -> str | None:
+    """The encoding for a *size*-byte body of *media_type*, if it is worth compressing."""
+    if size < MIN_SIZE or not is_compressible(media_type):
+        return None
+    return choose_encoding(accept_encoding)
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """Compress *data* with *encoding* (``"gzip"`` or ``"br"``)."""
+    if encoding == "gzip":
+        # mtime=0 keeps the output, and so its ETag, reproducible
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if encoding == "br":
+        brotli = _brotli()
+        if brotli is None:
+            raise ValueError("brotli is not installed")
+        return brotli.compress(data, quality=5)
+    raise ValueError(f"Unsupported encoding: {encoding!r}")
+
+
+def encoded_headers(headers: dict[str, str], encoding: str | None, media_type: str | None = None) -> dict[str, str]:
+    """Response headers for a body sent with *encoding*.
+
+    A compressed body is a different representation from the uncompressed
+    one, so a strong ``ETag`` is made weak (as ``If-None-Match`` compares
+    weakly, revalidation still matches).
+    """
+    headers = dict(headers)
+    if encoding or is_compressible(media_type):
+        headers["Vary"] = "Accept-Encoding"
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        etag = headers.get("ETag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = f"W/{etag}"
+    return headers
@@ -0,0 +1,318 @@
+"""Background render jobs for the web app.
+
+A render that may outlive a proxy's request timeout is started as a
+:class:`Job`: the client gets an id straight away, follows the job's
+stage, and fetches the artifact once it has finished.  :class:`JobStore`
+holds the jobs, cancels them on request and drops finished ones under a
+retention policy.
+
+When the server runs several worker processes, a job lives in the worker
+that started it, but the client's next request may reach any worker.  A
+store given a *shared_path* therefore also records every job's state in a
+SQLite database there: other workers read it to answer status requests,
+and a cancel request reaching another worker is picked up by the owner at
+the job's next stage.
+"""
+
+from __future__ import annotations
+
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from concurrent.futures import Future
+
+# Job states; every state but "queued" and "running" is final
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINAL_STATES = frozenset({SUCCEEDED, FAILED, CANCELLED})
+
+# Seconds between sweeps of expired jobs from the shared database
+_SHARED_EXPIRE_INTERVAL = 60.0
+
+
+@dataclass
+class Job:
+    """One background render and its progress."""
+
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = QUEUED
+    stage: str = QUEUED
+    created: float = field(default_factory=time.monotonic)
+    finished: float | None = None
+    error: str | None = None
+    # ``(stage, seconds since created)`` for every stage entered
+    stages: list[tuple[str, float]] = field(default_factory=list)
+    artifact: bytes | None = None
+    media_type: str = "application/octet-stream"
+    etag: str | None = None
+    slug: str | None = None
+    # Result cache key of the artifact, for workers that do not hold it
+    cache_key: str | None = None
+    # Increases with every change; lets streams detect updates cheaply
+    version: int = 0
+    # True for a snapshot of a job running in another worker process
+    remote: bool = False
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    future: Future[Any] | None = field(default=None, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in FINAL_STATES
+
+    def elapsed(self) -> float:
+        end = self.finished if self.finished is not None else time.monotonic()
+        return end - self.created
+
+    def as_dict(self) -> dict[str, Any]:
+        info: dict[str, Any] = {
+            "id": self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "elapsed_seconds": round(self.elapsed(), 3),
+            "stages": [{"stage": s, "at_seconds": round(t, 3)} for s, t in self.stages],
+            "error": self.error,
+        }
+        if self.status == SUCCEEDED:
+            info["artifact_url"] = f"/api/jobs/{self.id}/artifact"
+            if self.slug:
+                info["slug"] = self.slug
+        return info
+
+
+_SHARED_SCHEMA_VERSION = 1
+
+_SHARED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    status TEXT NOT NULL,
+    done INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    updated REAL NOT NULL
+);
+"""
+
+
+class JobStore:
+    """Thread-safe registry of jobs with time- and count-based retention.
+
+    Finished jobs, including their artifacts, are kept for *retention*
+    seconds, and only the *max_finished* most recent of them; older ones
+    are dropped whenever the store is used.  With *shared_path*, job states
+    are shared with other processes through that SQLite database.
+    """
+
+    def __init__(
+        self,
+        retention: float = 3600.0,
+        max_finished: int = 100,
+        shared_path: Path | None = None,
+    ) -> None:
+        self.retention = retention
+        self.max_finished = max_finished
+        self.shared_path = shared_path
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._shared_expired = float("-inf")
+        self._prepared = False
+        if shared_path is not None:
+            self._prepare()
+
+    def add(self, job: Job) -> Job:
+        with self._lock:
+            sweep = self._expire()
+            self._jobs[job.id] = job
+        if sweep:
+            self._sweep_shared()
+        self._publish(job)
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        with self._lock:
+            sweep = self._expire()
+            job = self._jobs.get(job_id)
+        if sweep:
+            self._sweep_shared()
+        if job is None and self.shared_path is not None:
+            return self._load(job_id)
+        return job
+
+    def refresh(self, job: Job) -> Job:
+        """Return the latest state of *job*: itself, unless it is remote."""
+        if not job.remote:
+            return job
+        return self._load(job.id) or job
+
+    def discard(self, job_id: str) -> None:
+        with self._lock:
+            self._jobs.pop(job_id, None)
+        self._shared("DELETE FROM jobs WHERE id = ?", (job_id,))
+
+    def set_stage(self, job: Job, stage: str) -> None:
+        """Record that *job* entered *stage*."""
+        if self._cancel_requested(job.id):
+            # Cancelled through another worker; stop at this stage boundary
+            self.cancel(job)
+            return
+        with self._lock:
+            if job.done:
+                return
+            job.stage = stage
+            job.stages.append((stage, time.monotonic() - job.created))
+            if stage != QUEUED:
+                job.status = RUNNING
+            job.version += 1
+        self._publish(job)
+
+    def finish(self, job: Job, status: str, **fields: Any) -> None:
+        """Move *job* to the final *status*, setting any extra *fields*."""
+        with self._lock:
+            if job.done:
+                return
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.status = job.stage = status
+            job.finished = time.monotonic()
+            job.stages.append((status, job.finished - job.created))
+            job.version += 1
+        self._publish(job)
+
+    def cancel(self, job: Job) -> None:
+        """Cancel *job*: drop it from the queue, or stop its render."""
+        if job.remote:
+            # The owning worker stops it when it next reports progress
+            self._shared("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (job.id,))
+            return
+        job.cancel_event.set()
+        if job.future is not None:
+            job.future.cancel()
+        self.finish(job, CANCELLED)
+
+    def counts(self) -> dict[str, int]:
+        if self.shared_path is not None:
+            rows = self._shared("SELECT status, COUNT(*) FROM jobs GROUP BY status") or []
+            return dict(rows)
+        with self._lock:
+            counts: dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    # ---- Sharing with other worker processes ----
+
+    def _prepare(self) -> None:
+        """Create the shared table, replacing one from an older release."""
+        assert self.shared_path is not None
+        try:
+            conn = sqlite3.connect(self.shared_path, timeout=10)
+            try:
+                with conn:
+                    # Workers starting together must not drop each other's table
+                    conn.execute("BEGIN IMMEDIATE")
+                    version = conn.execute("PRAGMA user_version").fetchone()[0]
+                    if version != _SHARED_SCHEMA_VERSION:
+                        # Job states are short-lived; nothing worth migrating
+                        conn.execute("DROP TABLE IF EXISTS jobs")
+                        conn.execute(f"PRAGMA user_version = {_SHARED_SCHEMA_VERSION}")
+                    conn.execute(_SHARED_SCHEMA)
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return
+        self._prepared = True
+
+    def _shared(self, sql: str, params: tuple = ()) -> list[tuple] | None:
+        """Run *sql* on the shared database; None without one or on error."""
+        if self.shared_path is None:
+            return None
+        if not self._prepared:
+            self._prepare()
+        try:
+            conn = sqlite3.connect(self.shared_path, timeout=10)
+            try:
+                with conn:
+                    return conn.execute(sql, params).fetchall()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            # Sharing is best-effort; the owning worker still has the job
+            return None
+
+    def _publish(self, job: Job) -> None:
+        if self.shared_path is None or job.remote:
+            return
+        state = {
+            **job.as_dict(),
+            "media_type": job.media_type,
+            "etag": job.etag,
+            "slug": job.slug,
+            "cache_key": job.cache_key,
+            "version": job.version,
+        }
+        self._shared(
+            "INSERT INTO jobs (id, state, status, done, updated) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET state = excluded.state, status = excluded.status,"
+            " done = excluded.done, updated = excluded.updated",
+            (job.id, json.dumps(state), job.status, int(job.done), time.time()),
+        )
+
+    def _load(self, job_id: str) -> Job | None:
+        rows = self._shared("SELECT state FROM jobs WHERE id = ?", (job_id,))
+        if not rows:
+            return None
+        state = json.loads(rows[0][0])
+        now = time.monotonic()
+        created = now - state["elapsed_seconds"]
+        return Job(
+            id=job_id,
+            status=state["status"],
+            stage=state["stage"],
+            created=created,
+            finished=now if state["status"] in FINAL_STATES else None,
+            error=state["error"],
+            stages=[(s["stage"], s["at_seconds"]) for s in state["stages"]],
+            media_type=state["media_type"],
+            etag=state["etag"],
+            slug=state["slug"],
+            cache_key=state["cache_key"],
+            version=state["version"],
+            remote=True,
+        )
+
+    def _cancel_requested(self, job_id: str) -> bool:
+        rows = self._shared("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,))
+        return bool(rows and rows[0][0])
+
+    def _expire(self) -> bool:
+        """Drop finished jobs past retention.  Caller holds the lock.
+
+        Returns True when the shared database is due a sweep, which the
+        caller runs with :meth:`_sweep_shared` after releasing the lock.
+        """
+        now = time.monotonic()
+        finished = sorted(
+            ((j.finished, j) for j in self._jobs.values() if j.finished is not None),
+            key=lambda pair: pair[0],
+        )
+        excess = len(finished) - self.max_finished
+        for index, (finished_at, job) in enumerate(finished):
+            if index < excess or now - finished_at > self.retention:
+                del self._jobs[job.id]
+        if self.shared_path is None or now - self._shared_expired <= _SHARED_EXPIRE_INTERVAL:
+            return False
+        self._shared_expired = now
+        return True
+
+    def _sweep_shared(self) -> None:
+        self._shared("DELETE FROM jobs WHERE done = 1 AND updated < ?", (time.time() - self.retention,))
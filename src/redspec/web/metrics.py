@@ -0,0 +1,289 @@
+"""Operational metrics for the web app, in the Prometheus text format.
+
+The counters, gauges and histograms here are deliberately minimal and need
+no dependency.  If ``prometheus_client`` is installed
+(``pip install redspec[metrics]``), its default registry -- process CPU,
+memory, open files and the like -- is appended to the output.
+"""
+
+from __future__ import annotations
+
+import logging
+import math
+import threading
+import time
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = tuple(float(1024 * 4**i) for i in range(10))  # 1 KiB .. 256 MiB
+
+# One sample: (name suffix, labels, value)
+Sample = tuple[str, dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> Iterable[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """A value that only goes up."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> None:
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield "_total", dict(zip(self.labelnames, key, strict=True)), value
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: bucket counts (last is +Inf), sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += value
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return sum(entry[0]) if entry else 0
+
+    def samples(self) -> Iterable[Sample]:
+        with self._lock:
+            items = sorted((k, (list(c), t[0])) for k, (c, t) in self._values.items())
+        for key, (counts, total) in items:
+            labels = dict(zip(self.labelnames, key, strict=True))
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts, strict=True):
+                cumulative += count
+                yield "_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield "_sum", labels, total
+            yield "_count", labels, cumulative
+
+
+class Gauge(_Metric):
+    """A value read when metrics are collected, from *read*.
+
+    *read* returns the value, or a list of ``(labels, value)`` pairs.
+    """
+
+    kind = "gauge"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        read: Callable[[], float | list[tuple[dict[str, str], float]]],
+    ) -> None:
+        super().__init__(name, help)
+        self._read = read
+
+    def samples(self) -> Iterable[Sample]:
+        value = self._read()
+        if isinstance(value, list):
+            for labels, sample in value:
+                yield "", labels, sample
+        else:
+            yield "", {}, value
+
+
+class MetricsRegistry:
+    """A set of metrics rendered together."""
+
+    def __init__(self) -> None:
+        self._metrics: list[_Metric] = []
+
+    def register(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            try:
+                samples = list(metric.samples())
+            except Exception:
+                # A failing reader must not break the whole scrape
+                logger.exception("Cannot read metric %s", metric.name)
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{metric.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        text = "\n".join(lines) + "\n"
+        try:
+            from prometheus_client import REGISTRY, generate_latest
+        except ImportError:
+            return text
+        return text + generate_latest(REGISTRY).decode("utf-8")
+
+
+class RenderObserver:
+    """Times the stages of one render and records its outcome.
+
+    Pass :meth:`stage` as the renderer's ``on_stage`` callback, then call
+    :meth:`done` with the result.
+    """
+
+    def __init__(self, metrics: AppMetrics, out_format: str) -> None:
+        self._metrics = metrics
+        self._format = out_format
+        self._stage: str | None = None
+        self._since = time.perf_counter()
+        self._started = self._since
+
+    def stage(self, name: str) -> None:
+        now = time.perf_counter()
+        if self._stage is not None:
+            self._metrics.stage_seconds.observe(now - self._since, stage=self._stage)
+        self._stage, self._since = name, now
+
+    def done(self, data: bytes | None, error: BaseException | None) -> None:
+        from redspec.exceptions import GraphvizError, RenderCancelledError
+
+        if error is None:
+            self.stage("done")
+            self._metrics.render_seconds.observe(time.perf_counter() - self._started, format=self._format)
+            self._metrics.output_bytes.observe(len(data or b""), format=self._format)
+        elif isinstance(error, RenderCancelledError):
+            self._metrics.graphviz_failures.inc(reason="cancelled")
+        elif isinstance(error, GraphvizError):
+            reason = "not_found" if "not found" in str(error) else "error"
+            self._metrics.graphviz_failures.inc(reason=reason)
+        else:
+            self._metrics.render_errors.inc(type=type(error).__name__)
+
+
+class AppMetrics:
+    """The web app's metrics.
+
+    Request metrics are labelled with the route template (such as
+    ``/api/gallery/{slug}``), not the concrete path, to bound their number.
+    """
+
+    def __init__(self) -> None:
+        self.registry = MetricsRegistry()
+        add = self.registry.register
+        self.requests = add(Counter(
+            "redspec_http_requests", "HTTP requests handled.", ("method", "route", "status")
+        ))
+        self.request_seconds = add(Histogram(
+            "redspec_http_request_duration_seconds", "Time to produce an HTTP response.", ("method", "route")
+        ))
+        self.stage_seconds = add(Histogram(
+            "redspec_render_stage_duration_seconds",
+            "Time spent in each render stage (parse, validate, build, layout, postprocess).",
+            ("stage",),
+        ))
+        self.render_seconds = add(Histogram(
+            "redspec_render_duration_seconds", "Time to render a diagram, once started.", ("format",)
+        ))
+        self.output_bytes = add(Histogram(
+            "redspec_render_output_bytes", "Size of rendered diagrams.", ("format",), buckets=SIZE_BUCKETS
+        ))
+        self.graphviz_failures = add(Counter(
+            "redspec_graphviz_failures", "Graphviz runs that failed, by reason.", ("reason",)
+        ))
+        self.render_errors = add(Counter(
+            "redspec_render_errors", "Renders that failed outside Graphviz.", ("type",)
+        ))
+
+    def gauge(self, name: str, help: str, read: Callable[[], Any]) -> None:
+        """Add a gauge whose value is read at collection time."""
+        self.registry.register(Gauge(name, help, read))
+
+    def counter_from(self, name: str, help: str, read: Callable[[], Any]) -> None:
+        """Add a counter whose value is read at collection time."""
+        gauge = Gauge(name, help, read)
+        gauge.kind = "counter"
+        self.registry.register(gauge)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float) -> None:
+        self.requests.inc(method=method, route=route, status=str(status))
+        self.request_seconds.observe(seconds, method=method, route=route)
+
+    @contextmanager
+    def time_stage(self, stage: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - started, stage=stage)
+
+    def render_observer(self, out_format: str) -> RenderObserver:
+        return RenderObserver(self, out_format)
+
+    def render(self) -> str:
+        return self.registry.render()
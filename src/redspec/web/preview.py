@@ -0,0 +1,248 @@
+"""Live preview sessions behind the editor's WebSocket (``/ws/preview``).
+
+A :class:`PreviewSession` keeps the editor's text, the last valid spec and
+the last results it sent, so the client only has to send what changed:
+
+- ``{"yaml_content": ..., "theme": ..., "direction": ..., "version": n}``
+  replaces the whole text (on connect, and after a ``resync``).
+- ``{"type": "edit", "base": m, "version": n, "changes": [...], "length": l}``
+  applies changes, each ``{"from": i, "to": j, "text": s}`` in UTF-16 code
+  units as the browser counts them, to version *m* of the text.  If the
+  session is not at version *m*, or the result is not *l* long, the server
+  answers ``{"type": "resync"}`` and the client sends the whole text.
+- ``{"type": "options", "theme": ..., "direction": ...}`` changes the
+  render options.
+
+Parsing, validation and lint run once the text has been quiet for
+:data:`DEBOUNCE_SECONDS`, not on every keystroke.  The server then pushes:
+
+- ``{"type": "validation", ...}`` only when the outcome changed, with the
+  lint warnings ``added`` and ``removed`` since the last push;
+- ``{"type": "preview", "svg": ..., "level": ...}`` only when the change can
+  alter the picture (see :func:`~redspec.generator.incremental.classify_change`)
+  and the new SVG differs from the last one sent.  *level* says how much
+  was redone: ``postprocess`` and ``restyle`` reuse the previous layout,
+  ``relayout`` ran Graphviz in full, ``cached`` came from the result cache.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from collections.abc import Awaitable, Callable
+from typing import TYPE_CHECKING, Any
+
+from starlette.concurrency import run_in_threadpool
+
+if TYPE_CHECKING:
+    from redspec.models import DiagramSpec
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE_SECONDS = 0.3
+
+# Render callback: spec -> (SVG bytes, level name)
+RenderPreview = Callable[["DiagramSpec"], Awaitable[tuple[bytes, str]]]
+
+
+def apply_changes(text: str, changes: list[dict[str, Any]]) -> str:
+    """Apply editor *changes*, in order, to *text*.
+
+    Offsets count UTF-16 code units, as JavaScript strings do, so text
+    outside the Basic Multilingual Plane (emoji) is handled correctly.
+    Raises ValueError for a change that does not fit the text.
+    """
+    data = text.encode("utf-16-le")
+    for change in changes:
+        start, end = int(change["from"]), int(change["to"])
+        if not 0 <= start <= end <= len(data) // 2:
+            raise ValueError(f"Change {start}..{end} is outside the text")
+        data = data[: 2 * start] + str(change.get("text", "")).encode("utf-16-le") + data[2 * end:]
+    return data.decode("utf-16-le", errors="surrogatepass")
+
+
+def _utf16_length(text: str) -> int:
+    return len(text.encode("utf-16-le")) // 2
+
+
+def parse_spec(text: str, options: dict[str, Any]) -> DiagramSpec:
+    """Parse and validate *text* with the session's render *options* applied.
+
+    Raises ValueError with a message for the editor.
+    """
+    import yaml
+
+    from redspec.models.diagram import DiagramSpec
+
+    try:
+        raw = yaml.safe_load(text)
+    except yaml.YAMLError as exc:
+        raise ValueError(f"Invalid YAML: {exc}") from exc
+    if not isinstance(raw, dict):
+        raise ValueError("YAML must be a mapping")
+    diagram = raw.setdefault("diagram", {})
+    if not isinstance(diagram, dict):
+        raise ValueError("'diagram' must be a mapping")
+    for name in ("theme", "direction"):
+        if options.get(name):
+            diagram[name] = options[name]
+    try:
+        return DiagramSpec.model_validate(raw)
+    except Exception as exc:
+        raise ValueError(str(exc)) from exc
+
+
+def _lint(spec: DiagramSpec) -> dict[tuple[str, str, str | None], dict[str, Any]]:
+    from redspec.linter import lint
+
+    return {
+        (w.rule, w.message, w.resource_name): {"rule": w.rule, "message": w.message, "resource_name": w.resource_name}
+        for w in lint(spec)
+    }
+
+
+class PreviewSession:
+    """State of one editor connected to ``/ws/preview``.
+
+    *send* delivers a message to the client; *render* renders a valid spec
+    to SVG.  Call :meth:`receive` with each client message and run
+    :meth:`run` as a task for the life of the connection.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[dict[str, Any]], Awaitable[None]],
+        render: RenderPreview,
+        debounce: float = DEBOUNCE_SECONDS,
+    ) -> None:
+        self._send = send
+        self._render = render
+        self.debounce = debounce
+        self.text = ""
+        self.version = 0
+        self.options: dict[str, Any] = {}
+        self.spec: DiagramSpec | None = None
+        self._dirty = asyncio.Event()
+        self._checked: tuple[str, tuple] | None = None  # (text digest, options) last validated
+        self._validation: dict[str, Any] | None = None
+        self._warnings: dict[tuple, dict[str, Any]] = {}
+        self._svg_digest: str | None = None
+
+    def receive(self, message: dict[str, Any]) -> dict[str, Any] | None:
+        """Take a client message; return an immediate reply, if any."""
+        kind = message.get("type")
+        if kind == "edit":
+            if message.get("base") != self.version:
+                return {"type": "resync", "version": self.version}
+            try:
+                text = apply_changes(self.text, message.get("changes") or [])
+            except (KeyError, TypeError, ValueError):
+                return {"type": "resync", "version": self.version}
+            if "length" in message and message["length"] != _utf16_length(text):
+                return {"type": "resync", "version": self.version}
+            self.text = text
+            self.version = message.get("version", self.version + 1)
+        elif kind == "options":
+            self._set_options(message)
+        elif kind in (None, "full"):
+            if not isinstance(message.get("yaml_content"), str):
+                return {"type": "error", "message": "yaml_content is required"}
+            self.text = message["yaml_content"]
+            self.version = message.get("version", self.version + 1)
+            self._set_options(message)
+        else:
+            return {"type": "error", "message": f"Unknown message type {kind!r}"}
+        self._dirty.set()
+        return None
+
+    def _set_options(self, message: dict[str, Any]) -> None:
+        for name in ("theme", "direction"):
+            if name in message:
+                self.options[name] = message[name] or None
+
+    async def run(self) -> None:
+        """Process changes as they settle, until cancelled."""
+        while True:
+            await self._dirty.wait()
+            # Wait for a pause in the edits
+            while True:
+                self._dirty.clear()
+                try:
+                    await asyncio.wait_for(self._dirty.wait(), self.debounce)
+                except asyncio.TimeoutError:
+                    break
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                logger.exception("Preview update failed")
+                await self._send({"type": "error", "version": self.version, "message": str(exc)})
+
+    async def flush(self) -> None:
+        """Validate the current text and push what changed."""
+        text, version = self.text, self.version
+        options = tuple(sorted(self.options.items()))
+        checked = (hashlib.sha256(text.encode("utf-8")).hexdigest(), options)
+        if checked == self._checked:
+            return  # edited back to what was last checked
+        self._checked = checked
+
+        try:
+            spec = await run_in_threadpool(parse_spec, text, dict(self.options))
+        except ValueError as exc:
+            await self._push_validation(version, {"valid": False, "error": str(exc)}, {})
+            return
+        warnings = await run_in_threadpool(_lint, spec)
+        summary = {
+            "valid": True,
+            "name": spec.diagram.name,
+            "resources": len(spec.resources),
+            "connections": len(spec.connections),
+        }
+        await self._push_validation(version, summary, warnings)
+
+        from redspec.generator.incremental import ChangeLevel, classify_change
+
+        previous, self.spec = self.spec, spec
+        if previous is not None and self._svg_digest is not None and classify_change(previous, spec) == ChangeLevel.NONE:
+            return
+        try:
+            svg, level = await self._render(spec)
+        except Exception as exc:
+            await self._send({"type": "error", "version": version, "message": str(exc)})
+            # Render again next time, whatever the change
+            self._svg_digest = None
+            return
+        digest = hashlib.sha256(svg).hexdigest()
+        if digest == self._svg_digest:
+            return
+        self._svg_digest = digest
+        await self._send({
+            "type": "preview",
+            "version": version,
+            "level": level,
+            "svg": svg.decode("utf-8", errors="replace"),
+        })
+
+    async def _push_validation(
+        self,
+        version: int,
+        result: dict[str, Any],
+        warnings: dict[tuple, dict[str, Any]],
+    ) -> None:
+        added = [w for key, w in warnings.items() if key not in self._warnings]
+        removed = [w for key, w in self._warnings.items() if key not in warnings]
+        self._warnings = warnings
+        if result == self._validation and not added and not removed:
+            return
+        self._validation = result
+        await self._send({
+            "type": "validation",
+            "version": version,
+            **result,
+            "warnings": len(warnings),
+            "added": added,
+            "removed": removed,
+        })
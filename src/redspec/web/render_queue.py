@@ -0,0 +1,195 @@
+"""Bounded, prioritised render queue for the web app.
+
+Rendering runs Graphviz and can take seconds, so it must not run on the
+event loop.  :class:`RenderQueue` hands jobs to a fixed pool of worker
+threads or processes.  Jobs that arrive while every worker is busy wait in
+a priority queue: interactive previews are started before gallery saves,
+and a share of the queue is reserved for them.  A job that does not fit is
+rejected immediately with :class:`~redspec.exceptions.QueueFullError`
+instead of piling up.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections.abc import Callable
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any
+
+from redspec.exceptions import QueueFullError
+
+# Weight of the newest sample in the moving averages
+_SMOOTHING = 0.2
+
+# Assumed render time before any job has finished
+_DEFAULT_RUN_SECONDS = 1.0
+
+
+class Priority(IntEnum):
+    """Job priority; lower values start first."""
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+
+
+@dataclass(order=True)
+class _Job:
+    priority: int
+    seq: int
+    fn: Callable[..., Any] = field(compare=False)
+    args: tuple = field(compare=False)
+    kwargs: dict[str, Any] = field(compare=False)
+    future: Future[Any] = field(compare=False, default_factory=Future)
+    enqueued: float = field(compare=False, default_factory=time.monotonic)
+
+
+class _MovingAverage:
+    def __init__(self) -> None:
+        self.value: float | None = None
+
+    def add(self, sample: float) -> None:
+        self.value = sample if self.value is None else self.value + _SMOOTHING * (sample - self.value)
+
+
+class RenderQueue:
+    """Run render jobs on a bounded worker pool, highest priority first.
+
+    At most *workers* jobs run at once and at most *max_queued* wait.  The
+    last quarter of the waiting slots is reserved for
+    :attr:`Priority.INTERACTIVE` jobs, so a burst of gallery saves cannot
+    lock out the live editor.  With *processes* the workers are separate
+    processes, which lets the Python side of rendering run in parallel too;
+    jobs must then be picklable module-level functions.
+    """
+
+    def __init__(self, workers: int = 2, max_queued: int = 16, processes: bool = False) -> None:
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.workers = workers
+        self.processes = processes
+        self.max_queued = max(0, max_queued)
+        self.reserved = self.max_queued // 4
+        self._executor: Executor = (
+            ProcessPoolExecutor(max_workers=workers)
+            if processes
+            else ThreadPoolExecutor(max_workers=workers, thread_name_prefix="redspec-render")
+        )
+        self._lock = threading.Lock()
+        self._pending: list[_Job] = []
+        self._seq = itertools.count()
+        self._running = 0
+        self._wait = _MovingAverage()
+        self._run = _MovingAverage()
+        self._completed = 0
+        self._rejected = 0
+
+    def submit(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        priority: Priority = Priority.INTERACTIVE,
+        **kwargs: Any,
+    ) -> Future[Any]:
+        """Queue ``fn(*args, **kwargs)`` and return a future for its result.
+
+        Raises :class:`~redspec.exceptions.QueueFullError` if every worker
+        is busy and the queue has no room for a job of this priority.
+        """
+        with self._lock:
+            if self._running >= self.workers:
+                limit = self.max_queued if priority == Priority.INTERACTIVE else self.max_queued - self.reserved
+                if len(self._pending) >= limit:
+                    self._rejected += 1
+                    raise QueueFullError(
+                        self._retry_after(),
+                        reserved=len(self._pending) < self.max_queued,
+                    )
+            job = _Job(int(priority), next(self._seq), fn, args, kwargs)
+            heapq.heappush(self._pending, job)
+            ready = self._take_ready()
+        self._start(ready)
+        return job.future
+
+    async def run(
+        self,
+        fn: Callable[..., Any],
+        *args: Any,
+        priority: Priority = Priority.INTERACTIVE,
+        **kwargs: Any,
+    ) -> Any:
+        """Await the result of ``fn(*args, **kwargs)`` run through the queue."""
+        return await asyncio.wrap_future(self.submit(fn, *args, priority=priority, **kwargs))
+
+    def stats(self) -> dict[str, Any]:
+        """Return queue depth, worker usage and recent wait and run times."""
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": len(self._pending),
+                "max_queued": self.max_queued,
+                "reserved_interactive": self.reserved,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "avg_wait_seconds": round(self._wait.value or 0.0, 4),
+                "avg_run_seconds": round(self._run.value or 0.0, 4),
+            }
+
+    def shutdown(self) -> None:
+        """Cancel waiting jobs and stop the workers once running jobs finish."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for job in pending:
+            job.future.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _retry_after(self) -> int:
+        per_job = self._run.value or _DEFAULT_RUN_SECONDS
+        return max(1, math.ceil(per_job * (len(self._pending) + 1) / self.workers))
+
+    def _take_ready(self) -> list[_Job]:
+        """Pop the jobs free workers can start.  Caller holds the lock."""
+        ready = []
+        while self._pending and self._running < self.workers:
+            job = heapq.heappop(self._pending)
+            # False when the caller gave up (cancelled) while it waited
+            if job.future.set_running_or_notify_cancel():
+                self._running += 1
+                self._wait.add(time.monotonic() - job.enqueued)
+                ready.append(job)
+        return ready
+
+    def _start(self, jobs: list[_Job]) -> None:
+        for job in jobs:
+            started = time.monotonic()
+            try:
+                inner = self._executor.submit(job.fn, *job.args, **job.kwargs)
+            except RuntimeError as exc:  # executor shut down
+                self._finish(job, started, None, exc)
+                continue
+            inner.add_done_callback(functools.partial(self._finish, job, started, error=None))
+
+    def _finish(self, job: _Job, started: float, inner: Future[Any] | None, error: BaseException | None) -> None:
+        with self._lock:
+            self._running -= 1
+            self._completed += 1
+            self._run.add(time.monotonic() - started)
+            ready = self._take_ready()
+        self._start(ready)
+
+        if inner is None:
+            job.future.set_exception(error)
+        elif inner.cancelled():
+            job.future.set_exception(RuntimeError("Render queue shut down"))
+        elif inner.exception() is not None:
+            job.future.set_exception(inner.exception())
+        else:
+            job.future.set_result(inner.result())
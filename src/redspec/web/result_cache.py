@@ -0,0 +1,302 @@
+"""Content-addressed cache of rendered diagrams and text exports.
+
+Results are keyed by a hash of the validated spec (so formatting and
+comments in the YAML do not matter), the render options, the redspec
+version and the installed icon packs.  A bounded in-memory LRU sits in
+front of a bounded directory of files, and concurrent requests for the same
+key share a single computation.
+
+Code on the event loop uses the ``a``-prefixed methods, which answer from
+memory directly and do disk reads, writes and pruning in a worker thread.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from concurrent.futures import Future
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from redspec.models import DiagramSpec
+
+
+def _icon_state() -> list[tuple[str, float]]:
+    """Installed icon packs, so installing or updating one invalidates results."""
+    from redspec.icons.packs import ALL_PACKS
+
+    state = []
+    for name, pack in sorted(ALL_PACKS.items()):
+        try:
+            state.append((name, pack.downloaded_marker.stat().st_mtime))
+        except OSError:
+            continue
+    return state
+
+
+def cache_key(kind: str, spec: DiagramSpec, **options: Any) -> str:
+    """Return the cache key for producing *kind* output from *spec*."""
+    from redspec import __version__
+
+    payload = {
+        "kind": kind,
+        "version": __version__,
+        "icons": _icon_state(),
+        "spec": spec.model_dump(mode="json", by_alias=True),
+        "options": options,
+    }
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def etag_for(key: str) -> str:
+    """Strong ETag for the result stored under *key*."""
+    return f'"{key[:32]}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """True if an ``If-None-Match`` header value names *etag*.
+
+    The comparison is weak, as HTTP specifies for ``If-None-Match``: a
+    compressed response's ``W/`` tag matches the uncompressed one.
+    """
+    if not if_none_match:
+        return False
+    etag = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") in (etag, "*") for tag in if_none_match.split(","))
+
+
+class ResultCache:
+    """Two-level (memory, then disk) byte cache with single-flight fills.
+
+    The memory level keeps at most *max_entries* results totalling at most
+    *max_memory_bytes*.  The disk level, when *directory* is given, stores
+    one file per key and drops the least recently used files once they
+    exceed *max_disk_bytes*.
+    """
+
+    def __init__(
+        self,
+        directory: Path | None = None,
+        max_entries: int = 256,
+        max_memory_bytes: int = 64 * 1024 * 1024,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ) -> None:
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes: int | None = None
+        self._inflight: dict[str, Future[bytes]] = {}
+        self._tasks: set[asyncio.Task[None]] = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> bytes | None:
+        """Return the cached result for *key*, or None."""
+        return self._count(self.peek(key))
+
+    def peek(self, key: str) -> bytes | None:
+        """Like :meth:`get`, but not counted in the hit ratio.
+
+        For checks made before a lookup that :meth:`get_or_create` counts.
+        """
+        data = self._recall(key)
+        return data if data is not None else self._load(key)
+
+    def put(self, key: str, data: bytes) -> None:
+        """Store *data* under *key* in both levels."""
+        with self._lock:
+            self._remember(key, data)
+        self._write_disk(key, data)
+
+    async def aget(self, key: str) -> bytes | None:
+        """:meth:`get` for the event loop."""
+        return self._count(await self.apeek(key))
+
+    async def apeek(self, key: str) -> bytes | None:
+        """:meth:`peek` for the event loop."""
+        data = self._recall(key)
+        return data if data is not None else await asyncio.to_thread(self._load, key)
+
+    async def aput(self, key: str, data: bytes) -> None:
+        """:meth:`put` for the event loop."""
+        with self._lock:
+            self._remember(key, data)
+        await asyncio.to_thread(self._write_disk, key, data)
+
+    async def get_or_create(self, key: str, produce: Callable[[], Awaitable[bytes]]) -> bytes:
+        """Return the result for *key*, running *produce* only if nobody else is.
+
+        Callers arriving while a result is being produced wait for it (and
+        see its exception, if it fails) instead of producing it again.  The
+        work runs in a task the cache owns, so a caller that is cancelled,
+        the first one included, only stops waiting; the others still get
+        the result.
+        """
+        data = await self.aget(key)
+        if data is not None:
+            return data
+
+        with self._lock:
+            pending = self._inflight.get(key)
+            if pending is not None:
+                leader = False
+            else:
+                leader = True
+                pending = self._inflight[key] = Future()
+        if not leader:
+            return await asyncio.shield(asyncio.wrap_future(pending))
+
+        task = asyncio.ensure_future(self._fill(key, produce, pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        # The first caller also waits for the disk write
+        await asyncio.shield(task)
+        return pending.result()
+
+    async def _fill(self, key: str, produce: Callable[[], Awaitable[bytes]], pending: Future[bytes]) -> None:
+        """Run *produce* and hand its result, or exception, to *pending*."""
+        try:
+            data = await produce()
+        except BaseException as exc:
+            with self._lock:
+                self._inflight.pop(key, None)
+            pending.set_exception(exc)
+            if not isinstance(exc, Exception):
+                raise
+            return
+        # Waiters need not wait for the disk write
+        with self._lock:
+            self._remember(key, data)
+            self._inflight.pop(key, None)
+        pending.set_result(data)
+        await asyncio.to_thread(self._write_disk, key, data)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "inflight": len(self._inflight),
+            }
+
+    def _count(self, data: bytes | None) -> bytes | None:
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def _recall(self, key: str) -> bytes | None:
+        """The result for *key* from the memory level, or None."""
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+            return data
+
+    def _load(self, key: str) -> bytes | None:
+        """The result for *key* from the disk level, kept in memory; or None."""
+        data = self._read_disk(key)
+        if data is not None:
+            with self._lock:
+                self._remember(key, data)
+        return data
+
+    # ---- Memory level (caller holds the lock) ----
+
+    def _remember(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while len(self._memory) > self.max_entries or self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    # ---- Disk level ----
+
+    def _path(self, key: str) -> Path:
+        assert self.directory is not None
+        return self.directory / key[:2] / key
+
+    def _read_disk(self, key: str) -> bytes | None:
+        if self.directory is None:
+            return None
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        # Reads refresh the mtime so pruning drops the least recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _write_disk(self, key: str, data: bytes) -> None:
+        if self.directory is None:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+            with os.fdopen(fd, "wb") as fh:
+                fh.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            # The disk level is best-effort; the memory level still works
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(f.stat().st_size for f in self._disk_files())
+            else:
+                self._disk_bytes += len(data)
+            over = self._disk_bytes > self.max_disk_bytes
+        if over:
+            self._prune_disk()
+
+    def _disk_files(self) -> list[Path]:
+        assert self.directory is not None
+        return [f for f in self.directory.glob("*/*") if f.is_file() and not f.name.startswith(".")]
+
+    def _prune_disk(self) -> None:
+        files = []
+        for f in self._disk_files():
+            try:
+                st = f.stat()
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, f))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        # Prune to 80% so a busy cache is not pruned on every write
+        target = self.max_disk_bytes * 0.8
+        for _, size, f in files:
+            if total <= target:
+                break
+            f.unlink(missing_ok=True)
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
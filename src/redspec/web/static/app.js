@@ -2,9 +2,10 @@
 
 let editor;
 let currentBlob = null;
+let currentEtag = null;
 let currentFormat = "png";
 let zoomLevel = 1;
-let resourceTypes = [];
+let resourceRequest = null;
 
 document.addEventListener("DOMContentLoaded", () => {
     // Init CodeMirror with hint addon
@@ -38,12 +39,6 @@ document.addEventListener("DOMContentLoaded", () => {
             });
         });
 
-    // Load resource types for autocomplete
-    fetch("/api/resources")
-        .then(r => r.json())
-        .then(types => { resourceTypes = types; })
-        .catch(() => { });
-
     // Template picker change
     document.getElementById("template-picker").addEventListener("change", (e) => {
         const name = e.target.value;
@@ -111,6 +106,9 @@ document.addEventListener("DOMContentLoaded", () => {
 
     // WebSocket live preview
     initWebSocket();
+    editor.on("change", queueWsChange);
+    document.getElementById("theme-picker").addEventListener("change", sendWsOptions);
+    document.getElementById("direction-picker").addEventListener("change", sendWsOptions);
 });
 
 /* ===== Status ===== */
@@ -154,9 +152,16 @@ function updatePreviewBackground() {
 
 /* ===== WebSocket Live Preview ===== */
 
+// The server keeps the text of the session: after the first full upload
+// only the edits are sent, and the server validates and renders once the
+// text has been quiet for a moment, pushing only what changed.
+
 let ws = null;
-let wsDebounceTimer = null;
-const WS_DEBOUNCE_MS = 800;
+let wsVersion = 0;
+let wsPendingChanges = [];
+let wsFlushTimer = null;
+let wsLintWarnings = new Map();
+const WS_FLUSH_MS = 150;
 
 function initWebSocket() {
     const protocol = location.protocol === "https:" ? "wss:" : "ws:";
@@ -171,8 +176,8 @@ function initWebSocket() {
 
     ws.onopen = () => {
         setWsStatus("on");
-        // Send current content on connect
-        sendWsPreview();
+        // A new session knows nothing: start from the full text
+        sendWsFull();
     };
 
     ws.onclose = () => {
@@ -186,30 +191,91 @@ function initWebSocket() {
     };
 
     ws.onmessage = (event) => {
+        let data;
         try {
-            const data = JSON.parse(event.data);
-            if (data.type === "preview" && data.svg) {
-                showSvgPreview(data.svg);
-            }
+            data = JSON.parse(event.data);
         } catch {
-            // Ignore invalid messages
+            return; // Ignore invalid messages
+        }
+        if (data.type === "preview" && data.svg) {
+            showSvgPreview(data.svg);
+        } else if (data.type === "validation") {
+            showWsValidation(data);
+        } else if (data.type === "resync") {
+            sendWsFull();
+        } else if (data.type === "error") {
+            updateStatus(`PREVIEW ERROR: ${data.message}`, "error");
         }
     };
+}
 
-    // Watch editor changes for live preview
-    editor.on("change", () => {
-        clearTimeout(wsDebounceTimer);
-        wsDebounceTimer = setTimeout(sendWsPreview, WS_DEBOUNCE_MS);
-    });
+function wsOpen() {
+    return ws && ws.readyState === WebSocket.OPEN;
 }
 
-function sendWsPreview() {
-    if (!ws || ws.readyState !== WebSocket.OPEN) return;
-    ws.send(JSON.stringify({
-        yaml_content: editor.getValue(),
+function wsOptions() {
+    return {
         theme: document.getElementById("theme-picker").value,
         direction: document.getElementById("direction-picker").value,
+    };
+}
+
+function sendWsFull() {
+    if (!wsOpen()) return;
+    clearTimeout(wsFlushTimer);
+    wsPendingChanges = [];
+    wsVersion += 1;
+    ws.send(JSON.stringify({ type: "full", version: wsVersion, yaml_content: editor.getValue(), ...wsOptions() }));
+}
+
+function sendWsOptions() {
+    if (!wsOpen()) return;
+    ws.send(JSON.stringify({ type: "options", ...wsOptions() }));
+}
+
+function queueWsChange(cm, change) {
+    // Offsets before the change: the text up to change.from is unaffected
+    const from = cm.indexFromPos(change.from);
+    wsPendingChanges.push({
+        from,
+        to: from + change.removed.join("\n").length,
+        text: change.text.join("\n"),
+    });
+    clearTimeout(wsFlushTimer);
+    wsFlushTimer = setTimeout(flushWsChanges, WS_FLUSH_MS);
+}
+
+function flushWsChanges() {
+    if (!wsPendingChanges.length) return;
+    if (!wsOpen()) {
+        wsPendingChanges = []; // resent in full on reconnect
+        return;
+    }
+    const last = editor.lastLine();
+    const base = wsVersion;
+    wsVersion += 1;
+    ws.send(JSON.stringify({
+        type: "edit",
+        base,
+        version: wsVersion,
+        changes: wsPendingChanges,
+        length: editor.indexFromPos({ line: last, ch: editor.getLine(last).length }),
     }));
+    wsPendingChanges = [];
+}
+
+function showWsValidation(data) {
+    data.removed.forEach(w => wsLintWarnings.delete(`${w.rule}|${w.message}|${w.resource_name}`));
+    data.added.forEach(w => wsLintWarnings.set(`${w.rule}|${w.message}|${w.resource_name}`, w));
+    if (!data.valid) {
+        updateStatus(`INVALID: ${data.error}`, "error");
+        return;
+    }
+    let msg = `VALID: ${data.name} (${data.resources} RES, ${data.connections} CONN)`;
+    if (wsLintWarnings.size > 0) {
+        msg += ` | ${wsLintWarnings.size} LINT WARNING(S)`;
+    }
+    updateStatus(msg, "success");
 }
 
 function showSvgPreview(svgText) {
@@ -244,7 +310,7 @@ function setZoom(level) {
 
 /* ===== CodeMirror YAML Hints ===== */
 
-function yamlHint(cm) {
+function yamlHint(cm, callback) {
     const cursor = cm.getCursor();
     const line = cm.getLine(cursor.line);
     const token = cm.getTokenAt(cursor);
@@ -255,27 +321,31 @@ function yamlHint(cm) {
     // Detect if we're in a type: field
     const isTypeField = /^\s*-?\s*type:\s*/.test(line.slice(0, start)) || /type:\s*$/.test(line.slice(0, end));
 
-    let completions = [];
+    const from = CodeMirror.Pos(cursor.line, start);
+    const to = CodeMirror.Pos(cursor.line, end);
 
-    if (isTypeField && resourceTypes.length > 0) {
-        completions = resourceTypes.filter(t => t.toLowerCase().includes(currentWord));
-    } else {
-        // General YAML keys
-        const yamlKeys = [
-            "diagram:", "name:", "theme:", "direction:", "dpi:", "legend:", "animation:",
-            "resources:", "type:", "children:", "zone:", "metadata:",
-            "connections:", "source:", "to:", "label:", "style:", "color:", "style_ref:",
-            "connection_styles:", "variables:",
-        ];
-        completions = yamlKeys.filter(k => k.toLowerCase().startsWith(currentWord));
+    if (isTypeField) {
+        // Ranked matches for what has been typed so far, one small page per keystroke
+        if (resourceRequest) resourceRequest.abort();
+        resourceRequest = new AbortController();
+        const query = currentWord.trim();
+        fetch(`/api/resources?q=${encodeURIComponent(query)}&limit=20`, { signal: resourceRequest.signal })
+            .then(r => r.json())
+            .then(data => callback({ list: data.items.map(item => item.type), from, to }))
+            .catch(() => { });
+        return;
     }
 
-    return {
-        list: completions,
-        from: CodeMirror.Pos(cursor.line, start),
-        to: CodeMirror.Pos(cursor.line, end),
-    };
+    // General YAML keys
+    const yamlKeys = [
+        "diagram:", "name:", "theme:", "direction:", "dpi:", "legend:", "animation:",
+        "resources:", "type:", "children:", "zone:", "metadata:",
+        "connections:", "source:", "to:", "label:", "style:", "color:", "style_ref:",
+        "connection_styles:", "variables:",
+    ];
+    callback({ list: yamlKeys.filter(k => k.toLowerCase().startsWith(currentWord)), from, to });
 }
+yamlHint.async = true;
 
 /* ===== Generate ===== */
 
@@ -303,18 +373,36 @@ async function generateDiagram() {
     };
 
     try {
+        const headers = { "Content-Type": "application/json" };
+        // Identical requests are answered with 304; reuse the diagram we have
+        if (currentBlob && currentEtag) headers["If-None-Match"] = currentEtag;
+
         const resp = await fetch("/api/generate", {
             method: "POST",
-            headers: { "Content-Type": "application/json" },
+            headers,
             body: JSON.stringify(payload),
         });
 
-        if (!resp.ok) {
+        if (resp.status === 429 || resp.status === 503) {
+            const wait = resp.headers.get("Retry-After") || "a few";
+            throw new Error(`Server busy, retry in ${wait}s`);
+        }
+        if (resp.status !== 304 && !resp.ok) {
             const err = await resp.json();
             throw new Error(err.detail || "Generation failed");
         }
 
-        currentBlob = await resp.blob();
+        if (resp.status === 202) {
+            // Large spec: the server rendered it as a background job
+            const job = await resp.json();
+            const done = await followJob(job);
+            const artifact = await fetch(done.artifact_url);
+            currentBlob = await artifact.blob();
+            currentEtag = artifact.headers.get("ETag");
+        } else if (resp.status !== 304) {
+            currentBlob = await resp.blob();
+            currentEtag = resp.headers.get("ETag");
+        }
         const url = URL.createObjectURL(currentBlob);
 
         updatePreviewBackground();
@@ -339,6 +427,26 @@ async function generateDiagram() {
     }
 }
 
+function followJob(job) {
+    return new Promise((resolve, reject) => {
+        const source = new EventSource(job.events_url);
+        source.addEventListener("progress", (e) => {
+            const info = JSON.parse(e.data);
+            updateStatus(`RENDERING: ${info.stage.toUpperCase()} (${info.elapsed_seconds.toFixed(0)}s)`, "");
+        });
+        source.addEventListener("done", (e) => {
+            source.close();
+            const info = JSON.parse(e.data);
+            if (info.status === "succeeded") resolve(info);
+            else reject(new Error(info.error || `Render ${info.status}`));
+        });
+        source.onerror = () => {
+            source.close();
+            reject(new Error("Lost connection to render job"));
+        };
+    });
+}
+
 /* ===== Validate ===== */
 
 async function validateYAML() {
@@ -439,7 +547,8 @@ async function loadGallery() {
 
         grid.innerHTML = entries.map((entry, index) => {
             const fmt = entry.format || "png";
-            const thumbSrc = `/api/gallery/${entry.slug}/diagram.${fmt}`;
+            const fullSrc = `/api/gallery/${entry.slug}/diagram.${fmt}`;
+            const thumbSrc = entry.thumbnail_url || fullSrc;
             const ts = entry.timestamp ? new Date(entry.timestamp).toLocaleString() : "";
             const meta = [entry.theme, entry.direction, entry.dpi ? `${entry.dpi}dpi` : ""].filter(Boolean).join(" | ");
             const delay = index * 0.08;
@@ -447,7 +556,8 @@ async function loadGallery() {
             return `
                 <div class="gallery-card" style="animation-delay: ${delay}s" data-slug="${entry.slug}">
                     <div class="gallery-card-thumb">
-                        <img src="${thumbSrc}" alt="${entry.name}" loading="lazy">
+                        <img src="${thumbSrc}" alt="${entry.name}" loading="lazy" decoding="async"
+                             onerror="this.onerror=null; this.src='${fullSrc}'">
                     </div>
                     <div class="gallery-card-body">
                         <div class="gallery-card-title">${entry.name}</div>
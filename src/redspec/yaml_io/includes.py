@@ -53,3 +53,33 @@ def resolve_includes(raw: dict[str, Any], base_dir: Path, _seen: set[str] | None
             raw.setdefault("connections", []).extend(included["connections"])
 
     return raw
+
+
+def include_closure(yaml_file: Path) -> set[Path]:
+    """Return the resolved paths of *yaml_file* and every file it includes.
+
+    Includes are followed transitively.  Missing or unparseable files are
+    still part of the closure, so creating or fixing them can be noticed by
+    a watcher, but contribute no further includes.
+    """
+    root = Path(yaml_file).resolve()
+    closure = {root}
+    stack = [root]
+    while stack:
+        path = stack.pop()
+        try:
+            raw = yaml.safe_load(path.read_text(encoding="utf-8"))
+        except (OSError, UnicodeDecodeError, yaml.YAMLError):
+            continue
+        if not isinstance(raw, dict):
+            continue
+
+        includes = raw.get("includes") or []
+        if not isinstance(includes, list):
+            includes = [includes]
+        for include_path_str in includes:
+            include_path = (path.parent / str(include_path_str)).resolve()
+            if include_path not in closure:
+                closure.add(include_path)
+                stack.append(include_path)
+    return closure
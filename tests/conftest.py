@@ -9,6 +9,14 @@ import pytest
 FIXTURES_DIR = Path(__file__).parent / "fixtures"
 
 
+@pytest.fixture(autouse=True)
+def _isolated_embed_cache(tmp_path, monkeypatch):
+    """Keep icon data URIs out of the user's icon cache."""
+    from redspec.icons import embedder
+
+    monkeypatch.setattr(embedder, "_shared", embedder.EmbedCache(tmp_path / "embedded.db"))
+
+
 @pytest.fixture
 def tmp_output_dir(tmp_path):
     """Return a temporary directory for test outputs."""
@@ -1,6 +1,8 @@
 """Tests for CLI commands."""
 
 import json
+import os
+import time
 from pathlib import Path
 from unittest.mock import patch, MagicMock
 
@@ -256,6 +258,101 @@ class TestGenerate:
         assert "Cannot use both" in result.output
 
 
+class TestGenerateExport:
+    def test_export_streams_to_stdout(self, runner, minimal_yaml_path):
+        from redspec.exporters.mermaid import export_mermaid
+        from redspec.yaml_io.parser import parse_yaml
+
+        result = runner.invoke(main, ["generate", str(minimal_yaml_path), "--export-format", "mermaid"])
+        assert result.exit_code == 0, result.output
+        assert result.output == export_mermaid(parse_yaml(str(minimal_yaml_path)))
+
+    def test_export_to_file(self, runner, minimal_yaml_path, tmp_path):
+        output = tmp_path / "diagram.puml"
+        result = runner.invoke(
+            main, ["generate", str(minimal_yaml_path), "--export-format", "plantuml", "-o", str(output)]
+        )
+        assert result.exit_code == 0, result.output
+        assert "Exported to" in result.output
+        assert output.read_text(encoding="utf-8").startswith("@startuml")
+
+    def test_unknown_export_format(self, runner, minimal_yaml_path):
+        result = runner.invoke(main, ["generate", str(minimal_yaml_path), "--export-format", "nope"])
+        assert result.exit_code == 2
+        assert "Unknown export format" in result.output
+
+
+class TestGenerateAllExports:
+    @pytest.fixture(autouse=True)
+    def _render(self):
+        from redspec.generator.layout import Layout
+
+        def fake_render(spec, output, on_layout=None, **kwargs):
+            Path(output).parent.mkdir(parents=True, exist_ok=True)
+            Path(output).write_bytes(b"<svg/>")
+            if on_layout is not None:
+                on_layout(Layout(graph={"bb": "0,0,120,60"}))
+            return Path(output)
+
+        with patch("redspec.icons.migration.migrate_flat_cache", return_value=False), \
+             patch("redspec.icons.packs.ALL_PACKS") as mock_packs, \
+             patch("redspec.generator.pipeline.generate", side_effect=fake_render) as render, \
+             patch("redspec.exporters.drawio.spec_layout", return_value=None) as layout:
+            mock_pack = MagicMock()
+            mock_pack.downloaded_marker.exists.return_value = True
+            mock_packs.__getitem__ = MagicMock(return_value=mock_pack)
+            self.render, self.layout = render, layout
+            yield
+
+    def test_all_writes_every_export_next_to_the_diagram(self, runner, minimal_yaml_path, tmp_path):
+        from redspec.yaml_io.parser import parse_yaml
+
+        output = tmp_path / "arch.svg"
+        with patch("redspec.yaml_io.parser.parse_yaml", wraps=parse_yaml) as parse:
+            result = runner.invoke(main, [
+                "generate", str(minimal_yaml_path), "-o", str(output), "--format", "svg", "--export-format", "all",
+            ])
+        assert result.exit_code == 0, result.output
+        assert output.exists()
+        assert (tmp_path / "arch.mmd").read_text(encoding="utf-8").startswith("flowchart")
+        assert (tmp_path / "arch.puml").read_text(encoding="utf-8").startswith("@startuml")
+        assert (tmp_path / "arch.drawio").read_text(encoding="utf-8").startswith("<mxGraphModel")
+        # Parsed and rendered once for all of them, with the render's layout
+        parse.assert_called_once()
+        self.render.assert_called_once()
+        self.layout.assert_not_called()
+        graph = json.loads((tmp_path / "arch.json").read_text(encoding="utf-8"))["graph"]
+        assert graph["bbox"] == [0.0, 0.0, 120.0, 60.0]
+
+    def test_repeated_and_comma_separated_formats(self, runner, minimal_yaml_path, tmp_path):
+        output = tmp_path / "arch.svg"
+        result = runner.invoke(main, [
+            "generate", str(minimal_yaml_path), "-o", str(output),
+            "--export-format", "mermaid,plantuml", "--export-format", "mermaid",
+        ])
+        assert result.exit_code == 0, result.output
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["arch.mmd", "arch.puml", "arch.svg"]
+        assert self.render.call_args.kwargs["on_layout"] is None
+
+    def test_organized_output(self, runner, minimal_yaml_path, tmp_path):
+        result = runner.invoke(main, [
+            "generate", str(minimal_yaml_path), "-d", str(tmp_path / "out"),
+            "--format", "svg", "--export-format", "mermaid,drawio",
+        ])
+        assert result.exit_code == 0, result.output
+        entry = tmp_path / "out" / "minimal-test"
+        assert (entry / "diagram.svg").exists()
+        assert (entry / "diagram.mmd").exists()
+        assert (entry / "diagram.drawio").exists()
+
+    def test_unknown_format_in_list(self, runner, minimal_yaml_path, tmp_path):
+        result = runner.invoke(main, [
+            "generate", str(minimal_yaml_path), "-o", str(tmp_path / "a.svg"), "--export-format", "mermaid,nope",
+        ])
+        assert result.exit_code == 2
+        self.render.assert_not_called()
+
+
 class TestGeneratePolish:
     def test_generate_with_polish_flag(self, runner, minimal_yaml_path, tmp_path):
         output = tmp_path / "output.svg"
@@ -318,6 +415,62 @@ class TestServe:
         assert result.exit_code == 0
         assert "port" in result.output
 
+    def test_serve_passes_render_options(self, runner, tmp_path):
+        pytest.importorskip("uvicorn")
+        with (
+            patch("redspec.icons.migration.migrate_flat_cache", return_value=False),
+            patch("redspec.web.app.create_app") as create_app,
+            patch("uvicorn.run") as run,
+        ):
+            result = runner.invoke(main, [
+                "serve", "-d", str(tmp_path), "--render-workers", "4", "--render-queue", "8", "--svgz",
+                "--max-render-seconds", "60", "--max-render-memory", "2G", "--client-quota", "30",
+            ])
+        assert result.exit_code == 0, result.output
+        kwargs = create_app.call_args.kwargs
+        assert (kwargs["render_workers"], kwargs["render_queue_size"], kwargs["render_processes"]) == (4, 8, False)
+        assert kwargs["compress_svg"] is True
+        assert (kwargs["max_render_seconds"], kwargs["max_render_memory"], kwargs["client_quota"]) == (60, 2 * 1024**3, 30)
+        run.assert_called_once()
+
+    def test_serve_passes_retention_policy(self, runner, tmp_path):
+        pytest.importorskip("uvicorn")
+        with (
+            patch("redspec.icons.migration.migrate_flat_cache", return_value=False),
+            patch("redspec.web.app.create_app") as create_app,
+            patch("uvicorn.run"),
+        ):
+            result = runner.invoke(main, [
+                "serve", "-d", str(tmp_path), "--max-bytes", "2G", "--max-age", "30d", "--gc-interval", "60",
+            ])
+        assert result.exit_code == 0, result.output
+        kwargs = create_app.call_args.kwargs
+        policy = kwargs["retention"]
+        assert (policy.max_bytes, policy.max_entries, policy.max_age) == (2 * 1024**3, None, 30 * 86400)
+        assert kwargs["gc_interval"] == 60
+
+    def test_serve_multiple_workers(self, runner, tmp_path, monkeypatch):
+        pytest.importorskip("uvicorn")
+        from redspec.web.app import SERVE_CONFIG_ENV
+
+        monkeypatch.delenv(SERVE_CONFIG_ENV, raising=False)
+        with (
+            patch("redspec.icons.migration.migrate_flat_cache", return_value=False),
+            patch("uvicorn.run") as run,
+        ):
+            result = runner.invoke(main, [
+                "serve", "-d", str(tmp_path), "--workers", "2", "--max-entries", "50", "--client-quota", "30",
+            ])
+            config = json.loads(os.environ[SERVE_CONFIG_ENV])
+        assert result.exit_code == 0, result.output
+        assert run.call_args.args == ("redspec.web.app:create_app_from_env",)
+        assert run.call_args.kwargs["factory"] is True
+        assert run.call_args.kwargs["workers"] == 2
+        assert config["shared_state"] is True
+        assert config["output_dir"] == str(tmp_path)
+        assert config["retention"]["max_entries"] == 50
+        assert "--client-quota is counted per worker" in result.output
+
 
 class TestListResources:
     def test_list_resources(self, runner, mock_icon_dir):
@@ -645,6 +798,40 @@ class TestClean:
         assert "File not found" in result.output
 
 
+
+    def test_clean_gc_requires_a_limit(self, runner, tmp_path):
+        out = tmp_path / "output"
+        _make_gallery_entry(out, "my-app")
+        with patch("redspec.icons.migration.migrate_flat_cache", return_value=False):
+            result = runner.invoke(main, ["clean", "-d", str(out), "--gc"])
+        assert result.exit_code != 0
+        assert "--max-bytes" in result.output
+
+    def test_clean_gc_evicts_oldest_unpinned(self, runner, tmp_path):
+        out = tmp_path / "output"
+        _make_gallery_entry(out, "oldest")
+        time.sleep(0.01)
+        _make_gallery_entry(out, "pinned")
+        time.sleep(0.01)
+        _make_gallery_entry(out, "newest")
+        with patch("redspec.icons.migration.migrate_flat_cache", return_value=False):
+            pinned = runner.invoke(main, ["clean", "-d", str(out), "--pin", "pinned"])
+            dry = runner.invoke(main, ["clean", "-d", str(out), "--gc", "--max-entries", "1", "--dry-run"])
+            result = runner.invoke(main, ["clean", "-d", str(out), "--gc", "--max-entries", "1", "-y"])
+        assert "Pinned: pinned" in pinned.output
+        assert "Would remove 2 diagram(s)" in dry.output
+        assert result.exit_code == 0, result.output
+        assert "Removed: oldest/" in result.output
+        assert sorted(p.name for p in out.iterdir() if not p.name.startswith(".")) == ["pinned"]
+
+    def test_clean_gc_rejects_bad_size(self, runner, tmp_path):
+        out = tmp_path / "output"
+        out.mkdir()
+        with patch("redspec.icons.migration.migrate_flat_cache", return_value=False):
+            result = runner.invoke(main, ["clean", "-d", str(out), "--gc", "--max-bytes", "lots"])
+        assert result.exit_code == 2
+        assert "Invalid size" in result.output
+
 class TestWatch:
     def test_watch_help(self, runner):
         with patch("redspec.icons.migration.migrate_flat_cache", return_value=False):
@@ -653,3 +840,23 @@ class TestWatch:
         assert "--port" in result.output
         assert "--no-browser" in result.output
         assert "--format" in result.output
+
+    def test_watch_directory_uses_tree_watcher(self, runner, tmp_path):
+        (tmp_path / "a.yaml").write_text("resources: []\n")
+        with (
+            patch("redspec.icons.migration.migrate_flat_cache", return_value=False),
+            patch("redspec.watch_server.WatchServer") as server_cls,
+            patch("redspec.watcher.watch_tree") as watch_tree,
+        ):
+            result = runner.invoke(
+                main, ["watch", str(tmp_path), "--workers", "3", "-o", str(tmp_path / "out"), "--format", "png"]
+            )
+        assert result.exit_code == 0, result.output
+        kwargs = watch_tree.call_args.kwargs
+        assert kwargs["max_workers"] == 3
+        assert kwargs["out_format"] == "png"
+        assert kwargs["output_dir"] == tmp_path / "out"
+
+        kwargs["on_building"](tmp_path.resolve() / "a.yaml")
+        server_cls.return_value.set_status.assert_called_with("a.yaml", "building")
+        server_cls.return_value.shutdown.assert_called_once()
@@ -1,6 +1,11 @@
 """Tests for draw.io XML export."""
 
-from redspec.exporters.drawio import export_drawio
+import json
+from unittest.mock import MagicMock
+from xml.etree import ElementTree
+
+from redspec.exporters.drawio import decode_compressed, export_drawio, iter_drawio
+from redspec.generator.layout import Layout
 from redspec.models.diagram import DiagramSpec
 
 
@@ -42,3 +47,135 @@ class TestExportDrawio:
         })
         result = export_drawio(spec)
         assert "dashed=1" in result
+
+
+def _layout_json():
+    from redspec.generator.layout import stable_node_id
+
+    return json.dumps({
+        "bb": "0,0,300,200",
+        "_subgraph_cnt": 1,
+        "objects": [
+            {"_gvid": 0, "name": "cluster_rg", "bb": "10,10,200,190"},
+            {"_gvid": 1, "name": stable_node_id("a"), "pos": "100,150", "width": "1", "height": "0.5"},
+            {"_gvid": 2, "name": stable_node_id("b"), "pos": "100,50", "width": "1", "height": "0.5"},
+            {"_gvid": 3, "name": stable_node_id("d"), "pos": "250,100", "width": "0.5", "height": "0.5"},
+        ],
+        "edges": [{
+            "_gvid": 0, "tail": 1, "head": 3,
+            "pos": "e,250,100 100,150 120,150 140,150 150,150 160,150 180,100 250,100",
+        }],
+    })
+
+
+_NESTED = {
+    "resources": [
+        {"type": "azure/resource-group", "name": "rg", "children": [
+            {"type": "azure/vm", "name": "a"},
+            {"type": "azure/vm", "name": "b"},
+        ]},
+        {"type": "azure/vm", "name": "d"},
+    ],
+    "connections": [{"from": "a", "to": "d"}],
+}
+
+
+def _cells(xml):
+    return {cell.get("value") or cell.get("id"): cell for cell in ElementTree.fromstring(xml).iter("mxCell")}
+
+
+def _geometry(cell):
+    geometry = cell.find("mxGeometry")
+    return tuple(float(geometry.get(k)) for k in ("x", "y", "width", "height"))
+
+
+class TestGraphvizGeometry:
+    def test_positions_come_from_layout(self):
+        spec = DiagramSpec.model_validate(_NESTED)
+        cells = _cells(export_drawio(spec, layout=Layout.from_json(_layout_json())))
+
+        # Graphviz's y axis points up; draw.io's points down
+        assert _geometry(cells["rg"]) == (10, 10, 190, 180)
+        # Children are placed relative to their container
+        assert cells["a"].get("parent") == cells["rg"].get("id")
+        assert _geometry(cells["a"]) == (54, 22, 72, 36)
+        assert _geometry(cells["d"]) == (232, 82, 36, 36)
+
+    def test_edge_waypoints(self):
+        spec = DiagramSpec.model_validate(_NESTED)
+        xml = export_drawio(spec, layout=Layout.from_json(_layout_json()))
+        edge = next(c for c in ElementTree.fromstring(xml).iter("mxCell") if c.get("edge"))
+        points = [(float(p.get("x")), float(p.get("y"))) for p in edge.iter("mxPoint")]
+        assert points == [(150, 50)]
+
+    def test_grid_layout_without_graphviz(self):
+        spec = DiagramSpec.model_validate(_NESTED)
+        cells = _cells(export_drawio(spec, use_graphviz=False))
+        rg, a, b = _geometry(cells["rg"]), _geometry(cells["a"]), _geometry(cells["b"])
+        # The container fits its children, which do not overlap
+        assert a[0] + a[2] <= rg[2] and a[1] + a[3] <= rg[3]
+        assert b[0] >= a[0] + a[2] or b[1] >= a[1] + a[3]
+        assert _geometry(cells["d"])[0] >= rg[0] + rg[2]
+
+    def test_zones_become_containers(self):
+        spec = DiagramSpec.model_validate({**_NESTED, "zones": [{"name": "Edge", "resources": ["d"]}]})
+        cells = _cells(export_drawio(spec, use_graphviz=False))
+        assert cells["d"].get("parent") == cells["Edge"].get("id")
+        assert "dashed=1" in cells["Edge"].get("style")
+
+    def test_ids_are_sequential_for_deep_trees(self):
+        resource = {"type": "azure/vm", "name": "leaf"}
+        for depth in range(50):
+            resource = {"type": "azure/resource-group", "name": f"g{depth}", "children": [resource]}
+        spec = DiagramSpec.model_validate({"resources": [resource], "connections": []})
+        cells = list(ElementTree.fromstring(export_drawio(spec, use_graphviz=False)).iter("mxCell"))
+        assert [c.get("id") for c in cells] == [str(i) for i in range(len(cells))]
+        assert cells[-1].get("value") == "leaf"
+        assert cells[-1].get("parent") == cells[-2].get("id")
+
+    def test_icons_are_embedded(self, tmp_path):
+        icon = tmp_path / "vm.svg"
+        icon.write_text('<svg xmlns="http://www.w3.org/2000/svg"/>', encoding="utf-8")
+        registry = MagicMock()
+        registry.resolve.return_value = icon
+        spec = DiagramSpec.model_validate(_NESTED)
+        style = _cells(export_drawio(spec, icon_registry=registry, use_graphviz=False))["a"].get("style")
+        assert "shape=image" in style and "image=data:image/svg+xml,%3Csvg" in style
+
+    def test_compressed_encoding(self):
+        spec = DiagramSpec.model_validate(_NESTED)
+        plain = export_drawio(spec, use_graphviz=False)
+        packed = export_drawio(spec, use_graphviz=False, compressed=True)
+        mxfile = ElementTree.fromstring(packed)
+        assert mxfile.tag == "mxfile"
+        assert decode_compressed(mxfile.find("diagram").text) == plain
+
+
+class TestStreaming:
+    def test_cells_are_written_one_at_a_time(self):
+        spec = DiagramSpec.model_validate({
+            "resources": [{"type": "azure/vm", "name": f"vm{i}"} for i in range(20)],
+            "connections": [],
+        })
+        chunks = list(iter_drawio(spec, use_graphviz=False))
+        assert len(chunks) > 20
+        assert "".join(chunks) == export_drawio(spec, use_graphviz=False)
+
+    def test_names_are_escaped(self):
+        spec = DiagramSpec.model_validate({
+            "diagram": {"name": 'A "quoted" <name>'},
+            "resources": [{"type": "azure/vm", "name": "a & b\nc"}],
+            "connections": [{"from": "a & b\nc", "to": "a & b\nc", "label": "<x>"}],
+        })
+        cells = _cells(export_drawio(spec, use_graphviz=False))
+        assert "a & b\nc" in cells
+        assert ElementTree.fromstring(export_drawio(spec, use_graphviz=False, compressed=True)).find(
+            "diagram").get("name") == 'A "quoted" <name>'
+
+    def test_compressed_stream_is_one_base64_string(self):
+        spec = DiagramSpec.model_validate({
+            "resources": [{"type": "azure/vm", "name": f"vm{i}"} for i in range(500)],
+            "connections": [],
+        })
+        packed = ElementTree.fromstring(export_drawio(spec, use_graphviz=False, compressed=True))
+        assert decode_compressed(packed.find("diagram").text) == export_drawio(spec, use_graphviz=False)
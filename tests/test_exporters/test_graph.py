@@ -0,0 +1,141 @@
+"""Tests for JSON graph and GraphML export."""
+
+import json
+from xml.etree import ElementTree
+
+from redspec.exporters.graph import export_graph_json, export_graphml, iter_graph_json
+from redspec.exporters.registry import ExportOptions, export_text
+from redspec.generator.layout import Layout, stable_node_id
+from redspec.models.diagram import DiagramSpec
+
+_GRAPHML = "{http://graphml.graphdrawing.org/xmlns}"
+
+_SPEC = {
+    "diagram": {"name": "Shop", "direction": "LR"},
+    "zones": [{"name": "Edge", "resources": ["rg"], "style": "dmz"}],
+    "resources": [
+        {"type": "azure/resource-group", "name": "rg", "children": [
+            {"type": "azure/vm", "name": "a", "metadata": {"sku": "B2s", "owner": "ops"}},
+            {"type": "azure/vm", "name": "b", "style": {"color": "#ff0000"}},
+        ]},
+        {"type": "azure/sql-database", "name": "d"},
+    ],
+    "connections": [
+        {"from": "a", "to": "d", "label": "SQL", "style": "dashed", "color": "blue", "minlen": "2"},
+        {"from": "a", "to": "d"},
+    ],
+}
+
+
+def _layout():
+    return Layout.from_json(json.dumps({
+        "bb": "0,0,300,200",
+        "_subgraph_cnt": 2,
+        "objects": [
+            {"_gvid": 0, "name": "cluster_Edge", "bb": "5,5,205,195"},
+            {"_gvid": 1, "name": "cluster_rg", "bb": "10,10,200,190"},
+            {"_gvid": 2, "name": stable_node_id("a"), "pos": "100,150", "width": "1", "height": "0.5"},
+            {"_gvid": 3, "name": stable_node_id("b"), "pos": "100,50", "width": "1", "height": "0.5"},
+            {"_gvid": 4, "name": stable_node_id("d"), "pos": "250,100", "width": "0.5", "height": "0.5"},
+        ],
+        "edges": [
+            {"_gvid": 0, "tail": 2, "head": 4, "pos": "e,250,100 100,150 150,150 200,100 250,100", "lp": "175,140"},
+            {"_gvid": 1, "tail": 2, "head": 4, "pos": "100,150 150,120 200,110 250,100"},
+        ],
+    }))
+
+
+def _spec():
+    return DiagramSpec.model_validate(_SPEC)
+
+
+class TestGraphJson:
+    def test_nodes_and_edges(self):
+        doc = json.loads(export_graph_json(_spec()))
+        assert doc["graph"] == {"name": "Shop", "direction": "LR"}
+        nodes = {node["id"]: node for node in doc["nodes"]}
+        assert [node["id"] for node in doc["nodes"]] == ["rg", "a", "b", "d"]
+        assert nodes["rg"] == {
+            "id": "rg", "type": "azure/resource-group", "metadata": {}, "parent": None, "zone": "Edge", "container": True,
+        }
+        assert nodes["a"]["metadata"] == {"sku": "B2s", "owner": "ops"}
+        assert nodes["a"]["parent"] == "rg"
+        # Nested resources are in their top-level ancestor's zone
+        assert nodes["a"]["zone"] == "Edge"
+        assert nodes["b"]["style"] == {"color": "#ff0000"}
+        assert nodes["d"]["zone"] is None
+        assert doc["zones"] == [{"name": "Edge", "resources": ["rg"], "style": "dmz"}]
+        assert doc["edges"][0] == {
+            "id": "e0", "source": "a", "target": "d", "label": "SQL", "style": "dashed", "color": "blue", "minlen": "2",
+        }
+        assert doc["edges"][1] == {"id": "e1", "source": "a", "target": "d"}
+
+    def test_layout_geometry(self):
+        doc = json.loads(export_graph_json(_spec(), layout=_layout()))
+        nodes = {node["id"]: node for node in doc["nodes"]}
+        # y points down, from the top of the diagram
+        assert doc["graph"]["bbox"] == [0, 0, 300, 200]
+        assert nodes["rg"]["bbox"] == [10, 10, 190, 180]
+        assert nodes["a"]["bbox"] == [64, 32, 72, 36]
+        assert nodes["d"]["bbox"] == [232, 82, 36, 36]
+        assert doc["zones"][0]["bbox"] == [5, 5, 200, 190]
+
+        first, second = doc["edges"]
+        assert first["points"] == [[100, 50], [150, 50], [200, 100], [250, 100]]
+        assert first["label_pos"] == [175, 60]
+        # Parallel edges keep their own routes
+        assert second["points"][1] == [150, 80]
+        assert "label_pos" not in second
+
+    def test_streams_one_record_per_chunk(self):
+        spec = DiagramSpec.model_validate({"resources": [{"type": "azure/vm", "name": f"vm{i}"} for i in range(10)]})
+        chunks = list(iter_graph_json(spec))
+        assert len(chunks) > 10
+        assert len(json.loads("".join(chunks))["nodes"]) == 10
+
+
+class TestGraphml:
+    def test_document(self):
+        root = ElementTree.fromstring(export_graphml(_spec(), layout=_layout()))
+        keys = {(k.get("for"), k.get("id")) for k in root.iter(_GRAPHML + "key")}
+        assert {("node", "type"), ("node", "x"), ("edge", "label"), ("edge", "points")} <= keys
+
+        def data(element):
+            return {d.get("key"): d.text for d in element.iter(_GRAPHML + "data")}
+
+        nodes = {n.get("id"): data(n) for n in root.iter(_GRAPHML + "node")}
+        assert nodes["a"]["type"] == "azure/vm"
+        assert json.loads(nodes["a"]["metadata"]) == {"sku": "B2s", "owner": "ops"}
+        assert nodes["a"]["parent"] == "rg"
+        assert nodes["rg"]["container"] == "true"
+        assert (nodes["a"]["x"], nodes["a"]["y"], nodes["a"]["width"]) == ("64", "32", "72")
+        assert "parent" not in nodes["rg"]
+
+        edge = next(root.iter(_GRAPHML + "edge"))
+        assert (edge.get("source"), edge.get("target")) == ("a", "d")
+        assert data(edge)["points"] == "100,50 150,50 200,100 250,100"
+        assert data(edge)["style"] == "dashed"
+
+    def test_escaping(self):
+        spec = DiagramSpec.model_validate({
+            "diagram": {"name": 'A "B" & <C>'},
+            "resources": [{"type": "azure/vm", "name": "x<&>\"y", "metadata": {"note": "a\nb"}}],
+            "connections": [{"from": "x<&>\"y", "to": "x<&>\"y", "label": "<l>"}],
+        })
+        root = ElementTree.fromstring(export_graphml(spec))
+        node = next(root.iter(_GRAPHML + "node"))
+        assert node.get("id") == 'x<&>"y'
+        data = {d.get("key"): d.text for d in node.iter(_GRAPHML + "data")}
+        assert json.loads(data["metadata"]) == {"note": "a\nb"}
+        assert root.find(_GRAPHML + "graph").get("id") == 'A "B" & <C>'
+
+
+class TestRegistered:
+    def test_formats_use_the_given_layout(self):
+        options = ExportOptions(layout=_layout())
+        assert json.loads(export_text("json", _spec(), options))["graph"]["bbox"] == [0, 0, 300, 200]
+        assert 'key="x"' in export_text("graphml", _spec(), options)
+
+    def test_without_graphviz_there_is_no_geometry(self):
+        doc = json.loads(export_text("json", _spec(), ExportOptions(use_graphviz=False)))
+        assert all("bbox" not in node for node in doc["nodes"])
@@ -0,0 +1,87 @@
+"""Tests for the exporter registry."""
+
+import io
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from redspec.exceptions import ExportFormatNotFoundError
+from redspec.exporters import registry
+from redspec.exporters.mermaid import export_mermaid
+from redspec.exporters.registry import (
+    Exporter,
+    ExportOptions,
+    export_text,
+    exporter_names,
+    get_exporter,
+    iter_export,
+    register_exporter,
+    write_export,
+)
+from redspec.models.diagram import DiagramSpec
+
+_SPEC = DiagramSpec.model_validate({
+    "resources": [{"type": "azure/vm", "name": f"vm{i}"} for i in range(50)],
+    "connections": [{"from": "vm0", "to": "vm1", "label": "link"}],
+})
+
+
+def _lines(spec, options):
+    yield from (f"{r.name}\n" for r in spec.resources)
+
+
+@pytest.fixture
+def clean_registry(monkeypatch):
+    """Isolate registrations and plugin loading made by a test."""
+    monkeypatch.setattr(registry, "_EXPORTERS", dict(registry._EXPORTERS))
+    monkeypatch.setattr(registry, "_plugins_loaded", False)
+
+
+class TestRegistry:
+    def test_builtin_formats(self, clean_registry):
+        with patch("redspec.exporters.registry.entry_points", return_value=[]):
+            assert exporter_names() == ["mermaid", "plantuml", "drawio", "json", "graphml"]
+        assert get_exporter("drawio").uses_layout
+
+    def test_unknown_format(self, clean_registry):
+        with patch("redspec.exporters.registry.entry_points", return_value=[]), \
+             pytest.raises(ExportFormatNotFoundError, match="available: mermaid"):
+            get_exporter("nope")
+
+    def test_register(self, clean_registry):
+        register_exporter(Exporter("names", _lines))
+        assert export_text("names", _SPEC).startswith("vm0\nvm1\n")
+        with pytest.raises(ValueError):
+            register_exporter(Exporter("names", _lines))
+        register_exporter(Exporter("names", _lines, extension=".lst"), replace=True)
+        assert get_exporter("names").extension == ".lst"
+
+    def test_plugins_from_entry_points(self, clean_registry):
+        good = MagicMock(value="pkg:NAMES")
+        good.load.return_value = Exporter("names", _lines)
+        clash = MagicMock(value="pkg:MERMAID")
+        clash.load.return_value = Exporter("mermaid", _lines)
+        broken = MagicMock(value="pkg:BROKEN")
+        broken.load.side_effect = ImportError("missing")
+        with patch("redspec.exporters.registry.entry_points", return_value=[good, clash, broken]) as eps:
+            assert exporter_names() == ["mermaid", "plantuml", "drawio", "json", "graphml", "names"]
+            exporter_names()
+        eps.assert_called_once_with(group="redspec.exporters")
+        assert get_exporter("mermaid").iter_chunks is not _lines
+
+
+class TestStreaming:
+    def test_write_export_matches_string_export(self):
+        stream = io.StringIO()
+        write_export("mermaid", _SPEC, stream)
+        assert stream.getvalue() == export_mermaid(_SPEC)
+
+    def test_chunks_are_joined_up_to_the_chunk_size(self):
+        chunks = list(iter_export("mermaid", _SPEC, chunk_size=100))
+        assert "".join(chunks) == export_mermaid(_SPEC)
+        assert len(chunks) > 1
+        assert all(len(chunk) >= 100 for chunk in chunks[:-1])
+
+    def test_options_reach_the_exporter(self):
+        text = export_text("drawio", _SPEC, ExportOptions(use_graphviz=False, compressed=True))
+        assert text.startswith("<mxfile")
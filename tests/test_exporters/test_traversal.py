@@ -0,0 +1,52 @@
+"""Tests for the shared exporter traversal."""
+
+from redspec.exporters.traversal import ENTER, EXIT, LEAF, edge_ordinals, walk_resources
+from redspec.models.diagram import DiagramSpec
+from redspec.models.resource import ResourceDef
+
+
+class TestWalkResources:
+    def test_document_order(self):
+        spec = DiagramSpec.model_validate({
+            "resources": [
+                {
+                    "type": "azure/vnet",
+                    "name": "vnet",
+                    "children": [
+                        {"type": "azure/vm", "name": "a"},
+                        {"type": "azure/subnet", "name": "sub", "children": [{"type": "azure/vm", "name": "b"}]},
+                    ],
+                },
+                {"type": "azure/vm", "name": "c"},
+            ],
+        })
+        steps = [(v.kind, v.resource.name, v.depth, v.parent.name if v.parent else None)
+                 for v in walk_resources(spec.resources)]
+        assert steps == [
+            (ENTER, "vnet", 0, None),
+            (LEAF, "a", 1, "vnet"),
+            (ENTER, "sub", 1, "vnet"),
+            (LEAF, "b", 2, "sub"),
+            (EXIT, "sub", 1, "vnet"),
+            (EXIT, "vnet", 0, None),
+            (LEAF, "c", 0, None),
+        ]
+
+    def test_deep_tree_does_not_recurse(self):
+        # Deeper than the interpreter's recursion limit
+        node = ResourceDef(type="azure/vm", name="leaf")
+        for i in range(5000):
+            node = ResourceDef.model_construct(type="azure/vnet", name=f"n{i}", children=[node], metadata={}, style=None)
+        visits = list(walk_resources([node]))
+        assert len(visits) == 2 * 5000 + 1
+        assert visits[5000].kind == LEAF
+        assert visits[5000].depth == 5000
+
+
+class TestEdgeOrdinals:
+    def test_parallel_edges_are_numbered(self):
+        spec = DiagramSpec.model_validate({
+            "resources": [{"type": "azure/vm", "name": "a"}, {"type": "azure/vm", "name": "b"}],
+            "connections": [{"from": "a", "to": "b"}, {"from": "b", "to": "a"}, {"from": "a", "to": "b"}],
+        })
+        assert [ordinal for _conn, ordinal in edge_ordinals(spec.connections)] == [0, 0, 1]
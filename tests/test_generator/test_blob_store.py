@@ -0,0 +1,127 @@
+"""Tests for the content-addressed gallery blob store."""
+
+import os
+import threading
+import time
+
+import pytest
+
+from redspec.generator import blob_store
+from redspec.generator.blob_store import (
+    BlobStore,
+    detach,
+    hash_file,
+    slug_lock,
+    write_atomic,
+)
+
+
+@pytest.fixture
+def no_grace(monkeypatch):
+    monkeypatch.setattr(blob_store, "_PRUNE_GRACE_SECONDS", -1.0)
+
+
+class TestBlobStore:
+    def test_put_stores_once(self, tmp_path):
+        store = BlobStore(tmp_path)
+        a = tmp_path / "a.svg"
+        b = tmp_path / "b.svg"
+        a.write_text("<svg/>")
+        b.write_text("<svg/>")
+
+        digest = store.put(a)
+        assert store.put(b) == digest == hash_file(a)
+        assert [p.name for p in store.root.glob("*/*")] == [digest]
+        assert store.path(digest).stat().st_mode & 0o777 == 0o444
+
+    def test_put_move_renames_source(self, tmp_path):
+        store = BlobStore(tmp_path)
+        src = tmp_path / "gen.png"
+        src.write_bytes(b"png")
+        digest = store.put(src, move=True)
+        assert not src.exists()
+        assert store.path(digest).read_bytes() == b"png"
+
+    def test_link_shares_inode(self, tmp_path):
+        store = BlobStore(tmp_path)
+        src = tmp_path / "gen.png"
+        src.write_bytes(b"png")
+        digest = store.put(src)
+        (tmp_path / "one").mkdir()
+        (tmp_path / "two").mkdir()
+        store.link(digest, tmp_path / "one" / "diagram.png")
+        store.link(digest, tmp_path / "two" / "diagram.png")
+
+        assert os.path.samefile(tmp_path / "one" / "diagram.png", tmp_path / "two" / "diagram.png")
+        assert store.path(digest).stat().st_nlink == 3
+
+    def test_link_replaces_atomically(self, tmp_path):
+        store = BlobStore(tmp_path)
+        dest = tmp_path / "diagram.svg"
+        dest.write_text("old")
+        src = tmp_path / "gen.svg"
+        src.write_text("new")
+        store.link(store.put(src), dest)
+        assert dest.read_text() == "new"
+        assert not [p for p in tmp_path.iterdir() if p.name.startswith(".tmp-")]
+
+    def test_release_and_prune(self, tmp_path, no_grace):
+        store = BlobStore(tmp_path)
+        src = tmp_path / "gen.svg"
+        src.write_text("x")
+        kept = store.put(src)
+        store.link(kept, tmp_path / "linked.svg")
+        src.write_text("y")
+        orphan = store.put(src)
+
+        store.release(kept)
+        assert store.path(kept).exists()
+        assert store.prune() == 1
+        assert not store.path(orphan).exists()
+
+    def test_prune_keeps_recent_blobs(self, tmp_path):
+        store = BlobStore(tmp_path)
+        src = tmp_path / "gen.svg"
+        src.write_text("x")
+        digest = store.put(src)
+        assert store.prune() == 0
+        assert store.path(digest).exists()
+
+
+class TestHelpers:
+    def test_write_atomic(self, tmp_path):
+        target = tmp_path / "metadata.json"
+        write_atomic(target, "{}")
+        write_atomic(target, b"[]")
+        assert target.read_text() == "[]"
+        assert [p.name for p in tmp_path.iterdir()] == ["metadata.json"]
+
+    def test_detach_breaks_link(self, tmp_path):
+        store = BlobStore(tmp_path)
+        src = tmp_path / "spec.src"
+        src.write_text("a: 1\n")
+        digest = store.put(src)
+        spec = tmp_path / "spec.yaml"
+        store.link(digest, spec)
+
+        detach(spec)
+        spec.write_text("a: 2\n")
+        assert store.path(digest).read_text() == "a: 1\n"
+
+    def test_slug_lock_serialises(self, tmp_path):
+        active = []
+        overlaps = []
+
+        def writer():
+            with slug_lock(tmp_path, "demo"):
+                active.append(1)
+                overlaps.append(len(active))
+                time.sleep(0.01)
+                active.pop()
+
+        threads = [threading.Thread(target=writer) for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert overlaps == [1] * 5
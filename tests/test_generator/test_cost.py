@@ -0,0 +1,75 @@
+"""Tests for render cost estimation."""
+
+import pytest
+
+from redspec.generator.cost import CostModel, SpecFeatures
+from redspec.models.diagram import DiagramSpec
+
+
+def _spec(**diagram):
+    return DiagramSpec.model_validate({
+        "diagram": {"name": "Cost", **diagram},
+        "resources": [
+            {"type": "azure/vnet", "name": "vnet", "children": [
+                {"type": "azure/subnet", "name": "subnet", "children": [
+                    {"type": "azure/vm", "name": "vm1"},
+                    {"type": "azure/vm", "name": "vm2"},
+                ]},
+            ]},
+            {"type": "azure/sql", "name": "db"},
+        ],
+        "connections": [{"from": "vm1", "to": "db"}, {"from": "vm2", "to": "db"}],
+        "zones": [{"name": "Data", "resources": ["db"]}],
+    })
+
+
+class TestSpecFeatures:
+    def test_measures_spec(self):
+        features = SpecFeatures.from_spec(_spec(dpi=300), "svg")
+        assert (features.nodes, features.edges, features.clusters, features.depth) == (3, 2, 3, 3)
+        assert features.splines == "ortho"
+        assert (features.dpi, features.out_format) == (300, "svg")
+
+
+class TestCostModel:
+    def test_bigger_specs_cost_more(self):
+        model = CostModel()
+        small = model.estimate(SpecFeatures(nodes=10, edges=10))
+        big = model.estimate(SpecFeatures(nodes=1000, edges=1000))
+        assert big.seconds > small.seconds * 100  # superlinear
+        assert big.memory_bytes > small.memory_bytes
+
+    def test_orthogonal_edges_and_dpi_cost_more(self):
+        model = CostModel()
+        ortho = model.estimate(SpecFeatures(nodes=100, edges=200, splines="ortho"))
+        line = model.estimate(SpecFeatures(nodes=100, edges=200, splines="line"))
+        assert ortho.seconds > line.seconds
+
+        svg = model.estimate(SpecFeatures(nodes=100, out_format="svg", dpi=600))
+        png = model.estimate(SpecFeatures(nodes=100, out_format="png", dpi=600))
+        assert png.memory_bytes > svg.memory_bytes and png.seconds > svg.seconds
+
+    def test_calibrates_by_median_ratio(self):
+        features = SpecFeatures(nodes=50, edges=60)
+        predicted = CostModel().estimate(features).seconds
+        model = CostModel()
+        for factor in (2.0, 3.0, 100.0):  # one outlier
+            model.record(features, predicted * factor)
+        assert model.scale == pytest.approx(3.0)
+        assert model.estimate(features).seconds == pytest.approx(predicted * 3.0)
+
+    def test_ignores_meaningless_samples(self):
+        model = CostModel()
+        model.record(SpecFeatures(nodes=5), 0.0)
+        assert (model.samples, model.scale) == (0, 1.0)
+
+    def test_save_and_load(self, tmp_path):
+        model = CostModel.calibrated([(SpecFeatures(nodes=20), 5.0)])
+        path = tmp_path / "model.json"
+        model.save(path)
+        assert CostModel.load(path).scale == pytest.approx(model.scale)
+
+    def test_load_missing_or_damaged(self, tmp_path):
+        assert CostModel.load(tmp_path / "missing.json").scale == 1.0
+        (tmp_path / "bad.json").write_text("[1, 2", encoding="utf-8")
+        assert CostModel.load(tmp_path / "bad.json").samples == 0
@@ -0,0 +1,145 @@
+"""Tests for Graphviz invocation and multi-graph output splitting."""
+
+import json
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import pytest
+
+from redspec.exceptions import GraphvizError, RenderCancelledError
+from redspec.generator import dot_runner
+from redspec.generator.dot_runner import pipe, run_dot_batch, split_output
+from redspec.generator.pipeline import generate_batch
+from redspec.generator.renderer import prepare_render
+from redspec.models.diagram import DiagramSpec
+
+
+def _png(payload: bytes) -> bytes:
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 0, 0, 0, 0))
+        # Payload deliberately contains an IEND lookalike
+        + chunk(b"IDAT", payload + b"IEND")
+        + chunk(b"IEND", b"")
+    )
+
+
+def _spec(name: str) -> DiagramSpec:
+    return DiagramSpec.model_validate({
+        "diagram": {"name": name},
+        "resources": [{"type": "azure/vm", "name": f"{name}-vm"}],
+    })
+
+
+class TestSplitOutput:
+    def test_split_svg(self):
+        doc = b'<?xml version="1.0"?>\n<svg><text>a &lt;?xml</text></svg>\n'
+        parts = split_output(doc * 3, "svg")
+        assert parts == [doc, doc, doc]
+
+    def test_split_png(self):
+        first, second = _png(b"one"), _png(b"two")
+        assert split_output(first + second, "png") == [first, second]
+
+    def test_split_truncated_png_raises(self):
+        with pytest.raises(GraphvizError):
+            split_output(_png(b"one")[:-6], "png")
+
+    def test_split_json(self):
+        docs = [json.dumps({"name": "a"}), json.dumps({"name": "b", "objects": [{"x": "}"}]})]
+        parts = split_output("\n".join(docs).encode(), "json")
+        assert [json.loads(p) for p in parts] == [json.loads(d) for d in docs]
+
+    def test_split_pdf_unsupported(self):
+        with pytest.raises(GraphvizError):
+            split_output(b"%PDF-1.5", "pdf")
+
+
+class TestPipe:
+    @pytest.fixture
+    def slow_engine(self, tmp_path):
+        script = tmp_path / "slow-dot"
+        script.write_text("#!/bin/sh\nexec sleep 10\n")
+        script.chmod(0o755)
+        return str(script)
+
+    def test_missing_executable(self):
+        with pytest.raises(GraphvizError, match="not found"):
+            pipe("digraph {}", "svg", engine="redspec-no-such-dot")
+
+    def test_cancel_kills_running_process(self, slow_engine):
+        cancel = threading.Event()
+        threading.Timer(0.1, cancel.set).start()
+        start = time.monotonic()
+        with pytest.raises(RenderCancelledError):
+            pipe("digraph {}", "svg", engine=slow_engine, cancel_event=cancel)
+        assert time.monotonic() - start < 5
+
+    def test_already_cancelled_does_not_start(self):
+        cancel = threading.Event()
+        cancel.set()
+        with pytest.raises(RenderCancelledError):
+            pipe("digraph {}", "svg", engine="redspec-no-such-dot", cancel_event=cancel)
+
+
+class TestRunDotBatch:
+    def test_writes_one_file_per_graph(self, tmp_path, monkeypatch):
+        doc = b"<?xml version='1.0'?><svg/>\n"
+        monkeypatch.setattr(dot_runner, "pipe", lambda source, fmt, engine="dot": doc * 2)
+        outputs = [tmp_path / "a.svg", tmp_path / "sub" / "b.svg"]
+        run_dot_batch(["digraph a {}", "digraph b {}"], "svg", outputs)
+        assert all(p.read_bytes() == doc for p in outputs)
+
+    def test_document_count_mismatch_raises(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(dot_runner, "pipe", lambda source, fmt, engine="dot": b"<?xml?><svg/>")
+        with pytest.raises(GraphvizError):
+            run_dot_batch(["digraph a {}", "digraph b {}"], "svg", [tmp_path / "a.svg", tmp_path / "b.svg"])
+
+
+class TestPrepareRender:
+    def test_builds_dot_source_without_graphviz(self, tmp_path):
+        job = prepare_render(_spec("prep"), str(tmp_path / "prep.svg"), out_format="svg")
+        assert job.source.startswith("digraph")
+        assert "prep-vm" in job.source
+        assert job.output == tmp_path / "prep.svg"
+        assert not job.output.exists()
+
+
+class TestGenerateBatch:
+    def test_falls_back_to_single_renders(self, tmp_path, monkeypatch):
+        def failing_batch(*args, **kwargs):
+            raise GraphvizError("syntax error in graph 2")
+
+        def fake_run_dot(source, out_format, output_path):
+            if "bad-vm" in source:
+                raise GraphvizError("bad graph")
+            Path(output_path).write_text("<svg/>")
+            return output_path
+
+        monkeypatch.setattr("redspec.generator.pipeline.run_dot_batch", failing_batch)
+        monkeypatch.setattr("redspec.generator.pipeline.run_dot", fake_run_dot)
+
+        jobs = [(_spec(n), str(tmp_path / f"{n}.png")) for n in ("good", "bad", "fine")]
+        results = generate_batch(jobs, out_format="png")
+
+        assert isinstance(results[0], Path) and results[0].exists()
+        assert isinstance(results[1], GraphvizError)
+        assert isinstance(results[2], Path)
+
+    def test_invalid_spec_reported_in_place(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(
+            "redspec.generator.pipeline.run_dot",
+            lambda source, fmt, out: Path(out).write_text("x") and out,
+        )
+        dup = DiagramSpec.model_validate({
+            "resources": [{"type": "azure/vm", "name": "x"}, {"type": "azure/vm", "name": "x"}],
+        })
+        results = generate_batch([(dup, str(tmp_path / "dup.png")), (_spec("ok"), str(tmp_path / "ok.png"))])
+        assert isinstance(results[0], Exception)
+        assert isinstance(results[1], Path)
@@ -0,0 +1,150 @@
+"""Tests for the SQLite gallery index."""
+
+import json
+import shutil
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from redspec.generator.gallery_index import GalleryIndex
+from redspec.generator.output_organizer import (
+    list_gallery,
+    organize_output,
+    query_gallery,
+    record_view,
+    update_gallery_entry,
+)
+
+
+def _add(tmp_path, output_dir, name, resources=(), timestamp=None, **meta):
+    gen = tmp_path / "gen.svg"
+    gen.write_text("<svg/>")
+    spec = tmp_path / "spec.yaml"
+    lines = [f"diagram:\n  name: {name}\nresources:"]
+    lines += [f"  - type: {rtype}\n    name: {rname}" for rtype, rname in resources]
+    spec.write_text("\n".join(lines) + "\n")
+    result = organize_output(gen, spec, output_dir, name, format="svg", **meta)
+    if timestamp:
+        meta_file = result.parent / "metadata.json"
+        data = json.loads(meta_file.read_text())
+        data["timestamp"] = timestamp
+        meta_file.write_text(json.dumps(data))
+        update_gallery_entry(output_dir, result.parent.name)
+    return result.parent.name
+
+
+@pytest.fixture
+def gallery(tmp_path):
+    out = tmp_path / "output"
+    _add(tmp_path, out, "Hub Network", [("azure/vnet", "hub-vnet"), ("azure/firewall", "fw")],
+         timestamp="2025-01-01T00:00:00", theme="dark")
+    _add(tmp_path, out, "Web App", [("azure/app-service", "frontend"), ("azure/sql-database", "orders-db")],
+         timestamp="2025-03-01T00:00:00")
+    _add(tmp_path, out, "Data Platform", [("azure/sql-database", "warehouse")],
+         timestamp="2025-02-01T00:00:00")
+    return out
+
+
+class TestGalleryIndex:
+    def test_organize_output_indexes_entry(self, gallery):
+        assert GalleryIndex(gallery).path.is_file()
+        assert [e["slug"] for e in list_gallery(gallery)] == ["web-app", "data-platform", "hub-network"]
+
+    def test_sort_and_paginate(self, gallery):
+        entries, total = query_gallery(gallery, sort="name", descending=False, limit=2)
+        assert total == 3
+        assert [e["name"] for e in entries] == ["Data Platform", "Hub Network"]
+        entries, _ = query_gallery(gallery, sort="name", descending=False, limit=2, offset=2)
+        assert [e["name"] for e in entries] == ["Web App"]
+
+    @pytest.mark.parametrize("q,expected", [
+        ("hub", ["hub-network"]),  # diagram name
+        ("orders", ["web-app"]),  # resource name, prefix match
+        ("azure/sql-database", ["web-app", "data-platform"]),  # resource type
+        ("dark", ["hub-network"]),  # metadata
+        ("sql warehouse", ["data-platform"]),  # every word must match
+        ('nothing"here', []),
+    ])
+    def test_search(self, gallery, q, expected):
+        entries, total = query_gallery(gallery, q=q)
+        assert [e["slug"] for e in entries] == expected
+        assert total == len(expected)
+
+    def test_delete_and_refresh(self, gallery):
+        shutil.rmtree(gallery / "hub-network")
+        update_gallery_entry(gallery, "hub-network")
+        assert query_gallery(gallery, q="hub")[1] == 0
+
+    def test_picks_up_changes_made_behind_its_back(self, gallery, tmp_path):
+        shutil.rmtree(gallery / "web-app")
+        extra = gallery / "manual"
+        extra.mkdir()
+        (extra / "metadata.json").write_text(json.dumps({"name": "Manual", "timestamp": "2026-01-01"}))
+        assert [e["slug"] for e in list_gallery(gallery)] == ["manual", "data-platform", "hub-network"]
+
+    def test_rebuilds_corrupt_index(self, gallery):
+        GalleryIndex(gallery).path.write_bytes(b"not a database" * 100)
+        assert len(list_gallery(gallery)) == 3
+
+    def test_unchanged_directory_is_not_rescanned(self, gallery, monkeypatch):
+        list_gallery(gallery)
+        mtime = gallery.stat().st_mtime_ns
+        scans = []
+        iterdir = Path.iterdir
+
+        def counting_iterdir(self):
+            if self == gallery:
+                scans.append(self)
+            return iterdir(self)
+
+        monkeypatch.setattr(Path, "iterdir", counting_iterdir)
+        for _ in range(3):
+            assert len(list_gallery(gallery)) == 3
+        assert scans == []
+        # The index's own writes leave the directory alone
+        assert gallery.stat().st_mtime_ns == mtime
+
+    def test_first_write_indexes_existing_entries(self, tmp_path):
+        out = tmp_path / "output"
+        for slug in ("one", "two"):
+            (out / slug).mkdir(parents=True)
+            (out / slug / "metadata.json").write_text(json.dumps({"name": slug}))
+        GalleryIndex(out).refresh("one")
+        assert sorted(e["slug"] for e in GalleryIndex(out).usage()) == ["one", "two"]
+
+    def test_rebuild(self, gallery):
+        GalleryIndex(gallery).rebuild()
+        assert query_gallery(gallery, q="firewall")[0][0]["slug"] == "hub-network"
+
+    def test_rejects_unknown_sort(self, gallery):
+        with pytest.raises(ValueError):
+            query_gallery(gallery, sort="metadata; DROP TABLE entries")
+
+
+class TestIndexErrors:
+    def test_locked_index_is_kept(self, gallery, tmp_path, monkeypatch):
+        def locked(self, *args):
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(GalleryIndex, "upsert", locked)
+        with pytest.raises(sqlite3.OperationalError):
+            _add(tmp_path, gallery, "Another")
+        assert GalleryIndex(gallery).path.is_file()
+
+    def test_corrupt_index_is_dropped(self, gallery, tmp_path, monkeypatch):
+        def corrupt(self, *args):
+            raise sqlite3.DatabaseError("database disk image is malformed")
+
+        monkeypatch.setattr(GalleryIndex, "upsert", corrupt)
+        _add(tmp_path, gallery, "Another")
+        assert not GalleryIndex(gallery).path.exists()
+        monkeypatch.undo()
+        assert len(list_gallery(gallery)) == 4
+
+    def test_locked_index_does_not_fail_views(self, gallery, monkeypatch):
+        def locked(self, *args):
+            raise sqlite3.OperationalError("database is locked")
+
+        monkeypatch.setattr(GalleryIndex, "touch", locked)
+        record_view(gallery, "web-app")
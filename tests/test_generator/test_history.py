@@ -0,0 +1,95 @@
+"""Tests for gallery revision history."""
+
+import json
+
+from redspec.generator import history
+from redspec.generator.history import (
+    HISTORY_DIRNAME,
+    read_revisions,
+    revision_artifact,
+    revision_spec,
+)
+from redspec.generator.output_organizer import organize_output, remove_gallery_entry
+
+
+def _spec(n_resources, extra=""):
+    lines = ["diagram:\n", "  name: Demo\n", "resources:\n"]
+    lines += [f"  - type: azure/vm\n    name: vm{i}\n" for i in range(n_resources)]
+    return "".join(lines) + extra
+
+
+def _save(tmp_path, spec_text, diagram, **kwargs):
+    gen = tmp_path / "gen.svg"
+    gen.write_text(diagram)
+    spec = tmp_path / "spec.yaml"
+    spec.write_text(spec_text)
+    return organize_output(gen, spec, tmp_path / "output", "Demo", theme="dark", format="svg", **kwargs)
+
+
+class TestDelta:
+    def test_round_trip(self):
+        old = "a\nb\nc\nd\n"
+        new = "a\nB\nc\nd\ne"
+        ops = history._encode_delta(old, new)
+        assert history._apply_delta(old, ops) == new
+        assert [0, 1] in ops
+
+    def test_empty_texts(self):
+        assert history._apply_delta("", history._encode_delta("", "x\n")) == "x\n"
+        assert history._apply_delta("x\n", history._encode_delta("x\n", "")) == ""
+
+
+class TestHistory:
+    def test_revisions_reconstruct_every_spec(self, tmp_path):
+        texts = [_spec(50, f"# edit {i}\n") for i in range(40)]
+        for i, text in enumerate(texts):
+            result = _save(tmp_path, text, f"<svg>{i}</svg>")
+        slug_dir = result.parent
+
+        revisions = read_revisions(slug_dir)
+        assert [r["revision"] for r in revisions] == list(range(1, 41))
+        assert revisions[-1]["theme"] == "dark"
+        for i, text in enumerate(texts, start=1):
+            assert revision_spec(slug_dir, i) == text
+        assert revision_spec(slug_dir, 41) is None
+
+    def test_history_costs_about_the_edits(self, tmp_path):
+        for i in range(20):
+            result = _save(tmp_path, _spec(200, f"# edit {i}\n"), f"<svg>{i}</svg>")
+        history_dir = result.parent / HISTORY_DIRNAME
+        spec_bytes = sum(p.stat().st_size for p in history_dir.glob("*.spec"))
+        # Two compressed snapshots (revisions 1 and 17) plus small deltas
+        assert spec_bytes < 20 * len(_spec(200)) / 10
+
+    def test_only_recent_artifacts_are_kept(self, tmp_path, monkeypatch):
+        from redspec.generator import blob_store
+
+        monkeypatch.setattr(blob_store, "_PRUNE_GRACE_SECONDS", -1.0)
+        for i in range(5):
+            result = _save(tmp_path, _spec(3, f"# {i}\n"), f"<svg>{i}</svg>", history_artifacts=2)
+        slug_dir = result.parent
+        revisions = read_revisions(slug_dir)
+        assert [r["artifact"] for r in revisions] == [False, False, False, True, True]
+        assert revision_artifact(slug_dir, revisions[0]) is None
+        assert revision_artifact(slug_dir, revisions[3]).read_text() == "<svg>3</svg>"
+        # Diagrams of revisions 4 and 5, and the current spec
+        assert len(list((tmp_path / "output" / ".blobs").glob("*/*"))) == 3
+
+    def test_unchanged_save_adds_no_revision(self, tmp_path):
+        _save(tmp_path, _spec(3), "<svg/>")
+        result = _save(tmp_path, _spec(3), "<svg/>")
+        assert len(read_revisions(result.parent)) == 1
+
+    def test_remove_releases_history_blobs(self, tmp_path, monkeypatch):
+        from redspec.generator import blob_store
+
+        monkeypatch.setattr(blob_store, "_PRUNE_GRACE_SECONDS", -1.0)
+        for i in range(3):
+            _save(tmp_path, _spec(3, f"# {i}\n"), f"<svg>{i}</svg>")
+        remove_gallery_entry(tmp_path / "output", "demo")
+        assert not list((tmp_path / "output" / ".blobs").glob("*/*"))
+
+    def test_manifest_is_json(self, tmp_path):
+        result = _save(tmp_path, _spec(1), "<svg/>")
+        manifest = json.loads((result.parent / HISTORY_DIRNAME / "revisions.json").read_text())
+        assert manifest[0]["content_hash"] == json.loads((result.parent / "metadata.json").read_text())["content_hash"]
@@ -0,0 +1,229 @@
+"""Tests for change classification, layout reuse and incremental rendering."""
+
+import json
+import shutil
+
+import pytest
+
+from redspec.exceptions import GraphvizError, RenderCancelledError
+from redspec.generator import incremental
+from redspec.generator.incremental import (
+    ChangeLevel,
+    IncrementalRenderer,
+    classify_change,
+)
+from redspec.generator.layout import Layout, stable_node_id
+from redspec.generator.renderer import prepare_render
+from redspec.models.diagram import DiagramSpec
+
+
+def _spec(**overrides) -> DiagramSpec:
+    data = {
+        "diagram": {"name": "Inc", "theme": "default"},
+        "resources": [
+            {"type": "azure/vnet", "name": "vnet", "children": [{"type": "azure/vm", "name": "vm"}]},
+            {"type": "azure/sql-database", "name": "db"},
+        ],
+        "connections": [{"from": "vm", "to": "db", "label": "SQL", "color": "#000000"}],
+    }
+    for key, value in overrides.items():
+        section, _, field = key.partition("__")
+        if field:
+            data[section] = {**data[section], field: value}
+        else:
+            data[section] = value
+    return DiagramSpec.model_validate(data)
+
+
+def _layout_json() -> str:
+    vm, db = stable_node_id("vm"), stable_node_id("db")
+    return json.dumps({
+        "name": "Inc",
+        "bb": "0,0,300,200",
+        "_subgraph_cnt": 1,
+        "objects": [
+            {"_gvid": 0, "name": "cluster_vnet", "bb": "10,10,120,190", "lp": "65,180", "nodes": [1]},
+            {"_gvid": 1, "name": vm, "pos": "60,100"},
+            {"_gvid": 2, "name": db, "pos": "240,100"},
+        ],
+        "edges": [
+            {"_gvid": 0, "tail": 1, "head": 2, "pos": "e,220,100 80,100 150,100 220,100", "lp": "150,110"},
+        ],
+    })
+
+
+class TestClassifyChange:
+    def test_first_render_needs_layout(self):
+        assert classify_change(None, _spec()) == ChangeLevel.RELAYOUT
+
+    def test_identical(self):
+        assert classify_change(_spec(), _spec()) == ChangeLevel.NONE
+
+    @pytest.mark.parametrize("key,value", [
+        ("diagram__polish", {"preset": "premium"}),
+        ("diagram__animation", "flow"),
+    ])
+    def test_postprocess_only(self, key, value):
+        assert classify_change(_spec(), _spec(**{key: value})) == ChangeLevel.POSTPROCESS
+
+    def test_edge_color_and_label_text_reuse_layout(self):
+        conns = [{"from": "vm", "to": "db", "label": "TDS", "color": "#FF0000"}]
+        assert classify_change(_spec(), _spec(connections=conns)) == ChangeLevel.RESTYLE
+
+    def test_connection_style_presets_reuse_layout(self):
+        styles = [{"name": "data", "color": "#00FF00"}]
+        assert classify_change(_spec(), _spec(connection_styles=styles)) == ChangeLevel.RESTYLE
+
+    @pytest.mark.parametrize("connections", [
+        [{"from": "vm", "to": "db", "color": "#000000"}],  # label removed
+        [{"from": "db", "to": "vm", "label": "SQL", "color": "#000000"}],  # reversed
+        [],
+    ])
+    def test_connection_topology_needs_layout(self, connections):
+        assert classify_change(_spec(), _spec(connections=connections)) == ChangeLevel.RELAYOUT
+
+    def test_new_resource_needs_layout(self):
+        resources = _spec().model_dump(by_alias=True)["resources"] + [{"type": "azure/vm", "name": "vm2"}]
+        assert classify_change(_spec(), _spec(resources=resources)) == ChangeLevel.RELAYOUT
+
+    def test_theme_needs_layout(self):
+        assert classify_change(_spec(), _spec(diagram__theme="dark")) == ChangeLevel.RELAYOUT
+
+    def test_highest_level_wins(self):
+        new = _spec(diagram__animation="flow", connections=[{"from": "vm", "to": "db", "label": "x"}])
+        assert classify_change(_spec(), new) == ChangeLevel.RESTYLE
+
+
+class TestLayout:
+    def test_from_json(self):
+        layout = Layout.from_json(_layout_json())
+        vm, db = stable_node_id("vm"), stable_node_id("db")
+        assert layout.graph == {"bb": "0,0,300,200"}
+        assert layout.node_attrs(vm) == {"pos": "60,100"}
+        assert layout.cluster_attrs("vnet") == {"bb": "10,10,120,190", "lp": "65,180"}
+        assert layout.edge_attrs(vm, db, 0, labelled=True)["lp"] == "150,110"
+        assert "lp" not in layout.edge_attrs(vm, db, 0, labelled=False)
+
+    def test_stable_ids_are_deterministic(self, tmp_path):
+        first = prepare_render(_spec(), str(tmp_path / "a.svg"), out_format="svg")
+        second = prepare_render(_spec(), str(tmp_path / "a.svg"), out_format="svg")
+        assert first.source == second.source
+        assert stable_node_id("vm") in first.source
+
+    def test_prepare_render_pins_positions(self, tmp_path):
+        job = prepare_render(
+            _spec(), str(tmp_path / "a.svg"), out_format="svg",
+            layout=Layout.from_json(_layout_json()),
+        )
+        assert 'pos="60,100"' in job.source
+        assert 'bb="10,10,120,190"' in job.source
+        assert 'pos="e,220,100 80,100 150,100 220,100"' in job.source
+        assert 'bb="0,0,300,200"' in job.source
+
+
+class TestIncrementalRenderer:
+    @pytest.fixture
+    def calls(self, monkeypatch):
+        calls = []
+
+        def fake_layout(source, fmt, output, cancel_event=None):
+            calls.append("layout")
+            output.write_text("<svg>layout</svg>")
+            return Layout.from_json(_layout_json())
+
+        def fake_pinned(source, fmt, output, cancel_event=None):
+            calls.append("pinned")
+            assert 'pos="60,100"' in source
+            output.write_text("<svg>pinned</svg>")
+            return output
+
+        def fake_finish(job):
+            calls.append("finish")
+            return job.output
+
+        monkeypatch.setattr(incremental, "render_with_layout", fake_layout)
+        monkeypatch.setattr(incremental, "render_pinned", fake_pinned)
+        monkeypatch.setattr(incremental, "finish_render", fake_finish)
+        return calls
+
+    def test_stages_follow_change_level(self, tmp_path, calls):
+        renderer = IncrementalRenderer(tmp_path / "out.svg")
+
+        renderer.render(_spec())
+        assert calls == ["layout", "finish"]
+        assert renderer.last_level == ChangeLevel.RELAYOUT
+
+        calls.clear()
+        out = renderer.render(_spec(diagram__animation="flow"))
+        assert calls == ["finish"]
+        assert out.read_text() == "<svg>layout</svg>"
+
+        calls.clear()
+        renderer.render(_spec(diagram__animation="flow", connections=[{"from": "vm", "to": "db", "label": "x"}]))
+        assert calls == ["pinned", "finish"]
+        assert renderer.last_level == ChangeLevel.RESTYLE
+
+        calls.clear()
+        renderer.render(_spec(diagram__animation="flow", connections=[{"from": "vm", "to": "db", "label": "x"}]))
+        assert calls == []
+        assert renderer.last_level == ChangeLevel.NONE
+
+        calls.clear()
+        renderer.render(_spec(connections=[]))
+        assert calls == ["layout", "finish"]
+
+    def test_failed_pinned_render_falls_back_to_layout(self, tmp_path, calls, monkeypatch):
+        renderer = IncrementalRenderer(tmp_path / "out.svg")
+        renderer.render(_spec())
+
+        def broken_pinned(*args, **kwargs):
+            raise GraphvizError("neato: node has no position")
+
+        monkeypatch.setattr(incremental, "render_pinned", broken_pinned)
+        calls.clear()
+        renderer.render(_spec(connections=[{"from": "vm", "to": "db", "label": "x"}]))
+        assert calls == ["layout", "finish"]
+        assert renderer.last_level == ChangeLevel.RELAYOUT
+
+    def test_cancelled_render_keeps_previous_state(self, tmp_path, calls, monkeypatch):
+        renderer = IncrementalRenderer(tmp_path / "out.svg")
+        renderer.render(_spec())
+
+        def cancelled(*args, **kwargs):
+            raise RenderCancelledError()
+
+        monkeypatch.setattr(incremental, "render_pinned", cancelled)
+        with pytest.raises(RenderCancelledError):
+            renderer.render(_spec(connections=[{"from": "vm", "to": "db", "label": "x"}]))
+
+        # The previous output is untouched, so going back needs no work
+        assert renderer.output_path.read_text() == "<svg>layout</svg>"
+        assert list(tmp_path.iterdir()) == [renderer.output_path]
+        calls.clear()
+        renderer.render(_spec())
+        assert calls == []
+        assert renderer.last_level == ChangeLevel.NONE
+
+
+@pytest.mark.skipif(shutil.which("dot") is None, reason="Graphviz not installed")
+class TestIncrementalWithGraphviz:
+    def test_restyle_reuses_layout(self, tmp_path):
+        renderer = IncrementalRenderer(tmp_path / "out.svg")
+        renderer.render(_spec())
+        renderer.render(_spec(connections=[{"from": "vm", "to": "db", "label": "TDS", "color": "#FF0000"}]))
+        assert renderer.last_level == ChangeLevel.RESTYLE
+        assert "#FF0000".lower() in renderer.output_path.read_text().lower()
+
+    def test_failed_render_keeps_previous_output(self, tmp_path, calls, monkeypatch):
+        renderer = IncrementalRenderer(tmp_path / "out.svg")
+        renderer.render(_spec())
+
+        def broken_layout(source, fmt, output, cancel_event=None):
+            output.write_text("<svg>partial")
+            raise GraphvizError("dot: syntax error")
+
+        monkeypatch.setattr(incremental, "render_with_layout", broken_layout)
+        with pytest.raises(GraphvizError):
+            renderer.render(_spec(connections=[]))
+        assert renderer.output_path.read_text() == "<svg>layout</svg>"
+        assert list(tmp_path.iterdir()) == [renderer.output_path]
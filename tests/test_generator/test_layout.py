@@ -0,0 +1,43 @@
+"""Tests for Graphviz layout parsing and the layout cache."""
+
+import json
+
+from redspec.generator import layout as layout_module
+from redspec.generator.layout import (
+    Layout,
+    compute_layout,
+    parse_bb,
+    parse_points,
+    stable_node_id,
+)
+
+
+def test_parse_bb():
+    assert parse_bb("0,0,300.5,200") == (0, 0, 300.5, 200)
+
+
+def test_parse_points_skips_arrow_ends():
+    assert parse_points("e,250,100 100,150 150,150") == [(100, 150), (150, 150)]
+    assert parse_points("s,1,2 3,4") == [(3, 4)]
+
+
+def test_node_sizes():
+    doc = {
+        "bb": "0,0,100,100",
+        "objects": [{"_gvid": 0, "name": stable_node_id("a"), "pos": "50,50", "width": "1.5", "height": "0.5"}],
+    }
+    assert Layout.from_json(json.dumps(doc)).node_sizes[stable_node_id("a")] == (1.5, 0.5)
+
+
+def test_compute_layout_is_cached(monkeypatch):
+    calls = []
+
+    def fake_pipe(source, fmt, cancel_event=None):
+        calls.append(fmt)
+        return json.dumps({"bb": "0,0,10,10", "objects": []}).encode()
+
+    monkeypatch.setattr(layout_module, "pipe", fake_pipe)
+    source = "digraph { cache_test_unique }"
+    first = compute_layout(source)
+    assert compute_layout(source) is first
+    assert calls == ["json"]
@@ -4,6 +4,7 @@ import json
 import time
 from pathlib import Path
 
+from redspec.generator.blob_store import hash_file
 from redspec.generator.output_organizer import list_gallery, organize_output, slugify
 
 
@@ -122,3 +123,84 @@ class TestListGallery:
     def test_ignores_dirs_without_metadata(self, tmp_path):
         (tmp_path / "some-dir").mkdir()
         assert list_gallery(tmp_path) == []
+
+
+class TestBlobStorage:
+    def _organize(self, tmp_path, name, content, yaml="resources: []\n", **kwargs):
+        gen = tmp_path / "gen.svg"
+        gen.write_text(content)
+        spec = tmp_path / "spec.yaml"
+        spec.write_text(yaml)
+        return organize_output(gen, spec, tmp_path / "output", name, **kwargs)
+
+    def test_identical_outputs_share_storage(self, tmp_path):
+        first = self._organize(tmp_path, "One", "<svg/>")
+        second = self._organize(tmp_path, "Two", "<svg/>")
+        assert first.stat().st_ino == second.stat().st_ino
+        assert (first.parent / "spec.yaml").stat().st_ino == (second.parent / "spec.yaml").stat().st_ino
+
+    def test_rerender_releases_old_blob(self, tmp_path, monkeypatch):
+        from redspec.generator import blob_store
+
+        monkeypatch.setattr(blob_store, "_PRUNE_GRACE_SECONDS", -1.0)
+        self._organize(tmp_path, "Demo", "<svg>1</svg>", history_artifacts=0)
+        result = self._organize(tmp_path, "Demo", "<svg>2</svg>", history_artifacts=0)
+        blobs = list((tmp_path / "output" / ".blobs").glob("*/*"))
+        # The new diagram and the (unchanged) spec
+        assert len(blobs) == 2
+        assert result.read_text() == "<svg>2</svg>"
+        meta = json.loads((result.parent / "metadata.json").read_text())
+        assert meta["content_hash"] == meta["blobs"][0][:20]
+
+    def test_compressed_svg(self, tmp_path):
+        import gzip
+
+        from redspec.generator.history import read_revisions, revision_artifact
+        from redspec.generator.output_organizer import diagram_file
+
+        result = self._organize(tmp_path, "Demo", "<svg>1</svg>", compress_svg=True)
+        assert result.name == "diagram.svgz"
+        assert gzip.decompress(result.read_bytes()) == b"<svg>1</svg>"
+        meta = json.loads((result.parent / "metadata.json").read_text())
+        assert (meta["format"], meta["encoding"]) == ("svg", "gzip")
+        assert diagram_file(result.parent, meta) == result
+        assert revision_artifact(result.parent, read_revisions(result.parent)[0]).name == "1.svgz"
+
+        # Saving uncompressed again replaces the .svgz
+        plain = self._organize(tmp_path, "Demo", "<svg>1</svg>")
+        assert plain.name == "diagram.svg"
+        assert not result.exists()
+
+    def test_remove_gallery_entry(self, tmp_path, monkeypatch):
+        from redspec.generator import blob_store
+        from redspec.generator.output_organizer import remove_gallery_entry
+
+        monkeypatch.setattr(blob_store, "_PRUNE_GRACE_SECONDS", -1.0)
+        self._organize(tmp_path, "Keep", "<svg/>")
+        self._organize(tmp_path, "Drop", "<svg>only here</svg>")
+        remove_gallery_entry(tmp_path / "output", "drop")
+
+        assert [e["slug"] for e in list_gallery(tmp_path / "output")] == ["keep"]
+        assert len(list((tmp_path / "output" / ".blobs").glob("*/*"))) == 2
+
+    def test_concurrent_writers(self, tmp_path):
+        from concurrent.futures import ThreadPoolExecutor
+
+        out = tmp_path / "output"
+
+        def write(i):
+            src = tmp_path / f"in{i}"
+            src.mkdir()
+            (src / "d.svg").write_text(f"<svg>{i}</svg>")
+            (src / "s.yaml").write_text(f"n: {i}\n")
+            organize_output(src / "d.svg", src / "s.yaml", out, "Same", move=True)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            # result() re-raises any writer's error
+            for future in [pool.submit(write, i) for i in range(8)]:
+                future.result()
+
+        meta = json.loads((out / "same" / "metadata.json").read_text())
+        n = (out / "same" / "spec.yaml").read_text().split()[1]
+        assert (out / "same" / "diagram.svg").read_text() == f"<svg>{n}</svg>"
+        assert meta["blobs"][0] == hash_file(out / "same" / "diagram.svg")
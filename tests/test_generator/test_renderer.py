@@ -466,3 +466,32 @@ class TestRenderWithLegend:
         output = tmp_path / "legend.png"
         result = render(spec, str(output))
         assert result.exists()
+
+
+class TestRenderStages:
+    def test_reports_each_stage(self, tmp_path, monkeypatch):
+        from redspec.generator import renderer
+
+        monkeypatch.setattr(renderer, "run_dot", lambda source, fmt, output, cancel_event=None: output)
+        spec = DiagramSpec.model_validate({"resources": [{"type": "azure/vm", "name": "vm1"}]})
+        stages = []
+        render(spec, str(tmp_path / "out.png"), out_format="png", on_stage=stages.append)
+        assert stages == ["build", "layout", "postprocess"]
+
+    def test_layout_comes_from_the_same_dot_run(self, tmp_path, monkeypatch):
+        from redspec.generator import renderer
+        from redspec.generator.layout import Layout
+
+        calls = []
+
+        def fake_render_with_layout(source, fmt, output, cancel_event=None):
+            calls.append(fmt)
+            return Layout(graph={"bb": "0,0,10,10"})
+
+        monkeypatch.setattr(renderer, "run_dot", lambda *args, **kwargs: pytest.fail("dot ran twice"))
+        monkeypatch.setattr(renderer, "render_with_layout", fake_render_with_layout)
+        spec = DiagramSpec.model_validate({"resources": [{"type": "azure/vm", "name": "vm1"}]})
+        layouts = []
+        render(spec, str(tmp_path / "out.png"), out_format="png", on_layout=layouts.append)
+        assert calls == ["png"]
+        assert layouts[0].graph == {"bb": "0,0,10,10"}
@@ -0,0 +1,147 @@
+"""Tests for gallery retention and garbage collection."""
+
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from redspec.generator import blob_store
+from redspec.generator.gallery_index import GalleryIndex
+from redspec.generator.output_organizer import (
+    list_gallery,
+    organize_output,
+    record_view,
+    set_pinned,
+)
+from redspec.generator.retention import (
+    RetentionPolicy,
+    collect_garbage,
+    parse_duration,
+    parse_size,
+    plan_gc,
+)
+
+_NOW = 1_700_000_000.0
+
+
+def _entry(slug, age_days, size=100, viewed_days=None, pinned=False):
+    saved = datetime.fromtimestamp(_NOW, timezone.utc) - timedelta(days=age_days)
+    return {
+        "slug": slug,
+        "size": size,
+        "timestamp": saved.isoformat(),
+        "pinned": pinned,
+        "last_viewed": None if viewed_days is None else _NOW - viewed_days * 86400,
+    }
+
+
+class TestParsing:
+    @pytest.mark.parametrize(
+        "text, expected",
+        [("100", 100), ("2K", 2048), ("1.5m", 1572864), ("20GB", 20 * 1024**3), ("1GiB", 1024**3)],
+    )
+    def test_size(self, text, expected):
+        assert parse_size(text) == expected
+
+    @pytest.mark.parametrize("text, expected", [("90", 90), ("15m", 900), ("12h", 43200), ("30d", 2592000)])
+    def test_duration(self, text, expected):
+        assert parse_duration(text) == expected
+
+    @pytest.mark.parametrize("text", ["", "ten", "5x", "-1"])
+    def test_invalid(self, text):
+        with pytest.raises(ValueError):
+            parse_size(text)
+        with pytest.raises(ValueError):
+            parse_duration(text)
+
+
+class TestPlan:
+    def test_disabled_policy_keeps_everything(self):
+        entries = [_entry("a", 400), _entry("b", 1)]
+        assert not RetentionPolicy().enabled
+        assert plan_gc(entries, RetentionPolicy(), _NOW) == []
+
+    def test_max_entries_evicts_least_recently_viewed(self):
+        entries = [
+            _entry("old-but-viewed", 30, viewed_days=0),
+            _entry("new", 1),
+            _entry("old", 20),
+        ]
+        evicted = plan_gc(entries, RetentionPolicy(max_entries=1), _NOW)
+        assert [e["slug"] for e in evicted] == ["old", "new"]
+
+    def test_max_bytes(self):
+        entries = [_entry("a", 3, size=600), _entry("b", 2, size=300), _entry("c", 1, size=300)]
+        evicted = plan_gc(entries, RetentionPolicy(max_bytes=700), _NOW)
+        assert [e["slug"] for e in evicted] == ["a"]
+
+    def test_max_age_uses_last_view(self):
+        entries = [_entry("stale", 10), _entry("viewed", 10, viewed_days=1), _entry("fresh", 2)]
+        evicted = plan_gc(entries, RetentionPolicy(max_age=5 * 86400), _NOW)
+        assert [e["slug"] for e in evicted] == ["stale"]
+
+    def test_pinned_entries_are_exempt_but_counted(self):
+        entries = [_entry("pinned", 100, pinned=True), _entry("a", 2), _entry("b", 1)]
+        evicted = plan_gc(entries, RetentionPolicy(max_entries=1, max_age=86400), _NOW)
+        assert [e["slug"] for e in evicted] == ["a", "b"]
+
+
+class TestCollectGarbage:
+    def _save(self, tmp_path, name, content):
+        gen = tmp_path / "gen.svg"
+        gen.write_text(content)
+        spec = tmp_path / "spec.yaml"
+        spec.write_text(f"diagram:\n  name: {name}\n")
+        return organize_output(gen, spec, tmp_path / "output", name)
+
+    def test_removes_entries_and_blobs(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(blob_store, "_PRUNE_GRACE_SECONDS", -1.0)
+        out = tmp_path / "output"
+        for i, name in enumerate(["First", "Second", "Third"]):
+            self._save(tmp_path, name, f"<svg>{i}</svg>")
+            time.sleep(0.01)
+        record_view(out, "first")
+
+        dry = collect_garbage(out, RetentionPolicy(max_entries=1), dry_run=True)
+        assert dry.removed == ["second", "third"]
+        assert len(list_gallery(out)) == 3
+
+        result = collect_garbage(out, RetentionPolicy(max_entries=1))
+        assert result.removed == ["second", "third"]
+        assert result.kept == 1
+        assert result.freed_bytes > 0
+        assert result.blobs_pruned == 0  # released with their entries
+        assert [e["slug"] for e in list_gallery(out)] == ["first"]
+        assert not (out / "second").exists()
+        assert len(list((out / ".blobs").glob("*/*"))) == 2
+
+    def test_min_interval_skips_recent_collection(self, tmp_path):
+        out = tmp_path / "output"
+        self._save(tmp_path, "Only", "<svg/>")
+        assert not collect_garbage(out, RetentionPolicy(max_entries=0), min_interval=60).skipped
+        # As another worker process would, right after the first collection
+        again = collect_garbage(out, RetentionPolicy(max_entries=0), min_interval=60)
+        assert again.skipped and again.removed == []
+        assert not collect_garbage(out, RetentionPolicy(max_entries=0), min_interval=0).skipped
+
+    def test_pin_survives_resave(self, tmp_path):
+        out = tmp_path / "output"
+        self._save(tmp_path, "Keep", "<svg>1</svg>")
+        assert set_pinned(out, "keep", True)
+        self._save(tmp_path, "Keep", "<svg>2</svg>")
+        assert json.loads((out / "keep" / "metadata.json").read_text())["pinned"] is True
+
+        result = collect_garbage(out, RetentionPolicy(max_entries=0))
+        assert result.removed == []
+        assert not set_pinned(out, "missing", True)
+
+    def test_views_are_recorded(self, tmp_path):
+        out = tmp_path / "output"
+        self._save(tmp_path, "Seen", "<svg/>")
+        index = GalleryIndex(out)
+        assert index.usage()[0]["last_viewed"] is None
+        record_view(out, "seen")
+        usage = index.usage()[0]
+        assert usage["last_viewed"] == pytest.approx(time.time(), abs=5)
+        assert usage["size"] > 0
@@ -0,0 +1,72 @@
+"""Tests for gallery thumbnails."""
+
+import sys
+
+import pytest
+
+from redspec.generator.thumbnails import (
+    THUMBS_DIRNAME,
+    content_hash,
+    ensure_thumbnail,
+    find_thumbnail,
+)
+
+_SVG = (
+    '<svg xmlns="http://www.w3.org/2000/svg" width="800pt" height="400pt" viewBox="0 0 800 400">'
+    '<g><image x="10" y="20" width="64" height="64" href="data:image/svg+xml;base64,' + "A" * 50000 + '"/>'
+    '<path d="M0 0L10 10"><animate attributeName="stroke-dashoffset" values="0;10" dur="1s"/></path>'
+    "<text>vm1</text></g></svg>"
+)
+
+
+@pytest.fixture(autouse=True)
+def no_cairosvg(monkeypatch):
+    # Exercise the dependency-free SVG path regardless of what is installed
+    monkeypatch.setitem(sys.modules, "cairosvg", None)
+
+
+class TestThumbnails:
+    def test_lite_svg_thumbnail(self, tmp_path):
+        diagram = tmp_path / "diagram.svg"
+        diagram.write_text(_SVG)
+        thumb = ensure_thumbnail(diagram)
+
+        assert thumb.parent == tmp_path / THUMBS_DIRNAME
+        assert thumb.name == f"{content_hash(diagram)}.svg"
+        text = thumb.read_text()
+        assert "<image" not in text and "<animate" not in text
+        assert '<rect x="10" y="20" width="64" height="64"' in text
+        assert 'width="320" height="160"' in text
+        assert "vm1" in text
+        assert thumb.stat().st_size < 1000
+
+    def test_compressed_svg_thumbnail(self, tmp_path):
+        import gzip
+
+        diagram = tmp_path / "diagram.svgz"
+        diagram.write_bytes(gzip.compress(_SVG.encode()))
+        text = ensure_thumbnail(diagram).read_text()
+        assert "<image" not in text and "vm1" in text
+
+    def test_reused_then_replaced(self, tmp_path):
+        diagram = tmp_path / "diagram.svg"
+        diagram.write_text(_SVG)
+        first = ensure_thumbnail(diagram)
+        assert ensure_thumbnail(diagram) == first
+
+        diagram.write_text(_SVG.replace("vm1", "vm2"))
+        second = ensure_thumbnail(diagram)
+        assert second != first
+        assert not first.exists()
+        assert find_thumbnail(tmp_path, content_hash(diagram)) == second
+
+    def test_png_needs_pillow(self, tmp_path, monkeypatch):
+        monkeypatch.setitem(sys.modules, "PIL", None)
+        diagram = tmp_path / "diagram.png"
+        diagram.write_bytes(b"\x89PNG fake")
+        assert ensure_thumbnail(diagram) is None
+
+    def test_pdf_has_no_thumbnail(self, tmp_path):
+        diagram = tmp_path / "diagram.pdf"
+        diagram.write_bytes(b"%PDF")
+        assert ensure_thumbnail(diagram) is None
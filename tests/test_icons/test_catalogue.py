@@ -0,0 +1,80 @@
+"""Tests for the resource type catalogue."""
+
+import pytest
+
+from redspec.icons.catalogue import (
+    ALIAS,
+    BUILTIN,
+    ICON,
+    CatalogueEntry,
+    ResourceCatalogue,
+)
+from redspec.icons.registry import IconRegistry
+
+
+@pytest.fixture
+def catalogue(mock_icon_dir, sample_svg):
+    (mock_icon_dir / "99999-icon-service-Quantum-Widgets.svg").write_bytes(sample_svg.read_bytes())
+    return ResourceCatalogue.from_registry(IconRegistry(icon_dir=mock_icon_dir), version="v1")
+
+
+def _types(entries):
+    return [e.type for e in entries]
+
+
+class TestResourceCatalogue:
+    def test_covers_icons_builtins_and_aliases(self, catalogue):
+        by_type = {e.type: e for e in catalogue.entries}
+        assert by_type["azure/quantum-widgets"].kind == ICON
+        assert by_type["azure/vm"].kind == BUILTIN
+        assert "azure/law" in by_type
+        assert "aws/s3" in by_type
+
+    def test_first_kind_wins(self):
+        catalogue = ResourceCatalogue([
+            CatalogueEntry("x", "a", BUILTIN),
+            CatalogueEntry("x", "a", ALIAS, "x/b"),
+            CatalogueEntry("x", "c", ALIAS, "x/b"),
+        ])
+        assert [e.as_dict() for e in catalogue.entries] == [
+            {"type": "x/a", "namespace": "x", "name": "a", "kind": BUILTIN},
+            {"type": "x/c", "namespace": "x", "name": "c", "kind": ALIAS, "target": "x/b"},
+        ]
+
+    def test_ranking(self):
+        catalogue = ResourceCatalogue([
+            CatalogueEntry("azure", name, ICON)
+            for name in ("virtual-networks", "vnet", "private-vnet-links", "subnets", "vnet-gateways", "avnet")
+        ])
+        assert _types(catalogue.search("vnet")) == [
+            "azure/vnet",                # exact
+            "azure/vnet-gateways",       # prefix
+            "azure/private-vnet-links",  # word prefix
+            "azure/avnet",               # substring
+            "azure/virtual-networks",    # letters in order
+        ]
+
+    def test_namespace_filter(self, catalogue):
+        assert {e.namespace for e in catalogue.search("s", namespace="aws")} == {"aws"}
+        assert catalogue.search("aws/s3") == catalogue.search("s3", namespace="aws")
+        assert _types(catalogue.search("s3", namespace="azure")) == []
+
+    def test_query_is_normalised(self, catalogue):
+        assert catalogue.search("Virtual Machines")[0].type == "azure/virtual-machines"
+
+    def test_pagination(self, catalogue):
+        everything = catalogue.search("")
+        assert len(everything) == len(catalogue)
+
+        seen, cursor = [], None
+        while True:
+            items, cursor, total = catalogue.page("", limit=7, cursor=cursor)
+            seen.extend(items)
+            assert total == len(everything)
+            if cursor is None:
+                break
+        assert seen == everything
+
+    def test_invalid_cursor(self, catalogue):
+        with pytest.raises(ValueError):
+            catalogue.page("vm", cursor="not-a-cursor")
@@ -1,8 +1,13 @@
 """Tests for SVG embedding."""
 
+import base64
+import os
 import urllib.parse
+from unittest.mock import patch
 
-from redspec.icons.embedder import embed_svg
+import pytest
+
+from redspec.icons.embedder import EmbedCache, embed_svg, embed_svg_base64
 
 
 def test_embed_svg_produces_data_uri(sample_svg):
@@ -34,3 +39,63 @@ def test_embed_svg_caching(sample_svg):
     r1 = embed_svg(str(sample_svg))
     r2 = embed_svg(str(sample_svg))
     assert r1 is r2  # Same object from cache
+
+
+def test_embed_svg_str_and_path_share_an_entry(sample_svg):
+    assert embed_svg(str(sample_svg)) is embed_svg(sample_svg)
+
+
+def test_embed_svg_base64(sample_svg):
+    result = embed_svg_base64(sample_svg)
+    assert result.startswith("data:image/svg+xml;base64,")
+    assert base64.b64decode(result.split(",", 1)[1]) == sample_svg.read_bytes()
+
+
+class TestEmbedCache:
+    def _icon(self, tmp_path, body="<svg/>"):
+        icon = tmp_path / "icon.svg"
+        icon.write_text(body, encoding="utf-8")
+        return icon
+
+    def test_persists_across_instances(self, tmp_path):
+        icon = self._icon(tmp_path)
+        db = tmp_path / "cache" / "embedded.db"
+        first = EmbedCache(db).get(icon)
+        with patch("redspec.icons.embedder._encode") as encode:
+            assert EmbedCache(db).get(icon) == first
+        encode.assert_not_called()
+
+    def test_changed_file_is_reencoded(self, tmp_path):
+        icon = self._icon(tmp_path)
+        db = tmp_path / "embedded.db"
+        EmbedCache(db).get(icon)
+        icon.write_text("<svg><rect/></svg>", encoding="utf-8")
+        os.utime(icon, ns=(1, 1))
+        assert "rect" in urllib.parse.unquote(EmbedCache(db).get(icon))
+
+    def test_touched_file_is_not_reencoded(self, tmp_path):
+        icon = self._icon(tmp_path)
+        db = tmp_path / "embedded.db"
+        first = EmbedCache(db).get(icon)
+        os.utime(icon, ns=(1, 1))
+        with patch("redspec.icons.embedder._encode") as encode:
+            assert EmbedCache(db).get(icon) == first
+        encode.assert_not_called()
+
+    def test_memory_is_bounded(self, tmp_path):
+        cache = EmbedCache(None, capacity=2)
+        for i in range(4):
+            icon = tmp_path / f"{i}.svg"
+            icon.write_text("<svg/>", encoding="utf-8")
+            cache.get(icon)
+        assert len(cache._memory) == 2
+
+    def test_unwritable_database_still_embeds(self, tmp_path):
+        blocker = tmp_path / "file"
+        blocker.write_text("", encoding="utf-8")
+        cache = EmbedCache(blocker / "embedded.db")
+        assert cache.get(self._icon(tmp_path)).startswith("data:image/svg+xml,")
+
+    def test_unknown_encoding(self, tmp_path):
+        with pytest.raises(ValueError):
+            EmbedCache(None).get(self._icon(tmp_path), "hex")
@@ -1,6 +1,7 @@
 """Tests for multi-pack IconRegistry and PackRegistry."""
 
 import shutil
+from collections import Counter
 from pathlib import Path
 
 import pytest
@@ -117,8 +118,18 @@ class TestIconRegistryMultiPack:
             "dynamics365": PackRegistry(DYNAMICS365_PACK, icon_dir=dynamics_icon_dir),
             "power-platform": PackRegistry(POWER_PLATFORM_PACK, icon_dir=power_platform_icon_dir),
         }
+        registry.misses = Counter()
         return registry
 
+    def test_misses_are_counted(self, multi_registry):
+        multi_registry.resolve("unknown/something")
+        multi_registry.resolve("unknown/something")
+        multi_registry.resolve("unknown/other-thing")
+        multi_registry.resolve("azure/no-such-icon")
+        multi_registry.resolve("no-such-icon")
+        multi_registry.resolve("dynamics365/sales")
+        assert multi_registry.misses == {"other": 3, "azure": 1, "none": 1}
+
     def test_namespace_routing(self, multi_registry):
         path = multi_registry.resolve("dynamics365/sales")
         assert path is not None
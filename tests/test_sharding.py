@@ -0,0 +1,185 @@
+"""Tests for CI shard partitioning and manifest merging."""
+
+import json
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+from click.testing import CliRunner
+
+from redspec.cli import main
+from redspec.sharding import (
+    ManifestEntry,
+    estimate_costs,
+    load_timings,
+    merge_manifests,
+    parse_shard,
+    partition,
+    select_shard,
+    write_manifest,
+)
+
+
+def _write_spec(directory: Path, name: str, n_resources: int) -> Path:
+    lines = ["diagram:", f"  name: {name}", "resources:"]
+    for i in range(n_resources):
+        lines += ["  - type: azure/vm", f"    name: {name}-vm{i}"]
+    path = directory / f"{name}.yaml"
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+
+class TestParseShard:
+    def test_valid(self):
+        assert parse_shard("2/4") == (2, 4)
+        assert parse_shard(" 1 / 1 ") == (1, 1)
+
+    @pytest.mark.parametrize("value", ["0/4", "5/4", "1/0", "abc", "1-4"])
+    def test_invalid(self, value):
+        with pytest.raises(ValueError):
+            parse_shard(value)
+
+
+class TestPartition:
+    def test_balances_costs(self):
+        costs = {"a": 10.0, "b": 6.0, "c": 5.0, "d": 4.0, "e": 3.0}
+        groups = partition(costs, 2)
+        loads = sorted(sum(costs[n] for n in g) for g in groups)
+        assert loads == [14.0, 14.0]
+
+    def test_deterministic_and_complete(self):
+        costs = {f"s{i}.yaml": float(i % 3) for i in range(20)}
+        first = partition(costs, 3)
+        assert first == partition(dict(reversed(list(costs.items()))), 3)
+        assert sorted(n for g in first for n in g) == sorted(costs)
+
+    def test_more_shards_than_items(self):
+        groups = partition({"a": 1.0}, 3)
+        assert groups == [["a"], [], []]
+
+
+class TestEstimateCosts:
+    def test_uses_resource_count_without_timings(self, tmp_path):
+        small = _write_spec(tmp_path, "small", 1)
+        big = _write_spec(tmp_path, "big", 8)
+        costs = estimate_costs([small, big])
+        assert costs["big.yaml"] > costs["small.yaml"]
+
+    def test_timings_scale_estimates(self, tmp_path):
+        timed = _write_spec(tmp_path, "timed", 2)
+        untimed = _write_spec(tmp_path, "untimed", 4)
+        prior = estimate_costs([timed, untimed])
+        costs = estimate_costs([timed, untimed], {"timed.yaml": 10.0})
+        assert costs["timed.yaml"] == 10.0
+        # The model is scaled by the timed file's observed / predicted time
+        assert costs["untimed.yaml"] == pytest.approx(prior["untimed.yaml"] * 10.0 / prior["timed.yaml"])
+
+    def test_format_and_dpi_raise_estimates(self, tmp_path):
+        spec = _write_spec(tmp_path, "spec", 20)
+        svg = estimate_costs([spec], out_format="svg")["spec.yaml"]
+        png = estimate_costs([spec], out_format="png")["spec.yaml"]
+        assert png > svg
+        assert estimate_costs([spec], dpi=600)["spec.yaml"] > png
+
+    def test_unparseable_file_costs_least(self, tmp_path):
+        bad = tmp_path / "bad.yaml"
+        bad.write_text("{{nope", encoding="utf-8")
+        good = _write_spec(tmp_path, "good", 1)
+        costs = estimate_costs([bad, good])
+        assert 0 < costs["bad.yaml"] < costs["good.yaml"]
+
+    def test_fully_timed_files_are_not_parsed(self, tmp_path):
+        files = [_write_spec(tmp_path, "a", 1), _write_spec(tmp_path, "b", 2)]
+        with patch("redspec.yaml_io.parser.parse_yaml") as parse:
+            costs = estimate_costs(files, {"a.yaml": 1.0, "b.yaml": 2.0})
+        assert costs == {"a.yaml": 1.0, "b.yaml": 2.0}
+        parse.assert_not_called()
+
+    def test_parsed_specs_are_kept(self, tmp_path):
+        bad = tmp_path / "bad.yaml"
+        bad.write_text("{{nope", encoding="utf-8")
+        good = _write_spec(tmp_path, "good", 1)
+        specs = {}
+        first = estimate_costs([bad, good], specs=specs)
+        assert specs["bad.yaml"] is None
+        assert specs["good.yaml"].diagram.name == "good"
+        with patch("redspec.yaml_io.parser.parse_yaml") as parse:
+            assert estimate_costs([bad, good], specs=specs) == first
+        parse.assert_not_called()
+
+    def test_select_shard_covers_every_file_once(self, tmp_path):
+        files = [_write_spec(tmp_path, f"s{i}", i + 1) for i in range(7)]
+        chosen = [select_shard(files, (i, 3))[0] for i in (1, 2, 3)]
+        names = sorted(f.name for group in chosen for f in group)
+        assert names == sorted(f.name for f in files)
+
+
+class TestManifests:
+    def test_round_trip_timings(self, tmp_path):
+        path = tmp_path / "m.json"
+        write_manifest(path, [
+            ManifestEntry(file="a.yaml", status="ok", seconds=1.5),
+            ManifestEntry(file="b.yaml", status="failed", error="boom", seconds=0.1),
+        ], "svg")
+        assert load_timings(path) == {"a.yaml": 1.5}
+
+    def test_missing_manifest_has_no_timings(self, tmp_path):
+        assert load_timings(tmp_path / "nope.json") == {}
+
+    def test_merge_reports_missing_shards(self, tmp_path):
+        one = tmp_path / "redspec-batch.shard-1-of-3.json"
+        two = tmp_path / "redspec-batch.shard-2-of-3.json"
+        write_manifest(one, [ManifestEntry(file="a.yaml", status="ok")], "png", shard=(1, 3))
+        write_manifest(two, [ManifestEntry(file="b.yaml", status="failed", error="x")], "png", shard=(2, 3))
+
+        merged = merge_manifests([one, two])
+        assert [e["file"] for e in merged["entries"]] == ["a.yaml", "b.yaml"]
+        assert merged["summary"] == {"succeeded": 1, "failed": 1}
+        assert merged["missing_shards"] == [3]
+        assert merged["format"] == "png"
+
+
+class TestShardCLI:
+    @pytest.fixture
+    def runner(self):
+        return CliRunner()
+
+    def _invoke(self, runner, args):
+        def fake_generate(spec, output_path, **kwargs):
+            Path(output_path).write_text("x")
+            return Path(output_path)
+
+        with patch("redspec.icons.migration.migrate_flat_cache", return_value=False), \
+             patch("redspec.icons.packs.ALL_PACKS") as mock_packs, \
+             patch("redspec.generator.pipeline.generate", side_effect=fake_generate):
+            mock_pack = MagicMock()
+            mock_pack.downloaded_marker.exists.return_value = True
+            mock_packs.__getitem__ = MagicMock(return_value=mock_pack)
+            return runner.invoke(main, args)
+
+    def test_shards_cover_all_specs_and_merge(self, runner, tmp_path):
+        src = tmp_path / "specs"
+        src.mkdir()
+        for i in range(5):
+            _write_spec(src, f"spec{i}", i + 1)
+        out = tmp_path / "out"
+
+        for index in (1, 2):
+            result = self._invoke(runner, ["batch", str(src), "--output-dir", str(out), "--shard", f"{index}/2"])
+            assert result.exit_code == 0, result.output
+
+        rendered = sorted(p.name for p in out.glob("*.png"))
+        assert rendered == [f"spec{i}.png" for i in range(5)]
+
+        result = self._invoke(runner, ["batch-merge", str(out)])
+        assert result.exit_code == 0, result.output
+        assert "5 succeeded" in result.output
+        merged = json.loads((out / "redspec-batch.json").read_text())
+        assert len(merged["entries"]) == 5
+        assert merged["missing_shards"] == []
+
+    def test_invalid_shard_rejected(self, runner, tmp_path):
+        _write_spec(tmp_path, "one", 1)
+        result = self._invoke(runner, ["batch", str(tmp_path), "--shard", "3/2"])
+        assert result.exit_code != 0
+        assert "Shard index" in result.output
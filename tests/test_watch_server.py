@@ -1,8 +1,12 @@
 """Tests for the watch mode HTTP server (D1)."""
 
+import json
+import urllib.error
 import urllib.request
 from pathlib import Path
 
+import pytest
+
 from redspec.watch_server import WatchServer
 
 
@@ -72,3 +76,141 @@ class TestWatchServer:
                 assert e.code == 404
         finally:
             server.shutdown()
+
+
+class TestLiveReload:
+    def _svg(self, tmp_path, body="<rect/>"):
+        svg = tmp_path / "diagram.svg"
+        svg.write_text(f'<svg xmlns="http://www.w3.org/2000/svg">{body}</svg>')
+        return svg
+
+    def test_etag_and_not_modified(self, tmp_path):
+        server = WatchServer(port=0)
+        server.update_diagram(self._svg(tmp_path))
+        server.start()
+        try:
+            url = f"http://127.0.0.1:{server.actual_port}/diagram"
+            with urllib.request.urlopen(url, timeout=2) as resp:
+                etag = resp.headers["ETag"]
+            assert etag
+
+            req = urllib.request.Request(url, headers={"If-None-Match": etag})
+            with pytest.raises(urllib.error.HTTPError) as info:
+                urllib.request.urlopen(req, timeout=2)
+            assert info.value.code == 304
+
+            server.update_diagram(self._svg(tmp_path, "<circle/>"))
+            with urllib.request.urlopen(req, timeout=2) as resp:
+                assert resp.status == 200
+                assert resp.headers["ETag"] != etag
+        finally:
+            server.shutdown()
+
+    def test_serves_from_memory(self, tmp_path):
+        svg = self._svg(tmp_path)
+        server = WatchServer(port=0)
+        server.update_diagram(svg)
+        svg.unlink()
+        server.start()
+        try:
+            url = f"http://127.0.0.1:{server.actual_port}/diagram"
+            with urllib.request.urlopen(url, timeout=2) as resp:
+                assert b"<rect/>" in resp.read()
+        finally:
+            server.shutdown()
+
+    def test_event_stream_announces_rebuild(self, tmp_path):
+        server = WatchServer(port=0)
+        server.update_diagram(self._svg(tmp_path))
+        server.start()
+        try:
+            url = f"http://127.0.0.1:{server.actual_port}/events?since=1"
+            with urllib.request.urlopen(url, timeout=5) as stream:
+                assert stream.headers["Content-Type"] == "text/event-stream"
+                assert stream.readline().startswith(b"retry:")
+                stream.readline()
+
+                # Other requests are served while the stream is open
+                page = f"http://127.0.0.1:{server.actual_port}/"
+                with urllib.request.urlopen(page, timeout=2) as resp:
+                    assert "EventSource" in resp.read().decode()
+
+                server.update_diagram(self._svg(tmp_path, "<circle/>"))
+                assert stream.readline() == b"id: 2\n"
+                assert stream.readline() == b"event: reload\n"
+                assert b'"version": 2' in stream.readline()
+        finally:
+            server.shutdown()
+
+    def test_stale_client_is_told_immediately(self, tmp_path):
+        server = WatchServer(port=0)
+        server.update_diagram(self._svg(tmp_path))
+        server.update_diagram(self._svg(tmp_path, "<circle/>"))
+        server.start()
+        try:
+            url = f"http://127.0.0.1:{server.actual_port}/events?since=1"
+            with urllib.request.urlopen(url, timeout=5) as stream:
+                lines = [stream.readline() for _ in range(4)]
+            assert lines[2:] == [b"id: 2\n", b"event: reload\n"]
+        finally:
+            server.shutdown()
+
+    def test_client_ahead_of_server_waits_for_next_change(self, tmp_path):
+        # e.g. a page left open across a server restart
+        server = WatchServer(port=0)
+        server.update_diagram(self._svg(tmp_path))
+        server.start()
+        try:
+            url = f"http://127.0.0.1:{server.actual_port}/events?since=99"
+            with urllib.request.urlopen(url, timeout=5) as stream:
+                assert stream.readline().startswith(b"retry:")
+                stream.readline()
+                server.update_diagram(self._svg(tmp_path, "<circle/>"))
+                # No keep-alives in between: the stream is not spinning
+                assert stream.readline() == b"id: 2\n"
+        finally:
+            server.shutdown()
+
+
+class TestMultiSpec:
+    def _get(self, server, path):
+        url = f"http://127.0.0.1:{server.actual_port}{path}"
+        with urllib.request.urlopen(url, timeout=2) as resp:
+            return resp.read().decode()
+
+    def test_index_lists_specs_with_status(self, tmp_path):
+        svg = tmp_path / "a.svg"
+        svg.write_text("<svg>a</svg>")
+        server = WatchServer(port=0)
+        server.update_diagram(svg, spec="net/hub.yaml")
+        server.set_status("spoke.yaml", "error", "bad include")
+        server.start()
+        try:
+            body = self._get(server, "/")
+            assert "/view/net/hub.yaml" in body
+            assert "error: bad include" in body
+
+            status = json.loads(self._get(server, "/status"))
+            assert status["net/hub.yaml"]["status"] == "ok"
+            assert status["spoke.yaml"] == {**status["spoke.yaml"], "status": "error", "error": "bad include"}
+
+            assert self._get(server, "/diagram/net/hub.yaml") == "<svg>a</svg>"
+            assert "/diagram/net/hub.yaml" in self._get(server, "/view/net/hub.yaml")
+        finally:
+            server.shutdown()
+
+    def test_removed_spec_is_unlisted(self, tmp_path):
+        svg = tmp_path / "a.svg"
+        svg.write_text("<svg/>")
+        server = WatchServer(port=0)
+        server.update_diagram(svg, spec="a.yaml")
+        server.update_diagram(svg, spec="b.yaml")
+        server.remove_spec("a.yaml")
+        server.start()
+        try:
+            assert list(json.loads(self._get(server, "/status"))) == ["b.yaml"]
+            with pytest.raises(urllib.error.HTTPError) as err:
+                self._get(server, "/diagram/a.yaml")
+            assert err.value.code == 404
+        finally:
+            server.shutdown()
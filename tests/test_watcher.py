@@ -1,11 +1,15 @@
 """Tests for watch mode (D1)."""
 
+import os
+import threading
+import time
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-from redspec.watcher import _get_mtime, watch_loop
+from redspec.exceptions import RenderCancelledError
+from redspec.watcher import _get_mtime, _Session, watch_loop, watch_tree
 
 
 class TestGetMtime:
@@ -89,7 +93,7 @@ class TestWatchLoop:
         def should_stop():
             return error_count[0] >= 1
 
-        def mock_rebuild(f):
+        def mock_rebuild(f, **kwargs):
             raise YAMLParseError("bad yaml")
 
         with patch("redspec.watcher._rebuild", side_effect=mock_rebuild):
@@ -102,3 +106,292 @@ class TestWatchLoop:
             )
 
         assert error_count[0] >= 1
+
+
+def _run_in_thread(**kwargs):
+    stop = threading.Event()
+    thread = threading.Thread(
+        target=watch_loop, kwargs={**kwargs, "should_stop": stop.is_set}, daemon=True
+    )
+    thread.start()
+    return stop, thread
+
+
+def _wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def _touch(path: Path, text: str) -> None:
+    path.write_text(text)
+    # Make sure mtime moves even on coarse-grained filesystems
+    stamp = time.time() + len(text)
+    os.utime(path, (stamp, stamp))
+
+
+@pytest.mark.parametrize("backend", ["poll", "watchfiles"])
+class TestEventDrivenWatch:
+    def _skip_unavailable(self, backend):
+        if backend == "watchfiles":
+            pytest.importorskip("watchfiles")
+
+    def test_included_file_change_triggers_rebuild(self, tmp_path, backend):
+        self._skip_unavailable(backend)
+        shared = tmp_path / "shared"
+        shared.mkdir()
+        fragment = shared / "net.yaml"
+        fragment.write_text("resources: []\n")
+        root = tmp_path / "main.yaml"
+        root.write_text("includes: [shared/net.yaml]\nresources: []\n")
+
+        rebuilds = []
+        with patch("redspec.watcher._rebuild", return_value=tmp_path / "d.svg"):
+            stop, thread = _run_in_thread(
+                yaml_file=root, on_rebuild=rebuilds.append,
+                poll_interval=0.01, debounce=0.02, backend=backend,
+            )
+            try:
+                assert _wait_for(lambda: len(rebuilds) == 1)
+                time.sleep(0.1)
+                _touch(fragment, "resources: []  # edited\n")
+                assert _wait_for(lambda: len(rebuilds) == 2)
+            finally:
+                stop.set()
+                thread.join(timeout=5)
+
+    def test_burst_of_saves_is_debounced(self, tmp_path, backend):
+        self._skip_unavailable(backend)
+        root = tmp_path / "main.yaml"
+        root.write_text("resources: []\n")
+
+        rebuilds = []
+        with patch("redspec.watcher._rebuild", return_value=tmp_path / "d.svg"):
+            stop, thread = _run_in_thread(
+                yaml_file=root, on_rebuild=rebuilds.append,
+                poll_interval=0.01, debounce=0.3, backend=backend,
+            )
+            try:
+                assert _wait_for(lambda: len(rebuilds) == 1)
+                time.sleep(0.1)
+                for i in range(5):
+                    _touch(root, "resources: []" + "#" * (i + 1) + "\n")
+                    time.sleep(0.03)
+                assert _wait_for(lambda: len(rebuilds) == 2)
+                time.sleep(0.5)
+                assert len(rebuilds) == 2
+            finally:
+                stop.set()
+                thread.join(timeout=5)
+
+
+class TestCancellation:
+    def test_newer_change_cancels_in_flight_render(self, tmp_path):
+        root = tmp_path / "main.yaml"
+        root.write_text("resources: []\n")
+        result = tmp_path / "d.svg"
+
+        started = threading.Event()
+        cancelled = []
+        calls = [0]
+
+        def slow_rebuild(f, cancel_event=None, **kwargs):
+            calls[0] += 1
+            if calls[0] == 2:
+                started.set()
+                if cancel_event.wait(5):
+                    cancelled.append(True)
+                    raise RenderCancelledError()
+            return result
+
+        rebuilds, errors = [], []
+        with patch("redspec.watcher._rebuild", side_effect=slow_rebuild):
+            stop, thread = _run_in_thread(
+                yaml_file=root, on_rebuild=rebuilds.append, on_error=errors.append,
+                poll_interval=0.01, debounce=0.01, backend="poll",
+            )
+            try:
+                assert _wait_for(lambda: len(rebuilds) == 1)
+                _touch(root, "resources: [] # one\n")
+                assert started.wait(5)
+                _touch(root, "resources: [] # two, longer\n")
+                assert _wait_for(lambda: len(rebuilds) == 2)
+            finally:
+                stop.set()
+                thread.join(timeout=5)
+
+        assert cancelled == [True]
+        assert calls[0] == 3
+        assert errors == []
+
+    def test_unknown_backend_rejected(self, tmp_path):
+        with pytest.raises(ValueError):
+            watch_loop(tmp_path / "x.yaml", on_rebuild=lambda p: None, backend="carrier-pigeon")
+
+
+class TestWatchTree:
+    @pytest.fixture
+    def tree(self, tmp_path):
+        root = tmp_path / "specs"
+        (root / "shared").mkdir(parents=True)
+        (root / "shared" / "net.yaml").write_text("resources: []\n")
+        (root / "hub.yaml").write_text("includes: [shared/net.yaml]\nresources: []\n")
+        (root / "spoke.yaml").write_text("includes: [shared/net.yaml]\nresources: []\n")
+        (root / "solo.yaml").write_text("resources: []\n")
+        return root
+
+    def _watch(self, root, out, **kwargs):
+        events = []
+
+        def fake_rebuild(f, output=None, **kw):
+            output.parent.mkdir(parents=True, exist_ok=True)
+            output.write_text("<svg/>")
+            return output
+
+        stop = threading.Event()
+        callbacks = {
+            "on_rebuild": lambda spec, output: events.append(("ok", spec.name)),
+            "on_removed": lambda spec: events.append(("removed", spec.name)),
+        }
+        patcher = patch("redspec.watcher._rebuild", side_effect=fake_rebuild)
+        patcher.start()
+        thread = threading.Thread(
+            target=watch_tree,
+            args=(root,),
+            kwargs={**callbacks, "should_stop": stop.is_set, "output_dir": out,
+                    "poll_interval": 0.01, "debounce": 0.02, "backend": "poll", **kwargs},
+            daemon=True,
+        )
+        thread.start()
+
+        def finish():
+            stop.set()
+            thread.join(timeout=5)
+            patcher.stop()
+
+        return events, finish
+
+    def test_builds_root_specs_only(self, tree, tmp_path):
+        out = tmp_path / "out"
+        events, finish = self._watch(tree, out)
+        try:
+            assert _wait_for(lambda: len(events) == 3)
+            assert sorted(events) == [("ok", "hub.yaml"), ("ok", "solo.yaml"), ("ok", "spoke.yaml")]
+            assert sorted(p.name for p in out.rglob("*.svg")) == ["hub.svg", "solo.svg", "spoke.svg"]
+        finally:
+            finish()
+
+    def test_fragment_change_rebuilds_dependents(self, tree, tmp_path):
+        events, finish = self._watch(tree, tmp_path / "out")
+        try:
+            assert _wait_for(lambda: len(events) == 3)
+            events.clear()
+            _touch(tree / "shared" / "net.yaml", "resources: [] # edited\n")
+            assert _wait_for(lambda: len(events) == 2)
+            time.sleep(0.2)
+            assert sorted(events) == [("ok", "hub.yaml"), ("ok", "spoke.yaml")]
+        finally:
+            finish()
+
+    def test_specs_added_and_removed(self, tree, tmp_path):
+        out = tmp_path / "out"
+        events, finish = self._watch(tree, out)
+        try:
+            assert _wait_for(lambda: len(events) == 3)
+            events.clear()
+            (tree / "new.yaml").write_text("resources: []\n")
+            assert _wait_for(lambda: ("ok", "new.yaml") in events)
+            (tree / "solo.yaml").unlink()
+            assert _wait_for(lambda: ("removed", "solo.yaml") in events)
+            assert not (out / "solo.svg").exists()
+        finally:
+            finish()
+
+    def test_save_by_rename_keeps_the_spec(self, tree, tmp_path):
+        removed = []
+        session = _Session(
+            tree, [], tmp_path / "out", "svg", 1, 0.01, 0.05, "poll",
+            on_rebuild=lambda spec, output: None, on_error=None, on_building=None, on_removed=removed.append,
+        )
+        try:
+            session._rescan()
+            solo = tree.resolve() / "solo.yaml"
+            watched = session.specs[solo]
+
+            # The editor writes a temporary file and renames it over the spec
+            solo.unlink()
+            session._on_change(solo)
+            solo.write_text("resources: [] # saved\n")
+            session._on_change(solo)
+            time.sleep(0.06)
+            session._check_missing()
+            assert session.specs[solo] is watched
+            assert removed == []
+
+            solo.unlink()
+            session._on_change(solo)
+            session._check_missing()
+            assert solo in session.specs
+            time.sleep(0.06)
+            session._check_missing()
+            assert solo not in session.specs
+            assert removed == [solo]
+        finally:
+            session.watcher.stop()
+            session.pool.shutdown()
+
+    def test_worker_pool_is_bounded(self, tmp_path):
+        root = tmp_path / "many"
+        root.mkdir()
+        for i in range(8):
+            (root / f"s{i}.yaml").write_text("resources: []\n")
+
+        running, peak, done = [0], [0], []
+        lock = threading.Lock()
+
+        def slow_rebuild(f, output=None, **kw):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+            return output
+
+        stop = threading.Event()
+        with patch("redspec.watcher._rebuild", side_effect=slow_rebuild):
+            thread = threading.Thread(
+                target=watch_tree, args=(root,),
+                kwargs={"on_rebuild": lambda s, o: done.append(s), "should_stop": stop.is_set,
+                        "output_dir": tmp_path / "out", "poll_interval": 0.01,
+                        "backend": "poll", "max_workers": 2},
+                daemon=True,
+            )
+            thread.start()
+            try:
+                assert _wait_for(lambda: len(done) == 8)
+            finally:
+                stop.set()
+                thread.join(timeout=5)
+        assert peak[0] == 2
+
+
+class TestSessionResources:
+    def test_default_output_dir_is_removed(self, tmp_path):
+        yaml_file = tmp_path / "test.yaml"
+        yaml_file.write_text("resources: []\n")
+        outputs = []
+
+        def fake_rebuild(f, output=None, **kw):
+            output.write_text("<svg/>")
+            outputs.append(output)
+            return output
+
+        with patch("redspec.watcher._rebuild", side_effect=fake_rebuild):
+            watch_loop(yaml_file, on_rebuild=lambda p: None, should_stop=lambda: bool(outputs),
+                       poll_interval=0.01, backend="poll")
+
+        assert outputs and not outputs[0].parent.exists()
@@ -0,0 +1,59 @@
+"""Tests for cost-based admission control."""
+
+import pytest
+
+from redspec.exceptions import QuotaExceededError, RenderTooLargeError
+from redspec.generator.cost import CostEstimate, CostModel
+from redspec.web.admission import Admission, ClientQuotas
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestClientQuotas:
+    def test_bucket_refills_over_time(self):
+        clock = _Clock()
+        quotas = ClientQuotas(60.0, clock=clock)  # one second per second
+        quotas.charge("a", 50.0)
+        with pytest.raises(QuotaExceededError) as info:
+            quotas.charge("a", 20.0)
+        assert info.value.retry_after == 10
+        quotas.charge("b", 20.0)  # other clients are unaffected
+
+        clock.now = 10.0
+        quotas.charge("a", 20.0)
+        assert quotas.rejected == 1
+
+    def test_oversized_render_waits_for_full_bucket(self):
+        clock = _Clock()
+        quotas = ClientQuotas(60.0, clock=clock)
+        quotas.charge("a", 120.0)  # allowed, leaves a debt
+        clock.now = 30.0  # still 30 seconds in debt
+        with pytest.raises(QuotaExceededError):
+            quotas.charge("a", 1.0)
+        clock.now = 70.0
+        quotas.charge("a", 1.0)
+
+
+class TestAdmission:
+    def test_limits(self):
+        admission = Admission(CostModel(), max_seconds=10.0, max_memory=1024**3)
+        admission.check(CostEstimate(seconds=5.0, memory_bytes=1024))
+        with pytest.raises(RenderTooLargeError) as info:
+            admission.check(CostEstimate(seconds=30.0, memory_bytes=3 * 1024**3))
+        assert info.value.reasons == [
+            "estimated 30s to render, limit 10s",
+            "estimated 3.0 GiB of memory, limit 1.0 GiB",
+        ]
+        assert "redspec generate" in str(info.value)
+        assert admission.stats()["rejected_too_large"] == 1
+
+    def test_no_limits_by_default(self):
+        admission = Admission(CostModel())
+        admission.check(CostEstimate(seconds=1e6, memory_bytes=1 << 40))
+        admission.charge("a", CostEstimate(seconds=1e6, memory_bytes=0))
@@ -1,7 +1,9 @@
 """Tests for the Redspec web API."""
 
 import json
+import time
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 
@@ -258,6 +260,15 @@ class TestExportAPI:
         data = resp.json()
         assert data["format"] == "drawio"
 
+    def test_export_drawio_compressed(self, client):
+        resp = client.post("/api/export", json={
+            "yaml_content": _VALID_YAML,
+            "format": "drawio",
+            "compressed": True,
+        })
+        assert resp.status_code == 200
+        assert resp.json()["content"].startswith("<mxfile")
+
     def test_export_unknown_format(self, client):
         resp = client.post("/api/export", json={
             "yaml_content": _VALID_YAML,
@@ -272,6 +283,39 @@ class TestExportAPI:
         })
         assert resp.status_code == 400
 
+    def test_export_stream(self, client):
+        import yaml
+
+        from redspec.exporters.mermaid import export_mermaid
+        from redspec.models.diagram import DiagramSpec
+
+        resp = client.post("/api/export/stream", json={"yaml_content": _VALID_YAML, "format": "mermaid"})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("text/vnd.mermaid")
+        assert 'filename="diagram.mmd"' in resp.headers["content-disposition"]
+        assert resp.text == export_mermaid(DiagramSpec.model_validate(yaml.safe_load(_VALID_YAML)))
+
+        cached = client.post(
+            "/api/export/stream",
+            json={"yaml_content": _VALID_YAML, "format": "mermaid"},
+            headers={"If-None-Match": resp.headers["etag"]},
+        )
+        assert cached.status_code == 304
+
+    def test_export_stream_drawio_uses_one_layout_pass(self, client):
+        with patch("redspec.exporters.drawio.spec_layout", return_value=None) as layout:
+            resp = client.post(
+                "/api/export/stream", json={"yaml_content": _VALID_YAML, "format": "drawio", "compressed": True}
+            )
+        assert resp.status_code == 200
+        assert resp.text.startswith("<mxfile")
+        layout.assert_called_once()
+
+    def test_export_stream_unknown_format(self, client):
+        resp = client.post("/api/export/stream", json={"yaml_content": _VALID_YAML, "format": "nope"})
+        assert resp.status_code == 400
+        assert "mermaid" in resp.json()["detail"]
+
 
 class TestGenerateGlow:
     _YAML = "resources:\n  - type: azure/vm\n    name: vm1\nconnections: []\n"
@@ -331,3 +375,631 @@ class TestGeneratePolish:
         })
         assert resp.status_code == 400
         assert "Invalid polish preset" in resp.json()["detail"]
+
+
+class TestRenderQueue:
+    _YAML = "resources:\n  - type: azure/vm\n    name: vm1\nconnections: []\n"
+
+    def test_preview_is_not_saved(self, client, tmp_path):
+        with patch("redspec.web.app._render_diagram", return_value=b"<svg/>") as render:
+            resp = client.post("/api/generate", json={
+                "yaml_content": self._YAML, "format": "svg", "save": False,
+            })
+        assert resp.status_code == 200
+        assert resp.content == b"<svg/>"
+        assert resp.headers["content-type"] == "image/svg+xml"
+        assert render.called
+        assert client.get("/api/gallery").json() == []
+
+    def test_queue_stats(self, client):
+        stats = client.get("/api/queue").json()
+        assert stats["workers"] == 2
+        assert stats["queued"] == 0
+
+    @pytest.mark.parametrize("reserved,status", [(True, 429), (False, 503)])
+    def test_full_queue_returns_retry_after(self, app, client, reserved, status):
+        from redspec.exceptions import QueueFullError
+
+        with patch.object(app.state.render_queue, "submit", side_effect=QueueFullError(7, reserved=reserved)):
+            resp = client.post("/api/generate", json={"yaml_content": self._YAML, "format": "svg"})
+        assert resp.status_code == status
+        assert resp.headers["Retry-After"] == "7"
+
+
+class TestResultCache:
+    _YAML = "diagram:\n  name: Cached\nresources:\n  - type: azure/vm\n    name: vm1\nconnections: []\n"
+
+    def test_repeated_preview_renders_once(self, client):
+        with patch("redspec.web.app._render_diagram", return_value=b"<svg/>") as render:
+            first = client.post("/api/generate", json={"yaml_content": self._YAML, "format": "svg", "save": False})
+            # Formatting differences do not matter; the validated spec is the key
+            reformatted = self._YAML.replace("name: Cached", "name:   Cached  # same")
+            second = client.post("/api/generate", json={"yaml_content": reformatted, "format": "svg", "save": False})
+        assert first.status_code == second.status_code == 200
+        assert first.headers["etag"] == second.headers["etag"]
+        assert render.call_count == 1
+
+    def test_preview_revalidation_returns_304(self, client):
+        with patch("redspec.web.app._render_diagram", return_value=b"<svg/>") as render:
+            etag = client.post(
+                "/api/generate", json={"yaml_content": self._YAML, "format": "svg", "save": False}
+            ).headers["etag"]
+            resp = client.post(
+                "/api/generate",
+                json={"yaml_content": self._YAML, "format": "svg", "save": False},
+                headers={"If-None-Match": etag},
+            )
+            assert resp.status_code == 304
+            assert resp.content == b""
+
+            resp = client.post(
+                "/api/generate",
+                json={"yaml_content": self._YAML, "format": "png", "save": False},
+                headers={"If-None-Match": etag},
+            )
+            assert resp.status_code == 200
+        assert render.call_count == 2
+
+    def test_save_reuses_render_and_gallery_entry(self, client, tmp_path):
+        with patch("redspec.web.app._render_diagram", return_value=b"<svg/>") as render:
+            client.post("/api/generate", json={"yaml_content": self._YAML, "format": "svg", "save": False})
+            resp = client.post("/api/generate", json={"yaml_content": self._YAML, "format": "svg"})
+            assert resp.headers["x-diagram-slug"] == "cached"
+            meta_file = tmp_path / "output" / "cached" / "metadata.json"
+            stamp = json.loads(meta_file.read_text())["timestamp"]
+
+            resp = client.post("/api/generate", json={"yaml_content": self._YAML, "format": "svg"})
+        assert resp.status_code == 200
+        assert render.call_count == 1
+        assert (tmp_path / "output" / "cached" / "diagram.svg").read_bytes() == b"<svg/>"
+        assert json.loads(meta_file.read_text())["timestamp"] == stamp
+
+    def test_export_etag(self, client):
+        with patch("redspec.web.app._export_text", return_value=b"graph LR") as export:
+            first = client.post("/api/export", json={"yaml_content": self._YAML, "format": "mermaid"})
+            again = client.post(
+                "/api/export",
+                json={"yaml_content": self._YAML, "format": "mermaid"},
+                headers={"If-None-Match": first.headers["etag"]},
+            )
+            client.post("/api/export", json={"yaml_content": self._YAML, "format": "mermaid"})
+        assert first.json() == {"format": "mermaid", "content": "graph LR"}
+        assert again.status_code == 304
+        assert export.call_count == 1
+        assert client.get("/api/cache").json()["hits"] >= 1
+
+
+class TestJobs:
+    _YAML = "diagram:\n  name: Big\nresources:\n  - type: azure/vm\n    name: vm1\nconnections: []\n"
+
+    @staticmethod
+    def _wait(client, job_id, status="succeeded"):
+        import time
+
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            info = client.get(f"/api/jobs/{job_id}").json()
+            if info["status"] == status:
+                return info
+            time.sleep(0.01)
+        raise AssertionError(f"job did not reach {status}: {info}")
+
+    @staticmethod
+    def _fake_render(spec, out_format, glow, cancel_event=None, on_stage=None):
+        for stage in ("build", "layout", "postprocess"):
+            on_stage(stage)
+        return b"<svg>big</svg>"
+
+    def test_job_lifecycle(self, client):
+        with patch("redspec.web.app._render_diagram", side_effect=self._fake_render):
+            resp = client.post("/api/jobs", json={"yaml_content": self._YAML, "format": "svg", "save": False})
+            assert resp.status_code == 202
+            job_id = resp.json()["id"]
+            assert resp.headers["location"] == f"/api/jobs/{job_id}"
+            info = self._wait(client, job_id)
+
+        stages = [s["stage"] for s in info["stages"]]
+        assert stages == ["parse", "validate", "queued", "build", "layout", "postprocess", "succeeded"]
+        assert info["elapsed_seconds"] >= 0
+        artifact = client.get(info["artifact_url"])
+        assert artifact.content == b"<svg>big</svg>"
+        assert artifact.headers["content-type"] == "image/svg+xml"
+        assert client.get(info["artifact_url"], headers={"If-None-Match": artifact.headers["etag"]}).status_code == 304
+
+    def test_job_event_stream(self, client):
+        with patch("redspec.web.app._render_diagram", side_effect=self._fake_render):
+            job_id = client.post("/api/jobs", json={"yaml_content": self._YAML, "format": "svg"}).json()["id"]
+            with client.stream("GET", f"/api/jobs/{job_id}/events") as stream:
+                text = "".join(stream.iter_text())
+        assert "event: done" in text
+        last = json.loads(text.strip().split("data: ")[-1])
+        assert last["status"] == "succeeded"
+        assert last["slug"] == "big"
+
+    def test_cancel_running_job(self, client):
+        import threading
+
+        from redspec.exceptions import RenderCancelledError
+
+        started = threading.Event()
+
+        def blocking_render(spec, out_format, glow, cancel_event=None, on_stage=None):
+            started.set()
+            cancel_event.wait(5)
+            raise RenderCancelledError()
+
+        with patch("redspec.web.app._render_diagram", side_effect=blocking_render):
+            job_id = client.post("/api/jobs", json={"yaml_content": self._YAML, "format": "svg"}).json()["id"]
+            assert started.wait(5)
+            assert client.delete(f"/api/jobs/{job_id}").json()["status"] == "cancelled"
+            self._wait(client, job_id, "cancelled")
+        assert client.get(f"/api/jobs/{job_id}/artifact").status_code == 409
+
+    def test_failed_job_reports_error(self, client):
+        with patch("redspec.web.app._render_diagram", side_effect=RuntimeError("dot crashed")):
+            job_id = client.post("/api/jobs", json={"yaml_content": self._YAML, "format": "svg"}).json()["id"]
+            info = self._wait(client, job_id, "failed")
+        assert info["error"] == "dot crashed"
+        assert client.get(f"/api/jobs/{job_id}/artifact").json()["detail"] == "dot crashed"
+
+    def test_finished_jobs_expire(self, tmp_path):
+        client = TestClient(create_app(output_dir=tmp_path / "out", job_retention=0))
+        with patch("redspec.web.app._render_diagram", return_value=b"x"):
+            job_id = client.post("/api/jobs", json={"yaml_content": self._YAML, "format": "svg"}).json()["id"]
+        import time
+
+        time.sleep(0.05)
+        assert client.get(f"/api/jobs/{job_id}").status_code == 404
+
+    def test_large_spec_switches_to_job(self, tmp_path):
+        client = TestClient(create_app(output_dir=tmp_path / "out", async_threshold=0))
+        with patch("redspec.web.app._render_diagram", side_effect=self._fake_render):
+            resp = client.post("/api/generate", json={"yaml_content": self._YAML, "format": "svg", "save": False})
+            assert resp.status_code == 202
+            self._wait(client, resp.json()["id"])
+            # The result is cached now, so the same request is answered directly
+            resp = client.post("/api/generate", json={"yaml_content": self._YAML, "format": "svg", "save": False})
+        assert resp.status_code == 200
+        assert resp.content == b"<svg>big</svg>"
+
+    def test_unknown_job(self, client):
+        assert client.get("/api/jobs/nope").status_code == 404
+        assert client.delete("/api/jobs/nope").status_code == 404
+
+
+class TestAdmission:
+    _YAML = TestJobs._YAML
+
+    def test_estimate(self, client):
+        data = client.post("/api/estimate", json={"yaml_content": self._YAML, "format": "svg"}).json()
+        assert data["features"]["nodes"] == 1
+        assert data["estimate"]["seconds"] > 0
+        assert data["accepted"] is True and data["background"] is False
+
+    def test_too_large_is_refused(self, tmp_path):
+        client = TestClient(create_app(output_dir=tmp_path / "out", max_render_seconds=0.001))
+        with patch("redspec.web.app._render_diagram") as render:
+            resp = client.post("/api/generate", json={"yaml_content": self._YAML, "format": "svg", "save": False})
+            jobs = client.post("/api/jobs", json={"yaml_content": self._YAML, "format": "svg", "save": False})
+        assert resp.status_code == 413
+        assert "limit" in resp.json()["detail"] and resp.json()["estimate"]["seconds"] > 0
+        assert jobs.status_code == 413
+        render.assert_not_called()
+        estimate = client.post("/api/estimate", json={"yaml_content": self._YAML}).json()
+        assert estimate["accepted"] is False and estimate["reasons"]
+
+    def test_client_quota(self, tmp_path):
+        client = TestClient(create_app(output_dir=tmp_path / "out", client_quota=0.01))
+        body = {"yaml_content": self._YAML, "format": "svg", "save": False}
+        with patch("redspec.web.app._render_diagram", return_value=b"<svg/>"):
+            assert client.post("/api/generate", json=body).status_code == 200
+            # Cached results cost nothing
+            assert client.post("/api/generate", json=body).status_code == 200
+            other = {**body, "theme": "dark"}
+            resp = client.post("/api/generate", json=other)
+        assert resp.status_code == 429
+        assert int(resp.headers["retry-after"]) >= 1
+        assert client.get("/api/queue").json()["admission"]["rejected_quota"] == 1
+
+    def test_renders_calibrate_the_model(self, client, app):
+        with patch("redspec.web.app._render_diagram", return_value=b"<svg/>"):
+            client.post("/api/generate", json={"yaml_content": self._YAML, "format": "svg", "save": False})
+        assert app.state.admission.model.samples == 1
+
+    def test_model_is_kept_across_restarts(self, tmp_path):
+        out = tmp_path / "out"
+        app = create_app(output_dir=out)
+        with TestClient(app) as client, patch("redspec.web.app._render_diagram", return_value=b"<svg/>"):
+            client.post("/api/generate", json={"yaml_content": self._YAML, "format": "svg", "save": False})
+        assert create_app(output_dir=out).state.admission.model.samples == 1
+
+
+class TestGalleryIndex:
+    def test_paginated_search(self, client, tmp_path):
+        out = tmp_path / "output"
+        for i in range(5):
+            _make_gallery_entry(out, f"diagram-{i}", name=f"Diagram {i}")
+        _make_gallery_entry(out, "special", name="Special Network")
+
+        resp = client.get("/api/gallery", params={"limit": 2, "sort": "name", "order": "asc"})
+        assert resp.headers["x-total-count"] == "6"
+        assert [e["slug"] for e in resp.json()] == ["diagram-0", "diagram-1"]
+
+        resp = client.get("/api/gallery", params={"q": "netw"})
+        assert [e["slug"] for e in resp.json()] == ["special"]
+
+    def test_bad_sort(self, client):
+        assert client.get("/api/gallery", params={"sort": "bogus"}).status_code == 400
+
+    def test_patch_and_delete_update_index(self, client, tmp_path):
+        out = tmp_path / "output"
+        _make_gallery_entry(out, "entry", name="Before")
+        assert client.get("/api/gallery", params={"q": "before"}).json()
+        client.patch("/api/gallery/entry", json={"name": "After"})
+        assert not client.get("/api/gallery", params={"q": "before"}).json()
+        assert client.get("/api/gallery", params={"q": "after"}).json()[0]["name"] == "After"
+        client.delete("/api/gallery/entry")
+        assert client.get("/api/gallery").json() == []
+
+
+class TestThumbnails:
+    _SVG = '<svg xmlns="http://www.w3.org/2000/svg" width="80pt" height="40pt" viewBox="0 0 80 40"><text>x</text></svg>'
+
+    def _entry(self, tmp_path):
+        from redspec.generator.output_organizer import organize_output
+
+        gen = tmp_path / "gen.svg"
+        gen.write_text(self._SVG)
+        spec = tmp_path / "spec.yaml"
+        spec.write_text("resources: []\n")
+        return organize_output(gen, spec, tmp_path / "output", "Thumbs")
+
+    def test_listing_links_hashed_thumbnail(self, client, tmp_path):
+        self._entry(tmp_path)
+        entry = client.get("/api/gallery").json()[0]
+        assert entry["thumbnail_url"] == f"/api/gallery/thumbs/thumbnail/{entry['content_hash']}"
+
+        resp = client.get(entry["thumbnail_url"])
+        assert resp.status_code == 200
+        assert resp.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert 'width="320"' in resp.text
+
+    def test_latest_redirects_to_hash(self, client, tmp_path):
+        self._entry(tmp_path)
+        resp = client.get("/api/gallery/thumbs/thumbnail", follow_redirects=False)
+        assert resp.status_code == 307
+        assert resp.headers["location"].startswith("/api/gallery/thumbs/thumbnail/")
+
+    @pytest.mark.parametrize("digest", ["0123456789abcdef0123", "not-hex"])
+    def test_unknown_digest(self, client, tmp_path, digest):
+        self._entry(tmp_path)
+        assert client.get(f"/api/gallery/thumbs/thumbnail/{digest}").status_code == 404
+
+
+class TestRetention:
+    def test_patch_pins_entry(self, client, tmp_path):
+        out = tmp_path / "output"
+        _make_gallery_entry(out, "keep")
+        resp = client.patch("/api/gallery/keep", json={"pinned": True})
+        assert resp.status_code == 200
+        assert json.loads((out / "keep" / "metadata.json").read_text())["pinned"] is True
+
+    def test_viewing_diagram_records_access(self, client, tmp_path):
+        from redspec.generator.gallery_index import GalleryIndex
+
+        out = tmp_path / "output"
+        _make_gallery_entry(out, "seen")
+        _make_gallery_entry(out, "unseen")
+        client.get("/api/gallery")
+        assert client.get("/api/gallery/seen/diagram.png").status_code == 200
+
+        viewed = {e["slug"]: e["last_viewed"] for e in GalleryIndex(out).usage()}
+        assert viewed["seen"] is not None
+        assert viewed["unseen"] is None
+
+    def test_background_gc_runs_in_lifespan(self, tmp_path):
+        from redspec.generator.retention import RetentionPolicy
+
+        out = tmp_path / "output"
+        _make_gallery_entry(out, "old")
+        app = create_app(output_dir=out, retention=RetentionPolicy(max_entries=0), gc_interval=3600)
+        with TestClient(app):
+            deadline = time.monotonic() + 5
+            while app.state.last_gc is None and time.monotonic() < deadline:
+                time.sleep(0.02)
+        assert app.state.last_gc["removed"] == ["old"]
+        assert not (out / "old").exists()
+
+
+class TestHistory:
+    def _save(self, tmp_path, yaml_text, svg):
+        from redspec.generator.output_organizer import organize_output
+
+        gen = tmp_path / "gen.svg"
+        gen.write_text(svg)
+        spec = tmp_path / "spec.yaml"
+        spec.write_text(yaml_text)
+        organize_output(gen, spec, tmp_path / "output", "Test", history_artifacts=1, format="svg", theme="dark")
+
+    def test_list_and_serve_revisions(self, client, tmp_path):
+        self._save(tmp_path, _VALID_YAML, "<svg>1</svg>")
+        self._save(tmp_path, _VALID_YAML + "# edited\n", "<svg>2</svg>")
+
+        revisions = client.get("/api/gallery/test/revisions").json()
+        assert [r["revision"] for r in revisions] == [2, 1]
+        assert [r["artifact"] for r in revisions] == [True, False]
+
+        spec = client.get(revisions[1]["spec_url"])
+        assert spec.text == _VALID_YAML
+        again = client.get(revisions[1]["spec_url"], headers={"If-None-Match": spec.headers["etag"]})
+        assert again.status_code == 304
+
+        latest = client.get(revisions[0]["diagram_url"])
+        assert latest.text == "<svg>2</svg>"
+        assert "x-regenerated" not in latest.headers
+
+    def test_old_diagram_is_regenerated(self, client, tmp_path):
+        self._save(tmp_path, _VALID_YAML, "<svg>1</svg>")
+        self._save(tmp_path, _VALID_YAML + "# edited\n", "<svg>2</svg>")
+
+        with patch("redspec.web.app._render_diagram", return_value=b"<svg>again</svg>") as render:
+            resp = client.get("/api/gallery/test/revisions/1/diagram")
+        assert resp.status_code == 200
+        assert resp.text == "<svg>again</svg>"
+        assert resp.headers["x-regenerated"] == "1"
+        spec, out_format = render.call_args.args[:2]
+        assert (spec.diagram.theme, out_format) == ("dark", "svg")
+
+    def test_unknown_revision(self, client, tmp_path):
+        self._save(tmp_path, _VALID_YAML, "<svg/>")
+        assert client.get("/api/gallery/test/revisions/9/spec").status_code == 404
+        assert client.get("/api/gallery/missing/revisions").status_code == 404
+
+
+class TestMetrics:
+    def test_request_metrics_use_route_templates(self, client, tmp_path):
+        _make_gallery_entry(tmp_path / "output", "one")
+        client.get("/api/gallery/one/spec")
+        client.get("/api/queue")
+        text = client.get("/metrics").text
+
+        assert 'redspec_http_requests_total{method="GET",route="/api/gallery/{slug}/spec",status="200"} 1' in text
+        assert 'redspec_http_request_duration_seconds_count{method="GET",route="/api/queue"} 1' in text
+        assert "redspec_render_queue_depth 0" in text
+        assert "redspec_result_cache_hit_ratio" in text
+
+    def test_render_metrics(self, client):
+        def fake_render(spec, out_format, glow, cancel_event=None, on_stage=None):
+            for stage in ("build", "layout", "postprocess"):
+                on_stage(stage)
+            return b"<svg/>"
+
+        with patch("redspec.web.app._render_diagram", side_effect=fake_render):
+            client.post("/api/generate", json={"yaml_content": _VALID_YAML, "format": "svg", "save": False})
+            client.post("/api/generate", json={"yaml_content": _VALID_YAML, "format": "svg", "save": False})
+        text = client.get("/metrics").text
+
+        assert 'redspec_render_stage_duration_seconds_count{stage="parse"} 2' in text
+        assert 'redspec_render_stage_duration_seconds_count{stage="layout"} 1' in text
+        assert 'redspec_render_output_bytes_count{format="svg"} 1' in text
+        assert "redspec_result_cache_hits_total 1" in text
+        assert client.get("/metrics").headers["content-type"].startswith("text/plain")
+
+    def test_icon_misses_by_pack_namespace(self, client, monkeypatch):
+        from collections import Counter
+        from types import SimpleNamespace
+
+        from redspec.web import app as web_app
+
+        registry = SimpleNamespace(misses=Counter({"azure": 2, "other": 1}))
+        monkeypatch.setattr(web_app, "_registry_cache", ([], registry))
+        text = client.get("/metrics").text
+
+        assert 'redspec_icon_misses_total{namespace="azure"} 2' in text
+        assert 'redspec_icon_misses_total{namespace="other"} 1' in text
+
+
+class TestMultiWorker:
+    _YAML = TestJobs._YAML
+
+    def test_jobs_are_shared_between_workers(self, tmp_path):
+        out = tmp_path / "output"
+        first = TestClient(create_app(output_dir=out, cache_dir=tmp_path / "cache", shared_state=True))
+        second = TestClient(create_app(output_dir=out, cache_dir=tmp_path / "cache", shared_state=True))
+
+        with patch("redspec.web.app._render_diagram", side_effect=TestJobs._fake_render):
+            job_id = first.post("/api/jobs", json={"yaml_content": self._YAML, "format": "svg"}).json()["id"]
+            TestJobs._wait(first, job_id)
+
+        info = second.get(f"/api/jobs/{job_id}").json()
+        assert info["status"] == "succeeded"
+        assert second.get(info["artifact_url"]).content == b"<svg>big</svg>"
+        assert [e["slug"] for e in second.get("/api/gallery").json()] == ["big"]
+
+    def test_app_from_environment(self, tmp_path, monkeypatch):
+        from redspec.web.app import SERVE_CONFIG_ENV, create_app_from_env
+
+        config = {
+            "output_dir": str(tmp_path / "output"),
+            "render_workers": 3,
+            "retention": {"max_bytes": None, "max_entries": 10, "max_age": None},
+            "shared_state": True,
+        }
+        monkeypatch.setenv(SERVE_CONFIG_ENV, json.dumps(config))
+        app = create_app_from_env()
+        assert app.state.render_queue.workers == 3
+        assert app.state.job_store.shared_path == tmp_path / "output" / ".jobs.db"
+
+    def test_icon_registry_follows_installed_packs(self, monkeypatch):
+        from redspec.web import app as web_app
+
+        monkeypatch.setattr(web_app, "_registry_cache", None)
+        state = [("azure", 1.0)]
+        monkeypatch.setattr("redspec.web.result_cache._icon_state", lambda: list(state))
+        with patch("redspec.icons.registry.IconRegistry", side_effect=lambda: object()):
+            first = web_app._icon_registry()
+            assert web_app._icon_registry() is first
+            state.append(("aws", 2.0))
+            assert web_app._icon_registry() is not first
+
+
+class TestCompression:
+    _YAML = "diagram:\n  name: Large\nresources:\n  - type: azure/vm\n    name: vm1\nconnections: []\n"
+    _SVG = b'<svg xmlns="http://www.w3.org/2000/svg">' + b'<rect width="1" height="1"/>' * 500 + b"</svg>"
+
+    def test_static_assets_are_fingerprinted_and_precompressed(self, client):
+        import re
+
+        url = re.search(r'src="(/static/app\.[0-9a-f]{12}\.js)"', client.get("/").text).group(1)
+        resp = client.get(url, headers={"Accept-Encoding": "gzip"})
+        assert resp.headers["content-encoding"] == "gzip"
+        assert resp.headers["cache-control"] == "public, max-age=31536000, immutable"
+        assert "function" in resp.text
+
+        plain = client.get("/static/app.js", headers={"Accept-Encoding": "identity"})
+        assert plain.headers["cache-control"] == "no-cache"
+        assert "content-encoding" not in plain.headers
+        assert plain.content == resp.content
+        again = client.get("/static/app.js", headers={"If-None-Match": plain.headers["etag"]})
+        assert again.status_code == 304
+        assert client.get("/static/missing.js").status_code == 404
+
+    def test_svg_response_is_compressed(self, client):
+        with patch("redspec.web.app._render_diagram", return_value=self._SVG):
+            resp = client.post(
+                "/api/generate",
+                json={"yaml_content": self._YAML, "format": "svg", "save": False},
+                headers={"Accept-Encoding": "gzip"},
+            )
+            plain = client.post(
+                "/api/generate",
+                json={"yaml_content": self._YAML, "format": "svg", "save": False},
+                headers={"Accept-Encoding": "identity"},
+            )
+        assert resp.headers["content-encoding"] == "gzip"
+        assert resp.headers["vary"] == "Accept-Encoding"
+        assert resp.headers["etag"] == f"W/{plain.headers['etag']}"
+        assert int(resp.headers["content-length"]) < len(self._SVG) / 5
+        assert resp.content == plain.content == self._SVG
+        assert "content-encoding" not in plain.headers
+
+        with patch("redspec.web.app._render_diagram", return_value=self._SVG):
+            cached = client.post(
+                "/api/generate",
+                json={"yaml_content": self._YAML, "format": "svg", "save": False},
+                headers={"If-None-Match": resp.headers["etag"]},
+            )
+        assert cached.status_code == 304
+
+    def test_export_is_compressed(self, client):
+        resources = "".join(f"  - type: azure/vm\n    name: vm{i}\n" for i in range(100))
+        resp = client.post(
+            "/api/export",
+            json={"yaml_content": f"resources:\n{resources}", "format": "drawio"},
+            headers={"Accept-Encoding": "gzip"},
+        )
+        assert resp.status_code == 200
+        assert resp.headers["content-encoding"] == "gzip"
+        assert "mxGraphModel" in resp.json()["content"]
+
+    def test_gallery_svgz(self, tmp_path):
+        client = TestClient(create_app(output_dir=tmp_path / "output", compress_svg=True))
+        with patch("redspec.web.app._render_diagram", return_value=self._SVG):
+            client.post("/api/generate", json={"yaml_content": self._YAML, "format": "svg", "save": True})
+        slug_dir = tmp_path / "output" / "large"
+        assert (slug_dir / "diagram.svgz").is_file()
+        assert not (slug_dir / "diagram.svg").exists()
+
+        resp = client.get("/api/gallery/large/diagram.svg", headers={"Accept-Encoding": "gzip"})
+        assert resp.headers["content-encoding"] == "gzip"
+        assert resp.headers["content-type"] == "image/svg+xml"
+        assert resp.content == self._SVG
+        plain = client.get("/api/gallery/large/diagram.svg", headers={"Accept-Encoding": "identity"})
+        assert "content-encoding" not in plain.headers
+        assert plain.content == self._SVG
+
+        revision = client.get("/api/gallery/large/revisions/1/diagram", headers={"Accept-Encoding": "gzip"})
+        assert revision.content == self._SVG
+        assert "X-Regenerated" not in revision.headers
+
+    def test_gallery_svg_is_compressed(self, client, tmp_path):
+        with patch("redspec.web.app._render_diagram", return_value=self._SVG):
+            client.post("/api/generate", json={"yaml_content": self._YAML, "format": "svg", "save": True})
+        resp = client.get("/api/gallery/large/diagram.svg", headers={"Accept-Encoding": "gzip"})
+        assert resp.headers["content-encoding"] == "gzip"
+        assert resp.content == self._SVG
+
+
+class TestResourceCatalogue:
+    @pytest.fixture(autouse=True)
+    def fresh_catalogue(self, monkeypatch):
+        from redspec.web import app as web_app
+
+        monkeypatch.setattr(web_app, "_catalogue_cache", None)
+
+    def test_ranked_page(self, client):
+        resp = client.get("/api/resources", params={"q": "vm", "limit": 3})
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["items"][0]["type"] == "azure/vm"
+        assert len(data["items"]) == 3
+        assert data["total"] > 3 and data["next_cursor"]
+
+        following = client.get("/api/resources", params={"q": "vm", "limit": 3, "cursor": data["next_cursor"]})
+        assert not {i["type"] for i in following.json()["items"]} & {i["type"] for i in data["items"]}
+
+    def test_namespace_filter(self, client):
+        items = client.get("/api/resources", params={"namespace": "aws", "limit": 200}).json()["items"]
+        assert items and {item["namespace"] for item in items} == {"aws"}
+
+    def test_etag_follows_installed_packs(self, client, monkeypatch):
+        first = client.get("/api/resources", params={"q": "sql"})
+        etag = first.headers["etag"]
+        assert client.get("/api/resources", params={"q": "sql"}, headers={"If-None-Match": etag}).status_code == 304
+
+        monkeypatch.setattr("redspec.web.result_cache._icon_state", lambda: [("azure", 42.0)])
+        changed = client.get("/api/resources", params={"q": "sql"}, headers={"If-None-Match": etag})
+        assert changed.status_code == 200
+        assert changed.headers["etag"] != etag
+
+    def test_bad_cursor(self, client):
+        assert client.get("/api/resources", params={"cursor": "x"}).status_code == 400
+        assert client.get("/api/resources", params={"limit": 0}).status_code == 422
+
+
+class TestPreviewSocket:
+    @pytest.fixture(autouse=True)
+    def fake_render(self):
+        with patch("redspec.web.app._render_incremental", return_value=(b"<svg>live</svg>", "relayout")) as render:
+            yield render
+
+    def test_full_text_then_edits(self, client, fake_render):
+        fake_render.side_effect = [(b"<svg>live</svg>", "relayout"), (b"<svg>renamed</svg>", "relayout")]
+        with client.websocket_connect("/ws/preview") as ws:
+            ws.send_json({"type": "full", "version": 1, "yaml_content": _VALID_YAML})
+            validation = ws.receive_json()
+            assert validation["type"] == "validation" and validation["valid"]
+            preview = ws.receive_json()
+            assert preview == {"type": "preview", "version": 1, "level": "relayout", "svg": "<svg>live</svg>"}
+
+            ws.send_json({"type": "edit", "base": 5, "version": 6, "changes": []})
+            assert ws.receive_json() == {"type": "resync", "version": 1}
+
+            at = _VALID_YAML.index("Test")
+            ws.send_json({
+                "type": "edit", "base": 1, "version": 2,
+                "changes": [{"from": at, "to": at + 4, "text": "Live"}],
+                "length": len(_VALID_YAML),
+            })
+            validation = ws.receive_json()
+            assert validation["version"] == 2 and validation["name"] == "Live"
+            # The title changed, so the diagram is redrawn
+            assert ws.receive_json()["svg"] == "<svg>renamed</svg>"
+        assert fake_render.call_count == 2
+
+    def test_bad_messages(self, client):
+        with client.websocket_connect("/ws/preview") as ws:
+            ws.send_text("not json")
+            assert ws.receive_json()["type"] == "error"
+            ws.send_json({"type": "launch"})
+            assert "Unknown message type" in ws.receive_json()["message"]
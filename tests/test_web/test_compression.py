@@ -0,0 +1,85 @@
+"""Tests for response compression and static assets."""
+
+import gzip
+
+import pytest
+
+from redspec.web.assets import StaticAssets
+from redspec.web.compression import (
+    MIN_SIZE,
+    choose_encoding,
+    compress,
+    encoded_headers,
+    negotiate,
+)
+
+
+class TestNegotiation:
+    @pytest.mark.parametrize("header, expected", [
+        (None, None),
+        ("", None),
+        ("gzip", "gzip"),
+        ("deflate, gzip;q=0.5", "gzip"),
+        ("gzip;q=0", None),
+        ("*", "gzip"),
+        ("*, gzip;q=0", None),
+        ("identity", None),
+    ])
+    def test_choose_encoding(self, header, expected):
+        assert choose_encoding(header, ("gzip",)) == expected
+
+    def test_prefers_higher_quality(self):
+        assert choose_encoding("gzip;q=0.4, br", ("br", "gzip")) == "br"
+        assert choose_encoding("gzip, br;q=0.4", ("br", "gzip")) == "gzip"
+
+    def test_only_large_compressible_bodies(self):
+        assert negotiate("gzip", "image/svg+xml", MIN_SIZE) == "gzip"
+        assert negotiate("gzip", "image/svg+xml", MIN_SIZE - 1) is None
+        assert negotiate("gzip", "image/png", 10 * MIN_SIZE) is None
+        assert negotiate("gzip", "application/json", 10 * MIN_SIZE) == "gzip"
+
+    def test_gzip_is_reproducible(self):
+        data = b"<svg>" + b"<g/>" * 1000 + b"</svg>"
+        assert compress(data, "gzip") == compress(data, "gzip")
+        assert gzip.decompress(compress(data, "gzip")) == data
+
+    def test_unknown_encoding(self):
+        with pytest.raises(ValueError):
+            compress(b"x", "zstd")
+
+    def test_encoded_headers(self):
+        headers = encoded_headers({"ETag": '"abc"'}, "gzip")
+        assert headers == {"ETag": 'W/"abc"', "Content-Encoding": "gzip", "Vary": "Accept-Encoding"}
+        assert encoded_headers({"ETag": '"abc"'}, None, "image/svg+xml") == {
+            "ETag": '"abc"', "Vary": "Accept-Encoding",
+        }
+        assert encoded_headers({}, None, "image/png") == {}
+
+
+class TestStaticAssets:
+    @pytest.fixture
+    def assets(self, tmp_path):
+        (tmp_path / "app.js").write_text("console.log('redspec');\n" * 200)
+        (tmp_path / "logo.png").write_bytes(b"\x89PNG" + bytes(2000))
+        return StaticAssets(tmp_path)
+
+    def test_fingerprinted_urls(self, assets):
+        url = assets.url("app.js")
+        assert url.startswith("/static/app.") and url.endswith(".js") and url != "/static/app.js"
+        asset, fingerprinted = assets.lookup(url.removeprefix("/static/"))
+        assert fingerprinted and asset.name == "app.js"
+        assert assets.lookup("app.js") == (asset, False)
+        assert assets.lookup("app.000000000000.js") == (asset, False)
+        assert assets.lookup("missing.js") is None
+        assert assets.url("missing.js") == "/static/missing.js"
+
+    def test_precompressed_variants(self, assets):
+        asset, _ = assets.lookup("app.js")
+        body, encoding = assets.select(asset, "gzip")
+        assert encoding == "gzip" and gzip.decompress(body) == asset.data
+        assert assets.select(asset, None) == (asset.data, None)
+
+    def test_binary_files_are_not_compressed(self, assets):
+        asset, _ = assets.lookup("logo.png")
+        assert asset.encoded == {}
+        assert assets.select(asset, "gzip") == (asset.data, None)
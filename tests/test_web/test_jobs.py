@@ -0,0 +1,68 @@
+"""Tests for the background job store."""
+
+import sqlite3
+
+from redspec.web.jobs import CANCELLED, RUNNING, SUCCEEDED, Job, JobStore
+
+
+class TestSharedJobStore:
+    def test_other_worker_sees_job_state(self, tmp_path):
+        owner = JobStore(shared_path=tmp_path / "jobs.db")
+        other = JobStore(shared_path=tmp_path / "jobs.db")
+        job = owner.add(Job(cache_key="k" * 64, etag='"abc"'))
+        owner.set_stage(job, "layout")
+
+        remote = other.get(job.id)
+        assert remote.remote
+        assert (remote.status, remote.stage, remote.cache_key) == (RUNNING, "layout", "k" * 64)
+
+        owner.finish(job, SUCCEEDED, artifact=b"data", slug="demo")
+        refreshed = other.refresh(remote)
+        assert refreshed.status == SUCCEEDED
+        assert refreshed.as_dict()["artifact_url"] == f"/api/jobs/{job.id}/artifact"
+        assert refreshed.artifact is None
+        assert other.counts() == {SUCCEEDED: 1}
+
+    def test_cancel_from_other_worker(self, tmp_path):
+        owner = JobStore(shared_path=tmp_path / "jobs.db")
+        other = JobStore(shared_path=tmp_path / "jobs.db")
+        job = owner.add(Job())
+        owner.set_stage(job, "build")
+
+        other.cancel(other.get(job.id))
+        assert not job.done
+        owner.set_stage(job, "layout")
+        assert job.status == CANCELLED
+        assert job.cancel_event.is_set()
+        assert other.get(job.id).status == CANCELLED
+
+    def test_discard_removes_shared_state(self, tmp_path):
+        owner = JobStore(shared_path=tmp_path / "jobs.db")
+        job = owner.add(Job())
+        owner.finish(job, SUCCEEDED)
+        owner.discard(job.id)
+        assert JobStore(shared_path=tmp_path / "jobs.db").get(job.id) is None
+
+    def test_counts_by_status(self, tmp_path):
+        owner = JobStore(shared_path=tmp_path / "jobs.db")
+        for stage in ("build", "layout"):
+            owner.set_stage(owner.add(Job()), stage)
+        owner.finish(owner.add(Job()), CANCELLED)
+        assert JobStore(shared_path=tmp_path / "jobs.db").counts() == {RUNNING: 2, CANCELLED: 1}
+
+    def test_table_from_older_release_is_replaced(self, tmp_path):
+        conn = sqlite3.connect(tmp_path / "jobs.db")
+        conn.execute("CREATE TABLE jobs (id TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)")
+        conn.commit()
+        conn.close()
+
+        store = JobStore(shared_path=tmp_path / "jobs.db")
+        job = store.add(Job())
+        assert JobStore(shared_path=tmp_path / "jobs.db").get(job.id).remote
+
+    def test_unshared_store_keeps_jobs_local(self, tmp_path):
+        store = JobStore()
+        job = store.add(Job())
+        assert store.get(job.id) is job
+        assert store.refresh(job) is job
+        assert JobStore().get(job.id) is None
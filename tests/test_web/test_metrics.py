@@ -0,0 +1,76 @@
+"""Tests for the web app's metrics."""
+
+import pytest
+
+from redspec.exceptions import GraphvizError, RenderCancelledError
+from redspec.web.metrics import AppMetrics, Counter, Gauge, Histogram, MetricsRegistry
+
+
+class TestPrimitives:
+    def test_counter_renders_total(self):
+        registry = MetricsRegistry()
+        counter = registry.register(Counter("hits", "Hits.", ("path",)))
+        counter.inc(path="/a")
+        counter.inc(2, path='/b"')
+        text = registry.render()
+        assert "# TYPE hits counter" in text
+        assert 'hits_total{path="/a"} 1' in text
+        assert 'hits_total{path="/b\\""} 2' in text
+
+    def test_counter_checks_labels(self):
+        with pytest.raises(ValueError):
+            Counter("hits", "Hits.", ("path",)).inc(route="/")
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry()
+        hist = registry.register(Histogram("latency", "Latency.", buckets=(0.1, 1.0)))
+        for value in (0.05, 0.5, 0.7, 3.0):
+            hist.observe(value)
+        text = registry.render()
+        assert 'latency_bucket{le="0.1"} 1' in text
+        assert 'latency_bucket{le="1"} 3' in text
+        assert 'latency_bucket{le="+Inf"} 4' in text
+        assert "latency_sum 4.25" in text
+        assert "latency_count 4" in text
+        assert hist.count() == 4
+
+    def test_failing_gauge_is_skipped(self):
+        registry = MetricsRegistry()
+        registry.register(Gauge("broken", "Broken.", lambda: 1 / 0))
+        registry.register(Gauge("depth", "Depth.", lambda: 3))
+        text = registry.render()
+        assert "broken" not in text
+        assert "depth 3" in text
+
+
+class TestRenderObserver:
+    def test_stage_durations_and_size(self):
+        metrics = AppMetrics()
+        observer = metrics.render_observer("svg")
+        for stage in ("build", "layout", "postprocess"):
+            observer.stage(stage)
+        observer.done(b"x" * 2000, None)
+
+        for stage in ("build", "layout", "postprocess"):
+            assert metrics.stage_seconds.count(stage=stage) == 1
+        assert metrics.output_bytes.count(format="svg") == 1
+        assert metrics.render_seconds.count(format="svg") == 1
+
+    @pytest.mark.parametrize(
+        "error, reason",
+        [
+            (GraphvizError("dot exited with status 1: syntax error"), "error"),
+            (GraphvizError("Graphviz executable not found: 'dot'."), "not_found"),
+            (RenderCancelledError(), "cancelled"),
+        ],
+    )
+    def test_graphviz_failures(self, error, reason):
+        metrics = AppMetrics()
+        metrics.render_observer("png").done(None, error)
+        assert metrics.graphviz_failures.value(reason=reason) == 1
+        assert metrics.output_bytes.count(format="png") == 0
+
+    def test_other_errors(self):
+        metrics = AppMetrics()
+        metrics.render_observer("png").done(None, ValueError("bad"))
+        assert metrics.render_errors.value(type="ValueError") == 1
@@ -0,0 +1,156 @@
+"""Tests for live preview sessions."""
+
+import asyncio
+
+import pytest
+
+from redspec.web.preview import PreviewSession, apply_changes
+
+_YAML = "diagram:\n  name: Live\nresources:\n  - type: azure/vm\n    name: vm1\nconnections: []\n"
+
+
+class TestApplyChanges:
+    def test_changes_apply_in_order(self):
+        text = apply_changes("hello world", [{"from": 0, "to": 5, "text": "goodbye"}, {"from": 13, "to": 13, "text": "!"}])
+        assert text == "goodbye world!"
+
+    def test_offsets_count_utf16_units(self):
+        # The emoji is two UTF-16 code units, as the browser counts them
+        assert apply_changes("a\U0001F600b", [{"from": 3, "to": 4, "text": "c"}]) == "a\U0001F600c"
+
+    def test_change_outside_text(self):
+        with pytest.raises(ValueError):
+            apply_changes("abc", [{"from": 2, "to": 9, "text": ""}])
+
+
+class _Session:
+    """A session with recorded messages and renders, flushed explicitly."""
+
+    def __init__(self):
+        self.sent = []
+        self.rendered = []
+
+        async def send(message):
+            self.sent.append(message)
+
+        async def render(spec):
+            self.rendered.append(spec)
+            return f"<svg>{spec.diagram.theme}|{len(spec.connections)}</svg>".encode(), "relayout"
+
+        self.session = PreviewSession(send, render)
+
+    def step(self, message):
+        reply = self.session.receive(message)
+        asyncio.run(self.session.flush())
+        sent, self.sent = self.sent, []
+        return reply, sent
+
+
+class TestPreviewSession:
+    def test_full_text_validates_and_renders(self):
+        s = _Session()
+        reply, sent = s.step({"yaml_content": _YAML, "theme": "dark"})
+        assert reply is None
+        assert [m["type"] for m in sent] == ["validation", "preview"]
+        assert sent[0]["valid"] and sent[0]["name"] == "Live"
+        assert sent[1]["svg"] == "<svg>dark|0</svg>"
+
+    def test_edits_are_applied_to_the_session_text(self):
+        s = _Session()
+        s.step({"yaml_content": _YAML, "version": 1})
+        at = _YAML.index("Live")
+        reply, sent = s.step({
+            "type": "edit", "base": 1, "version": 2,
+            "changes": [{"from": at, "to": at + 4, "text": "Edited"}],
+            "length": len(_YAML) + 2,
+        })
+        assert reply is None
+        assert s.session.text == _YAML.replace("Live", "Edited")
+        assert sent[0]["type"] == "validation" and sent[0]["name"] == "Edited"
+
+    @pytest.mark.parametrize("edit", [
+        {"type": "edit", "base": 7, "version": 8, "changes": []},
+        {"type": "edit", "base": 1, "version": 2, "changes": [{"from": 0, "to": 0, "text": "#"}], "length": 1},
+        {"type": "edit", "base": 1, "version": 2, "changes": [{"from": 0, "to": 10_000, "text": ""}]},
+    ])
+    def test_out_of_step_edits_ask_for_resync(self, edit):
+        s = _Session()
+        s.step({"yaml_content": _YAML, "version": 1})
+        reply = s.session.receive(edit)
+        assert reply == {"type": "resync", "version": 1}
+        assert s.session.text == _YAML
+
+    def test_unchanged_picture_is_not_rerendered(self):
+        s = _Session()
+        s.step({"yaml_content": _YAML})
+        # A comment changes neither validation nor the picture
+        _, sent = s.step({"yaml_content": "# note\n" + _YAML})
+        assert sent == []
+        assert len(s.rendered) == 1
+
+    def test_only_validation_differences_are_pushed(self):
+        s = _Session()
+        s.step({"yaml_content": _YAML})
+        _, sent = s.step({"yaml_content": "resources: [oops"})
+        assert [m["type"] for m in sent] == ["validation"]
+        assert sent[0]["valid"] is False and "Invalid YAML" in sent[0]["error"]
+
+        _, sent = s.step({"yaml_content": _YAML})
+        assert sent[0]["valid"] is True
+        # Back to the spec last rendered: nothing to draw
+        assert [m["type"] for m in sent] == ["validation"]
+
+    def test_lint_warnings_are_sent_as_differences(self):
+        s = _Session()
+        _, sent = s.step({"yaml_content": _YAML})
+        orphan = sent[0]["added"]
+        assert orphan and sent[0]["removed"] == []
+
+        connected = _YAML.replace(
+            "    name: vm1\nconnections: []\n",
+            "    name: vm1\n  - type: azure/vm\n    name: vm2\nconnections:\n  - source: vm1\n    to: vm2\n",
+        )
+        _, sent = s.step({"yaml_content": connected})
+        assert sent[0]["removed"] == orphan
+
+    def test_options_change_rerenders(self):
+        s = _Session()
+        s.step({"yaml_content": _YAML, "theme": "default"})
+        _, sent = s.step({"type": "options", "theme": "dark"})
+        assert sent[-1]["svg"] == "<svg>dark|0</svg>"
+
+    def test_render_failure_is_reported(self):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def render(spec):
+            raise RuntimeError("dot crashed")
+
+        session = PreviewSession(send, render)
+        session.receive({"yaml_content": _YAML})
+        asyncio.run(session.flush())
+        assert sent[-1] == {"type": "error", "version": 1, "message": "dot crashed"}
+
+    def test_run_debounces_bursts(self):
+        async def main():
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+
+            async def render(spec):
+                return b"<svg/>", "relayout"
+
+            session = PreviewSession(send, render, debounce=0.05)
+            worker = asyncio.create_task(session.run())
+            for i in range(5):
+                session.receive({"yaml_content": _YAML.replace("Live", f"Live {i}")})
+                await asyncio.sleep(0.01)
+            await asyncio.sleep(0.3)
+            worker.cancel()
+            return sent
+
+        sent = asyncio.run(main())
+        assert [m["name"] for m in sent if m["type"] == "validation"] == ["Live 4"]
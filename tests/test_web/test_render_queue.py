@@ -0,0 +1,107 @@
+"""Tests for the web app's bounded render queue."""
+
+import asyncio
+import threading
+
+import pytest
+
+from redspec.exceptions import QueueFullError
+from redspec.web.render_queue import Priority, RenderQueue
+
+
+@pytest.fixture
+def queue():
+    q = RenderQueue(workers=1, max_queued=4)
+    yield q
+    q.shutdown()
+
+
+def _blocker(queue):
+    """Occupy the single worker until the returned event is set."""
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+        return "blocked"
+
+    future = queue.submit(block)
+    assert started.wait(5)
+    return release, future
+
+
+class TestRenderQueue:
+    def test_runs_job(self, queue):
+        assert queue.submit(lambda a, b=0: a + b, 1, b=2).result(timeout=5) == 3
+        assert queue.stats()["completed"] == 1
+
+    def test_propagates_errors(self, queue):
+        def fail():
+            raise ValueError("boom")
+
+        with pytest.raises(ValueError, match="boom"):
+            queue.submit(fail).result(timeout=5)
+
+    def test_interactive_jobs_start_first(self, queue):
+        release, first = _blocker(queue)
+        order = []
+        jobs = [
+            queue.submit(order.append, "save-1", priority=Priority.BACKGROUND),
+            queue.submit(order.append, "save-2", priority=Priority.BACKGROUND),
+            queue.submit(order.append, "preview", priority=Priority.INTERACTIVE),
+        ]
+        assert queue.stats()["queued"] == 3
+        release.set()
+        for job in [first, *jobs]:
+            job.result(timeout=5)
+        assert order == ["preview", "save-1", "save-2"]
+
+    def test_background_jobs_leave_reserved_room(self, queue):
+        release, first = _blocker(queue)
+        try:
+            for _ in range(3):
+                queue.submit(lambda: None, priority=Priority.BACKGROUND)
+            with pytest.raises(QueueFullError) as err:
+                queue.submit(lambda: None, priority=Priority.BACKGROUND)
+            assert err.value.reserved
+            assert err.value.retry_after >= 1
+
+            queue.submit(lambda: None, priority=Priority.INTERACTIVE)
+            with pytest.raises(QueueFullError) as err:
+                queue.submit(lambda: None, priority=Priority.INTERACTIVE)
+            assert not err.value.reserved
+            assert queue.stats()["rejected"] == 2
+        finally:
+            release.set()
+        first.result(timeout=5)
+
+    def test_cancelled_waiting_job_is_skipped(self, queue):
+        release, first = _blocker(queue)
+        ran = []
+        waiting = queue.submit(ran.append, 1)
+        assert waiting.cancel()
+        release.set()
+        first.result(timeout=5)
+        assert queue.submit(lambda: "after").result(timeout=5) == "after"
+        assert ran == []
+
+    def test_run_awaits_without_blocking_loop(self, queue):
+        async def main():
+            release, _ = _blocker(queue)
+            task = asyncio.ensure_future(queue.run(lambda: "done"))
+            await asyncio.sleep(0.01)
+            assert not task.done()  # the loop keeps running while the job waits
+            release.set()
+            return await task
+
+        assert asyncio.run(main()) == "done"
+
+    def test_stats_report_wait_time(self, queue):
+        release, _ = _blocker(queue)
+        waiting = queue.submit(lambda: None)
+        threading.Timer(0.05, release.set).start()
+        waiting.result(timeout=5)
+        stats = queue.stats()
+        assert stats["avg_wait_seconds"] > 0
+        assert stats["workers"] == 1 and stats["queued"] == 0
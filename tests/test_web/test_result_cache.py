@@ -0,0 +1,164 @@
+"""Tests for the web result cache."""
+
+import asyncio
+import threading
+
+import pytest
+
+from redspec.models.diagram import DiagramSpec
+from redspec.web.result_cache import ResultCache, cache_key, etag_for, etag_matches
+
+
+def _spec(name="Cache", **diagram):
+    return DiagramSpec.model_validate({
+        "diagram": {"name": name, **diagram},
+        "resources": [{"type": "azure/vm", "name": "vm1"}],
+    })
+
+
+class TestCacheKey:
+    def test_same_spec_same_key(self):
+        assert cache_key("generate", _spec(), format="svg") == cache_key("generate", _spec(), format="svg")
+
+    @pytest.mark.parametrize("other", [
+        ("export", _spec(), {"format": "svg"}),
+        ("generate", _spec(name="Other"), {"format": "svg"}),
+        ("generate", _spec(), {"format": "png"}),
+    ])
+    def test_kind_spec_and_options_change_key(self, other):
+        kind, spec, options = other
+        assert cache_key(kind, spec, **options) != cache_key("generate", _spec(), format="svg")
+
+    def test_etag_matching(self):
+        etag = etag_for("ab" * 32)
+        assert etag_matches(etag, etag)
+        assert etag_matches(f'"other", {etag}', etag)
+        assert etag_matches("*", etag)
+        assert not etag_matches(None, etag)
+        assert not etag_matches('"other"', etag)
+
+    def test_etag_matching_is_weak(self):
+        etag = etag_for("ab" * 32)
+        assert etag_matches(f"W/{etag}", etag)
+        assert etag_matches(etag, f"W/{etag}")
+
+
+class TestResultCache:
+    def test_memory_lru_eviction(self):
+        cache = ResultCache(max_entries=2)
+        cache.put("a", b"1")
+        cache.put("b", b"2")
+        assert cache.get("a") == b"1"  # a is now most recent
+        cache.put("c", b"3")
+        assert cache.get("b") is None
+        assert cache.get("a") == b"1"
+        assert cache.get("c") == b"3"
+
+    def test_memory_byte_limit(self):
+        cache = ResultCache(max_memory_bytes=10)
+        cache.put("a", b"x" * 6)
+        cache.put("b", b"y" * 6)
+        assert cache.get("a") is None
+        assert cache.stats()["memory_bytes"] == 6
+
+    def test_disk_level_survives_restart(self, tmp_path):
+        ResultCache(tmp_path).put("k" * 64, b"data")
+        fresh = ResultCache(tmp_path)
+        assert fresh.get("k" * 64) == b"data"
+        assert fresh.stats()["hits"] == 1
+
+    def test_disk_pruning(self, tmp_path):
+        cache = ResultCache(tmp_path, max_disk_bytes=25)
+        for i in range(5):
+            cache.put(f"{i:02d}" + "k" * 62, b"x" * 10)
+        files = [f for f in tmp_path.glob("*/*") if f.is_file()]
+        assert sum(f.stat().st_size for f in files) <= 25
+
+    def test_single_flight(self):
+        cache = ResultCache()
+        calls = []
+
+        async def produce():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return b"rendered"
+
+        async def main():
+            return await asyncio.gather(*(cache.get_or_create("key", produce) for _ in range(5)))
+
+        assert asyncio.run(main()) == [b"rendered"] * 5
+        assert calls == [1]
+        assert cache.get("key") == b"rendered"
+
+    def test_failure_is_shared_and_not_cached(self):
+        cache = ResultCache()
+        calls = []
+
+        async def produce():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            raise ValueError("render failed")
+
+        async def main():
+            return await asyncio.gather(
+                *(cache.get_or_create("key", produce) for _ in range(3)), return_exceptions=True
+            )
+
+        results = asyncio.run(main())
+        assert all(isinstance(r, ValueError) for r in results)
+        assert calls == [1]
+        assert cache.get("key") is None
+
+    def test_cancelled_caller_does_not_fail_the_others(self):
+        cache = ResultCache()
+        calls = []
+
+        async def produce():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return b"rendered"
+
+        async def main():
+            leader = asyncio.create_task(cache.get_or_create("key", produce))
+            await asyncio.sleep(0)
+            follower = asyncio.create_task(cache.get_or_create("key", produce))
+            quitter = asyncio.create_task(cache.get_or_create("key", produce))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            quitter.cancel()
+            results = await asyncio.gather(leader, follower, quitter, return_exceptions=True)
+            return results, await cache.get_or_create("key", produce)
+
+        (leader, follower, quitter), again = asyncio.run(main())
+        assert isinstance(leader, asyncio.CancelledError)
+        assert isinstance(quitter, asyncio.CancelledError)
+        assert follower == b"rendered"
+        assert again == b"rendered"
+        assert calls == [1]
+
+    def test_async_methods_keep_disk_io_off_the_loop(self, tmp_path, monkeypatch):
+        cache = ResultCache(tmp_path)
+        threads = []
+        read_disk, write_disk = cache._read_disk, cache._write_disk
+
+        def recording(fn):
+            def wrapper(*args):
+                threads.append(threading.current_thread())
+                return fn(*args)
+            return wrapper
+
+        monkeypatch.setattr(cache, "_read_disk", recording(read_disk))
+        monkeypatch.setattr(cache, "_write_disk", recording(write_disk))
+
+        async def produce():
+            return b"rendered"
+
+        async def main():
+            assert await cache.get_or_create("k" * 64, produce) == b"rendered"
+            await cache.aput("j" * 64, b"other")
+            assert await ResultCache(tmp_path).apeek("j" * 64) == b"other"
+
+        asyncio.run(main())
+        assert len(threads) == 3  # read miss, write, write
+        assert threading.main_thread() not in threads
+        assert ResultCache(tmp_path).get("k" * 64) == b"rendered"
@@ -3,7 +3,7 @@
 import pytest
 
 from redspec.exceptions import IncludeFileNotFoundError
-from redspec.yaml_io.includes import resolve_includes
+from redspec.yaml_io.includes import include_closure, resolve_includes
 
 
 class TestResolveIncludes:
@@ -89,3 +89,32 @@ class TestResolveIncludes:
         raw = {"resources": [{"type": "azure/vm", "name": "vm1"}]}
         result = resolve_includes(raw, None)
         assert result == raw
+
+
+class TestIncludeClosure:
+    def test_transitive_closure(self, tmp_path):
+        shared = tmp_path / "shared"
+        shared.mkdir()
+        (shared / "net.yaml").write_text("includes: [dns.yaml]\nresources: []\n", encoding="utf-8")
+        (shared / "dns.yaml").write_text("resources: []\n", encoding="utf-8")
+        root = tmp_path / "main.yaml"
+        root.write_text("includes:\n  - shared/net.yaml\nresources: []\n", encoding="utf-8")
+
+        assert include_closure(root) == {
+            root.resolve(),
+            (shared / "net.yaml").resolve(),
+            (shared / "dns.yaml").resolve(),
+        }
+
+    def test_missing_and_circular_includes(self, tmp_path):
+        a = tmp_path / "a.yaml"
+        b = tmp_path / "b.yaml"
+        a.write_text("includes: [b.yaml, missing.yaml]\n", encoding="utf-8")
+        b.write_text("includes: [a.yaml]\n", encoding="utf-8")
+
+        assert include_closure(a) == {a.resolve(), b.resolve(), (tmp_path / "missing.yaml").resolve()}
+
+    def test_invalid_yaml_is_leaf(self, tmp_path):
+        root = tmp_path / "main.yaml"
+        root.write_text("{{not yaml", encoding="utf-8")
+        assert include_closure(root) == {root.resolve()}